@@ -29,6 +29,8 @@ from wevote_functions.functions_date import DATE_FORMAT_YMD_HMS
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
+# How many ActivityNotices fan_out_activity_notices_from_seed sends between saving its place on the seed
+ACTIVITY_NOTICE_FAN_OUT_BATCH_SIZE = 100
 
 
 def delete_activity_comments_for_voter(voter_to_delete_we_vote_id, from_organization_we_vote_id):
@@ -1708,6 +1710,94 @@ def update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed):
     return results
 
 
+def fan_out_activity_notices_from_seed(
+        activity_notice_seed,
+        send_activity_notice_function,
+        mark_scheduled_before_sending=False):
+    """
+    Send every ActivityNotice from this seed that is waiting for an email, lowest id first, in batches of
+    ACTIVITY_NOTICE_FAN_OUT_BATCH_SIZE. Each batch is found with "id > last id sent" instead of excluding the ids
+    already reviewed, and marked with one UPDATE. The last id sent is saved on the seed after each batch, so a run
+    that is stopped part way through picks up where it left off. When a send fails, the rest of the batch is still
+    sent, but the saved id stops before the failed notice, so the next run tries it again.
+    :param activity_notice_seed:
+    :param send_activity_notice_function: Called with each ActivityNotice, returns a results dict with 'success'
+    :param mark_scheduled_before_sending: Mark the whole batch scheduled_to_email before sending any of it
+    :return:
+    """
+    status = ''
+    success = True
+    activity_notice_count = 0
+    activity_manager = ActivityManager()
+
+    continue_retrieving = True
+    while continue_retrieving and success:
+        results = activity_manager.retrieve_activity_notice_list(
+            activity_notice_seed_id=activity_notice_seed.id,
+            to_be_sent_to_email=True,
+            retrieve_count_limit=ACTIVITY_NOTICE_FAN_OUT_BATCH_SIZE,
+            after_activity_notice_id=activity_notice_seed.activity_notices_scheduled_through_id,
+        )
+        if not results['success']:
+            status += results['status']
+            success = False
+            break
+        if not results['activity_notice_list_found']:
+            break
+        activity_notice_list = results['activity_notice_list']
+        continue_retrieving = len(activity_notice_list) == ACTIVITY_NOTICE_FAN_OUT_BATCH_SIZE
+
+        if mark_scheduled_before_sending:
+            update_results = activity_manager.update_activity_notice_list_delivery_in_bulk(
+                activity_notice_id_list=[activity_notice.id for activity_notice in activity_notice_list],
+                scheduled_to_email=True)
+            if not update_results['success']:
+                status += update_results['status']
+                success = False
+                break
+
+        activity_notice_id_sent_list = []
+        scheduled_through_id = activity_notice_seed.activity_notices_scheduled_through_id
+        for activity_notice in activity_notice_list:
+            send_results = send_activity_notice_function(activity_notice)
+            if send_results['success']:
+                activity_notice_id_sent_list.append(activity_notice.id)
+                if success:
+                    scheduled_through_id = activity_notice.id
+                # We'll want to create a routine that connects up to the SendGrid API to tell us
+                #  when the message was received or bounced
+            else:
+                status += send_results['status']
+                success = False
+        if len(activity_notice_id_sent_list) > 0:
+            update_results = activity_manager.update_activity_notice_list_delivery_in_bulk(
+                activity_notice_id_list=activity_notice_id_sent_list,
+                sent=True)
+            if update_results['success']:
+                activity_notice_count += len(activity_notice_id_sent_list)
+            else:
+                status += update_results['status']
+                success = False
+
+        if scheduled_through_id == activity_notice_seed.activity_notices_scheduled_through_id:
+            continue
+        activity_notice_seed.activity_notices_scheduled_through_id = scheduled_through_id
+        try:
+            ActivityNoticeSeed.objects.filter(id=activity_notice_seed.id).update(
+                activity_notices_scheduled_through_id=activity_notice_seed.activity_notices_scheduled_through_id)
+        except Exception as e:
+            status += "FAILED_SAVING_ACTIVITY_NOTICE_SEED_SCHEDULED_THROUGH_ID: " + str(e) + " "
+            success = False
+
+    status += "ACTIVITY_NOTICES_FANNED_OUT: " + str(activity_notice_count) + " "
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'activity_notice_count':    activity_notice_count,
+    }
+    return results
+
+
 def schedule_activity_notices_from_seed(activity_notice_seed):
     status = ''
     success = True
@@ -1759,63 +1849,29 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
             politician_full_sentence_string = ''
 
         # Send to the campaignX supporters (which includes the campaign owner)
-        continue_retrieving = True
-        activity_notice_id_already_reviewed_list = []
-        safety_valve_count = 0
-        while continue_retrieving and success \
-                and safety_valve_count < 5000:  # Current limit: 500,000 supporters (5000 loops)
-            safety_valve_count += 1
-            results = activity_manager.retrieve_activity_notice_list(
-                activity_notice_seed_id=activity_notice_seed.id,
-                to_be_sent_to_email=True,
-                retrieve_count_limit=100,
-                activity_notice_id_already_reviewed_list=activity_notice_id_already_reviewed_list,
+        def send_campaignx_news_item(activity_notice):
+            return campaignx_news_item_send(
+                campaignx_news_item_we_vote_id=activity_notice_seed.campaignx_news_item_we_vote_id,
+                campaigns_root_url_verified=campaigns_root_url_verified,
+                campaignx_title=campaignx_title,
+                campaignx_url=campaignx_url,
+                campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
+                politician_count=politician_count,
+                politician_full_sentence_string=politician_full_sentence_string,
+                recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                speaker_voter_name=speaker_voter_name,
+                speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
+                statement_subject=activity_notice_seed.statement_subject,
+                statement_text_preview=activity_notice_seed.statement_text_preview,
+                we_vote_hosted_campaign_photo_large_url=we_vote_hosted_campaign_photo_large_url,
             )
-            if not results['success']:
-                status += results['status']
-                success = False
-            elif results['activity_notice_list_found']:
-                activity_notice_list = results['activity_notice_list']
-                for activity_notice in activity_notice_list:
-                    send_results = campaignx_news_item_send(
-                        campaignx_news_item_we_vote_id=activity_notice_seed.campaignx_news_item_we_vote_id,
-                        campaigns_root_url_verified=campaigns_root_url_verified,
-                        campaignx_title=campaignx_title,
-                        campaignx_url=campaignx_url,
-                        campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                        politician_count=politician_count,
-                        politician_full_sentence_string=politician_full_sentence_string,
-                        recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                        speaker_voter_name=speaker_voter_name,
-                        speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
-                        statement_subject=activity_notice_seed.statement_subject,
-                        statement_text_preview=activity_notice_seed.statement_text_preview,
-                        we_vote_hosted_campaign_photo_large_url=we_vote_hosted_campaign_photo_large_url,
-                    )
-                    activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                    try:
-                        activity_notice.scheduled_to_email = True
-                        activity_notice.save()
-                    except Exception as e:
-                        status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_NEWS_ITEM_SCHEDULED: " + str(e) + " "
-                        success = False
-                    if send_results['success']:
-                        try:
-                            activity_notice.sent_to_email = True
-                            activity_notice.scheduled_to_sms = True
-                            activity_notice.sent_to_sms = True
-                            activity_notice.save()
-                            activity_notice_count += 1
-                            # We'll want to create a routine that connects up to the SendGrid API to tell us
-                            #  when the message was received or bounced
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_NEWS_ITEM: " + str(e) + " "
-                            success = False
-                    else:
-                        status += send_results['status']
-                        success = False
-            else:
-                continue_retrieving = False
+        fan_out_results = fan_out_activity_notices_from_seed(
+            activity_notice_seed=activity_notice_seed,
+            send_activity_notice_function=send_campaignx_news_item,
+            mark_scheduled_before_sending=True)
+        status += fan_out_results['status']
+        success = fan_out_results['success']
+        activity_notice_count += fan_out_results['activity_notice_count']
 
         try:
             activity_notice_seed.activity_notices_scheduled = True
@@ -1858,66 +1914,31 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
             success = False
 
         # Send to the person who signed the campaign's friends
-        continue_retrieving = True
-        activity_notice_id_already_reviewed_list = []
-        safety_valve_count = 0
-        while continue_retrieving and success \
-                and safety_valve_count < 500:  # Current limit: 5,000 friends (500 loops with 100 per)
-            safety_valve_count += 1
-            # To find the code where we set an activity_notice to send_to_email or send_to_sms,
-            #  search for: kind_of_notice = NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED
-            # 2023-08-06 Not sending notifications to friends regarding Politician campaigns
-            results = activity_manager.retrieve_activity_notice_list(
+        # To find the code where we set an activity_notice to send_to_email or send_to_sms,
+        #  search for: kind_of_notice = NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED
+        # 2023-08-06 Not sending notifications to friends regarding Politician campaigns
+        if success and not positive_value_exists(activity_notice_seed.campaignx_we_vote_id):
+            # If missing campaignx_we_vote_id, then we don't want to send to friends.
+            #  Marking them sent isn't accurate, but will stop further notices from being sent
+            #  Should be looked at in the future
+            update_results = activity_manager.update_activity_notice_list_delivery_in_bulk(
                 activity_notice_seed_id=activity_notice_seed.id,
-                to_be_sent_to_email=True,
-                retrieve_count_limit=100,
-                activity_notice_id_already_reviewed_list=activity_notice_id_already_reviewed_list,
-            )
-            if not results['success']:
-                status += results['status']
+                sent=True)
+            if not update_results['success']:
+                status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_FRIEND_NOT_SENT: " + update_results['status']
                 success = False
-            elif results['activity_notice_list_found']:
-                activity_notice_list = results['activity_notice_list']
-                # If missing campaignx_we_vote_id, then we don't want to send to friends
-                do_not_notify_friends = not positive_value_exists(activity_notice_seed.campaignx_we_vote_id)
-                for activity_notice in activity_notice_list:
-                    if do_not_notify_friends:
-                        # Do not tell friends in this case
-                        try:
-                            # This isn't accurate, but will stop further notices from being sent
-                            #  Should be looked at in the future
-                            activity_notice.scheduled_to_email = True
-                            activity_notice.sent_to_email = True
-                            activity_notice.scheduled_to_sms = True
-                            activity_notice.sent_to_sms = True
-                            activity_notice.save()
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_FRIEND_NOT_SENT: " + str(e) + " "
-                            success = False
-                    else:
-                        send_results = campaignx_friend_has_supported_send(
-                            campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                            recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                            speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id)
-                        activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                        if send_results['success']:
-                            try:
-                                activity_notice.scheduled_to_email = True
-                                activity_notice.sent_to_email = True
-                                activity_notice.scheduled_to_sms = True
-                                activity_notice.sent_to_sms = True
-                                activity_notice.save()
-                                activity_notice_count += 1
-                                # We'll want to create a routine that connects up to the SendGrid API to tell us
-                                #  when the message was received or bounced
-                            except Exception as e:
-                                status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED: " + str(e) + " "
-                                success = False
-                        else:
-                            status += send_results['status']
-                            success = False
-            else:
-                continue_retrieving = False
+        elif success:
+            def send_campaignx_friend_has_supported(activity_notice):
+                return campaignx_friend_has_supported_send(
+                    campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
+                    recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                    speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id)
+            fan_out_results = fan_out_activity_notices_from_seed(
+                activity_notice_seed=activity_notice_seed,
+                send_activity_notice_function=send_campaignx_friend_has_supported)
+            status += fan_out_results['status']
+            success = fan_out_results['success']
+            activity_notice_count += fan_out_results['activity_notice_count']
         if success:
             try:
                 # activity_notice_seed.activity_notices_scheduled = True  # Saved above
@@ -1936,57 +1957,28 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
         # Schedule/send emails
         # For these kinds of seeds, we just send an email notification for the activity_notice (that is displayed
         #  to each voter in the header bar
-        continue_retrieving = True
-        activity_notice_id_already_reviewed_list = []
-        safety_valve_count = 0
-        while continue_retrieving and success \
-                and safety_valve_count < 500:  # Current limit: 5,000 friends (500 loops with 100 per)
-            safety_valve_count += 1
-            results = activity_manager.retrieve_activity_notice_list(
-                activity_notice_seed_id=activity_notice_seed.id,
-                to_be_sent_to_email=True,
-                retrieve_count_limit=100,
-                activity_notice_id_already_reviewed_list=activity_notice_id_already_reviewed_list,
-            )
-            if not results['success']:
-                status += results['status']
-                success = False
-            elif results['activity_notice_list_found']:
-                position_name_list = []
-                if positive_value_exists(activity_notice_seed.position_names_for_friends_serialized):
-                    position_name_list_for_friends = \
-                        json.loads(activity_notice_seed.position_names_for_friends_serialized)
-                    position_name_list += position_name_list_for_friends
-                if positive_value_exists(activity_notice_seed.position_names_for_public_serialized):
-                    position_name_list_for_public = \
-                        json.loads(activity_notice_seed.position_names_for_public_serialized)
-                    position_name_list += position_name_list_for_public
-
-                activity_notice_list = results['activity_notice_list']
-                for activity_notice in activity_notice_list:
-                    send_results = notice_friend_endorsements_send(
-                        speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
-                        recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                        activity_tidbit_we_vote_id=activity_notice_seed.we_vote_id,
-                        position_name_list=position_name_list)
-                    activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                    if send_results['success']:
-                        try:
-                            activity_notice.scheduled_to_email = True
-                            activity_notice.sent_to_email = True
-                            activity_notice.scheduled_to_sms = True
-                            activity_notice.sent_to_sms = True
-                            activity_notice.save()
-                            activity_notice_count += 1
-                            # We'll want to create a routine that connects up to the SendGrid API to tell us
-                            #  when the message was received or bounced
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE: " + str(e) + " "
-                    else:
-                        status += send_results['status']
-                        success = False
-            else:
-                continue_retrieving = False
+        position_name_list = []
+        if positive_value_exists(activity_notice_seed.position_names_for_friends_serialized):
+            position_name_list_for_friends = \
+                json.loads(activity_notice_seed.position_names_for_friends_serialized)
+            position_name_list += position_name_list_for_friends
+        if positive_value_exists(activity_notice_seed.position_names_for_public_serialized):
+            position_name_list_for_public = \
+                json.loads(activity_notice_seed.position_names_for_public_serialized)
+            position_name_list += position_name_list_for_public
+
+        def send_friend_endorsements(activity_notice):
+            return notice_friend_endorsements_send(
+                speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
+                recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                activity_tidbit_we_vote_id=activity_notice_seed.we_vote_id,
+                position_name_list=position_name_list)
+        fan_out_results = fan_out_activity_notices_from_seed(
+            activity_notice_seed=activity_notice_seed,
+            send_activity_notice_function=send_friend_endorsements)
+        status += fan_out_results['status']
+        success = fan_out_results['success']
+        activity_notice_count += fan_out_results['activity_notice_count']
         try:
             activity_notice_seed.activity_notices_scheduled = True
             activity_notice_seed.save()
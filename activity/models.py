@@ -575,7 +575,18 @@ class ActivityManager(models.Manager):
             to_be_sent_to_email=False,
             to_be_sent_to_sms=False,
             retrieve_count_limit=0,
-            activity_notice_id_already_reviewed_list=[]):
+            activity_notice_id_already_reviewed_list=[],
+            after_activity_notice_id=None):
+        """
+        :param activity_notice_seed_id:
+        :param to_be_sent_to_email:
+        :param to_be_sent_to_sms:
+        :param retrieve_count_limit:
+        :param activity_notice_id_already_reviewed_list:
+        :param after_activity_notice_id: Keyset pagination. When passed, return the notices with a higher id,
+          lowest id first, instead of the most recent first
+        :return:
+        """
         status = ""
 
         activity_notice_list = []
@@ -595,9 +606,13 @@ class ActivityManager(models.Manager):
             if activity_notice_id_already_reviewed_list and len(activity_notice_id_already_reviewed_list) > 0:
                 queryset = queryset.exclude(id__in=activity_notice_id_already_reviewed_list)
 
-            queryset = queryset.order_by('-id')  # Put most recent at top of list
+            if after_activity_notice_id is not None:
+                queryset = queryset.filter(id__gt=after_activity_notice_id)
+                queryset = queryset.order_by('id')
+            else:
+                queryset = queryset.order_by('-id')  # Put most recent at top of list
             if positive_value_exists(retrieve_count_limit):
-                activity_notice_list = queryset[:retrieve_count_limit]
+                activity_notice_list = list(queryset[:retrieve_count_limit])
             else:
                 activity_notice_list = list(queryset)
 
@@ -1297,6 +1312,67 @@ class ActivityManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def update_activity_notice_list_delivery_in_bulk(
+            activity_notice_id_list=[],
+            activity_notice_seed_id=0,
+            scheduled_to_email=False,
+            sent=False):
+        """
+        Mark ActivityNotices as scheduled (or sent) with one UPDATE, either by id, or every notice from one seed that
+        is still waiting to be sent by email.
+        :param activity_notice_id_list:
+        :param activity_notice_seed_id:
+        :param scheduled_to_email:
+        :param sent: Also marks scheduled_to_email, scheduled_to_sms and sent_to_sms, like a notice saved after sending
+        :return:
+        """
+        status = ""
+        activity_notice_update_count = 0
+        update_values = {}
+        if positive_value_exists(scheduled_to_email):
+            update_values['scheduled_to_email'] = True
+        if positive_value_exists(sent):
+            update_values['scheduled_to_email'] = True
+            update_values['sent_to_email'] = True
+            update_values['scheduled_to_sms'] = True
+            update_values['sent_to_sms'] = True
+        if not update_values or \
+                not (activity_notice_id_list or positive_value_exists(activity_notice_seed_id)):
+            status += 'UPDATE_ACTIVITY_NOTICE_LIST_DELIVERY_MISSING_VARIABLES '
+            results = {
+                'success':                      False,
+                'status':                       status,
+                'activity_notice_update_count': activity_notice_update_count,
+            }
+            return results
+
+        try:
+            queryset = ActivityNotice.objects.all()
+            if activity_notice_id_list:
+                queryset = queryset.filter(id__in=activity_notice_id_list)
+            else:
+                queryset = queryset.filter(
+                    activity_notice_seed_id=activity_notice_seed_id,
+                    deleted=False,
+                    send_to_email=True,
+                    scheduled_to_email=False,
+                    sent_to_email=False,
+                )
+            activity_notice_update_count = queryset.update(**update_values)
+            success = True
+            status += 'ACTIVITY_NOTICE_LIST_DELIVERY_UPDATED: ' + str(activity_notice_update_count) + ' '
+        except Exception as e:
+            success = False
+            status += 'FAILED update_activity_notice_list_delivery_in_bulk ' + str(e) + ' '
+
+        results = {
+            'success':                      success,
+            'status':                       status,
+            'activity_notice_update_count': activity_notice_update_count,
+        }
+        return results
+
     @staticmethod
     def update_activity_notice_seed(activity_notice_seed_id, update_values):
         """
@@ -1667,6 +1743,8 @@ class ActivityNoticeSeed(models.Model):
     activity_tidbit_we_vote_ids_for_public_serialized = models.TextField(default=None, null=True)
     date_of_notice_earlier_than_update_window = models.BooleanField(default=False)
     activity_notices_scheduled = models.BooleanField(default=False)
+    # Resume point for fan_out_activity_notices_from_seed: every ActivityNotice up to this id has been sent
+    activity_notices_scheduled_through_id = models.BigIntegerField(default=0)
     added_to_voter_daily_summary = models.BooleanField(default=False)
     campaignx_news_item_we_vote_id = models.CharField(max_length=255, default=None, null=True)
     campaignx_we_vote_id = models.CharField(max_length=255, default=None, null=True)
@@ -0,0 +1,66 @@
+# activity/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.test import TestCase
+
+import activity.controllers
+from activity.controllers import fan_out_activity_notices_from_seed
+from activity.models import ActivityNotice, ActivityNoticeSeed
+
+
+class FanOutActivityNoticesTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.activity_notice_seed = ActivityNoticeSeed.objects.create(we_vote_id='wv01actseed1')
+        ActivityNotice.objects.bulk_create([
+            ActivityNotice(activity_notice_seed_id=self.activity_notice_seed.id, send_to_email=True,
+                           recipient_voter_we_vote_id='wv01voter' + str(number))
+            for number in range(5)])
+        self.activity_notice_id_list = list(ActivityNotice.objects.order_by('id').values_list('id', flat=True))
+        # Two notices per batch
+        patcher = mock.patch.object(activity.controllers, 'ACTIVITY_NOTICE_FAN_OUT_BATCH_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fan_out(self, failing_recipient_set=()):
+        sent_recipient_list = []
+
+        def send_activity_notice(activity_notice):
+            if activity_notice.recipient_voter_we_vote_id in failing_recipient_set:
+                return {'success': False, 'status': 'SEND_FAILED '}
+            sent_recipient_list.append(activity_notice.recipient_voter_we_vote_id)
+            return {'success': True, 'status': ''}
+        # Fresh from the database, as each batch process run would load it
+        activity_notice_seed = ActivityNoticeSeed.objects.get(id=self.activity_notice_seed.id)
+        results = fan_out_activity_notices_from_seed(
+            activity_notice_seed=activity_notice_seed, send_activity_notice_function=send_activity_notice)
+        return results, sent_recipient_list
+
+    def fetch_scheduled_through_id(self):
+        return ActivityNoticeSeed.objects.get(id=self.activity_notice_seed.id).activity_notices_scheduled_through_id
+
+    def test_resume_after_the_last_notice_sent(self):
+        # A run which stopped after the first batch
+        ActivityNoticeSeed.objects.filter(id=self.activity_notice_seed.id)\
+            .update(activity_notices_scheduled_through_id=self.activity_notice_id_list[1])
+        results, sent_recipient_list = self.fan_out()
+        self.assertTrue(results['success'])
+        self.assertEqual(sent_recipient_list, ['wv01voter2', 'wv01voter3', 'wv01voter4'])
+        self.assertEqual(self.fetch_scheduled_through_id(), self.activity_notice_id_list[-1])
+
+    def test_failed_notice_is_sent_on_retry(self):
+        results, sent_recipient_list = self.fan_out(failing_recipient_set={'wv01voter2'})
+        self.assertFalse(results['success'])
+        # The rest of the failed batch is still sent, but we stop there
+        self.assertEqual(sent_recipient_list, ['wv01voter0', 'wv01voter1', 'wv01voter3'])
+        self.assertEqual(self.fetch_scheduled_through_id(), self.activity_notice_id_list[1])
+
+        results, sent_recipient_list = self.fan_out()
+        self.assertTrue(results['success'])
+        self.assertEqual(sent_recipient_list, ['wv01voter2', 'wv01voter4'])
+        self.assertEqual(results['activity_notice_count'], 2)
+        self.assertEqual(ActivityNotice.objects.filter(sent_to_email=True).count(), 5)
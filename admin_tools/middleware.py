@@ -0,0 +1,149 @@
+# admin_tools/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Per-request SQL and timing instrumentation"""
+
+from collections import Counter, deque
+from contextlib import ExitStack
+import json
+import os
+import random
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.timezone import now
+
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# Most recent instrumented requests in this process, newest last. Shown on the admin_tools request_instrumentation page
+request_instrumentation_ring_buffer = deque(maxlen=getattr(settings, 'REQUEST_INSTRUMENTATION_RING_BUFFER_SIZE', 200))
+request_instrumentation_ring_buffer_lock = threading.Lock()
+
+DUPLICATE_QUERIES_TO_REPORT = 5
+DUPLICATE_QUERY_SQL_MAX_LENGTH = 300
+INSTRUMENTATION_IGNORED_PATH_FRAGMENTS = (
+    os.sep + 'django' + os.sep,
+    'site-packages',
+    os.sep + 'admin_tools' + os.sep + 'middleware.py',
+)
+
+
+def find_calling_site_in_our_code():
+    """
+    The innermost frame of our own code that led to this query, like "position/models.py:4012 in retrieve_...".
+    """
+    for frame_summary in reversed(traceback.extract_stack()):
+        if any(path_fragment in frame_summary.filename for path_fragment in INSTRUMENTATION_IGNORED_PATH_FRAGMENTS):
+            continue
+        file_name = os.path.relpath(frame_summary.filename, settings.BASE_DIR)
+        return file_name + ":" + str(frame_summary.lineno) + " in " + frame_summary.name
+    return ''
+
+
+class RequestQueryRecorder(object):
+    """
+    A database execute_wrapper. Counts and times every query; when capture_details is on (sampled requests),
+    also keeps the SQL text and the calling site, which are needed to find N+1 patterns.
+    """
+
+    def __init__(self, capture_details=False):
+        self.capture_details = capture_details
+        self.query_count = 0
+        self.sql_time_seconds = 0.0
+        self.sql_counter = Counter()
+        self.calling_site_counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        time_started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time_seconds += time.perf_counter() - time_started
+            self.query_count += 1
+            if self.capture_details:
+                # Parameters are left out, so the same query run for many different ids counts as a duplicate
+                self.sql_counter[sql] += 1
+                self.calling_site_counter[find_calling_site_in_our_code()] += 1
+
+
+class RequestInstrumentationMiddleware(object):
+    """
+    Opt-in with REQUEST_INSTRUMENTATION_ON. Every request under REQUEST_INSTRUMENTATION_PATH_PREFIX is timed and its
+    queries counted, which is cheap. REQUEST_INSTRUMENTATION_SAMPLE_RATE of them (and any request slower than
+    REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS) are also logged and added to the ring buffer; only sampled requests
+    collect the duplicate query and calling site details, since walking the stack for every query is not cheap.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION_ON', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path_prefix = getattr(settings, 'REQUEST_INSTRUMENTATION_PATH_PREFIX', '/apis/v1/')
+        self.sample_rate = float(getattr(settings, 'REQUEST_INSTRUMENTATION_SAMPLE_RATE', 0.01))
+        self.slow_request_ms = float(getattr(settings, 'REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS', 1000))
+
+    def __call__(self, request):
+        if not request.path.startswith(self.path_prefix):
+            return self.get_response(request)
+
+        is_sampled = random.random() < self.sample_rate
+        query_recorder = RequestQueryRecorder(capture_details=is_sampled)
+        time_started = time.perf_counter()
+        with ExitStack() as exit_stack:
+            # Test databases can mirror one another, so wrap each underlying connection only once
+            for connection in {id(connection): connection for connection in connections.all()}.values():
+                exit_stack.enter_context(connection.execute_wrapper(query_recorder))
+            response = self.get_response(request)
+        wall_time_ms = (time.perf_counter() - time_started) * 1000
+
+        if is_sampled or wall_time_ms >= self.slow_request_ms:
+            self.save_request_instrumentation(request, response, query_recorder, wall_time_ms, is_sampled)
+        return response
+
+    @staticmethod
+    def save_request_instrumentation(request, response, query_recorder, wall_time_ms, is_sampled):
+        duplicate_query_list = [
+            {'sql': sql[:DUPLICATE_QUERY_SQL_MAX_LENGTH], 'count': count}
+            for sql, count in query_recorder.sql_counter.most_common(DUPLICATE_QUERIES_TO_REPORT) if count > 1]
+        top_repeated_stack_site = ''
+        top_repeated_stack_site_count = 0
+        if query_recorder.calling_site_counter:
+            top_repeated_stack_site, top_repeated_stack_site_count = \
+                query_recorder.calling_site_counter.most_common(1)[0]
+
+        request_instrumentation = {
+            'date':                             now().strftime('%Y-%m-%d %H:%M:%S'),
+            'method':                           request.method,
+            'path':                             request.path,
+            'status_code':                      response.status_code,
+            'is_sampled':                       is_sampled,
+            'wall_time_ms':                     round(wall_time_ms, 1),
+            'query_count':                      query_recorder.query_count,
+            'sql_time_ms':                      round(query_recorder.sql_time_seconds * 1000, 1),
+            'duplicate_query_list':             duplicate_query_list,
+            'top_repeated_stack_site':          top_repeated_stack_site,
+            'top_repeated_stack_site_count':    top_repeated_stack_site_count,
+        }
+        with request_instrumentation_ring_buffer_lock:
+            request_instrumentation_ring_buffer.append(request_instrumentation)
+        logger.info("REQUEST_INSTRUMENTATION " + json.dumps(request_instrumentation))
+
+
+def retrieve_request_instrumentation_list(sort_by='date'):
+    """
+    Copy of the ring buffer for the admin page, slowest or most queries first if asked.
+    """
+    with request_instrumentation_ring_buffer_lock:
+        request_instrumentation_list = list(request_instrumentation_ring_buffer)
+    if sort_by in ('wall_time_ms', 'query_count', 'sql_time_ms'):
+        request_instrumentation_list.sort(key=lambda one_request: one_request[sort_by], reverse=True)
+    else:
+        request_instrumentation_list.reverse()
+    return request_instrumentation_list
@@ -21,6 +21,7 @@ urlpatterns = [
         views.data_cleanup_voter_list_analysis_view, name='data_cleanup_voter_list_analysis'),
     re_path(r'^data_voter_statistics/$', views.data_voter_statistics_view, name='data_voter_statistics'),
     re_path(r'^import_sample_data/$', views.import_sample_data_view, name='import_sample_data'),
+    re_path(r'^request_instrumentation/$', views.request_instrumentation_view, name='request_instrumentation'),
     re_path(r'^statistics/$', views.statistics_summary_view, name='statistics_summary'),
     re_path(r'^sync_dashboard/$', views.sync_data_with_master_servers_view, name='sync_dashboard'),
 ]
@@ -14,14 +14,19 @@ from django.urls import reverse
 
 import wevote_functions
 from ballot.models import BallotReturned, VoterBallotSaved
+from admin_tools.middleware import retrieve_request_instrumentation_list
 from candidate.controllers import candidates_import_from_sample_file
 from candidate.models import CandidateCampaign, CandidateManager
-from config.base import get_environment_variable, LOGIN_URL, BASE_DIR, PROJECT_PATH
+from config.base import get_environment_variable, LOGIN_URL, BASE_DIR, PROJECT_PATH, REQUEST_INSTRUMENTATION_ON, \
+    REQUEST_INSTRUMENTATION_SAMPLE_RATE, REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS
+from config.database_router import read_replica_routing_is_on, retrieve_database_routing_count_list
 from election.controllers import elections_import_from_sample_file
 from election.models import Election
 from email_outbound.models import EmailAddress
 from follow.models import FollowOrganizationList
 from friend.models import CurrentFriend, FriendManager, SuggestedFriend
+from geoip.controllers import retrieve_geoip_lookup_cache_counts
+from googlebot_site_map.controllers_request_log import retrieve_googlebot_reverse_dns_cache_counts
 from import_export_ctcl.models import CTCLApiCounterManager
 from import_export_facebook.models import FacebookLinkToVoter, FacebookManager
 from import_export_google_civic.models import GoogleCivicApiCounterManager
@@ -1172,18 +1177,15 @@ def data_cleanup_voter_list_analysis_view(request):
 
     suggested_friend_created_count = 0
     if updated_suggested_friends:
-        current_friends_results = CurrentFriend.objects.all()
-
-        for one_current_friend in current_friends_results:
-            # Start with one_current_friend.viewer_voter_we_vote_id, get a list of all of that voter's friends
-            results = friend_manager.update_suggested_friends_starting_with_one_voter(
-                one_current_friend.viewer_voter_we_vote_id)
-            if results['suggested_friend_created_count']:
-                suggested_friend_created_count += results['suggested_friend_created_count']
-
-            # Then do the other side of the friendship - the viewee
-            results = friend_manager.update_suggested_friends_starting_with_one_voter(
-                one_current_friend.viewee_voter_we_vote_id)
+        # Both sides of every friendship, once per voter
+        voter_we_vote_id_set = set(CurrentFriend.objects.values_list('viewer_voter_we_vote_id', flat=True))
+        voter_we_vote_id_set.update(CurrentFriend.objects.values_list('viewee_voter_we_vote_id', flat=True))
+        voter_we_vote_id_set.discard(None)
+        voter_we_vote_id_set.discard('')
+
+        for voter_we_vote_id in sorted(voter_we_vote_id_set):
+            # Get a list of all of this voter's friends, and suggest them to each other
+            results = friend_manager.update_suggested_friends_starting_with_one_voter(voter_we_vote_id)
             if results['suggested_friend_created_count']:
                 suggested_friend_created_count += results['suggested_friend_created_count']
 
@@ -1914,6 +1916,36 @@ def redirect_to_sign_in_page(request, authority_required={}):
     return HttpResponseRedirect(LOGIN_URL + next_url_variable)
 
 
+@login_required
+def request_instrumentation_view(request):
+    # admin, analytics_admin, partner_organization, political_data_manager, political_data_viewer, verified_volunteer
+    authority_required = {'admin'}
+    if not voter_has_authority(request, authority_required):
+        return redirect_to_sign_in_page(request, authority_required)
+
+    sort_by = request.GET.get('sort_by', 'date')
+    show_sampled_only = positive_value_exists(request.GET.get('show_sampled_only', False))
+
+    request_instrumentation_list = retrieve_request_instrumentation_list(sort_by=sort_by)
+    if show_sampled_only:
+        request_instrumentation_list = [one_request for one_request in request_instrumentation_list
+                                        if one_request['is_sampled']]
+
+    template_values = {
+        'database_routing_count_list':             retrieve_database_routing_count_list(),
+        'geoip_lookup_cache_counts':               retrieve_geoip_lookup_cache_counts(),
+        'googlebot_reverse_dns_cache_counts':      retrieve_googlebot_reverse_dns_cache_counts(),
+        'read_replica_routing_on':                 read_replica_routing_is_on(),
+        'request_instrumentation_list':            request_instrumentation_list,
+        'request_instrumentation_on':              REQUEST_INSTRUMENTATION_ON,
+        'request_instrumentation_sample_rate':     REQUEST_INSTRUMENTATION_SAMPLE_RATE,
+        'request_instrumentation_slow_request_ms': REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS,
+        'show_sampled_only':                       show_sampled_only,
+        'sort_by':                                 sort_by,
+    }
+    return render(request, 'admin_tools/request_instrumentation.html', template_values)
+
+
 @login_required
 def statistics_summary_view(request):
     # admin, analytics_admin, partner_organization, political_data_manager, political_data_viewer, verified_volunteer
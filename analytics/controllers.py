@@ -2,11 +2,17 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from .controllers_rollup import fetch_analytics_rollup_daily_and_total, fetch_analytics_rollup_for_one_day, \
+    fetch_analytics_rollup_total, generate_election_sketch_key, generate_organization_election_sketch_key, \
+    generate_organization_sketch_key, SKETCH_AUTHENTICATED_VISITORS, SKETCH_BALLOT_VIEWERS, SKETCH_VISITORS, \
+    SKETCH_VOTER_GUIDES_VIEWED
+from .controllers_action_buffer import ANALYTICS_ACTION_BUFFER_ON, buffer_analytics_action, \
+    fetch_politician_we_vote_id_from_seo_friendly_path
 from .models import AnalyticsAction, AnalyticsCountManager, AnalyticsManager, \
     ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS
 from candidate.models import CandidateManager
 from config.base import get_environment_variable
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from django.db.models import Q
 from django.utils.timezone import localtime, now
 from exception.models import print_to_log
@@ -21,7 +27,6 @@ from import_export_batches.models import AUGMENT_ANALYTICS_ACTION_WITH_ELECTION_
     CALCULATE_SITEWIDE_VOTER_METRICS
 from measure.models import ContestMeasureManager
 from office.models import ContestOfficeManager
-from politician.models import Politician
 from position.models import PositionMetricsManager
 from share.models import ShareManager
 from voter.models import VoterManager, VoterMetricsManager
@@ -875,38 +880,63 @@ def save_analytics_action_for_api(  # saveAnalyticsAction
     if positive_value_exists(seo_friendly_path) and not positive_value_exists(politician_we_vote_id):
         # Look up the politician_we_vote_id based on the seo_friendly_path
         try:
-            queryset = Politician.objects.using('readonly').filter(seo_friendly_path=seo_friendly_path)
-            one_politician = queryset.first()
-            politician_we_vote_id = one_politician.we_vote_id
+            politician_we_vote_id = fetch_politician_we_vote_id_from_seo_friendly_path(seo_friendly_path)
+            if politician_we_vote_id is None:
+                status += "POLITICIAN_NOT_FOUND-FROM_SEO_FRIENDLY_PATH "
         except Exception as e:
             politician_we_vote_id = None
             status += "POLITICIAN_NOT_FOUND-FROM_SEO_FRIENDLY_PATH: " + str(e) + " "
 
-    save_results = analytics_manager.save_action(
-        action_constant=action_constant,
-        voter_we_vote_id=voter_we_vote_id,
-        voter_id=voter_id,
-        is_signed_in=is_signed_in,
-        state_code=state_code,
-        organization_we_vote_id=organization_we_vote_id,
-        organization_id=organization_id,
-        google_civic_election_id=google_civic_election_id,
-        user_agent_string=user_agent_string,
-        is_bot=is_bot,
-        is_mobile=is_mobile,
-        is_desktop=is_desktop,
-        is_tablet=is_tablet,
-        ballot_item_we_vote_id=ballot_item_we_vote_id,
-        voter_device_id=voter_device_id,
-        politician_we_vote_id=politician_we_vote_id)
-    if save_results['action_saved']:
-        action = save_results['action']
-        date_as_integer = action.date_as_integer
-        status += save_results['status']
-        success = save_results['success']
+    if ANALYTICS_ACTION_BUFFER_ON:
+        # Saved in bulk by the flusher in analytics/controllers_action_buffer.py, so this request doesn't wait on
+        #  the analytics database
+        try:
+            date_as_integer = buffer_analytics_action(
+                action_constant=action_constant,
+                voter_we_vote_id=voter_we_vote_id,
+                voter_id=voter_id,
+                is_signed_in=is_signed_in,
+                state_code=state_code,
+                organization_we_vote_id=organization_we_vote_id,
+                organization_id=organization_id if action_requires_organization_ids else None,
+                google_civic_election_id=google_civic_election_id,
+                user_agent_string=user_agent_string,
+                is_bot=is_bot,
+                is_mobile=is_mobile,
+                is_desktop=is_desktop,
+                is_tablet=is_tablet,
+                ballot_item_we_vote_id=ballot_item_we_vote_id,
+                politician_we_vote_id=politician_we_vote_id)
+            status += "ANALYTICS_ACTION_BUFFERED "
+        except Exception as e:
+            status += "ANALYTICS_ACTION_NOT_BUFFERED: " + str(e) + " "
+            success = False
     else:
-        status += "ACTION_VOTER_GUIDE_VISIT-NOT_SAVED "
-        success = False
+        save_results = analytics_manager.save_action(
+            action_constant=action_constant,
+            voter_we_vote_id=voter_we_vote_id,
+            voter_id=voter_id,
+            is_signed_in=is_signed_in,
+            state_code=state_code,
+            organization_we_vote_id=organization_we_vote_id,
+            organization_id=organization_id,
+            google_civic_election_id=google_civic_election_id,
+            user_agent_string=user_agent_string,
+            is_bot=is_bot,
+            is_mobile=is_mobile,
+            is_desktop=is_desktop,
+            is_tablet=is_tablet,
+            ballot_item_we_vote_id=ballot_item_we_vote_id,
+            voter_device_id=voter_device_id,
+            politician_we_vote_id=politician_we_vote_id)
+        if save_results['action_saved']:
+            action = save_results['action']
+            date_as_integer = action.date_as_integer
+            status += save_results['status']
+            success = save_results['success']
+        else:
+            status += "ACTION_VOTER_GUIDE_VISIT-NOT_SAVED "
+            success = False
 
     results = {
         'status':                   status,
@@ -943,17 +973,30 @@ def calculate_organization_election_metrics(google_civic_election_id, organizati
     return_voter_we_vote_id = True
 
     google_civic_election_id = convert_to_int(google_civic_election_id)
-    visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id, organization_we_vote_id)
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id, organization_we_vote_id, 0, 0, limit_to_authenticated)
+    # From the running total sketches kept by analytics/controllers_rollup.py when we have them, otherwise counted
+    visitors_total = fetch_analytics_rollup_total(generate_organization_election_sketch_key(
+        'visitors', google_civic_election_id, organization_we_vote_id))
+    if visitors_total is None:
+        visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id, organization_we_vote_id)
+    authenticated_visitors_total = fetch_analytics_rollup_total(generate_organization_election_sketch_key(
+        'authenticated_visitors', google_civic_election_id, organization_we_vote_id))
+    if authenticated_visitors_total is None:
+        authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id, organization_we_vote_id, 0, 0, limit_to_authenticated)
     voter_guide_entrants = analytics_count_manager.fetch_visitors_first_visit_to_organization_in_election(
         organization_we_vote_id, google_civic_election_id)
     followers_at_time_of_election = follow_count_manager.fetch_organization_followers(
         organization_we_vote_id, google_civic_election_id)
-    new_followers = analytics_count_manager.fetch_new_followers_in_election(
-        google_civic_election_id, organization_we_vote_id)
-    new_auto_followers = analytics_count_manager.fetch_new_auto_followers_in_election(
-        google_civic_election_id, organization_we_vote_id)
+    new_followers = fetch_analytics_rollup_total(generate_organization_election_sketch_key(
+        'followers', google_civic_election_id, organization_we_vote_id))
+    if new_followers is None:
+        new_followers = analytics_count_manager.fetch_new_followers_in_election(
+            google_civic_election_id, organization_we_vote_id)
+    new_auto_followers = fetch_analytics_rollup_total(generate_organization_election_sketch_key(
+        'auto_followers', google_civic_election_id, organization_we_vote_id))
+    if new_auto_followers is None:
+        new_auto_followers = analytics_count_manager.fetch_new_auto_followers_in_election(
+            google_civic_election_id, organization_we_vote_id)
     entrants_visited_ballot = analytics_count_manager.fetch_organization_entrants_visited_ballot(
         organization_we_vote_id, google_civic_election_id)
     followers_visited_ballot = analytics_count_manager.fetch_organization_followers_visited_ballot(
@@ -1031,15 +1074,20 @@ def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_d
     position_metrics_manager = PositionMetricsManager()
     follow_organization_list = FollowOrganizationList()
 
-    date_as_integer = convert_to_int(date)
-    visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id_zero, organization_we_vote_id)
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, 0, 0, limit_to_authenticated)
-
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer, 0, limit_to_authenticated)
+    date_as_integer = convert_to_int(limit_to_one_date_as_integer)
+    # One scan of the day for every organization, see analytics/controllers_rollup.py
+    rollup_results = fetch_analytics_rollup_for_one_day(date_as_integer)
+    visitors_today, visitors_total = fetch_analytics_rollup_daily_and_total(
+        rollup_results, generate_organization_sketch_key('visitors', organization_we_vote_id), date_as_integer)
+    authenticated_visitors_today, authenticated_visitors_total = fetch_analytics_rollup_daily_and_total(
+        rollup_results, generate_organization_sketch_key('authenticated_visitors', organization_we_vote_id),
+        date_as_integer)
+    if visitors_total is None:
+        visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, 0, date_as_integer)
+    if authenticated_visitors_total is None:
+        authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, 0, date_as_integer, limit_to_authenticated)
 
     new_visitors_today = None
     voter_guide_entrants_today = None
@@ -1096,27 +1144,33 @@ def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
     limit_to_one_date_as_integer = convert_to_int(limit_to_one_date_as_integer)
     count_through_this_date_as_integer = limit_to_one_date_as_integer
 
-    visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
-        count_through_this_date_as_integer)
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, limit_to_one_date_as_integer)
+    # Today's counts come from one scan of today's AnalyticsAction rows. The totals are carried forward from
+    #  yesterday in HyperLogLog sketches (see analytics/controllers_rollup.py), and only recounted from all of
+    #  history when the sketches aren't current through the day before.
+    rollup_results = fetch_analytics_rollup_for_one_day(limit_to_one_date_as_integer)
+    status += rollup_results['status']
+    visitors_today, visitors_total = fetch_analytics_rollup_daily_and_total(
+        rollup_results, SKETCH_VISITORS, limit_to_one_date_as_integer)
+    if visitors_total is None:
+        visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
+            count_through_this_date_as_integer)
     new_visitors_today = None
     voter_guide_entrants_today = None
     welcome_page_entrants_today = None
     friend_entrants_today = None
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        limit_to_one_date_as_integer, date_as_integer_zero, limit_to_authenticated)
-    ballot_views_today = analytics_count_manager.fetch_ballot_views(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-    voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
-    voter_guides_viewed_today = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
+    authenticated_visitors_today, authenticated_visitors_total = fetch_analytics_rollup_daily_and_total(
+        rollup_results, SKETCH_AUTHENTICATED_VISITORS, limit_to_one_date_as_integer)
+    if authenticated_visitors_total is None:
+        authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty,
+            date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
+    ballot_views_today = rollup_results['daily_count_by_sketch_key'].get(SKETCH_BALLOT_VIEWERS, 0)
+    voter_guides_viewed_today, voter_guides_viewed_total = fetch_analytics_rollup_daily_and_total(
+        rollup_results, SKETCH_VOTER_GUIDES_VIEWED, limit_to_one_date_as_integer)
+    if voter_guides_viewed_total is None:
+        voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
+            google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
 
     issues_followed_total = follow_metrics_manager.fetch_issues_followed(
         voter_we_vote_id_empty, date_as_integer_zero, count_through_this_date_as_integer)
@@ -1202,15 +1256,27 @@ def calculate_sitewide_election_metrics(google_civic_election_id):
     voter_metrics_manager = VoterMetricsManager()
 
     google_civic_election_id = convert_to_int(google_civic_election_id)
-    visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id)
+    # From the running total sketches kept by analytics/controllers_rollup.py when we have them, otherwise counted
+    visitors_total = fetch_analytics_rollup_total(generate_election_sketch_key('visitors', google_civic_election_id))
+    if visitors_total is None:
+        visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id)
     voter_guide_entries = None
     voter_guide_views = None
-    voter_guides_viewed = analytics_count_manager.fetch_voter_guides_viewed(google_civic_election_id)
+    voter_guides_viewed = fetch_analytics_rollup_total(
+        generate_election_sketch_key('voter_guides_viewed', google_civic_election_id))
+    if voter_guides_viewed is None:
+        voter_guides_viewed = analytics_count_manager.fetch_voter_guides_viewed(google_civic_election_id)
     issues_followed = None
-    unique_voters_that_followed_organizations = analytics_count_manager.fetch_new_followers_in_election(
-        google_civic_election_id)
-    unique_voters_that_auto_followed_organizations = analytics_count_manager.fetch_new_auto_followers_in_election(
-        google_civic_election_id)
+    unique_voters_that_followed_organizations = fetch_analytics_rollup_total(
+        generate_election_sketch_key('followers', google_civic_election_id))
+    if unique_voters_that_followed_organizations is None:
+        unique_voters_that_followed_organizations = analytics_count_manager.fetch_new_followers_in_election(
+            google_civic_election_id)
+    unique_voters_that_auto_followed_organizations = fetch_analytics_rollup_total(
+        generate_election_sketch_key('auto_followers', google_civic_election_id))
+    if unique_voters_that_auto_followed_organizations is None:
+        unique_voters_that_auto_followed_organizations = \
+            analytics_count_manager.fetch_new_auto_followers_in_election(google_civic_election_id)
     organizations_followed = None
     organizations_auto_followed = None
     organizations_signed_in = None
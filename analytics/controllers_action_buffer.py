@@ -0,0 +1,294 @@
+# analytics/controllers_action_buffer.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import atexit
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.db import close_old_connections
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from config.base import get_environment_variable_default
+from politician.models import Politician
+import wevote_functions.admin
+from wevote_functions.functions_date import generate_date_as_integer
+from .models import AnalyticsAction
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# saveAnalyticsAction puts each action in an in-process buffer, and appends it to this process' spool file. A flusher
+#  thread saves the buffer with one bulk_create every ANALYTICS_ACTION_FLUSH_SIZE actions or
+#  ANALYTICS_ACTION_FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+ANALYTICS_ACTION_BUFFER_ON = \
+    str(get_environment_variable_default('ANALYTICS_ACTION_BUFFER_ON', True)).lower() == 'true'
+ANALYTICS_ACTION_FLUSH_SIZE = int(get_environment_variable_default('ANALYTICS_ACTION_FLUSH_SIZE', 500))
+ANALYTICS_ACTION_FLUSH_INTERVAL_MS = int(get_environment_variable_default('ANALYTICS_ACTION_FLUSH_INTERVAL_MS', 1000))
+ANALYTICS_ACTION_SPOOL_DIRECTORY = get_environment_variable_default(
+    'ANALYTICS_ACTION_SPOOL_DIRECTORY', os.path.join(tempfile.gettempdir(), 'wevote_analytics_action_spool'))
+# How often each process looks for spool files left behind by processes that died before flushing
+ANALYTICS_ACTION_SPOOL_REPLAY_INTERVAL_SECONDS = 60
+ANALYTICS_ACTION_SPOOL_FILE_PATTERNS = ('*.spool', '*.flushing')
+ANALYTICS_ACTION_BULK_CREATE_BATCH_SIZE = 500
+SEO_FRIENDLY_PATH_CACHE_MAX_SIZE = 10000
+SEO_FRIENDLY_PATH_CACHE_SECONDS = 3600
+
+# Fields copied from the action dict to AnalyticsAction, everything except exact_time. Like save_action, we don't
+#  store voter_device_id, which is only meant for sessions that haven't been verified yet.
+ANALYTICS_ACTION_FIELD_LIST = [
+    'action_constant', 'date_as_integer', 'voter_we_vote_id', 'voter_id', 'is_signed_in', 'state_code',
+    'organization_we_vote_id', 'organization_id', 'politician_we_vote_id', 'ballot_item_we_vote_id',
+    'google_civic_election_id', 'user_agent', 'is_bot', 'is_mobile', 'is_desktop', 'is_tablet']
+
+seo_friendly_path_cache = {}
+seo_friendly_path_cache_lock = threading.Lock()
+
+
+def fetch_politician_we_vote_id_from_seo_friendly_path(seo_friendly_path):
+    """
+    Memoized seo_friendly_path -> politician_we_vote_id, including paths with no politician (None)
+    :param seo_friendly_path:
+    :return:
+    """
+    with seo_friendly_path_cache_lock:
+        cached = seo_friendly_path_cache.get(seo_friendly_path)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    politician_we_vote_id = Politician.objects.using('readonly')\
+        .filter(seo_friendly_path=seo_friendly_path)\
+        .values_list('we_vote_id', flat=True)\
+        .first()
+    with seo_friendly_path_cache_lock:
+        if len(seo_friendly_path_cache) >= SEO_FRIENDLY_PATH_CACHE_MAX_SIZE:
+            seo_friendly_path_cache.clear()
+        seo_friendly_path_cache[seo_friendly_path] = \
+            (politician_we_vote_id, time.monotonic() + SEO_FRIENDLY_PATH_CACHE_SECONDS)
+    return politician_we_vote_id
+
+
+def generate_analytics_action(action_dict):
+    analytics_action = AnalyticsAction(
+        **{field: action_dict[field] for field in ANALYTICS_ACTION_FIELD_LIST if field in action_dict})
+    analytics_action.exact_time = parse_datetime(action_dict['exact_time'])
+    return analytics_action
+
+
+def generate_analytics_action_list_from_spool_lines(spool_line_list):
+    analytics_action_list = []
+    for spool_line in spool_line_list:
+        try:
+            action_dict = json.loads(spool_line)
+        except ValueError:
+            # The process died in the middle of writing this line
+            continue
+        analytics_action_list.append(generate_analytics_action(action_dict))
+    return analytics_action_list
+
+
+def save_analytics_action_list(analytics_action_list):
+    AnalyticsAction.objects.using('analytics').bulk_create(
+        analytics_action_list, batch_size=ANALYTICS_ACTION_BULK_CREATE_BATCH_SIZE)
+
+
+def open_locked_spool_file(spool_file_path):
+    """
+    The process writing a spool file keeps an exclusive flock on it. The lock goes away when that process dies, which
+    is how replay_orphaned_analytics_action_spool_files tells a live spool file from a left-behind one.
+    """
+    spool_file = open(spool_file_path, 'a', encoding='utf-8')
+    fcntl.flock(spool_file.fileno(), fcntl.LOCK_EX)
+    return spool_file
+
+
+def replay_orphaned_analytics_action_spool_files(spool_directory=ANALYTICS_ACTION_SPOOL_DIRECTORY):
+    """
+    Save the actions in spool files that no running process holds: from a process that crashed or was killed
+    before flushing, or from a flush that failed. Safe to run from any number of processes at once.
+    :param spool_directory:
+    :return:
+    """
+    status = ""
+    success = True
+    analytics_actions_replayed = 0
+    spool_file_path_list = []
+    for spool_file_pattern in ANALYTICS_ACTION_SPOOL_FILE_PATTERNS:
+        spool_file_path_list += glob.glob(os.path.join(spool_directory, spool_file_pattern))
+
+    for spool_file_path in spool_file_path_list:
+        try:
+            spool_file = open(spool_file_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with spool_file:
+            try:
+                fcntl.flock(spool_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still being written, or being replayed by another process
+                continue
+            try:
+                if os.stat(spool_file_path).st_ino != os.fstat(spool_file.fileno()).st_ino:
+                    continue
+            except FileNotFoundError:
+                # Another process replayed and removed it between our open and our lock
+                continue
+            analytics_action_list = generate_analytics_action_list_from_spool_lines(spool_file.readlines())
+            try:
+                save_analytics_action_list(analytics_action_list)
+            except Exception as e:
+                success = False
+                status += "ANALYTICS_ACTION_SPOOL_REPLAY_FAILED " + os.path.basename(spool_file_path) + ": " + \
+                    str(e) + " "
+                continue
+            os.unlink(spool_file_path)
+            analytics_actions_replayed += len(analytics_action_list)
+
+    status += "ANALYTICS_ACTIONS_REPLAYED: " + str(analytics_actions_replayed) + " "
+    return {
+        'success':                      success,
+        'status':                       status,
+        'analytics_actions_replayed':   analytics_actions_replayed,
+    }
+
+
+class AnalyticsActionBuffer(object):
+    """
+    One per process. Every action is held in memory and also appended to this process' spool file, so it survives
+    the process crashing before the next flush. A flush swaps in a new spool file and saves the old one's actions
+    with bulk_create; if the save fails, the old spool file is left for replay_orphaned_analytics_action_spool_files.
+    Replay is at-least-once: a process killed between a bulk_create and removing its spool file saves those
+    actions twice.
+    """
+
+    def __init__(self, spool_directory=ANALYTICS_ACTION_SPOOL_DIRECTORY):
+        os.makedirs(spool_directory, exist_ok=True)
+        self.spool_directory = spool_directory
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.action_list = []
+        self.spool_file = None
+        self.open_new_spool_file()
+        self.date_spool_replayed = 0
+        self.flusher_thread = threading.Thread(target=self.run_flusher, name='AnalyticsActionFlusher', daemon=True)
+        self.flusher_thread.start()
+        atexit.register(self.flush)
+
+    def open_new_spool_file(self):
+        spool_file_path = os.path.join(
+            self.spool_directory, "analytics_action-" + str(self.pid) + "-" + uuid.uuid4().hex + ".spool")
+        self.spool_file = open_locked_spool_file(spool_file_path)
+
+    def append(self, action_dict):
+        spool_line = json.dumps(action_dict) + "\n"
+        with self.lock:
+            self.spool_file.write(spool_line)
+            # Out of our memory and into the kernel's, so it is in the file even if this process dies now
+            self.spool_file.flush()
+            self.action_list.append(action_dict)
+            if len(self.action_list) >= ANALYTICS_ACTION_FLUSH_SIZE:
+                self.flush_requested.set()
+
+    def flush(self):
+        with self.lock:
+            if not self.action_list:
+                return 0
+            action_list = self.action_list
+            self.action_list = []
+            flushing_spool_file = self.spool_file
+            flushing_spool_file_path = flushing_spool_file.name.replace('.spool', '.flushing')
+            os.rename(flushing_spool_file.name, flushing_spool_file_path)
+            self.open_new_spool_file()
+
+        try:
+            save_analytics_action_list([generate_analytics_action(action_dict) for action_dict in action_list])
+            os.unlink(flushing_spool_file_path)
+        except Exception as e:
+            logger.error("AnalyticsActionBuffer flush of " + str(len(action_list)) + " actions failed, left in " +
+                         flushing_spool_file_path + " for replay: " + str(e))
+        finally:
+            # Releases our lock, which lets replay pick up the .flushing file if it is still there
+            flushing_spool_file.close()
+        return len(action_list)
+
+    def run_flusher(self):
+        while True:
+            self.flush_requested.wait(ANALYTICS_ACTION_FLUSH_INTERVAL_MS / 1000)
+            self.flush_requested.clear()
+            close_old_connections()
+            try:
+                self.flush()
+                if time.monotonic() - self.date_spool_replayed > ANALYTICS_ACTION_SPOOL_REPLAY_INTERVAL_SECONDS:
+                    self.date_spool_replayed = time.monotonic()
+                    results = replay_orphaned_analytics_action_spool_files(self.spool_directory)
+                    if not results['success']:
+                        logger.error("AnalyticsActionBuffer: " + results['status'])
+            except Exception as e:
+                logger.error("AnalyticsActionBuffer flusher: " + str(e))
+
+
+analytics_action_buffer = None
+analytics_action_buffer_lock = threading.Lock()
+
+
+def fetch_analytics_action_buffer():
+    """
+    The buffer for this process, started on first use. A forked child (a new gunicorn worker) gets its own buffer
+    and spool file rather than the parent's.
+    """
+    global analytics_action_buffer
+    with analytics_action_buffer_lock:
+        if analytics_action_buffer is None or analytics_action_buffer.pid != os.getpid():
+            analytics_action_buffer = AnalyticsActionBuffer()
+        return analytics_action_buffer
+
+
+def buffer_analytics_action(
+        action_constant=0,
+        voter_we_vote_id='',
+        voter_id=0,
+        is_signed_in=False,
+        state_code='',
+        organization_we_vote_id='',
+        organization_id=0,
+        google_civic_election_id=0,
+        user_agent_string='',
+        is_bot=False,
+        is_mobile=False,
+        is_desktop=False,
+        is_tablet=False,
+        ballot_item_we_vote_id=None,
+        politician_we_vote_id=None):
+    """
+    Queue one AnalyticsAction to be saved by the flusher. exact_time and date_as_integer are set now, not when saved.
+    :return: the date_as_integer given to the action
+    """
+    date_as_integer = generate_date_as_integer()
+    action_dict = {
+        'action_constant':          action_constant,
+        'date_as_integer':          date_as_integer,
+        'exact_time':               now().isoformat(),
+        'voter_we_vote_id':         voter_we_vote_id,
+        'voter_id':                 voter_id,
+        'is_signed_in':             is_signed_in,
+        'state_code':               state_code,
+        'organization_we_vote_id':  organization_we_vote_id,
+        'organization_id':          organization_id,
+        'politician_we_vote_id':    politician_we_vote_id,
+        'ballot_item_we_vote_id':   ballot_item_we_vote_id,
+        'google_civic_election_id': google_civic_election_id,
+        'user_agent':               user_agent_string,
+        'is_bot':                   is_bot,
+        'is_mobile':                is_mobile,
+        'is_desktop':               is_desktop,
+        'is_tablet':                is_tablet,
+    }
+    fetch_analytics_action_buffer().append(action_dict)
+    return date_as_integer
@@ -0,0 +1,363 @@
+# analytics/controllers_rollup.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import math
+import time
+import zlib
+
+from django.db import transaction
+
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+from .models import ACTION_BALLOT_VISIT, ACTION_ORGANIZATION_AUTO_FOLLOW, ACTION_ORGANIZATION_FOLLOW, \
+    ACTION_VOTER_GUIDE_VISIT, AnalyticsAction, AnalyticsRollupSketch
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# 2**12 registers: about 1.6% standard error on totals, 4KB per sketch before compression
+HYPERLOGLOG_PRECISION = 12
+ANALYTICS_ROLLUP_CHUNK_SIZE = 10000
+# How many days of history one backfill_analytics_rollup_sketches run merges into the sketches
+ANALYTICS_ROLLUP_BACKFILL_DAYS_PER_RUN = 30
+# How long fetch_analytics_rollup_for_one_day reuses the last day it rolled up
+ANALYTICS_ROLLUP_REUSE_SECONDS = 600
+# The all-time visitors sketch doubles as the watermark: every sketch has seen every AnalyticsAction through its date
+ANALYTICS_ROLLUP_WATERMARK_SKETCH_KEY = 'visitors'
+
+# Sitewide keys
+SKETCH_VISITORS = 'visitors'
+SKETCH_AUTHENTICATED_VISITORS = 'authenticated_visitors'
+SKETCH_BALLOT_VIEWERS = 'ballot_viewers'
+SKETCH_VOTER_GUIDES_VIEWED = 'voter_guides_viewed'  # Distinct organizations, not voters
+
+
+class HyperLogLog(object):
+    """
+    Estimates how many distinct strings were added, in a fixed 2**precision bytes. Two sketches merge into the
+    sketch of the union, and adding the same string twice changes nothing, so a running total is just yesterday's
+    sketch merged with today's strings.
+    """
+
+    def __init__(self, precision=HYPERLOGLOG_PRECISION, registers=None):
+        self.precision = precision
+        self.number_of_registers = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.number_of_registers)
+
+    def add(self, value):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        register_index = hashed >> (64 - self.precision)
+        remaining_bits = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining_bits.bit_length() + 1
+        if rank > self.registers[register_index]:
+            self.registers[register_index] = rank
+
+    def update(self, value_iterable):
+        for value in value_iterable:
+            self.add(value)
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        number_of_registers = self.number_of_registers
+        alpha = 0.7213 / (1 + 1.079 / number_of_registers)
+        estimate = alpha * number_of_registers * number_of_registers / sum(2.0 ** -rank for rank in self.registers)
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * number_of_registers and empty_registers:
+            # Linear counting is much closer for small counts, and exact enough for a handful of voters
+            estimate = number_of_registers * math.log(number_of_registers / empty_registers)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, compressed_registers):
+        return cls(registers=zlib.decompress(bytes(compressed_registers)))
+
+
+def generate_organization_sketch_key(kind, organization_we_vote_id):
+    return 'organization_' + kind + ':' + organization_we_vote_id
+
+
+def generate_election_sketch_key(kind, google_civic_election_id):
+    return 'election_' + kind + ':' + str(google_civic_election_id)
+
+
+def generate_organization_election_sketch_key(kind, google_civic_election_id, organization_we_vote_id):
+    return 'organization_election_' + kind + ':' + str(google_civic_election_id) + ':' + organization_we_vote_id
+
+
+def generate_sketch_members_for_analytics_action(
+        action_constant, voter_we_vote_id, is_signed_in, organization_we_vote_id, google_civic_election_id):
+    """
+    Every (sketch_key, member) pair this one AnalyticsAction counts toward. These match the filters in
+    AnalyticsCountManager.fetch_visitors, fetch_ballot_views, fetch_voter_guides_viewed and
+    fetch_new_followers_in_election, so one pass over the rows replaces all of those COUNT(DISTINCT ...) queries.
+    """
+    if not voter_we_vote_id:
+        return
+    yield SKETCH_VISITORS, voter_we_vote_id
+    if is_signed_in:
+        yield SKETCH_AUTHENTICATED_VISITORS, voter_we_vote_id
+    if action_constant == ACTION_BALLOT_VISIT:
+        yield SKETCH_BALLOT_VIEWERS, voter_we_vote_id
+    is_voter_guide_visit = action_constant == ACTION_VOTER_GUIDE_VISIT and organization_we_vote_id
+    is_follow = action_constant in (ACTION_ORGANIZATION_FOLLOW, ACTION_ORGANIZATION_AUTO_FOLLOW)
+    if is_voter_guide_visit:
+        yield SKETCH_VOTER_GUIDES_VIEWED, organization_we_vote_id
+        yield generate_organization_sketch_key('visitors', organization_we_vote_id), voter_we_vote_id
+        if is_signed_in:
+            yield generate_organization_sketch_key('authenticated_visitors', organization_we_vote_id), \
+                voter_we_vote_id
+    if not google_civic_election_id:
+        return
+    yield generate_election_sketch_key('visitors', google_civic_election_id), voter_we_vote_id
+    if is_voter_guide_visit:
+        yield generate_election_sketch_key('voter_guides_viewed', google_civic_election_id), organization_we_vote_id
+        yield generate_organization_election_sketch_key(
+            'visitors', google_civic_election_id, organization_we_vote_id), voter_we_vote_id
+        if is_signed_in:
+            yield generate_organization_election_sketch_key(
+                'authenticated_visitors', google_civic_election_id, organization_we_vote_id), voter_we_vote_id
+    if is_follow:
+        yield generate_election_sketch_key('followers', google_civic_election_id), voter_we_vote_id
+        if action_constant == ACTION_ORGANIZATION_AUTO_FOLLOW:
+            yield generate_election_sketch_key('auto_followers', google_civic_election_id), voter_we_vote_id
+        if organization_we_vote_id:
+            yield generate_organization_election_sketch_key(
+                'followers', google_civic_election_id, organization_we_vote_id), voter_we_vote_id
+            if action_constant == ACTION_ORGANIZATION_AUTO_FOLLOW:
+                yield generate_organization_election_sketch_key(
+                    'auto_followers', google_civic_election_id, organization_we_vote_id), voter_we_vote_id
+
+
+def generate_analytics_action_rows(after_date_as_integer=0, through_date_as_integer=0):
+    queryset = AnalyticsAction.objects.using('readonly')\
+        .filter(date_as_integer__gt=after_date_as_integer, date_as_integer__lte=through_date_as_integer)\
+        .values_list('action_constant', 'voter_we_vote_id', 'is_signed_in', 'organization_we_vote_id',
+                     'google_civic_election_id')
+    return queryset.iterator(chunk_size=ANALYTICS_ROLLUP_CHUNK_SIZE)
+
+
+def collect_sketch_members_for_one_day(date_as_integer):
+    """
+    The exact set of members behind every sketch_key touched on this one day
+    """
+    members_by_sketch_key = {}
+    for one_row in generate_analytics_action_rows(date_as_integer - 1, date_as_integer):
+        for sketch_key, member in generate_sketch_members_for_analytics_action(*one_row):
+            if sketch_key not in members_by_sketch_key:
+                members_by_sketch_key[sketch_key] = set()
+            members_by_sketch_key[sketch_key].add(member)
+    return members_by_sketch_key
+
+
+def merge_one_day_into_analytics_rollup_sketches(date_as_integer, members_by_sketch_key):
+    """
+    Merge one day's members into the running total sketches and move the watermark to that day, in one transaction.
+    The watermark row is locked first, so two runs take turns, and a day is only merged when the sketches have seen
+    every earlier day with actions. Merging the day the watermark is on again changes nothing.
+    :param date_as_integer:
+    :param members_by_sketch_key: From collect_sketch_members_for_one_day
+    :return:
+    """
+    status = ""
+    total_count_by_sketch_key = {}
+    with transaction.atomic(using='analytics'):
+        watermark_sketch = AnalyticsRollupSketch.objects.using('analytics').select_for_update()\
+            .filter(sketch_key=ANALYTICS_ROLLUP_WATERMARK_SKETCH_KEY).first()
+        if watermark_sketch is None:
+            status += "ANALYTICS_ROLLUP_NOT_BACKFILLED-TOTALS_NOT_AVAILABLE "
+            return {
+                'status':                       status,
+                'total_count_by_sketch_key':    total_count_by_sketch_key,
+                'day_merged':                   False,
+            }
+        watermark_date_as_integer = watermark_sketch.through_date_as_integer
+        if watermark_date_as_integer > date_as_integer:
+            status += "ANALYTICS_ROLLUP_ALREADY_PAST_" + str(date_as_integer) + "-TOTALS_NOT_AVAILABLE "
+            return {
+                'status':                       status,
+                'total_count_by_sketch_key':    total_count_by_sketch_key,
+                'day_merged':                   False,
+            }
+        if watermark_date_as_integer < date_as_integer and AnalyticsAction.objects.using('readonly')\
+                .filter(date_as_integer__gt=watermark_date_as_integer, date_as_integer__lt=date_as_integer)\
+                .exists():
+            status += "ANALYTICS_ROLLUP_BACKFILL_BEHIND_" + str(date_as_integer) + "-TOTALS_NOT_AVAILABLE "
+            return {
+                'status':                       status,
+                'total_count_by_sketch_key':    total_count_by_sketch_key,
+                'day_merged':                   False,
+            }
+
+        # A day without any actions still moves the watermark forward
+        sketch_key_set = set(members_by_sketch_key) | {ANALYTICS_ROLLUP_WATERMARK_SKETCH_KEY}
+        saved_sketch_by_key = {
+            analytics_rollup_sketch.sketch_key: analytics_rollup_sketch
+            for analytics_rollup_sketch in AnalyticsRollupSketch.objects.using('analytics')
+            .select_for_update().filter(sketch_key__in=sketch_key_set)}
+
+        new_sketch_list = []
+        for sketch_key in sketch_key_set:
+            analytics_rollup_sketch = saved_sketch_by_key.get(sketch_key)
+            sketch = HyperLogLog.from_bytes(analytics_rollup_sketch.registers) if analytics_rollup_sketch \
+                else HyperLogLog()
+            sketch.update(members_by_sketch_key.get(sketch_key, ()))
+            total_count_by_sketch_key[sketch_key] = sketch.count()
+            if analytics_rollup_sketch:
+                analytics_rollup_sketch.registers = sketch.to_bytes()
+                analytics_rollup_sketch.through_date_as_integer = date_as_integer
+                analytics_rollup_sketch.save()
+            else:
+                new_sketch_list.append(AnalyticsRollupSketch(
+                    sketch_key=sketch_key, through_date_as_integer=date_as_integer, registers=sketch.to_bytes()))
+        AnalyticsRollupSketch.objects.using('analytics').bulk_create(new_sketch_list)
+
+    status += "ANALYTICS_ROLLUP_DAY_MERGED: " + str(date_as_integer) + " "
+    return {
+        'status':                       status,
+        'total_count_by_sketch_key':    total_count_by_sketch_key,
+        'day_merged':                   True,
+    }
+
+
+def roll_up_analytics_actions_for_one_day(date_as_integer):
+    """
+    Scan one day of AnalyticsAction once, for the exact distinct counts of that day (sitewide, per organization,
+    per election and per organization in an election), and merge the day into the running total sketches.
+    Totals are only available when the sketches are current through the day before, which is
+    backfill_analytics_rollup_sketches' job. Otherwise the callers count the totals from AnalyticsAction.
+    :param date_as_integer:
+    :return:
+    """
+    status = ""
+    date_as_integer = convert_to_int(date_as_integer)
+    members_today_by_sketch_key = collect_sketch_members_for_one_day(date_as_integer)
+    daily_count_by_sketch_key = {sketch_key: len(members) for sketch_key, members in members_today_by_sketch_key.items()}
+
+    results = merge_one_day_into_analytics_rollup_sketches(date_as_integer, members_today_by_sketch_key)
+    status += results['status']
+    status += "ANALYTICS_ROLLUP_COMPLETE: " + str(date_as_integer) + ", " + \
+        str(len(daily_count_by_sketch_key)) + " daily counts "
+    return {
+        'success':                      True,
+        'status':                       status,
+        'daily_count_by_sketch_key':    daily_count_by_sketch_key,
+        'total_count_by_sketch_key':    results['total_count_by_sketch_key'],
+        'totals_are_current':           results['day_merged'],
+    }
+
+
+def backfill_analytics_rollup_sketches(
+        through_date_as_integer,
+        maximum_number_of_days=ANALYTICS_ROLLUP_BACKFILL_DAYS_PER_RUN):
+    """
+    Bring the running total sketches up to through_date_as_integer, one day with actions at a time. Each day is
+    its own transaction and moves the watermark, so a run can stop anywhere and the next run starts after the
+    watermark. Only one day of members is in memory at a time.
+    :param through_date_as_integer: Usually yesterday, since today's actions are still coming in
+    :param maximum_number_of_days:
+    :return:
+    """
+    status = ""
+    success = True
+    days_merged_count = 0
+    backfill_complete = False
+    through_date_as_integer = convert_to_int(through_date_as_integer)
+
+    try:
+        # sketch_key is unique, so when the first two runs race only one of them creates the watermark
+        AnalyticsRollupSketch.objects.using('analytics').get_or_create(
+            sketch_key=ANALYTICS_ROLLUP_WATERMARK_SKETCH_KEY,
+            defaults={'through_date_as_integer': 0, 'registers': HyperLogLog().to_bytes()})
+        watermark_date_as_integer = fetch_analytics_rollup_watermark()
+        date_as_integer_list = list(
+            AnalyticsAction.objects.using('readonly')
+            .filter(date_as_integer__gt=watermark_date_as_integer, date_as_integer__lte=through_date_as_integer)
+            .order_by('date_as_integer')
+            .values_list('date_as_integer', flat=True)
+            .distinct()[:maximum_number_of_days])
+        if len(date_as_integer_list) < maximum_number_of_days and watermark_date_as_integer < through_date_as_integer \
+                and through_date_as_integer not in date_as_integer_list:
+            # No actions after the last day in the list, so the watermark can move up to through_date_as_integer
+            date_as_integer_list.append(through_date_as_integer)
+        for date_as_integer in date_as_integer_list:
+            results = merge_one_day_into_analytics_rollup_sketches(
+                date_as_integer, collect_sketch_members_for_one_day(date_as_integer))
+            if not results['day_merged']:
+                # Another run got past this day first
+                status += results['status']
+                break
+            days_merged_count += 1
+        backfill_complete = fetch_analytics_rollup_watermark() >= through_date_as_integer
+    except Exception as e:
+        status += "ANALYTICS_ROLLUP_BACKFILL_FAILED: " + str(e) + " "
+        logger.error(status)
+        success = False
+
+    status += "ANALYTICS_ROLLUP_BACKFILL_DAYS_MERGED: " + str(days_merged_count) + " "
+    if backfill_complete:
+        status += "ANALYTICS_ROLLUP_BACKFILL_COMPLETE "
+    return {
+        'success':              success,
+        'status':               status,
+        'days_merged_count':    days_merged_count,
+        'backfill_complete':    backfill_complete,
+    }
+
+
+def fetch_analytics_rollup_watermark():
+    return AnalyticsRollupSketch.objects.using('analytics')\
+        .filter(sketch_key=ANALYTICS_ROLLUP_WATERMARK_SKETCH_KEY)\
+        .values_list('through_date_as_integer', flat=True)\
+        .first() or 0
+
+
+def fetch_analytics_rollup_total(sketch_key, through_date_as_integer=0):
+    """
+    The running total for a sketch_key that wasn't touched by the day just rolled up
+    :param sketch_key:
+    :param through_date_as_integer: If set, None unless the sketch is through exactly this day
+    :return: the estimated total, 0 if nothing was ever counted for sketch_key, None if the sketches can't answer
+    """
+    watermark_date_as_integer = fetch_analytics_rollup_watermark()
+    if not positive_value_exists(watermark_date_as_integer) or \
+            (positive_value_exists(through_date_as_integer) and watermark_date_as_integer != through_date_as_integer):
+        return None
+    analytics_rollup_sketch = AnalyticsRollupSketch.objects.using('analytics').filter(sketch_key=sketch_key).first()
+    if analytics_rollup_sketch is None:
+        return 0
+    return HyperLogLog.from_bytes(analytics_rollup_sketch.registers).count()
+
+
+analytics_rollup_for_one_day = {'date_as_integer': 0, 'date_rolled_up': 0, 'results': None}
+
+
+def fetch_analytics_rollup_for_one_day(date_as_integer):
+    """
+    calculate_organization_daily_metrics is called once per organization for the same day. Keep the last day's
+    rollup, so that day is scanned once and not once per organization.
+    """
+    date_as_integer = convert_to_int(date_as_integer)
+    if analytics_rollup_for_one_day['date_as_integer'] != date_as_integer or \
+            time.monotonic() - analytics_rollup_for_one_day['date_rolled_up'] > ANALYTICS_ROLLUP_REUSE_SECONDS:
+        analytics_rollup_for_one_day['results'] = roll_up_analytics_actions_for_one_day(date_as_integer)
+        analytics_rollup_for_one_day['date_as_integer'] = date_as_integer
+        analytics_rollup_for_one_day['date_rolled_up'] = time.monotonic()
+    return analytics_rollup_for_one_day['results']
+
+
+def fetch_analytics_rollup_daily_and_total(rollup_results, sketch_key, date_as_integer):
+    """
+    :return: (count for the day, running total through the day or None if the sketches can't answer)
+    """
+    daily_count = rollup_results['daily_count_by_sketch_key'].get(sketch_key, 0)
+    if not rollup_results['totals_are_current']:
+        return daily_count, None
+    if sketch_key in rollup_results['total_count_by_sketch_key']:
+        return daily_count, rollup_results['total_count_by_sketch_key'][sketch_key]
+    return daily_count, fetch_analytics_rollup_total(sketch_key, through_date_as_integer=date_as_integer)
@@ -116,7 +116,8 @@ class AnalyticsAction(models.Model):
     action_constant = models.PositiveSmallIntegerField(
         verbose_name="constant representing action", null=True, unique=False, db_index=True)
 
-    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, auto_now_add=True)
+    # Not auto_now_add, so actions saved later in bulk (see controllers_action_buffer.py) keep the time they happened
+    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, default=now)
     # We store YYYYMMDD as an integer for very fast lookup (ex/ "20170901" for September, 1, 2017)
     date_as_integer = models.PositiveIntegerField(
         verbose_name="YYYYMMDD of the action", null=True, unique=False, db_index=True)
@@ -1741,6 +1742,19 @@ class AnalyticsProcessed(models.Model):
     kind_of_process = models.CharField(max_length=50, null=True, unique=False)
 
 
+class AnalyticsRollupSketch(models.Model):
+    """
+    A HyperLogLog sketch of the distinct voters (or organizations) behind one running total, like all-time visitors.
+    See analytics/controllers_rollup.py
+    """
+    # Ex/ "visitors", "organization_visitors:wv02org123", "election_followers:1000052"
+    sketch_key = models.CharField(max_length=255, null=False, unique=True)
+    # The last day merged into this sketch. The "visitors" sketch's date is the date all sketches are current through
+    through_date_as_integer = models.PositiveIntegerField(verbose_name="YYYYMMDD", null=False, unique=False)
+    # zlib compressed HyperLogLog registers
+    registers = models.BinaryField(null=False)
+
+
 class OrganizationDailyMetrics(models.Model):
     """
     This is a summary of the organization activity on one day.
@@ -0,0 +1,200 @@
+# analytics/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import glob
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils.timezone import now
+
+import analytics.controllers_action_buffer
+from analytics.controllers_action_buffer import AnalyticsActionBuffer, buffer_analytics_action, \
+    open_locked_spool_file, replay_orphaned_analytics_action_spool_files
+from analytics.controllers_rollup import SKETCH_VISITORS, HyperLogLog, backfill_analytics_rollup_sketches, \
+    fetch_analytics_rollup_total, fetch_analytics_rollup_watermark, roll_up_analytics_actions_for_one_day
+from analytics.models import ACTION_VOTER_GUIDE_VISIT, AnalyticsAction
+
+
+def generate_action_dict(voter_we_vote_id):
+    return {
+        'action_constant':          ACTION_VOTER_GUIDE_VISIT,
+        'date_as_integer':          20261018,
+        'exact_time':               now().isoformat(),
+        'voter_we_vote_id':         voter_we_vote_id,
+        'voter_id':                 1,
+        'is_signed_in':             False,
+        'state_code':               'CA',
+        'organization_we_vote_id':  'wv01org1',
+        'organization_id':          1,
+        'politician_we_vote_id':    None,
+        'ballot_item_we_vote_id':   None,
+        'google_civic_election_id': 1000001,
+        'user_agent':               'Mozilla/5.0',
+        'is_bot':                   False,
+        'is_mobile':                False,
+        'is_desktop':               True,
+        'is_tablet':                False,
+    }
+
+
+class AnalyticsActionBufferTestCase(TestCase):
+    databases = ["default", "readonly", "analytics"]
+
+    def setUp(self):
+        spool_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_directory.cleanup)
+        self.spool_directory = spool_directory.name
+        # Flush only when the test asks to, not from the flusher thread
+        patcher = mock.patch.object(analytics.controllers_action_buffer, 'ANALYTICS_ACTION_FLUSH_INTERVAL_MS', 3600000)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def retrieve_spool_file_path_list(self):
+        return sorted(glob.glob(os.path.join(self.spool_directory, '*')))
+
+    def test_flush_saves_buffered_actions(self):
+        analytics_action_buffer = AnalyticsActionBuffer(spool_directory=self.spool_directory)
+        analytics_action_buffer.append(generate_action_dict('wv01voter1'))
+        analytics_action_buffer.append(generate_action_dict('wv01voter2'))
+        with open(analytics_action_buffer.spool_file.name, encoding='utf-8') as spool_file:
+            self.assertEqual(len(spool_file.readlines()), 2)
+
+        self.assertEqual(analytics_action_buffer.flush(), 2)
+        self.assertEqual(
+            sorted(AnalyticsAction.objects.using('analytics').values_list('voter_we_vote_id', flat=True)),
+            ['wv01voter1', 'wv01voter2'])
+        # Only the new, empty spool file is left
+        self.assertEqual(self.retrieve_spool_file_path_list(), [analytics_action_buffer.spool_file.name])
+        self.assertEqual(os.path.getsize(analytics_action_buffer.spool_file.name), 0)
+        self.assertEqual(analytics_action_buffer.flush(), 0)
+
+    def test_failed_flush_is_replayed(self):
+        analytics_action_buffer = AnalyticsActionBuffer(spool_directory=self.spool_directory)
+        analytics_action_buffer.append(generate_action_dict('wv01voter1'))
+        with mock.patch.object(analytics.controllers_action_buffer, 'save_analytics_action_list',
+                               side_effect=Exception("analytics database unavailable")):
+            analytics_action_buffer.flush()
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 0)
+        self.assertEqual(len(glob.glob(os.path.join(self.spool_directory, '*.flushing'))), 1)
+
+        results = replay_orphaned_analytics_action_spool_files(self.spool_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['analytics_actions_replayed'], 1)
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 1)
+        # The live spool file is still being written by the buffer
+        self.assertEqual(self.retrieve_spool_file_path_list(), [analytics_action_buffer.spool_file.name])
+
+    def test_replay_orphaned_spool_file(self):
+        orphaned_spool_file_path = os.path.join(self.spool_directory, 'analytics_action-1-orphaned.spool')
+        with open(orphaned_spool_file_path, 'w', encoding='utf-8') as orphaned_spool_file:
+            orphaned_spool_file.write(json.dumps(generate_action_dict('wv01voter1')) + "\n")
+            # Written before voter_device_id was left out of the spool
+            orphaned_spool_file.write(json.dumps(
+                dict(generate_action_dict('wv01voter2'), voter_device_id='device1')) + "\n")
+            # The process died in the middle of this line
+            orphaned_spool_file.write('{"action_constant": ')
+        live_spool_file = open_locked_spool_file(os.path.join(self.spool_directory, 'analytics_action-2-live.spool'))
+        self.addCleanup(live_spool_file.close)
+        live_spool_file.write(json.dumps(generate_action_dict('wv01voter3')) + "\n")
+        live_spool_file.flush()
+
+        results = replay_orphaned_analytics_action_spool_files(self.spool_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['analytics_actions_replayed'], 2)
+        self.assertEqual(
+            sorted(AnalyticsAction.objects.using('analytics').values_list('voter_we_vote_id', flat=True)),
+            ['wv01voter1', 'wv01voter2'])
+        self.assertFalse(AnalyticsAction.objects.using('analytics').filter(voter_device_id__isnull=False).exists())
+        self.assertEqual(self.retrieve_spool_file_path_list(), [live_spool_file.name])
+
+    def test_buffer_analytics_action_leaves_out_voter_device_id(self):
+        analytics_action_buffer = AnalyticsActionBuffer(spool_directory=self.spool_directory)
+        with mock.patch.object(analytics.controllers_action_buffer, 'fetch_analytics_action_buffer',
+                               return_value=analytics_action_buffer):
+            buffer_analytics_action(
+                action_constant=ACTION_VOTER_GUIDE_VISIT, voter_we_vote_id='wv01voter1', voter_id=1,
+                organization_we_vote_id='wv01org1', organization_id=1)
+        self.assertNotIn('voter_device_id', analytics_action_buffer.action_list[0])
+        analytics_action_buffer.flush()
+        self.assertIsNone(AnalyticsAction.objects.using('analytics').get().voter_device_id)
+
+
+def create_analytics_action_history():
+    # Voters 1 through 7 over three days, with a gap before the third
+    for date_as_integer, voter_number_range in ((20261001, range(1, 4)), (20261002, range(3, 6)),
+                                                (20261005, range(5, 8))):
+        for voter_number in voter_number_range:
+            AnalyticsAction.objects.using('analytics').create(**dict(
+                generate_action_dict('wv01voter' + str(voter_number)), date_as_integer=date_as_integer))
+
+
+class HyperLogLogTestCase(SimpleTestCase):
+
+    @staticmethod
+    def generate_sketch(value_range):
+        sketch = HyperLogLog()
+        sketch.update('wv01voter' + str(number) for number in value_range)
+        return sketch
+
+    def test_count(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+        # Linear counting is exact for a handful of voters
+        self.assertEqual(self.generate_sketch(range(10)).count(), 10)
+        sketch = self.generate_sketch(range(100000))
+        self.assertAlmostEqual(sketch.count(), 100000, delta=100000 * 0.05)
+        # Adding the same voters again changes nothing
+        registers = bytes(sketch.registers)
+        sketch.update('wv01voter' + str(number) for number in range(1000))
+        self.assertEqual(bytes(sketch.registers), registers)
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        sketch = self.generate_sketch(range(0, 20000))
+        sketch.merge(self.generate_sketch(range(10000, 30000)))
+        self.assertEqual(sketch.registers, self.generate_sketch(range(30000)).registers)
+        self.assertAlmostEqual(sketch.count(), 30000, delta=30000 * 0.05)
+
+    def test_to_bytes_and_back(self):
+        sketch = self.generate_sketch(range(5000))
+        self.assertEqual(HyperLogLog.from_bytes(sketch.to_bytes()).registers, sketch.registers)
+
+
+class AnalyticsRollupBackfillTestCase(TransactionTestCase):
+    # AnalyticsAction is read with using('readonly'), so the rows need to be committed to be visible there
+    databases = ["default", "readonly", "analytics"]
+
+    def test_daily_rollup_waits_for_backfill(self):
+        create_analytics_action_history()
+        results = roll_up_analytics_actions_for_one_day(20261005)
+        self.assertEqual(results['daily_count_by_sketch_key'][SKETCH_VISITORS], 3)
+        self.assertFalse(results['totals_are_current'])
+        self.assertIsNone(fetch_analytics_rollup_total(SKETCH_VISITORS))
+
+    def test_backfill_is_chunked_and_resumable(self):
+        create_analytics_action_history()
+        results = backfill_analytics_rollup_sketches(through_date_as_integer=20261006, maximum_number_of_days=2)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['days_merged_count'], 2)
+        self.assertFalse(results['backfill_complete'])
+        self.assertEqual(fetch_analytics_rollup_watermark(), 20261002)
+        self.assertEqual(fetch_analytics_rollup_total(SKETCH_VISITORS), 5)
+        # 20261005 hasn't been merged yet, so the sketches can't give totals for the day after
+        self.assertFalse(roll_up_analytics_actions_for_one_day(20261006)['totals_are_current'])
+
+        results = backfill_analytics_rollup_sketches(through_date_as_integer=20261006, maximum_number_of_days=2)
+        self.assertEqual(results['days_merged_count'], 2)
+        self.assertTrue(results['backfill_complete'])
+        self.assertEqual(fetch_analytics_rollup_watermark(), 20261006)
+        results = backfill_analytics_rollup_sketches(through_date_as_integer=20261006)
+        self.assertEqual(results['days_merged_count'], 0)
+        self.assertTrue(results['backfill_complete'])
+
+        AnalyticsAction.objects.using('analytics').create(**dict(
+            generate_action_dict('wv01voter8'), date_as_integer=20261007))
+        results = roll_up_analytics_actions_for_one_day(20261007)
+        self.assertTrue(results['totals_are_current'])
+        self.assertEqual(results['total_count_by_sketch_key'][SKETCH_VISITORS], 8)
+        self.assertEqual(fetch_analytics_rollup_watermark(), 20261007)
@@ -2,13 +2,191 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
 from django.db import models
 from django.utils.timezone import now
 from django.db.models import Q
 from datetime import timedelta
 import json
+import threading
+import time
+import uuid
+from config.base import get_environment_variable_default
+import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
 
+logger = wevote_functions.admin.get_logger(__name__)
+
+# The api_internal_cache is read through three tiers:
+#  1) A process-local LRU holding already-decoded payloads (no DB round trip and no json.loads)
+#  2) An optional shared tier (the 'shared' alias in settings.CACHES, e.g. Redis) so a new gunicorn worker
+#     doesn't have to go to Postgres
+#  3) Postgres (ApiInternalCache), which stays the system of record
+# Entries in the local tier expire after API_INTERNAL_CACHE_LOCAL_TTL_SECONDS, since
+# mark_prior_api_internal_cache_entries_as_replaced runs in the batch process, and can only clear the local tier
+# of the process it runs in (plus the shared tier).
+# Each key also has a generation in the shared tier, which invalidate_api_internal_cache_tiers replaces. Entries carry
+# the generation read before their database read, and only count as shared tier hits while it is still current, so
+# a database read which started before an invalidation can't put the replaced payload back in the shared tier.
+API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES = int(get_environment_variable_default('API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES', 32))
+API_INTERNAL_CACHE_LOCAL_TTL_SECONDS = int(get_environment_variable_default('API_INTERNAL_CACHE_LOCAL_TTL_SECONDS', 120))
+API_INTERNAL_CACHE_SHARED_ALIAS = get_environment_variable_default('API_INTERNAL_CACHE_SHARED_ALIAS', 'shared')
+API_INTERNAL_CACHE_SHARED_TTL_SECONDS = 60 * 60 * 2
+# How long a process trusts that an ApiRefreshRequest is already scheduled, before checking the database again
+API_REFRESH_REQUEST_CHECK_INTERVAL_SECONDS = 5 * 60
+
+
+def api_internal_cache_key(api_name='', election_id_list_serialized=''):
+    # Postgres lookups use iexact, so the cache key is case-insensitive too
+    return 'api_internal_cache:' + str(api_name).lower() + ':' + str(election_id_list_serialized).lower()
+
+
+def api_internal_cache_generation_key(key):
+    return 'api_internal_cache_generation:' + key
+
+
+class ApiInternalCacheLocalTier(object):
+    """
+    Thread-safe, process-local LRU with a time-to-live per entry. Payloads are shared with callers, and
+    must be treated as read-only.
+    """
+    def __init__(self, max_entries=API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES, ttl_seconds=API_INTERNAL_CACHE_LOCAL_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry_tuple = self.entries.get(key)
+            if entry_tuple is None:
+                self.misses += 1
+                return None
+            expires_at, entry = entry_tuple
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ApiInternalCacheSharedTier(object):
+    """
+    Thin wrapper around a Django cache backend, so that a missing or unreachable shared cache
+    degrades to "cache miss" instead of breaking the API.
+    """
+    def __init__(self, alias=API_INTERNAL_CACHE_SHARED_ALIAS):
+        self.alias = alias
+
+    def backend(self):
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return None
+
+    def get(self, key):
+        backend = self.backend()
+        if backend is None:
+            return None
+        try:
+            return backend.get(key)
+        except Exception as e:
+            logger.error('API_INTERNAL_CACHE_SHARED_TIER_GET_ERROR: ' + str(e))
+            return None
+
+    def get_many(self, key_list):
+        backend = self.backend()
+        if backend is None:
+            return {}
+        try:
+            return backend.get_many(key_list)
+        except Exception as e:
+            logger.error('API_INTERNAL_CACHE_SHARED_TIER_GET_MANY_ERROR: ' + str(e))
+            return {}
+
+    def set(self, key, entry, timeout=API_INTERNAL_CACHE_SHARED_TTL_SECONDS):
+        backend = self.backend()
+        if backend is None:
+            return False
+        try:
+            backend.set(key, entry, timeout)
+            return True
+        except Exception as e:
+            logger.error('API_INTERNAL_CACHE_SHARED_TIER_SET_ERROR: ' + str(e))
+            return False
+
+    def add(self, key, value, timeout):
+        """
+        Atomic "set if not present". Returns True when there is no shared tier, so the caller proceeds.
+        """
+        backend = self.backend()
+        if backend is None:
+            return True
+        try:
+            return backend.add(key, value, timeout)
+        except Exception as e:
+            logger.error('API_INTERNAL_CACHE_SHARED_TIER_ADD_ERROR: ' + str(e))
+            return True
+
+    def delete(self, key):
+        backend = self.backend()
+        if backend is None:
+            return
+        try:
+            backend.delete(key)
+        except Exception as e:
+            logger.error('API_INTERNAL_CACHE_SHARED_TIER_DELETE_ERROR: ' + str(e))
+
+
+api_internal_cache_local_tier = ApiInternalCacheLocalTier()
+api_internal_cache_shared_tier = ApiInternalCacheSharedTier()
+# api_internal_cache_key -> time.monotonic() until which we trust that a refresh is already scheduled
+api_refresh_request_scheduled_until = {}
+api_refresh_request_scheduled_lock = threading.Lock()
+
+
+def fetch_api_internal_cache_generation(key):
+    """
+    The current generation of key in the shared tier, started if there isn't one yet (or it was evicted).
+    None when there is no shared tier.
+    """
+    generation_key = api_internal_cache_generation_key(key)
+    generation = api_internal_cache_shared_tier.get(generation_key)
+    if generation is None:
+        # When two processes race to start it, add keeps the first one
+        api_internal_cache_shared_tier.add(generation_key, uuid.uuid4().hex, None)
+        generation = api_internal_cache_shared_tier.get(generation_key)
+    return generation
+
+
+def invalidate_api_internal_cache_tiers(api_name='', election_id_list_serialized=''):
+    key = api_internal_cache_key(api_name=api_name, election_id_list_serialized=election_id_list_serialized)
+    api_internal_cache_local_tier.delete(key)
+    # A new generation first, so an entry read from the database before this can't count as a hit after it
+    api_internal_cache_shared_tier.set(api_internal_cache_generation_key(key), uuid.uuid4().hex, None)
+    api_internal_cache_shared_tier.delete(key)
+
 
 class ApiInternalCacheManager(models.Manager):
     def __unicode__(self):
@@ -153,6 +331,9 @@ class ApiInternalCacheManager(models.Manager):
                     date_replaced=now(),
                 )
                 status += "API_INTERNAL_CACHE_MARK_REPLACED_COUNT: " + str(number_updated) + " "
+                invalidate_api_internal_cache_tiers(
+                    api_name=api_name,
+                    election_id_list_serialized=election_id_list_serialized)
             except Exception as e:
                 success = False
                 status += 'API_INTERNAL_CACHE_MARK_REPLACED_ERROR ' + str(e) + ' '
@@ -253,7 +434,8 @@ class ApiInternalCacheManager(models.Manager):
                 replaced=False)
             query = query.exclude(cached_api_response_serialized='')
             query = query.order_by('-date_cached')
-            api_internal_cache_list = list(query)
+            # Only the newest entry is used, so don't load every unreplaced row
+            api_internal_cache_list = list(query[:1])
             if len(api_internal_cache_list):
                 api_internal_cache = api_internal_cache_list[0]
                 api_internal_cache_found = True
@@ -277,16 +459,130 @@ class ApiInternalCacheManager(models.Manager):
         }
         return results
 
+    def retrieve_latest_api_internal_cache_json_data(self, api_name='', election_id_list_serialized=''):
+        """
+        Read-through version of retrieve_latest_api_internal_cache for the request path. Returns the decoded
+        payload from the local tier, then the shared tier, and only then from Postgres.
+        Do not modify the returned cached_api_response_json_data, since it is shared between requests.
+        """
+        status = ''
+        if not positive_value_exists(api_name):
+            status += "RETRIEVE_LATEST_CACHE_JSON-MISSING_API_NAME "
+            results = {
+                'success':                          False,
+                'status':                           status,
+                'api_internal_cache_found':         False,
+                'api_internal_cache_id':            0,
+                'date_cached':                      None,
+                'cached_api_response_json_data':    {},
+            }
+            return results
+
+        key = api_internal_cache_key(api_name=api_name, election_id_list_serialized=election_id_list_serialized)
+        generation_key = api_internal_cache_generation_key(key)
+        entry = api_internal_cache_local_tier.get(key)
+        if entry is not None:
+            status += "API_INTERNAL_CACHE_LOCAL_TIER_HIT "
+        else:
+            value_by_key = api_internal_cache_shared_tier.get_many([key, generation_key])
+            entry = value_by_key.get(key)
+            if entry is not None and entry.get('generation') is not None \
+                    and entry['generation'] == value_by_key.get(generation_key):
+                status += "API_INTERNAL_CACHE_SHARED_TIER_HIT "
+                api_internal_cache_local_tier.set(key, entry)
+            else:
+                entry = None
+
+        if entry is None:
+            # Read before the database, so we can tell if the cache was invalidated while we were reading
+            generation = fetch_api_internal_cache_generation(key)
+            results = self.retrieve_latest_api_internal_cache(
+                api_name=api_name,
+                election_id_list_serialized=election_id_list_serialized)
+            status += results['status']
+            if not results['success']:
+                results = {
+                    'success':                          False,
+                    'status':                           status,
+                    'api_internal_cache_found':         False,
+                    'api_internal_cache_id':            0,
+                    'date_cached':                      None,
+                    'cached_api_response_json_data':    {},
+                }
+                return results
+            if results['api_internal_cache_found']:
+                status += "API_INTERNAL_CACHE_DATABASE_HIT "
+                api_internal_cache = results['api_internal_cache']
+                entry = {
+                    'api_internal_cache_id':            api_internal_cache.id,
+                    'date_cached':                      api_internal_cache.date_cached,
+                    'cached_api_response_json_data':    results['cached_api_response_json_data'],
+                    'generation':                       generation,
+                }
+                if api_internal_cache_shared_tier.get(generation_key) == generation:
+                    api_internal_cache_local_tier.set(key, entry)
+                    api_internal_cache_shared_tier.set(key, entry)
+                else:
+                    # Still returned to this caller, but the next read goes to the database for the replacement
+                    status += "API_INTERNAL_CACHE_INVALIDATED_DURING_READ-NOT_CACHED "
+
+        if entry is None:
+            results = {
+                'success':                          True,
+                'status':                           status,
+                'api_internal_cache_found':         False,
+                'api_internal_cache_id':            0,
+                'date_cached':                      None,
+                'cached_api_response_json_data':    {},
+            }
+            return results
+
+        results = {
+            'success':                          True,
+            'status':                           status,
+            'api_internal_cache_found':         True,
+            'api_internal_cache_id':            entry['api_internal_cache_id'],
+            'date_cached':                      entry['date_cached'],
+            'cached_api_response_json_data':    entry['cached_api_response_json_data'],
+        }
+        return results
+
     def schedule_refresh_of_api_internal_cache(
             self,
             api_name='',
             election_id_list_serialized='',
-            api_internal_cache=None):
+            api_internal_cache=None,
+            date_cached=None):
         api_internal_cache_found = False
         status = ''
         success = True
 
-        if api_internal_cache and hasattr(api_internal_cache, 'api_name'):
+        # Reads should not write: once this process (or, with a shared tier, any process) has made sure
+        #  a refresh is scheduled, skip the database for API_REFRESH_REQUEST_CHECK_INTERVAL_SECONDS
+        key = api_internal_cache_key(api_name=api_name, election_id_list_serialized=election_id_list_serialized)
+        with api_refresh_request_scheduled_lock:
+            scheduled_until = api_refresh_request_scheduled_until.get(key, 0)
+            if scheduled_until > time.monotonic():
+                status += "API_REFRESH_REQUEST_RECENTLY_SCHEDULED "
+                results = {
+                    'success':                          success,
+                    'status':                           status,
+                }
+                return results
+            api_refresh_request_scheduled_until[key] = time.monotonic() + API_REFRESH_REQUEST_CHECK_INTERVAL_SECONDS
+        if not api_internal_cache_shared_tier.add(
+                'api_refresh_request_scheduled:' + key, 1, API_REFRESH_REQUEST_CHECK_INTERVAL_SECONDS):
+            status += "API_REFRESH_REQUEST_RECENTLY_SCHEDULED_BY_OTHER_PROCESS "
+            results = {
+                'success':                          success,
+                'status':                           status,
+            }
+            return results
+
+        if date_cached is not None:
+            api_internal_cache_found = True
+            status += "API_INTERNAL_CACHE_DATE_CACHED_PASSED_IN "
+        elif api_internal_cache and hasattr(api_internal_cache, 'api_name'):
             # Work with this existing object
             api_internal_cache_found = True
             status += "API_INTERNAL_CACHE_PASSED_IN "
@@ -299,15 +595,17 @@ class ApiInternalCacheManager(models.Manager):
                 api_internal_cache_found = True
                 api_internal_cache = results['api_internal_cache']
                 status += "API_INTERNAL_CACHE_RETRIEVED "
+        if date_cached is None and api_internal_cache and hasattr(api_internal_cache, 'date_cached'):
+            date_cached = api_internal_cache.date_cached
 
         # Was there an existing api_internal_cache retrieved in the last 60 minutes?
         # If not, schedule refresh immediately.
         create_entry_immediately = False
         if not api_internal_cache_found:
             create_entry_immediately = True
-        elif api_internal_cache and hasattr(api_internal_cache, 'date_cached'):
+        elif date_cached is not None:
             sixty_minutes_ago = now() - timedelta(hours=1)
-            if api_internal_cache.date_cached < sixty_minutes_ago:
+            if date_cached < sixty_minutes_ago:
                 create_entry_immediately = True
         if create_entry_immediately:
             # We don't pass in date_refresh_is_needed, so it assumes value is "immediately"
@@ -0,0 +1,123 @@
+# api_internal_cache/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from api_internal_cache.models import ApiInternalCache, ApiInternalCacheManager, ApiRefreshRequest, \
+    api_internal_cache_key, api_internal_cache_local_tier, api_internal_cache_shared_tier, \
+    api_refresh_request_scheduled_until, invalidate_api_internal_cache_tiers
+
+SHARED_CACHES = {
+    'default':  {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared':   {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api_internal_cache_tests'},
+}
+
+
+class ApiInternalCacheTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        api_internal_cache_local_tier.clear()
+        api_refresh_request_scheduled_until.clear()
+        self.api_internal_cache_manager = ApiInternalCacheManager()
+        self.election_id_list_serialized = json.dumps(['1000001'])
+        results = self.api_internal_cache_manager.create_api_internal_cache(
+            api_name='voterGuidesUpcoming',
+            cached_api_response_serialized=json.dumps({'success': True, 'voter_guides': [{'id': 1}]}),
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.api_internal_cache_id = results['api_internal_cache_id']
+
+    def test_read_through_decodes_once(self):
+        results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.assertTrue(results['api_internal_cache_found'])
+        self.assertIn('API_INTERNAL_CACHE_DATABASE_HIT', results['status'])
+        self.assertEqual(results['cached_api_response_json_data']['voter_guides'], [{'id': 1}])
+
+        with self.assertNumQueries(0):
+            results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+                api_name='voterGuidesUpcoming',
+                election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_LOCAL_TIER_HIT', results['status'])
+        self.assertEqual(results['api_internal_cache_id'], self.api_internal_cache_id)
+
+    def test_replacement_invalidates_cache(self):
+        self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        results = self.api_internal_cache_manager.create_api_internal_cache(
+            api_name='voterGuidesUpcoming',
+            cached_api_response_serialized=json.dumps({'success': True, 'voter_guides': []}),
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.api_internal_cache_manager.mark_prior_api_internal_cache_entries_as_replaced(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized,
+            excluded_api_internal_cache_id=results['api_internal_cache_id'])
+        self.assertEqual(ApiInternalCache.objects.filter(replaced=False).count(), 1)
+
+        results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_DATABASE_HIT', results['status'])
+        self.assertEqual(results['cached_api_response_json_data']['voter_guides'], [])
+
+    def test_refresh_scheduling_is_deduplicated(self):
+        self.api_internal_cache_manager.schedule_refresh_of_api_internal_cache(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        refresh_request_count = ApiRefreshRequest.objects.count()
+        self.assertEqual(refresh_request_count, 1)
+
+        with self.assertNumQueries(0):
+            results = self.api_internal_cache_manager.schedule_refresh_of_api_internal_cache(
+                api_name='voterGuidesUpcoming',
+                election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_REFRESH_REQUEST_RECENTLY_SCHEDULED', results['status'])
+        self.assertEqual(ApiRefreshRequest.objects.count(), refresh_request_count)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_invalidation_during_database_read_is_not_cached(self):
+        key = api_internal_cache_key(
+            api_name='voterGuidesUpcoming', election_id_list_serialized=self.election_id_list_serialized)
+        api_internal_cache_shared_tier.delete(key)
+        retrieve_latest_api_internal_cache = self.api_internal_cache_manager.retrieve_latest_api_internal_cache
+
+        def retrieve_then_replace(**kwargs):
+            # The batch process replaces the entry after our database read, and before we write the shared tier
+            results = retrieve_latest_api_internal_cache(**kwargs)
+            invalidate_api_internal_cache_tiers(**kwargs)
+            return results
+
+        with mock.patch.object(self.api_internal_cache_manager, 'retrieve_latest_api_internal_cache',
+                               side_effect=retrieve_then_replace):
+            results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+                api_name='voterGuidesUpcoming',
+                election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_INVALIDATED_DURING_READ-NOT_CACHED', results['status'])
+        self.assertIsNone(api_internal_cache_shared_tier.get(key))
+        self.assertIsNone(api_internal_cache_local_tier.get(key))
+
+        results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_DATABASE_HIT', results['status'])
+        api_internal_cache_local_tier.clear()
+        results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_SHARED_TIER_HIT', results['status'])
+
+        # A write which lost the race to an invalidation doesn't count as a hit either
+        stale_entry = api_internal_cache_shared_tier.get(key)
+        invalidate_api_internal_cache_tiers(
+            api_name='voterGuidesUpcoming', election_id_list_serialized=self.election_id_list_serialized)
+        api_internal_cache_shared_tier.set(key, stale_entry)
+        results = self.api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
+            api_name='voterGuidesUpcoming',
+            election_id_list_serialized=self.election_id_list_serialized)
+        self.assertIn('API_INTERNAL_CACHE_DATABASE_HIT', results['status'])
@@ -0,0 +1,489 @@
+# apis_v1/controllers_benchmark.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+import json
+import math
+import random
+import subprocess
+import time
+import tracemalloc
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils.timezone import now
+
+from activity.models import ActivityNotice, NOTICE_FRIEND_ENDORSEMENTS
+from ballot.models import BallotItem, BallotReturned, VoterBallotSaved
+from candidate.models import CandidateCampaign, CandidateToOfficeLink
+from election.models import Election
+from follow.models import FOLLOWING, FollowOrganization
+from friend.models import CurrentFriend
+from measure.models import ContestMeasure
+from office.models import ContestOffice
+from organization.models import GROUP, INDIVIDUAL, Organization
+from position.models import INFORMATION_ONLY, OPPOSE, PositionEntered, PositionForFriends, SUPPORT
+from voter.models import BALLOT_ADDRESS, Voter, VoterAddress, VoterDeviceLink
+from voter_guide.models import VoterGuide
+import wevote_functions.admin
+from wevote_functions.functions import generate_voter_device_id
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+BENCHMARK_GOOGLE_CIVIC_ELECTION_ID = 9900001
+BENCHMARK_STATE_CODE = 'CA'
+# Synthetic we_vote_ids use a site prefix that is never handed out, so they cannot collide with real data
+BENCHMARK_WE_VOTE_ID_PREFIX = 'wv99bench'
+BENCHMARK_ITERATIONS = 20
+BENCHMARK_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) ' \
+                       'Version/17.0 Safari/605.1.15'
+BENCHMARK_RANDOM_SEED = 2024
+
+# (api_name, url name in apis_v1/urls.py, function that builds the GET variables from the seeded election)
+BENCHMARK_API_LIST = [
+    ('voterBallotItemsRetrieve', 'voterBallotItemsRetrieveView',
+     lambda seed: {'google_civic_election_id': seed['google_civic_election_id']}),
+    ('voterGuidesToFollowRetrieve', 'voterGuidesToFollowRetrieveView',
+     lambda seed: {'google_civic_election_id': seed['google_civic_election_id']}),
+    ('positionListForBallotItem', 'positionListForBallotItemView',
+     lambda seed: {'ballot_item_we_vote_id': seed['candidate_we_vote_id_list'][0], 'kind_of_ballot_item': 'CANDIDATE'}),
+    ('voterRetrieve', 'voterRetrieveView', lambda seed: {}),
+    ('friendList', 'friendListView', lambda seed: {'kind_of_list': 'CURRENT_FRIENDS'}),
+    ('activityNoticeListRetrieve', 'activityNoticeListRetrieveView', lambda seed: {}),
+    ('activityListRetrieve', 'activityListRetrieveView', lambda seed: {}),
+    ('voterGuidesFollowedRetrieve', 'voterGuidesFollowedRetrieveView', lambda seed: {}),
+    ('voterGuidesUpcomingRetrieve', 'voterGuidesUpcomingRetrieveView',
+     lambda seed: {'google_civic_election_id_list[]': [seed['google_civic_election_id']]}),
+    ('voterAllPositionsRetrieve', 'voterAllPositionsRetrieveView',
+     lambda seed: {'google_civic_election_id': seed['google_civic_election_id']}),
+    ('voterAllBookmarksStatusRetrieve', 'voterAllBookmarksStatusRetrieveView', lambda seed: {}),
+    ('voterAddressRetrieve', 'voterAddressRetrieveView', lambda seed: {}),
+    ('ballotItemOptionsRetrieve', 'ballotItemOptionsRetrieveView',
+     lambda seed: {'google_civic_election_id': seed['google_civic_election_id'], 'search_string': 'Benchmark',
+                   'state_code': BENCHMARK_STATE_CODE}),
+    ('electionsRetrieve', 'electionsRetrieveView', lambda seed: {}),
+    ('organizationsFollowedRetrieve', 'organizationsFollowedRetrieveView', lambda seed: {}),
+    ('positionListForVoter', 'positionListForVoterView',
+     lambda seed: {'google_civic_election_id': seed['google_civic_election_id'], 'show_only_this_election': True}),
+    ('candidateRetrieve', 'candidateRetrieveView',
+     lambda seed: {'candidate_we_vote_id': seed['candidate_we_vote_id_list'][0]}),
+    ('candidatesRetrieve', 'candidatesRetrieveView',
+     lambda seed: {'office_we_vote_id': seed['office_we_vote_id_list'][0]}),
+    ('officeRetrieve', 'officeRetrieveView',
+     lambda seed: {'office_we_vote_id': seed['office_we_vote_id_list'][0]}),
+    ('organizationRetrieve', 'organizationRetrieveView',
+     lambda seed: {'organization_we_vote_id': seed['organization_we_vote_id_list'][0]}),
+]
+
+
+def seed_benchmark_election(
+        number_of_offices=20,
+        candidates_per_office=3,
+        number_of_measures=5,
+        number_of_organizations=200,
+        positions_per_organization=10,
+        number_of_voters=50,
+        organizations_followed_per_voter=20,
+        friends_per_voter=10,
+        activity_notices_per_voter=20):
+    """
+    Fill the (empty, throwaway) database with one synthetic upcoming election, and the organizations, positions,
+    voters and friends that the benchmarked APIs read. Rows are bulk created, so no signals or save() hooks run.
+    :return: The we_vote_ids and voter_device_ids the benchmarked API calls need
+    """
+    random_generator = random.Random(BENCHMARK_RANDOM_SEED)
+    google_civic_election_id = BENCHMARK_GOOGLE_CIVIC_ELECTION_ID
+    state_code = BENCHMARK_STATE_CODE
+    election_day = (now() + timedelta(days=30)).date()
+    polling_location_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'ploc1'
+    ballot_returned_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'ballot1'
+
+    Election.objects.create(
+        google_civic_election_id=str(google_civic_election_id),
+        google_civic_election_id_new=google_civic_election_id,
+        election_name="Benchmark Election",
+        election_day_text=election_day.strftime('%Y-%m-%d'),
+        state_code=state_code,
+        include_in_list_for_voters=True)
+    BallotReturned.objects.create(
+        we_vote_id=ballot_returned_we_vote_id,
+        polling_location_we_vote_id=polling_location_we_vote_id,
+        google_civic_election_id=google_civic_election_id,
+        election_date=election_day,
+        election_description_text="Benchmark Election",
+        normalized_state=state_code,
+        state_code=state_code,
+        text_for_map_search="1 Main St, Oakland, CA 94612")
+
+    office_list = []
+    candidate_list = []
+    candidate_to_office_link_list = []
+    ballot_item_list = []
+    for office_number in range(number_of_offices):
+        office_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'off' + str(office_number)
+        office_name = "Benchmark Office " + str(office_number)
+        office_list.append(ContestOffice(
+            we_vote_id=office_we_vote_id,
+            office_name=office_name,
+            google_civic_election_id=str(google_civic_election_id),
+            google_civic_election_id_new=google_civic_election_id,
+            state_code=state_code))
+        ballot_item_list.append(BallotItem(
+            polling_location_we_vote_id=polling_location_we_vote_id,
+            google_civic_election_id=str(google_civic_election_id),
+            state_code=state_code,
+            local_ballot_order=office_number,
+            contest_office_we_vote_id=office_we_vote_id,
+            ballot_item_display_name=office_name))
+        for candidate_number in range(candidates_per_office):
+            candidate_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'cand' + str(office_number) + \
+                '_' + str(candidate_number)
+            candidate_list.append(CandidateCampaign(
+                we_vote_id=candidate_we_vote_id,
+                candidate_name="Benchmark Candidate " + str(office_number) + "-" + str(candidate_number),
+                contest_office_we_vote_id=office_we_vote_id,
+                contest_office_name=office_name,
+                google_civic_election_id=str(google_civic_election_id),
+                google_civic_election_id_new=google_civic_election_id,
+                state_code=state_code))
+            candidate_to_office_link_list.append(CandidateToOfficeLink(
+                candidate_we_vote_id=candidate_we_vote_id,
+                contest_office_we_vote_id=office_we_vote_id,
+                google_civic_election_id=google_civic_election_id,
+                state_code=state_code))
+
+    measure_list = []
+    for measure_number in range(number_of_measures):
+        measure_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'meas' + str(measure_number)
+        measure_title = "Benchmark Measure " + str(measure_number)
+        measure_list.append(ContestMeasure(
+            we_vote_id=measure_we_vote_id,
+            measure_title=measure_title,
+            google_civic_election_id=str(google_civic_election_id),
+            google_civic_election_id_new=google_civic_election_id,
+            state_code=state_code))
+        ballot_item_list.append(BallotItem(
+            polling_location_we_vote_id=polling_location_we_vote_id,
+            google_civic_election_id=str(google_civic_election_id),
+            state_code=state_code,
+            local_ballot_order=number_of_offices + measure_number,
+            contest_measure_we_vote_id=measure_we_vote_id,
+            ballot_item_display_name=measure_title))
+
+    ContestOffice.objects.bulk_create(office_list)
+    CandidateCampaign.objects.bulk_create(candidate_list)
+    CandidateToOfficeLink.objects.bulk_create(candidate_to_office_link_list)
+    ContestMeasure.objects.bulk_create(measure_list)
+    BallotItem.objects.bulk_create(ballot_item_list)
+
+    ballot_item_value_list = \
+        [('candidate_campaign_we_vote_id', candidate.we_vote_id, candidate.candidate_name)
+         for candidate in candidate_list] + \
+        [('contest_measure_we_vote_id', measure.we_vote_id, measure.measure_title) for measure in measure_list]
+    stance_list = [SUPPORT, SUPPORT, OPPOSE, INFORMATION_ONLY]
+
+    organization_list = []
+    voter_guide_list = []
+    for organization_number in range(number_of_organizations):
+        organization_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'org' + str(organization_number)
+        organization_name = "Benchmark Organization " + str(organization_number)
+        organization_list.append(Organization(
+            we_vote_id=organization_we_vote_id,
+            organization_name=organization_name,
+            organization_type=GROUP))
+        voter_guide_list.append(VoterGuide(
+            we_vote_id=BENCHMARK_WE_VOTE_ID_PREFIX + 'vg' + str(organization_number),
+            organization_we_vote_id=organization_we_vote_id,
+            owner_we_vote_id=organization_we_vote_id,
+            google_civic_election_id=google_civic_election_id,
+            election_day_text=election_day.strftime('%Y-%m-%d'),
+            state_code=state_code,
+            display_name=organization_name,
+            voter_guide_owner_type=GROUP))
+    Organization.objects.bulk_create(organization_list)
+    VoterGuide.objects.bulk_create(voter_guide_list)
+
+    position_list = []
+    for organization in organization_list:
+        for field_name, ballot_item_we_vote_id, ballot_item_display_name in random_generator.sample(
+                ballot_item_value_list, min(positions_per_organization, len(ballot_item_value_list))):
+            position_list.append(PositionEntered(**{
+                'we_vote_id': BENCHMARK_WE_VOTE_ID_PREFIX + 'pos' + str(len(position_list)),
+                'organization_we_vote_id': organization.we_vote_id,
+                'speaker_display_name': organization.organization_name,
+                'google_civic_election_id': str(google_civic_election_id),
+                'state_code': state_code,
+                'stance': random_generator.choice(stance_list),
+                'ballot_item_display_name': ballot_item_display_name,
+                field_name: ballot_item_we_vote_id,
+            }))
+    PositionEntered.objects.bulk_create(position_list, batch_size=1000)
+
+    voter_list = []
+    voter_organization_list = []
+    for voter_number in range(number_of_voters):
+        voter_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'voter' + str(voter_number)
+        voter_organization_we_vote_id = BENCHMARK_WE_VOTE_ID_PREFIX + 'vorg' + str(voter_number)
+        voter_list.append(Voter(
+            we_vote_id=voter_we_vote_id,
+            linked_organization_we_vote_id=voter_organization_we_vote_id,
+            first_name="Benchmark",
+            last_name="Voter " + str(voter_number)))
+        voter_organization_list.append(Organization(
+            we_vote_id=voter_organization_we_vote_id,
+            organization_name="Benchmark Voter " + str(voter_number),
+            organization_type=INDIVIDUAL))
+    Voter.objects.bulk_create(voter_list)
+    Organization.objects.bulk_create(voter_organization_list)
+    # bulk_create does not return primary keys on every database backend, so read them back
+    voter_list = list(Voter.objects.filter(we_vote_id__startswith=BENCHMARK_WE_VOTE_ID_PREFIX).order_by('id'))
+    organization_id_by_we_vote_id = dict(
+        Organization.objects.filter(we_vote_id__startswith=BENCHMARK_WE_VOTE_ID_PREFIX)
+        .values_list('we_vote_id', 'id'))
+
+    voter_device_id_list = []
+    voter_device_link_list = []
+    voter_address_list = []
+    voter_ballot_saved_list = []
+    follow_organization_list = []
+    current_friend_list = []
+    position_for_friends_list = []
+    activity_notice_list = []
+    for voter_number, voter in enumerate(voter_list):
+        voter_device_id = generate_voter_device_id()
+        voter_device_id_list.append(voter_device_id)
+        voter_device_link_list.append(VoterDeviceLink(
+            voter_device_id=voter_device_id,
+            voter_id=voter.id,
+            google_civic_election_id=google_civic_election_id,
+            state_code=state_code))
+        voter_address_list.append(VoterAddress(
+            voter_id=voter.id,
+            address_type=BALLOT_ADDRESS,
+            text_for_map_search="1 Main St, Oakland, CA 94612",
+            normalized_city="Oakland",
+            normalized_state=state_code,
+            normalized_zip="94612",
+            google_civic_election_id=google_civic_election_id))
+        voter_ballot_saved_list.append(VoterBallotSaved(
+            voter_id=voter.id,
+            google_civic_election_id=google_civic_election_id,
+            state_code=state_code,
+            election_date=election_day,
+            election_description_text="Benchmark Election",
+            original_text_for_map_search="1 Main St, Oakland, CA 94612",
+            ballot_returned_we_vote_id=ballot_returned_we_vote_id,
+            polling_location_we_vote_id_source=polling_location_we_vote_id))
+        for organization in random_generator.sample(
+                organization_list, min(organizations_followed_per_voter, len(organization_list))):
+            follow_organization_list.append(FollowOrganization(
+                voter_id=voter.id,
+                organization_id=organization_id_by_we_vote_id.get(organization.we_vote_id),
+                organization_we_vote_id=organization.we_vote_id,
+                following_status=FOLLOWING))
+        # Each voter is friends with the next friends_per_voter voters, wrapping around the list
+        for friend_offset in range(1, min(friends_per_voter, len(voter_list) - 1) + 1):
+            friend = voter_list[(voter_number + friend_offset) % len(voter_list)]
+            if friend_offset <= friends_per_voter // 2 or voter_number < friend_offset:
+                current_friend_list.append(CurrentFriend(
+                    viewer_voter_we_vote_id=voter.we_vote_id,
+                    viewer_organization_we_vote_id=voter.linked_organization_we_vote_id,
+                    viewee_voter_we_vote_id=friend.we_vote_id,
+                    viewee_organization_we_vote_id=friend.linked_organization_we_vote_id))
+            if len(activity_notice_list) < (voter_number + 1) * activity_notices_per_voter:
+                activity_notice_list.append(ActivityNotice(
+                    kind_of_notice=NOTICE_FRIEND_ENDORSEMENTS,
+                    date_of_notice=now(),
+                    is_in_app=True,
+                    new_positions_entered_count=1,
+                    speaker_name=friend.first_name + " " + friend.last_name,
+                    speaker_voter_we_vote_id=friend.we_vote_id,
+                    speaker_organization_we_vote_id=friend.linked_organization_we_vote_id,
+                    recipient_voter_we_vote_id=voter.we_vote_id))
+        for field_name, ballot_item_we_vote_id, ballot_item_display_name in random_generator.sample(
+                ballot_item_value_list, min(3, len(ballot_item_value_list))):
+            position_for_friends_list.append(PositionForFriends(**{
+                'we_vote_id': BENCHMARK_WE_VOTE_ID_PREFIX + 'fpos' + str(len(position_for_friends_list)),
+                'voter_id': voter.id,
+                'voter_we_vote_id': voter.we_vote_id,
+                'organization_we_vote_id': voter.linked_organization_we_vote_id,
+                'speaker_display_name': voter.first_name + " " + voter.last_name,
+                'google_civic_election_id': str(google_civic_election_id),
+                'state_code': state_code,
+                'stance': random_generator.choice(stance_list),
+                'ballot_item_display_name': ballot_item_display_name,
+                field_name: ballot_item_we_vote_id,
+            }))
+    VoterDeviceLink.objects.bulk_create(voter_device_link_list)
+    VoterAddress.objects.bulk_create(voter_address_list)
+    VoterBallotSaved.objects.bulk_create(voter_ballot_saved_list)
+    FollowOrganization.objects.bulk_create(follow_organization_list, batch_size=1000)
+    CurrentFriend.objects.bulk_create(current_friend_list, batch_size=1000)
+    PositionForFriends.objects.bulk_create(position_for_friends_list, batch_size=1000)
+    ActivityNotice.objects.bulk_create(activity_notice_list, batch_size=1000)
+
+    return {
+        'google_civic_election_id':     google_civic_election_id,
+        'candidate_we_vote_id_list':    [candidate.we_vote_id for candidate in candidate_list],
+        'office_we_vote_id_list':       [office.we_vote_id for office in office_list],
+        'organization_we_vote_id_list': [organization.we_vote_id for organization in organization_list],
+        'voter_device_id_list':         voter_device_id_list,
+        'seed_counts': {
+            'activity_notices':         len(activity_notice_list),
+            'candidates':               len(candidate_list),
+            'current_friends':          len(current_friend_list),
+            'follow_organizations':     len(follow_organization_list),
+            'measures':                 len(measure_list),
+            'offices':                  len(office_list),
+            'organizations':            len(organization_list),
+            'positions_for_friends':    len(position_for_friends_list),
+            'positions_public':         len(position_list),
+            'voters':                   len(voter_list),
+        },
+    }
+
+
+def percentile_of_sorted_list(sorted_value_list, percent):
+    # Nearest-rank percentile, so the reported value is always one that was measured
+    if not sorted_value_list:
+        return 0
+    rank = max(int(math.ceil(percent / 100.0 * len(sorted_value_list))), 1)
+    return sorted_value_list[rank - 1]
+
+
+def benchmark_one_api(api_name='', url_name='', get_variables=None, voter_device_id_list=None,
+                      iterations=BENCHMARK_ITERATIONS):
+    """
+    Call one apis_v1 view function directly (no middleware, no HTTP) iterations times, rotating through the
+    seeded voters. Latency and query counts come from these calls; peak memory comes from one extra call made
+    under tracemalloc, which would otherwise slow down the timed calls.
+    """
+    request_factory = RequestFactory()
+    path = reverse('apis_v1:' + url_name)
+    view_function = resolve(path).func
+
+    def build_request(iteration_number):
+        one_request_get_variables = dict(get_variables or {})
+        if voter_device_id_list:
+            one_request_get_variables['voter_device_id'] = \
+                voter_device_id_list[iteration_number % len(voter_device_id_list)]
+        request = request_factory.get(path, one_request_get_variables, HTTP_USER_AGENT=BENCHMARK_USER_AGENT)
+        request.user = AnonymousUser()
+        return request
+
+    latency_ms_list = []
+    query_count_list = []
+    readonly_query_count_list = []
+    status_code = 0
+    error = ''
+    try:
+        for iteration_number in range(iterations):
+            request = build_request(iteration_number)
+            with CaptureQueriesContext(connections['default']) as default_queries, \
+                    CaptureQueriesContext(connections['readonly']) as readonly_queries:
+                time_started = time.perf_counter()
+                response = view_function(request)
+                latency_ms_list.append((time.perf_counter() - time_started) * 1000)
+            status_code = response.status_code
+            query_count_list.append(len(default_queries))
+            readonly_query_count_list.append(len(readonly_queries))
+
+        request = build_request(0)
+        tracemalloc.start()
+        try:
+            view_function(request)
+            peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        error = str(e)
+        peak_memory_bytes = 0
+        logger.error("benchmark_one_api " + api_name + " failed: " + error)
+
+    latency_ms_list.sort()
+    api_results = {
+        'api_name':             api_name,
+        'iterations':           len(latency_ms_list),
+        'status_code':          status_code,
+        'latency_ms_p50':       round(percentile_of_sorted_list(latency_ms_list, 50), 2),
+        'latency_ms_p95':       round(percentile_of_sorted_list(latency_ms_list, 95), 2),
+        'latency_ms_max':       round(latency_ms_list[-1], 2) if latency_ms_list else 0,
+        # Query counts should not vary between calls, so report the highest
+        'query_count':          max(query_count_list) if query_count_list else 0,
+        'readonly_query_count': max(readonly_query_count_list) if readonly_query_count_list else 0,
+        'peak_memory_kb':       round(peak_memory_bytes / 1024, 1),
+    }
+    if error:
+        api_results['error'] = error
+    return api_results
+
+
+def run_api_benchmarks(seed_results=None, api_name_list=None, iterations=BENCHMARK_ITERATIONS):
+    """
+    Benchmark the apis_v1 endpoints in BENCHMARK_API_LIST (or just those named in api_name_list) against an
+    election seeded with seed_benchmark_election.
+    :return: A report that can be saved as JSON and compared with compare_api_benchmark_reports
+    """
+    api_results_by_name = {}
+    for api_name, url_name, get_variables_function in BENCHMARK_API_LIST:
+        if api_name_list and api_name not in api_name_list:
+            continue
+        api_results_by_name[api_name] = benchmark_one_api(
+            api_name=api_name,
+            url_name=url_name,
+            get_variables=get_variables_function(seed_results),
+            voter_device_id_list=seed_results['voter_device_id_list'],
+            iterations=iterations)
+
+    try:
+        git_commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    timeout=10).stdout.strip()
+    except Exception:
+        git_commit = ''
+
+    return {
+        'git_commit':       git_commit,
+        'date_run':         now().strftime('%Y-%m-%d %H:%M:%S'),
+        'database_vendor':  connections['default'].vendor,
+        'iterations':       iterations,
+        'seed_counts':      seed_results['seed_counts'],
+        'apis':             api_results_by_name,
+    }
+
+
+def compare_api_benchmark_reports(previous_report=None, current_report=None):
+    """
+    List the change in latency, query count and peak memory for every api in both reports.
+    :return: One line of text per api
+    """
+    comparison_line_list = []
+    for api_name, current_api_results in current_report['apis'].items():
+        previous_api_results = previous_report.get('apis', {}).get(api_name)
+        if not previous_api_results:
+            comparison_line_list.append(api_name + ": new")
+            continue
+        comparison_line_list.append(
+            "{api_name}: p50 {p50_before} -> {p50_after} ms, p95 {p95_before} -> {p95_after} ms, "
+            "queries {queries_before} -> {queries_after}, readonly queries {readonly_before} -> {readonly_after}, "
+            "peak memory {memory_before} -> {memory_after} KB".format(
+                api_name=api_name,
+                p50_before=previous_api_results['latency_ms_p50'],
+                p50_after=current_api_results['latency_ms_p50'],
+                p95_before=previous_api_results['latency_ms_p95'],
+                p95_after=current_api_results['latency_ms_p95'],
+                queries_before=previous_api_results['query_count'],
+                queries_after=current_api_results['query_count'],
+                readonly_before=previous_api_results['readonly_query_count'],
+                readonly_after=current_api_results['readonly_query_count'],
+                memory_before=previous_api_results['peak_memory_kb'],
+                memory_after=current_api_results['peak_memory_kb']))
+    return comparison_line_list
+
+
+def save_api_benchmark_report(report=None, report_path=''):
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
@@ -25,6 +25,13 @@ def search_all_doc_template_values(url_root):
         },
     ]
     optional_query_parameter_list = [
+        {
+            'name':         'search_scope_list[]',
+            'value':        'stringlist',  # boolean, integer, long, string
+            'description':  'Limit the search to some kinds of results. '
+                            'CN = candidate name, OFN = office name, ON = organization name, PN = politician name. '
+                            'Without a search_scope_list we search all of them.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -54,12 +61,16 @@ def search_all_doc_template_values(url_root):
                    '     "result_image": string,\n' \
                    '     "result_subtitle": string,\n' \
                    '     "result_summary": string,\n' \
-                   '     "result_score": integer,\n' \
+                   '     "result_score": float (higher is a better match, results are sorted best first),\n' \
                    '     "link_internal": string,\n' \
                    '     "kind_of_owner": string,\n' \
                    '     "google_civic_election_id": integer,\n' \
                    '     "state_code": string,\n' \
                    '     "twitter_handle": string,\n' \
+                   '     "twitter_handle2": string,\n' \
+                   '     "twitter_handle3": string,\n' \
+                   '     "twitter_handle4": string,\n' \
+                   '     "twitter_handle5": string,\n' \
                    '     "we_vote_id": string,\n' \
                    '     "local_id": integer,\n' \
                    '   },]\n' \
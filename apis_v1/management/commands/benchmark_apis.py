@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from apis_v1.controllers_benchmark import BENCHMARK_ITERATIONS, compare_api_benchmark_reports, run_api_benchmarks, \
+    save_api_benchmark_report, seed_benchmark_election
+
+# Seeds a synthetic election into throwaway test databases (the same ones "manage.py test" creates), calls the
+#  busiest apis_v1 views directly, and writes p50/p95 latency, SQL query counts and peak memory to a JSON report:
+#      python manage.py benchmark_apis --output benchmark_before.json
+#      (change code)
+#      python manage.py benchmark_apis --output benchmark_after.json --compare benchmark_before.json
+# Unlike loadtest/WeVoteLocust.py, this does not need a running server or real voter_device_ids.
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, query counts and peak memory of the busiest apis_v1 endpoints against seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offices', type=int, default=20)
+        parser.add_argument('--candidates-per-office', type=int, default=3)
+        parser.add_argument('--measures', type=int, default=5)
+        parser.add_argument('--organizations', type=int, default=200)
+        parser.add_argument('--positions-per-organization', type=int, default=10)
+        parser.add_argument('--voters', type=int, default=50)
+        parser.add_argument('--organizations-followed-per-voter', type=int, default=20)
+        parser.add_argument('--friends-per-voter', type=int, default=10)
+        parser.add_argument('--activity-notices-per-voter', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=BENCHMARK_ITERATIONS)
+        parser.add_argument('--api', action='append', dest='api_name_list',
+                            help='Only benchmark this api, for example --api voterBallotItemsRetrieve')
+        parser.add_argument('--output', default='benchmark_apis.json', help='Where to write the JSON report')
+        parser.add_argument('--compare', default='', help='An earlier JSON report to compare this run with')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test databases from an earlier run')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            seed_results = seed_benchmark_election(
+                number_of_offices=options['offices'],
+                candidates_per_office=options['candidates_per_office'],
+                number_of_measures=options['measures'],
+                number_of_organizations=options['organizations'],
+                positions_per_organization=options['positions_per_organization'],
+                number_of_voters=options['voters'],
+                organizations_followed_per_voter=options['organizations_followed_per_voter'],
+                friends_per_voter=options['friends_per_voter'],
+                activity_notices_per_voter=options['activity_notices_per_voter'])
+            report = run_api_benchmarks(
+                seed_results=seed_results,
+                api_name_list=options['api_name_list'],
+                iterations=options['iterations'])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        save_api_benchmark_report(report=report, report_path=options['output'])
+        for api_name, api_results in report['apis'].items():
+            self.stdout.write(
+                "{api_name}: p50 {p50} ms, p95 {p95} ms, {queries} queries, {readonly_queries} readonly queries, "
+                "{memory} KB peak{error}".format(
+                    api_name=api_name,
+                    p50=api_results['latency_ms_p50'],
+                    p95=api_results['latency_ms_p95'],
+                    queries=api_results['query_count'],
+                    readonly_queries=api_results['readonly_query_count'],
+                    memory=api_results['peak_memory_kb'],
+                    error=" ERROR: " + api_results['error'] if 'error' in api_results else ""))
+        self.stdout.write("Report saved to " + options['output'])
+
+        if options['compare']:
+            with open(options['compare']) as previous_report_file:
+                previous_report = json.load(previous_report_file)
+            for comparison_line in compare_api_benchmark_reports(
+                    previous_report=previous_report, current_report=report):
+                self.stdout.write(comparison_line)
@@ -119,7 +119,10 @@ def search_all_view(request):  # searchAll
     text_from_search_field = request.GET.get('text_from_search_field', '')
     search_scope_list = request.GET.getlist('search_scope_list[]')
     search_scope_list = list(filter(None, search_scope_list))
-    # search_scope_list options
+    # search_scope_list options (no scope searches all of them)
+    # CN = CANDIDATE_NAME
+    # OFN = OFFICE_NAME
+    # ON = ORGANIZATION_NAME
     # PN = POLITICIAN_NAME
 
     if not positive_value_exists(text_from_search_field):
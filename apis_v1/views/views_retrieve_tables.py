@@ -3,12 +3,12 @@
 # -*- coding: UTF-8 -*-
 import json
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 import wevote_functions.admin
 from config.base import get_environment_variable
-from retrieve_tables.controllers_master import fast_load_status_retrieve, get_total_row_count, get_max_id, \
-    retrieve_sql_tables_as_csv
+from retrieve_tables.controllers_master import FAST_LOAD_STREAM_CHUNK_SIZE, fast_load_status_retrieve, \
+    get_total_row_count, get_max_id, retrieve_sql_table_chunk_as_csv_stream, retrieve_sql_tables_as_csv
 from retrieve_tables.controllers_master import fast_load_status_update
 from wevote_functions.functions import get_voter_api_device_id
 
@@ -44,6 +44,32 @@ def retrieve_sql_tables(request):  # retrieveSQLTables
     return HttpResponse(json.dumps(json_data), content_type='application/json')
 
 
+def retrieve_sql_tables_stream(request):  # retrieveSQLTablesStream
+    """
+    Streaming mode of retrieveSQLTables: one keyset chunk of a table as a gzipped CSV stream, with no JSON around it.
+    The number of rows and the last id in the chunk are in the X-Row-Count and X-Last-Id headers.
+    :param request:
+    :return:
+    """
+    table_name = request.GET.get('table_name', 'bad_table_param_error')
+    after_id = request.GET.get('after_id', 0)
+    chunk_size = request.GET.get('chunk_size', FAST_LOAD_STREAM_CHUNK_SIZE)
+
+    results = retrieve_sql_table_chunk_as_csv_stream(table_name, after_id=after_id, chunk_size=chunk_size)
+    if not results['success']:
+        json_data = {
+            'success': False,
+            'status': results['status'],
+        }
+        return HttpResponse(json.dumps(json_data), content_type='application/json', status=400)
+
+    response = StreamingHttpResponse(results['csv_stream'], content_type='text/csv')
+    response['Content-Encoding'] = 'gzip'
+    response['X-Row-Count'] = str(results['row_count'])
+    response['X-Last-Id'] = str(results['last_id'])
+    return response
+
+
 def retrieve_sql_tables_row_count(request):  # retrieveSQLTablesRowCount
     json_data = {
         'rowCount': str(get_total_row_count())
@@ -439,8 +439,8 @@ def voter_guides_upcoming_retrieve_view(request):  # voterGuidesUpcomingRetrieve
     :return:
     """
     status = ""
-    api_internal_cache = None
     api_internal_cache_found = False
+    date_cached = None
     json_data = {}
 
     google_civic_election_id_list = request.GET.getlist('google_civic_election_id_list[]')
@@ -454,12 +454,13 @@ def voter_guides_upcoming_retrieve_view(request):  # voterGuidesUpcomingRetrieve
     # Since this API assembles a lot of data, we pre-cache it. Get the data cached most recently.
     api_internal_cache_manager = ApiInternalCacheManager()
     election_id_list_serialized = json.dumps(google_civic_election_id_list)
-    results = api_internal_cache_manager.retrieve_latest_api_internal_cache(
+    # This is read through an in-memory (and optionally shared) cache, so most requests don't touch the database
+    results = api_internal_cache_manager.retrieve_latest_api_internal_cache_json_data(
         api_name='voterGuidesUpcoming',
         election_id_list_serialized=election_id_list_serialized)
     if results['api_internal_cache_found']:
         api_internal_cache_found = True
-        api_internal_cache = results['api_internal_cache']
+        date_cached = results['date_cached']
         json_data = results['cached_api_response_json_data']
 
     # Schedule the next retrieve. It is possible for the first retrieve
@@ -467,7 +468,7 @@ def voter_guides_upcoming_retrieve_view(request):  # voterGuidesUpcomingRetrieve
     results = api_internal_cache_manager.schedule_refresh_of_api_internal_cache(
         api_name='voterGuidesUpcoming',
         election_id_list_serialized=election_id_list_serialized,
-        api_internal_cache=api_internal_cache,
+        date_cached=date_cached,
     )
     # Add a log entry here
 
@@ -3,20 +3,20 @@
 # -*- coding: UTF-8 -*-
 
 from .models import BallotItemListManager, BallotItemManager, BallotReturnedListManager, BallotReturnedManager, \
-    CANDIDATE, find_best_previously_stored_ballot_returned, OFFICE, MEASURE, \
+    BallotSnapshotManager, CANDIDATE, find_best_previously_stored_ballot_returned, OFFICE, MEASURE, \
     VoterBallotSaved, VoterBallotSavedManager
 from candidate.models import CandidateListManager
 from config.base import get_environment_variable
 from datetime import datetime, timedelta
 import datetime as the_other_datetime
 from election.controllers import retrieve_upcoming_election_id_list
-from election.models import ElectionManager
+from election.models import ElectionManager, fetch_next_national_election_day_text
 from exception.models import handle_exception
 from import_export_google_civic.controllers import \
     refresh_voter_ballot_items_from_google_civic_from_voter_ballot_saved, \
     voter_ballot_items_retrieve_from_google_civic_for_api
 from measure.models import ContestMeasureListManager, ContestMeasureManager
-from office.models import ContestOfficeManager, ContestOfficeListManager
+from office.models import ContestOfficeListManager
 from polling_location.models import PollingLocationManager
 import pytz
 from voter.models import BALLOT_ADDRESS, VoterAddress, VoterAddressManager, VoterDeviceLinkManager, VoterManager
@@ -971,7 +971,8 @@ def voter_ballot_items_retrieve_for_api(  # voterBallotItemsRetrieve
         incoming_status=''):
     status = incoming_status
 
-    next_national_election_day_text = '2024/11/05'
+    # The WebApp expects YYYY/MM/DD
+    next_national_election_day_text = fetch_next_national_election_day_text().replace('-', '/')
 
     specific_ballot_requested = positive_value_exists(ballot_returned_we_vote_id) or \
         positive_value_exists(ballot_location_shortcut)
@@ -1236,13 +1237,28 @@ def voter_ballot_items_retrieve_for_api(  # voterBallotItemsRetrieve
             return json_data
     elif use_office_held_ballot:
         status += "USING_OFFICE_HELD_BALLOT, google_civic_election_id: " + str(google_civic_election_id) + " "
-        from ballot.controllers_ballot_from_offices_held import \
-            voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api
-        results = voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(
-            # voter_device_id,
-            # voter_id=voter_id,
-            google_civic_election_id=google_civic_election_id,
+        snapshot_results = BallotSnapshotManager.retrieve_ballot_snapshot(
             offices_held_for_location_id=offices_held_for_location_id)
+        if snapshot_results['ballot_snapshot_found']:
+            ballot_snapshot = snapshot_results['ballot_snapshot']
+            results = {
+                'status':                       snapshot_results['status'],
+                'success':                      True,
+                'ballot_item_list':             snapshot_results['ballot_item_list'],
+                'ballot_item_list_found':       len(snapshot_results['ballot_item_list']) > 0,
+                'google_civic_election_id':     ballot_snapshot.google_civic_election_id,
+                'is_from_substituted_address':  True,
+                'polling_location_we_vote_id':  ballot_snapshot.polling_location_we_vote_id,
+            }
+        else:
+            status += snapshot_results['status']
+            from ballot.controllers_ballot_from_offices_held import \
+                voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api
+            results = voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(
+                # voter_device_id,
+                # voter_id=voter_id,
+                google_civic_election_id=google_civic_election_id,
+                offices_held_for_location_id=offices_held_for_location_id)
         if 'polling_location_we_vote_id' in results and \
                 positive_value_exists(results['polling_location_we_vote_id']):
             polling_location_we_vote_id_source = results['polling_location_we_vote_id']
@@ -2799,6 +2815,22 @@ def voter_ballot_items_retrieve_for_one_election_for_api(
     polling_location_we_vote_id = ''
 
     if positive_value_exists(ballot_returned_we_vote_id):
+        # Voters at the same map point share one ballot, so use the snapshot built by GENERATE_BALLOT_SNAPSHOTS
+        snapshot_results = BallotSnapshotManager.retrieve_ballot_snapshot(
+            ballot_returned_we_vote_id=ballot_returned_we_vote_id,
+            google_civic_election_id=google_civic_election_id)
+        if snapshot_results['ballot_snapshot_found']:
+            results = {
+                'status':                   status + snapshot_results['status'],
+                'success':                  True,
+                'voter_device_id':          voter_device_id,
+                'ballot_item_list':         snapshot_results['ballot_item_list'],
+                'ballot_item_list_found':   len(snapshot_results['ballot_item_list']) > 0,
+                'google_civic_election_id': google_civic_election_id,
+            }
+            return results
+        status += snapshot_results['status']
+
         ballot_returned_results = \
             ballot_returned_manager.retrieve_existing_ballot_returned_by_identifier(
                 ballot_returned_we_vote_id=ballot_returned_we_vote_id,
@@ -2841,6 +2873,7 @@ def voter_ballot_items_retrieve_for_one_election_for_api(
             google_civic_election_id=google_civic_election_id,
             voter_device_id=voter_device_id,
         )
+        results['status'] = status + results['status']
     else:
         results = {
             'status': status,
@@ -2863,13 +2896,14 @@ def generate_ballot_item_list_from_object_list(
     status = ''
     success = True
 
-    contest_office_manager = ContestOfficeManager()
-    candidate_list_object = CandidateListManager()
-
     # Loop through measures to make sure we have full measure data needed
     contest_measure_we_vote_id_list = []
+    contest_office_we_vote_id_list = []
     for ballot_item in ballot_item_object_list:
-        if ballot_item.contest_measure_we_vote_id and \
+        if ballot_item.contest_office_we_vote_id:
+            if ballot_item.contest_office_we_vote_id not in contest_office_we_vote_id_list:
+                contest_office_we_vote_id_list.append(ballot_item.contest_office_we_vote_id)
+        elif ballot_item.contest_measure_we_vote_id and \
                 ballot_item.contest_measure_we_vote_id not in contest_measure_we_vote_id_list:
             contest_measure_we_vote_id_list.append(ballot_item.contest_measure_we_vote_id)
 
@@ -2884,10 +2918,26 @@ def generate_ballot_item_list_from_object_list(
             for one_measure in measure_list_objects:
                 measure_results_dict[one_measure.we_vote_id] = one_measure
 
+    # Retrieve all offices, their candidates, and the data needed for each candidate dict, in a few bulk queries
+    from candidate.controllers import generate_candidate_dict_from_candidate_object, \
+        retrieve_candidate_data_for_office_list
+    candidate_list_by_office = {}
+    candidate_to_office_link_list = []
+    election_dict = {}
+    office_dict = {}
+    if len(contest_office_we_vote_id_list) > 0:
+        candidate_data_results = retrieve_candidate_data_for_office_list(
+            office_we_vote_id_list=contest_office_we_vote_id_list,
+            read_only=True)
+        status += candidate_data_results['status']
+        candidate_list_by_office = candidate_data_results['candidate_list_by_office']
+        candidate_to_office_link_list = candidate_data_results['candidate_to_office_link_list']
+        election_dict = candidate_data_results['election_dict']
+        office_dict = candidate_data_results['office_dict']
+
     # Now prepare the full list for json result
     status += "BALLOT_ITEM_LIST_FOUND "
     ballot_item_list_found = len(ballot_item_object_list) > 0
-    from candidate.controllers import generate_candidate_dict_from_candidate_object
     for ballot_item in ballot_item_object_list:
         if ballot_item.contest_office_we_vote_id:
             office_name = ""
@@ -2897,37 +2947,31 @@ def generate_ballot_item_list_from_object_list(
             primary_party = ""
             race_office_level = ""
             if positive_value_exists(office_we_vote_id):
-                office_results = contest_office_manager.retrieve_contest_office_from_we_vote_id(
-                    office_we_vote_id, read_only=True)
-                if office_results['contest_office_found']:
-                    contest_office = office_results['contest_office']
+                contest_office = office_dict.get(office_we_vote_id)
+                if contest_office:
                     office_id = contest_office.id
                     office_name = contest_office.office_name
                     primary_party = contest_office.primary_party
                     race_office_level = contest_office.ballotpedia_race_office_level
             try:
-                results = candidate_list_object.retrieve_all_candidates_for_office(
-                    office_we_vote_id=office_we_vote_id, read_only=True)
-
                 candidates_to_display = []
-                if results['candidate_list_found']:
-                    candidate_list = results['candidate_list']
-                    for candidate in candidate_list:
-                        candidate_dict_results = generate_candidate_dict_from_candidate_object(
-                            candidate=candidate,
-                            google_civic_election_id=google_civic_election_id,
-                            office_id=office_id,
-                            office_name=office_name,
-                            office_we_vote_id=office_we_vote_id,
-                        )
-                        if candidate_dict_results['success']:
-                            candidate_dict = candidate_dict_results['candidate_dict']
-                            candidates_to_display.append(candidate_dict)
+                for candidate in candidate_list_by_office.get(office_we_vote_id, []):
+                    candidate_dict_results = generate_candidate_dict_from_candidate_object(
+                        candidate=candidate,
+                        candidate_to_office_link_list_from_multiple_candidates=candidate_to_office_link_list,
+                        election_dict=election_dict,
+                        google_civic_election_id=google_civic_election_id,
+                        office_dict=office_dict,
+                        office_id=office_id,
+                        office_name=office_name,
+                        office_we_vote_id=office_we_vote_id,
+                    )
+                    if candidate_dict_results['success']:
+                        candidate_dict = candidate_dict_results['candidate_dict']
+                        candidates_to_display.append(candidate_dict)
             except Exception as e:
-                status += 'FAILED retrieve_all_candidates_for_office. ' + str(e) + " "
+                status += 'FAILED generate_candidate_dict_from_candidate_object. ' + str(e) + " "
                 candidates_to_display = []
-                if hasattr(results, 'status'):
-                    status += results['status'] + " "
 
             if len(candidates_to_display):
                 one_ballot_item = {
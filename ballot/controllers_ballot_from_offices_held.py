@@ -216,7 +216,8 @@ def voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(  # vot
     results = office_held_manager.retrieve_offices_held_for_location(
         offices_held_for_location_id=offices_held_for_location_id,
         read_only=True)
-    if results['offices_held_for_location_found']:
+    offices_held_for_location_found = results['offices_held_for_location_found']
+    if offices_held_for_location_found:
         offices_held_for_location = results['offices_held_for_location']
         polling_location_we_vote_id = offices_held_for_location.polling_location_we_vote_id
         office_held_index_count = 1
@@ -242,6 +243,7 @@ def voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(  # vot
             contest_office_list = list(queryset)
         except Exception as e:
             status += 'FAILED_CONTEST_OFFICE_QUERY: ' + str(e) + " "
+            success = False
 
         # # Retrieve all the office_held objects mentioned in office_held_we_vote_id_list
         # office_held_list = []
@@ -289,16 +291,19 @@ def voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(  # vot
             # voter_device_id=voter_device_id,
         )
         results['is_from_substituted_address'] = True
+        results['offices_held_for_location_found'] = offices_held_for_location_found
         results['polling_location_we_vote_id'] = polling_location_we_vote_id
     else:
+        # A location which has no matching offices is a success with an empty ballot_item_list
         results = {
-            'status':                       status,
-            'success':                      False,
-            # 'voter_device_id':            voter_device_id,
-            'ballot_item_list':             [],
-            'ballot_item_list_found':       ballot_item_list_found,
-            'google_civic_election_id':     google_civic_election_id,
-            'polling_location_we_vote_id':  polling_location_we_vote_id,
+            'status':                           status,
+            'success':                          success and offices_held_for_location_found,
+            # 'voter_device_id':                voter_device_id,
+            'ballot_item_list':                 [],
+            'ballot_item_list_found':           ballot_item_list_found,
+            'google_civic_election_id':         google_civic_election_id,
+            'offices_held_for_location_found':  offices_held_for_location_found,
+            'polling_location_we_vote_id':      polling_location_we_vote_id,
         }
 
     return results
@@ -0,0 +1,208 @@
+# ballot/controllers_ballot_snapshot.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from ballot.controllers import generate_ballot_item_list_from_object_list
+from ballot.controllers_ballot_from_offices_held import \
+    voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api
+from ballot.models import BallotItemListManager, BallotReturned, BallotSnapshot, BallotSnapshotManager
+from office_held.models import OfficesHeldForLocation
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# How many snapshots one GENERATE_BALLOT_SNAPSHOTS batch process will build before handing off to the next run
+BALLOT_SNAPSHOTS_TO_GENERATE_PER_BATCH_PROCESS = 1000
+
+
+def generate_ballot_snapshot_for_ballot_returned(
+        ballot_returned_we_vote_id='',
+        polling_location_we_vote_id='',
+        google_civic_election_id=0):
+    """
+    Build the voter-independent part of voterBallotItemsRetrieve for one map point ballot, and store it.
+    :param ballot_returned_we_vote_id:
+    :param polling_location_we_vote_id:
+    :param google_civic_election_id:
+    :return:
+    """
+    status = ""
+    ballot_item_list_manager = BallotItemListManager()
+    results = ballot_item_list_manager.retrieve_all_ballot_items_for_polling_location(
+        polling_location_we_vote_id=polling_location_we_vote_id,
+        google_civic_election_id_list=[google_civic_election_id],
+        read_only=True)
+    if not results['success']:
+        status += "BALLOT_SNAPSHOT_BALLOT_ITEMS_NOT_RETRIEVED: " + results['status']
+        return {
+            'success':                  False,
+            'status':                   status,
+            'ballot_snapshot_saved':    False,
+        }
+
+    results = generate_ballot_item_list_from_object_list(
+        ballot_item_object_list=results['ballot_item_list'],
+        google_civic_election_id=google_civic_election_id)
+    results = BallotSnapshotManager.update_or_create_ballot_snapshot(
+        ballot_returned_we_vote_id=ballot_returned_we_vote_id,
+        google_civic_election_id=google_civic_election_id,
+        polling_location_we_vote_id=polling_location_we_vote_id,
+        ballot_item_list=results['ballot_item_list'])
+    status += results['status']
+    return {
+        'success':                  results['success'],
+        'status':                   status,
+        'ballot_snapshot_saved':    results['ballot_snapshot_saved'],
+    }
+
+
+def generate_ballot_snapshot_for_offices_held_for_location(offices_held_for_location_id=0):
+    """
+    The office-held ballot works out its own google_civic_election_id from the offices, so we store that one.
+    A location without any matching offices gets an empty snapshot, so it isn't rebuilt on every run.
+    :param offices_held_for_location_id:
+    :return:
+    """
+    status = ""
+    results = voter_ballot_items_retrieve_for_one_election_by_offices_held_for_api(
+        offices_held_for_location_id=offices_held_for_location_id)
+    if not results['success']:
+        status += "BALLOT_SNAPSHOT_OFFICES_HELD_BALLOT_NOT_GENERATED: " + results['status']
+        return {
+            'success':                  False,
+            'status':                   status,
+            'ballot_snapshot_saved':    False,
+        }
+
+    results = BallotSnapshotManager.update_or_create_ballot_snapshot(
+        offices_held_for_location_id=offices_held_for_location_id,
+        google_civic_election_id=results['google_civic_election_id'],
+        polling_location_we_vote_id=results['polling_location_we_vote_id'],
+        ballot_item_list=results['ballot_item_list'])
+    status += results['status']
+    return {
+        'success':                  results['success'],
+        'status':                   status,
+        'ballot_snapshot_saved':    results['ballot_snapshot_saved'],
+    }
+
+
+def generate_ballot_snapshots_for_election(
+        google_civic_election_id=0,
+        maximum_number_to_generate=BALLOT_SNAPSHOTS_TO_GENERATE_PER_BATCH_PROCESS):
+    """
+    Build every missing or stale snapshot for this election: first the BallotReturned (map point) ballots,
+    and then the office-held ballots. There is one office-held snapshot per OfficesHeldForLocation, whichever
+    election its offices are in, so the run for any upcoming election keeps all of them fresh.
+    A snapshot which fails to generate is left stale and tried again on a backoff (see
+    record_ballot_snapshot_generation_failure), so one broken ballot isn't rebuilt on every run.
+    :param google_civic_election_id:
+    :param maximum_number_to_generate:
+    :return:
+    """
+    status = ""
+    success = True
+    ballot_snapshots_attempted_count = 0
+    ballot_snapshots_generated_count = 0
+    ballot_snapshots_remaining = False
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+
+    if not positive_value_exists(google_civic_election_id):
+        status += "GENERATE_BALLOT_SNAPSHOTS_MISSING_GOOGLE_CIVIC_ELECTION_ID "
+        return {
+            'success':                          False,
+            'status':                           status,
+            'ballot_snapshots_generated_count': ballot_snapshots_generated_count,
+            'ballot_snapshots_remaining':       ballot_snapshots_remaining,
+        }
+
+    try:
+        # Fresh snapshots, and stale ones waiting out a backoff or given up on
+        queryset = BallotSnapshot.objects.using('readonly')\
+            .filter(google_civic_election_id=google_civic_election_id)\
+            .exclude(ballot_returned_we_vote_id__isnull=True)
+        fresh_ballot_returned_we_vote_id_set = set(queryset.values_list('ballot_returned_we_vote_id', flat=True))
+        queryset = BallotSnapshotManager.retrieve_ballot_snapshots_due_query()\
+            .filter(google_civic_election_id=google_civic_election_id)\
+            .exclude(ballot_returned_we_vote_id__isnull=True)
+        fresh_ballot_returned_we_vote_id_set -= set(queryset.values_list('ballot_returned_we_vote_id', flat=True))
+
+        queryset = BallotReturned.objects.using('readonly')\
+            .filter(google_civic_election_id=google_civic_election_id)\
+            .exclude(polling_location_we_vote_id__isnull=True)\
+            .exclude(polling_location_we_vote_id='')
+        ballot_returned_value_list = list(queryset.values_list('we_vote_id', 'polling_location_we_vote_id'))
+    except Exception as e:
+        status += "GENERATE_BALLOT_SNAPSHOTS_BALLOT_RETURNED_QUERY_FAILED: " + str(e) + " "
+        ballot_returned_value_list = []
+        fresh_ballot_returned_we_vote_id_set = set()
+        success = False
+
+    for ballot_returned_we_vote_id, polling_location_we_vote_id in ballot_returned_value_list:
+        if ballot_returned_we_vote_id in fresh_ballot_returned_we_vote_id_set:
+            continue
+        if ballot_snapshots_attempted_count >= maximum_number_to_generate:
+            ballot_snapshots_remaining = True
+            break
+        ballot_snapshots_attempted_count += 1
+        results = generate_ballot_snapshot_for_ballot_returned(
+            ballot_returned_we_vote_id=ballot_returned_we_vote_id,
+            polling_location_we_vote_id=polling_location_we_vote_id,
+            google_civic_election_id=google_civic_election_id)
+        if results['ballot_snapshot_saved']:
+            ballot_snapshots_generated_count += 1
+        else:
+            status += results['status']
+            if not results['success']:
+                results = BallotSnapshotManager.record_ballot_snapshot_generation_failure(
+                    ballot_returned_we_vote_id=ballot_returned_we_vote_id,
+                    google_civic_election_id=google_civic_election_id,
+                    polling_location_we_vote_id=polling_location_we_vote_id)
+                status += results['status']
+
+    if not ballot_snapshots_remaining:
+        try:
+            queryset = BallotSnapshot.objects.using('readonly').filter(offices_held_for_location_id__gt=0)
+            fresh_offices_held_for_location_id_set = \
+                set(queryset.values_list('offices_held_for_location_id', flat=True))
+            queryset = BallotSnapshotManager.retrieve_ballot_snapshots_due_query()\
+                .filter(offices_held_for_location_id__gt=0)
+            fresh_offices_held_for_location_id_set -= \
+                set(queryset.values_list('offices_held_for_location_id', flat=True))
+
+            queryset = OfficesHeldForLocation.objects.using('readonly').order_by('id')
+            offices_held_for_location_id_list = list(queryset.values_list('id', flat=True))
+        except Exception as e:
+            status += "GENERATE_BALLOT_SNAPSHOTS_OFFICES_HELD_QUERY_FAILED: " + str(e) + " "
+            fresh_offices_held_for_location_id_set = set()
+            offices_held_for_location_id_list = []
+            success = False
+
+        for offices_held_for_location_id in offices_held_for_location_id_list:
+            if offices_held_for_location_id in fresh_offices_held_for_location_id_set:
+                continue
+            if ballot_snapshots_attempted_count >= maximum_number_to_generate:
+                ballot_snapshots_remaining = True
+                break
+            ballot_snapshots_attempted_count += 1
+            results = generate_ballot_snapshot_for_offices_held_for_location(
+                offices_held_for_location_id=offices_held_for_location_id)
+            if results['ballot_snapshot_saved']:
+                ballot_snapshots_generated_count += 1
+            else:
+                status += results['status']
+                if not results['success']:
+                    results = BallotSnapshotManager.record_ballot_snapshot_generation_failure(
+                        offices_held_for_location_id=offices_held_for_location_id)
+                    status += results['status']
+
+    status += "BALLOT_SNAPSHOTS_GENERATED_COUNT: " + str(ballot_snapshots_generated_count) + " "
+    if ballot_snapshots_remaining:
+        status += "BALLOT_SNAPSHOTS_REMAINING "
+    return {
+        'success':                          success,
+        'status':                           status,
+        'ballot_snapshots_generated_count': ballot_snapshots_generated_count,
+        'ballot_snapshots_remaining':       ballot_snapshots_remaining,
+    }
@@ -2,25 +2,31 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import json
 import sys
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 from django.db import models
 from django.db.models import F, Q, Count, FloatField, ExpressionWrapper, Func
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
 from geopy.exc import GeocoderQuotaExceeded
 from geopy.geocoders import get_geocoder_for_service
 
 import wevote_functions.admin
-from candidate.models import CandidateCampaign
+from candidate.models import CandidateCampaign, CandidateToOfficeLink
 from config.base import get_environment_variable
 from election.models import ElectionManager
 from exception.models import handle_exception, handle_record_found_more_than_one_exception
-from measure.models import ContestMeasureManager
-from office.models import ContestOfficeManager
+from measure.models import ContestMeasure, ContestMeasureManager
+from office.models import ContestOffice, ContestOfficeManager
+from office_held.models import OfficesHeldForLocation
 from polling_location.models import PollingLocationManager
 from wevote_functions.functions import convert_to_int, extract_state_code_from_address_string, \
     positive_value_exists, STATE_CODE_MAP
-from wevote_functions.functions_date import convert_date_to_date_as_integer, DATE_FORMAT_YMD
+from wevote_functions.functions_date import convert_date_to_date_as_integer, DATE_FORMAT_YMD, \
+    get_current_date_as_integer
 from wevote_settings.models import fetch_next_we_vote_id_ballot_returned_integer, fetch_site_unique_id_prefix
 
 OFFICE = 'OFFICE'
@@ -39,6 +45,10 @@ GEOCODE_TIMEOUT = 10
 RADIUS_OF_EARTH_IN_MILES = 3958.756
 DEG_TO_RADS = 0.0174533
 DISTANCE_LIMIT_IN_MILES = 25
+# A snapshot which fails to generate is tried again after 15 minutes, then 30, 60... and not after 8 failures,
+#  until one of its source rows changes
+BALLOT_SNAPSHOT_GENERATION_RETRY_MINUTES = 15
+BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES = 8
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -761,6 +771,10 @@ class BallotItemManager(models.Manager):
                 # state_code=contest_measure.state_code,
                 yes_vote_description=contest_measure.ballotpedia_yes_vote_description,
             )
+            # update() doesn't send post_save
+            results = BallotSnapshotManager.mark_ballot_snapshots_stale(
+                google_civic_election_id_list=[contest_measure.google_civic_election_id])
+            status += results['status']
         except Exception as e:
             success = False
             number_of_ballot_items_updated = 0
@@ -788,6 +802,12 @@ class BallotItemManager(models.Manager):
                 contest_office_id=contest_office.id,
                 # state_code=contest_office.state_code,
             )
+            # update() doesn't send post_save
+            results = BallotSnapshotManager.mark_ballot_snapshots_stale_for_contest_offices(
+                contest_office_we_vote_id_list=[contest_office.we_vote_id],
+                google_civic_election_id_list=[contest_office.google_civic_election_id],
+                office_held_we_vote_id_list=[contest_office.office_held_we_vote_id])
+            status += results['status']
         except Exception as e:
             success = False
             number_of_ballot_items_updated = 0
@@ -4321,6 +4341,416 @@ class VoterBallotSavedManager(models.Manager):
         return results
 
 
+class BallotSnapshot(models.Model):
+    """
+    A precomputed ballot_item_list for one BallotReturned (map point ballot) or one OfficesHeldForLocation.
+    Many voters share the same ballot_returned_we_vote_id, so we generate the list once in the
+    GENERATE_BALLOT_SNAPSHOTS batch process, and voterBallotItemsRetrieve overlays the per-voter fields.
+    Snapshots are marked stale when candidates, offices, measures or ballot items in the election change.
+    Fields which depend on today's date, like election_is_upcoming, are filled in when the snapshot is served.
+    """
+    ballot_returned_we_vote_id = models.CharField(
+        max_length=255, default=None, null=True, unique=False, db_index=True)
+    offices_held_for_location_id = models.PositiveIntegerField(default=0, null=False, db_index=True)
+    google_civic_election_id = models.PositiveIntegerField(default=0, null=False, db_index=True)
+    polling_location_we_vote_id = models.CharField(
+        max_length=255, default=None, null=True, unique=False, db_index=True)
+    ballot_item_list_serialized = models.TextField(null=True, blank=True)
+    date_generated = models.DateTimeField(null=True, auto_now=True, db_index=True)
+    is_stale = models.BooleanField(default=False, db_index=True)
+    # Set while the snapshot fails to generate, so it is tried again with a backoff instead of on every run
+    generation_failure_count = models.PositiveSmallIntegerField(default=0)
+    date_generation_retry = models.DateTimeField(null=True)
+
+
+def mark_ballot_snapshot_queryset_stale(queryset):
+    """
+    Snapshots which failed to generate get a fresh set of attempts, since one of their source rows changed
+    :param queryset: BallotSnapshot queryset
+    :return: The number of snapshots marked stale
+    """
+    return queryset.filter(Q(is_stale=False) | Q(generation_failure_count__gt=0))\
+        .update(is_stale=True, generation_failure_count=0, date_generation_retry=None)
+
+
+def update_election_is_upcoming_in_ballot_item_list(ballot_item_list):
+    """
+    election_is_upcoming changes with the date rather than with the candidate, so it isn't taken from the snapshot.
+    This should match generate_candidate_dict_from_candidate_object.
+    """
+    date_today_as_integer = get_current_date_as_integer()
+    for ballot_item in ballot_item_list:
+        for candidate_dict in ballot_item.get('candidate_list', []):
+            candidate_ultimate_election_date = candidate_dict.get('candidate_ultimate_election_date')
+            candidate_dict['election_is_upcoming'] = positive_value_exists(candidate_ultimate_election_date) \
+                and candidate_ultimate_election_date > date_today_as_integer
+
+
+class BallotSnapshotManager(models.Manager):
+
+    def __unicode__(self):
+        return "BallotSnapshotManager"
+
+    @staticmethod
+    def retrieve_ballot_snapshot(
+            ballot_returned_we_vote_id='',
+            offices_held_for_location_id=0,
+            google_civic_election_id=0,
+            read_only=True):
+        """
+        Only snapshots which have not been marked stale are returned.
+        :param ballot_returned_we_vote_id:
+        :param offices_held_for_location_id:
+        :param google_civic_election_id:
+        :param read_only:
+        :return:
+        """
+        ballot_item_list = []
+        ballot_snapshot = None
+        ballot_snapshot_found = False
+        status = ""
+        success = True
+
+        if not positive_value_exists(ballot_returned_we_vote_id) \
+                and not positive_value_exists(offices_held_for_location_id):
+            status += "RETRIEVE_BALLOT_SNAPSHOT_MISSING_KEY "
+            results = {
+                'success':                  False,
+                'status':                   status,
+                'ballot_item_list':         ballot_item_list,
+                'ballot_snapshot':          ballot_snapshot,
+                'ballot_snapshot_found':    ballot_snapshot_found,
+            }
+            return results
+
+        try:
+            if read_only:
+                queryset = BallotSnapshot.objects.using('readonly').all()
+            else:
+                queryset = BallotSnapshot.objects.all()
+            if positive_value_exists(ballot_returned_we_vote_id):
+                queryset = queryset.filter(ballot_returned_we_vote_id=ballot_returned_we_vote_id)
+            else:
+                queryset = queryset.filter(offices_held_for_location_id=convert_to_int(offices_held_for_location_id))
+            if positive_value_exists(google_civic_election_id):
+                queryset = queryset.filter(google_civic_election_id=convert_to_int(google_civic_election_id))
+            queryset = queryset.filter(is_stale=False)
+            queryset = queryset.order_by('-date_generated')
+            ballot_snapshot_list = list(queryset[:1])
+            if len(ballot_snapshot_list) > 0:
+                ballot_snapshot = ballot_snapshot_list[0]
+                ballot_item_list = json.loads(ballot_snapshot.ballot_item_list_serialized)
+                update_election_is_upcoming_in_ballot_item_list(ballot_item_list)
+                ballot_snapshot_found = True
+                status += "BALLOT_SNAPSHOT_FOUND "
+            else:
+                status += "BALLOT_SNAPSHOT_NOT_FOUND "
+        except Exception as e:
+            status += "RETRIEVE_BALLOT_SNAPSHOT_FAILED: " + str(e) + " "
+            success = False
+            ballot_item_list = []
+            ballot_snapshot_found = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'ballot_item_list':         ballot_item_list,
+            'ballot_snapshot':          ballot_snapshot,
+            'ballot_snapshot_found':    ballot_snapshot_found,
+        }
+        return results
+
+    @staticmethod
+    def update_or_create_ballot_snapshot(
+            ballot_returned_we_vote_id='',
+            offices_held_for_location_id=0,
+            google_civic_election_id=0,
+            polling_location_we_vote_id='',
+            ballot_item_list=[]):
+        ballot_snapshot = None
+        ballot_snapshot_saved = False
+        status = ""
+        success = True
+
+        offices_held_for_location_id = convert_to_int(offices_held_for_location_id)
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        defaults = {
+            'ballot_item_list_serialized':  json.dumps(ballot_item_list),
+            'date_generation_retry':        None,
+            'generation_failure_count':     0,
+            'is_stale':                     False,
+            'polling_location_we_vote_id':  polling_location_we_vote_id,
+        }
+        if positive_value_exists(ballot_returned_we_vote_id):
+            lookup = {
+                'ballot_returned_we_vote_id':   ballot_returned_we_vote_id,
+                'google_civic_election_id':     google_civic_election_id,
+            }
+        elif positive_value_exists(offices_held_for_location_id):
+            # The office-held ballot's google_civic_election_id comes from its offices and can change,
+            #  so there is one snapshot per location
+            lookup = {'offices_held_for_location_id': offices_held_for_location_id}
+            defaults['google_civic_election_id'] = google_civic_election_id
+        else:
+            status += "UPDATE_OR_CREATE_BALLOT_SNAPSHOT_MISSING_KEY "
+            results = {
+                'success':                  False,
+                'status':                   status,
+                'ballot_snapshot':          ballot_snapshot,
+                'ballot_snapshot_saved':    ballot_snapshot_saved,
+            }
+            return results
+
+        try:
+            ballot_snapshot, created = BallotSnapshot.objects.update_or_create(defaults=defaults, **lookup)
+            ballot_snapshot_saved = True
+            status += "BALLOT_SNAPSHOT_CREATED " if created else "BALLOT_SNAPSHOT_UPDATED "
+        except BallotSnapshot.MultipleObjectsReturned:
+            # Two generators raced. Remove the duplicates, and the next run will write a single snapshot.
+            BallotSnapshot.objects.filter(**lookup).delete()
+            status += "BALLOT_SNAPSHOT_DUPLICATES_REMOVED "
+        except Exception as e:
+            status += "UPDATE_OR_CREATE_BALLOT_SNAPSHOT_FAILED: " + str(e) + " "
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'ballot_snapshot':          ballot_snapshot,
+            'ballot_snapshot_saved':    ballot_snapshot_saved,
+        }
+        return results
+
+    @staticmethod
+    def mark_ballot_snapshots_stale(
+            google_civic_election_id_list=[],
+            offices_held_for_location_id=0,
+            polling_location_we_vote_id=''):
+        """
+        Mark all affected snapshots stale with one UPDATE. Called from the post_save/post_delete signals below,
+        so it needs to stay cheap and must never raise. Without an offices_held_for_location_id, only map point
+        snapshots in the elections are marked, since the office-held ballots are built from offices alone.
+        :param google_civic_election_id_list:
+        :param offices_held_for_location_id:
+        :param polling_location_we_vote_id:
+        :return:
+        """
+        number_marked_stale = 0
+        status = ""
+        success = True
+
+        try:
+            queryset = BallotSnapshot.objects.all()
+            if positive_value_exists(offices_held_for_location_id):
+                queryset = queryset.filter(offices_held_for_location_id=convert_to_int(offices_held_for_location_id))
+            else:
+                google_civic_election_id_list = [
+                    convert_to_int(one_id) for one_id in google_civic_election_id_list if positive_value_exists(one_id)]
+                if not positive_value_exists(len(google_civic_election_id_list)):
+                    results = {
+                        'success':              success,
+                        'status':               "MARK_BALLOT_SNAPSHOTS_STALE_NO_ELECTION ",
+                        'number_marked_stale':  number_marked_stale,
+                    }
+                    return results
+                queryset = queryset.filter(
+                    google_civic_election_id__in=google_civic_election_id_list, offices_held_for_location_id=0)
+                if positive_value_exists(polling_location_we_vote_id):
+                    queryset = queryset.filter(polling_location_we_vote_id=polling_location_we_vote_id)
+            number_marked_stale = mark_ballot_snapshot_queryset_stale(queryset)
+            status += "BALLOT_SNAPSHOTS_MARKED_STALE: " + str(number_marked_stale) + " "
+        except Exception as e:
+            status += "MARK_BALLOT_SNAPSHOTS_STALE_FAILED: " + str(e) + " "
+            logger.error(status)
+            success = False
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'number_marked_stale':  number_marked_stale,
+        }
+        return results
+
+    @staticmethod
+    def mark_ballot_snapshots_stale_for_contest_offices(
+            contest_office_we_vote_id_list=[],
+            google_civic_election_id_list=[],
+            office_held_we_vote_id_list=None):
+        """
+        Mark stale only the snapshots which contain one of these offices: the map point snapshots in these elections
+        whose ballot items include the offices, and the office-held snapshots of the locations which hold them.
+        Called from the post_save/post_delete signals below, so it must never raise.
+        :param contest_office_we_vote_id_list:
+        :param google_civic_election_id_list:
+        :param office_held_we_vote_id_list: Looked up from the ContestOffice entries if None
+        :return:
+        """
+        number_marked_stale = 0
+        status = ""
+        success = True
+
+        contest_office_we_vote_id_list = [
+            one_we_vote_id for one_we_vote_id in contest_office_we_vote_id_list if positive_value_exists(one_we_vote_id)]
+        google_civic_election_id_list = [
+            convert_to_int(one_id) for one_id in google_civic_election_id_list if positive_value_exists(one_id)]
+        if not positive_value_exists(len(contest_office_we_vote_id_list)):
+            results = {
+                'success':              success,
+                'status':               "MARK_BALLOT_SNAPSHOTS_STALE_NO_CONTEST_OFFICES ",
+                'number_marked_stale':  number_marked_stale,
+            }
+            return results
+
+        try:
+            if positive_value_exists(len(google_civic_election_id_list)):
+                polling_location_queryset = BallotItem.objects\
+                    .filter(contest_office_we_vote_id__in=contest_office_we_vote_id_list)\
+                    .values('polling_location_we_vote_id')
+                number_marked_stale += mark_ballot_snapshot_queryset_stale(BallotSnapshot.objects.filter(
+                    offices_held_for_location_id=0,
+                    google_civic_election_id__in=google_civic_election_id_list,
+                    polling_location_we_vote_id__in=polling_location_queryset))
+
+            if office_held_we_vote_id_list is None:
+                office_held_we_vote_id_list = ContestOffice.objects\
+                    .filter(we_vote_id__in=contest_office_we_vote_id_list)\
+                    .values_list('office_held_we_vote_id', flat=True)
+            office_held_we_vote_id_list = list(set(
+                one_we_vote_id for one_we_vote_id in office_held_we_vote_id_list
+                if positive_value_exists(one_we_vote_id)))
+            if positive_value_exists(len(office_held_we_vote_id_list)):
+                # A location can hold an office in any of its 30 office_held_we_vote_id fields
+                offices_held_filter = Q()
+                for office_held_index in range(1, 31):
+                    we_vote_id_key = "office_held_we_vote_id_{index:02}__in".format(index=office_held_index)
+                    offices_held_filter |= Q(**{we_vote_id_key: office_held_we_vote_id_list})
+                offices_held_for_location_queryset = OfficesHeldForLocation.objects\
+                    .filter(offices_held_filter)\
+                    .values('id')
+                number_marked_stale += mark_ballot_snapshot_queryset_stale(BallotSnapshot.objects.filter(
+                    offices_held_for_location_id__in=offices_held_for_location_queryset))
+            status += "BALLOT_SNAPSHOTS_MARKED_STALE: " + str(number_marked_stale) + " "
+        except Exception as e:
+            status += "MARK_BALLOT_SNAPSHOTS_STALE_FOR_CONTEST_OFFICES_FAILED: " + str(e) + " "
+            logger.error(status)
+            success = False
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'number_marked_stale':  number_marked_stale,
+        }
+        return results
+
+
+    @staticmethod
+    def mark_ballot_snapshots_stale_for_candidates(candidate_we_vote_id_list=[]):
+        """
+        Mark stale the snapshots which show one of these candidates. For queryset update() and bulk_update() calls
+        on CandidateCampaign, which skip the post_save signal below.
+        :param candidate_we_vote_id_list:
+        :return:
+        """
+        candidate_we_vote_id_list = list(set(
+            one_we_vote_id for one_we_vote_id in candidate_we_vote_id_list if positive_value_exists(one_we_vote_id)))
+        if not positive_value_exists(len(candidate_we_vote_id_list)):
+            results = {
+                'success':              True,
+                'status':               "MARK_BALLOT_SNAPSHOTS_STALE_NO_CANDIDATES ",
+                'number_marked_stale':  0,
+            }
+            return results
+
+        try:
+            link_value_list = list(CandidateToOfficeLink.objects
+                                   .filter(candidate_we_vote_id__in=candidate_we_vote_id_list)
+                                   .values_list('contest_office_we_vote_id', 'google_civic_election_id'))
+        except Exception as e:
+            status = "MARK_BALLOT_SNAPSHOTS_STALE_FOR_CANDIDATES_FAILED: " + str(e) + " "
+            logger.error(status)
+            results = {
+                'success':              False,
+                'status':               status,
+                'number_marked_stale':  0,
+            }
+            return results
+        return BallotSnapshotManager.mark_ballot_snapshots_stale_for_contest_offices(
+            contest_office_we_vote_id_list=[link_value[0] for link_value in link_value_list],
+            google_civic_election_id_list=[link_value[1] for link_value in link_value_list])
+
+    @staticmethod
+    def record_ballot_snapshot_generation_failure(
+            ballot_returned_we_vote_id='',
+            offices_held_for_location_id=0,
+            google_civic_election_id=0,
+            polling_location_we_vote_id=''):
+        """
+        Keep a stale snapshot for a ballot which failed to generate, so GENERATE_BALLOT_SNAPSHOTS tries it again after
+        a backoff, and gives up after BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES.
+        :param ballot_returned_we_vote_id:
+        :param offices_held_for_location_id:
+        :param google_civic_election_id:
+        :param polling_location_we_vote_id:
+        :return:
+        """
+        status = ""
+        success = True
+        generation_failure_count = 0
+
+        if positive_value_exists(ballot_returned_we_vote_id):
+            lookup = {
+                'ballot_returned_we_vote_id':   ballot_returned_we_vote_id,
+                'google_civic_election_id':     convert_to_int(google_civic_election_id),
+            }
+        else:
+            lookup = {'offices_held_for_location_id': convert_to_int(offices_held_for_location_id)}
+        try:
+            ballot_snapshot, created = BallotSnapshot.objects.get_or_create(
+                defaults={
+                    'google_civic_election_id':     convert_to_int(google_civic_election_id),
+                    'is_stale':                     True,
+                    'polling_location_we_vote_id':  polling_location_we_vote_id,
+                },
+                **lookup)
+            generation_failure_count = ballot_snapshot.generation_failure_count + 1
+            date_generation_retry = now() + timedelta(
+                minutes=BALLOT_SNAPSHOT_GENERATION_RETRY_MINUTES * 2 ** (generation_failure_count - 1))
+            BallotSnapshot.objects.filter(id=ballot_snapshot.id).update(
+                is_stale=True,
+                generation_failure_count=generation_failure_count,
+                date_generation_retry=date_generation_retry)
+            if generation_failure_count >= BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES:
+                status += "BALLOT_SNAPSHOT_GENERATION_GIVEN_UP "
+            else:
+                status += "BALLOT_SNAPSHOT_GENERATION_RETRY_SCHEDULED "
+        except Exception as e:
+            status += "RECORD_BALLOT_SNAPSHOT_GENERATION_FAILURE_FAILED: " + str(e) + " "
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'generation_failure_count': generation_failure_count,
+        }
+        return results
+
+    @staticmethod
+    def retrieve_ballot_snapshots_due_query(read_only=True):
+        """
+        The stale snapshots which GENERATE_BALLOT_SNAPSHOTS should build now: not waiting out a backoff after a
+        failure, and not given up on
+        :param read_only:
+        :return: BallotSnapshot queryset
+        """
+        if read_only:
+            queryset = BallotSnapshot.objects.using('readonly').all()
+        else:
+            queryset = BallotSnapshot.objects.all()
+        return queryset\
+            .filter(is_stale=True, generation_failure_count__lt=BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES)\
+            .filter(Q(date_generation_retry__isnull=True) | Q(date_generation_retry__lte=now()))
+
+
 def find_best_previously_stored_ballot_returned(
         voter_id,
         text_for_map_search,
@@ -4642,3 +5072,59 @@ def retrieve_address_fields_from_geocoder(text_for_map_search):
         'zip_long':     zip_long,
     }
     return results
+
+
+# BallotSnapshot invalidation
+@receiver(post_save, sender=BallotItem)
+@receiver(post_delete, sender=BallotItem)
+def ballot_item_changed_mark_ballot_snapshots_stale(sender, instance, **kwargs):
+    if positive_value_exists(instance.polling_location_we_vote_id):
+        # A change to one map point's ballot only affects the snapshots built from that map point
+        BallotSnapshotManager.mark_ballot_snapshots_stale(
+            google_civic_election_id_list=[instance.google_civic_election_id],
+            polling_location_we_vote_id=instance.polling_location_we_vote_id)
+
+
+@receiver(post_save, sender=CandidateCampaign)
+@receiver(post_delete, sender=CandidateCampaign)
+def candidate_changed_mark_ballot_snapshots_stale(sender, instance, **kwargs):
+    # Only the snapshots with one of the candidate's offices show this candidate
+    BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(candidate_we_vote_id_list=[instance.we_vote_id])
+
+
+@receiver(post_save, sender=CandidateToOfficeLink)
+@receiver(post_delete, sender=CandidateToOfficeLink)
+def candidate_to_office_link_changed_mark_ballot_snapshots_stale(sender, instance, **kwargs):
+    BallotSnapshotManager.mark_ballot_snapshots_stale_for_contest_offices(
+        contest_office_we_vote_id_list=[instance.contest_office_we_vote_id],
+        google_civic_election_id_list=[instance.google_civic_election_id])
+
+
+@receiver(post_save, sender=ContestMeasure)
+@receiver(post_delete, sender=ContestMeasure)
+def contest_measure_changed_mark_ballot_snapshots_stale(sender, instance, **kwargs):
+    BallotSnapshotManager.mark_ballot_snapshots_stale(
+        google_civic_election_id_list=[instance.google_civic_election_id])
+
+
+@receiver(post_save, sender=ContestOffice)
+@receiver(post_delete, sender=ContestOffice)
+def contest_office_changed_mark_ballot_snapshots_stale(sender, instance, **kwargs):
+    # After a delete the office is no longer there to look up its office_held_we_vote_id
+    BallotSnapshotManager.mark_ballot_snapshots_stale_for_contest_offices(
+        contest_office_we_vote_id_list=[instance.we_vote_id],
+        google_civic_election_id_list=[instance.google_civic_election_id],
+        office_held_we_vote_id_list=[instance.office_held_we_vote_id])
+
+
+@receiver(post_save, sender=OfficesHeldForLocation)
+def offices_held_for_location_saved_mark_ballot_snapshot_stale(sender, instance, **kwargs):
+    BallotSnapshotManager.mark_ballot_snapshots_stale(offices_held_for_location_id=instance.id)
+
+
+@receiver(post_delete, sender=OfficesHeldForLocation)
+def offices_held_for_location_deleted_delete_ballot_snapshot(sender, instance, **kwargs):
+    try:
+        BallotSnapshot.objects.filter(offices_held_for_location_id=instance.id).delete()
+    except Exception as e:
+        logger.error("OFFICES_HELD_FOR_LOCATION_DELETED_DELETE_BALLOT_SNAPSHOT_FAILED: " + str(e))
@@ -1,9 +1,21 @@
 from unittest import mock
 from collections import namedtuple
+from datetime import timedelta
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.utils.timezone import now
 
-from ballot.models import BallotReturned, BallotReturnedManager
+from ballot.controllers import generate_ballot_item_list_from_object_list, \
+    voter_ballot_items_retrieve_for_one_election_for_api
+import ballot.controllers_ballot_snapshot
+import ballot.models
+from ballot.controllers_ballot_snapshot import generate_ballot_snapshots_for_election
+from ballot.models import BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES, BallotItem, BallotItemManager, \
+    BallotReturned, BallotReturnedManager, BallotSnapshot, BallotSnapshotManager
+from candidate.models import CandidateCampaign, CandidateListManager, CandidateToOfficeLink
+from election.models import Election
+from office.models import ContestOffice
+from office_held.models import OfficesHeldForLocation
 
 
 Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
@@ -100,3 +112,253 @@ class BallotTestCase(TestCase):
             self.assertFalse(result['geocoder_quota_exceeded'])
             self.assertTrue(result['ballot_returned_found'])
             self.assertEqual(result['ballot_returned'], ballot_in_jackson)
+
+
+class BallotItemListGenerationTestCase(TransactionTestCase):
+    # Ballot items are read with read_only=True, so the rows need to be committed to be visible to 'readonly'
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.google_civic_election_id = 4185
+        Election.objects.create(
+            google_civic_election_id=str(self.google_civic_election_id),
+            election_name='Test Election',
+            election_day_text='2026-11-03',
+            state_code='MS')
+
+    def create_ballot(self, number_of_offices, candidates_per_office, prefix='test', polling_location_we_vote_id=None):
+        ballot_item_list = []
+        for office_index in range(number_of_offices):
+            office_we_vote_id = 'wv{prefix}off{office_number}'.format(prefix=prefix, office_number=office_index)
+            contest_office = ContestOffice.objects.create(
+                we_vote_id=office_we_vote_id,
+                office_name='Office {office_number}'.format(office_number=office_index),
+                google_civic_election_id=str(self.google_civic_election_id),
+                state_code='MS')
+            for candidate_index in range(candidates_per_office):
+                candidate_we_vote_id = 'wv{prefix}cand{office_number}x{candidate_number}'.format(
+                    prefix=prefix, office_number=office_index, candidate_number=candidate_index)
+                CandidateCampaign.objects.create(
+                    we_vote_id=candidate_we_vote_id,
+                    candidate_name='Candidate {office_number} {candidate_number}'.format(
+                        office_number=office_index, candidate_number=candidate_index),
+                    google_civic_election_id=str(self.google_civic_election_id),
+                    state_code='MS',
+                    twitter_followers_count=candidate_index)
+                CandidateToOfficeLink.objects.create(
+                    candidate_we_vote_id=candidate_we_vote_id,
+                    contest_office_we_vote_id=office_we_vote_id,
+                    google_civic_election_id=self.google_civic_election_id,
+                    state_code='MS')
+            ballot_item_list.append(BallotItem.objects.create(
+                google_civic_election_id=str(self.google_civic_election_id),
+                ballot_item_display_name=contest_office.office_name,
+                contest_office_id=str(contest_office.id),
+                contest_office_we_vote_id=office_we_vote_id,
+                local_ballot_order=office_index,
+                polling_location_we_vote_id=polling_location_we_vote_id,
+                state_code='MS'))
+        return ballot_item_list
+
+    def test_ballot_item_list_query_count_does_not_grow_with_ballot(self):
+        ballot_item_list = self.create_ballot(number_of_offices=3, candidates_per_office=2)
+        with self.assertNumQueries(5, using='readonly'):
+            results = generate_ballot_item_list_from_object_list(
+                ballot_item_object_list=ballot_item_list,
+                google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(len(results['ballot_item_list']), 3)
+
+        ballot_item_list = self.create_ballot(number_of_offices=30, candidates_per_office=4, prefix='big')
+        with self.assertNumQueries(5, using='readonly'):
+            results = generate_ballot_item_list_from_object_list(
+                ballot_item_object_list=ballot_item_list,
+                google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(len(results['ballot_item_list']), 30)
+
+    def test_ballot_item_list_json(self):
+        ballot_item_list = self.create_ballot(number_of_offices=2, candidates_per_office=3)
+        results = generate_ballot_item_list_from_object_list(
+            ballot_item_object_list=ballot_item_list,
+            google_civic_election_id=self.google_civic_election_id)
+        first_office = results['ballot_item_list'][0]
+        self.assertEqual(first_office['we_vote_id'], 'wvtestoff0')
+        self.assertEqual(first_office['ballot_item_display_name'], 'Office 0')
+        # Candidates are ordered by twitter_followers_count, most followers first
+        self.assertEqual([candidate['we_vote_id'] for candidate in first_office['candidate_list']],
+                         ['wvtestcand0x2', 'wvtestcand0x1', 'wvtestcand0x0'])
+        one_candidate = first_office['candidate_list'][0]
+        self.assertEqual(one_candidate['contest_office_name'], 'Office 0')
+        self.assertEqual(one_candidate['contest_office_list'], [{
+            'contest_office_name':          'Office 0',
+            'contest_office_we_vote_id':    'wvtestoff0',
+            'district_name':                None,
+            'election_day_text':            '2026-11-03',
+            'google_civic_election_id':     self.google_civic_election_id,
+            'state_code':                   'MS',
+        }])
+
+    def test_ballot_snapshot_is_served_and_invalidated(self):
+        self.create_ballot(number_of_offices=2, candidates_per_office=2, polling_location_we_vote_id='wvtestploc1')
+        BallotReturned.objects.create(
+            we_vote_id='wvtestballot1',
+            google_civic_election_id=self.google_civic_election_id,
+            polling_location_we_vote_id='wvtestploc1',
+            state_code='MS')
+        live_results = voter_ballot_items_retrieve_for_one_election_for_api(
+            'device1', google_civic_election_id=self.google_civic_election_id,
+            ballot_returned_we_vote_id='wvtestballot1')
+        self.assertIn('BALLOT_SNAPSHOT_NOT_FOUND', live_results['status'])
+
+        results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(results['ballot_snapshots_generated_count'], 1)
+
+        with self.assertNumQueries(1, using='readonly'):
+            snapshot_results = voter_ballot_items_retrieve_for_one_election_for_api(
+                'device2', google_civic_election_id=self.google_civic_election_id,
+                ballot_returned_we_vote_id='wvtestballot1')
+        self.assertIn('BALLOT_SNAPSHOT_FOUND', snapshot_results['status'])
+        self.assertEqual(snapshot_results['voter_device_id'], 'device2')
+        self.assertEqual(snapshot_results['ballot_item_list'], live_results['ballot_item_list'])
+
+        # Any change to an office in this election has to take the snapshot out of service
+        ContestOffice.objects.filter(we_vote_id='wvtestoff0').first().save()
+        self.assertTrue(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1').is_stale)
+        results = voter_ballot_items_retrieve_for_one_election_for_api(
+            'device3', google_civic_election_id=self.google_civic_election_id,
+            ballot_returned_we_vote_id='wvtestballot1')
+        self.assertIn('BALLOT_SNAPSHOT_NOT_FOUND', results['status'])
+
+    def test_candidate_change_only_marks_snapshots_with_that_candidate_stale(self):
+        self.create_ballot(number_of_offices=1, candidates_per_office=1, polling_location_we_vote_id='wvtestploc1')
+        self.create_ballot(
+            number_of_offices=1, candidates_per_office=1, prefix='other', polling_location_we_vote_id='wvtestploc2')
+        for ballot_index in (1, 2):
+            BallotReturned.objects.create(
+                we_vote_id='wvtestballot{index}'.format(index=ballot_index),
+                google_civic_election_id=self.google_civic_election_id,
+                polling_location_we_vote_id='wvtestploc{index}'.format(index=ballot_index),
+                state_code='MS')
+        ContestOffice.objects.filter(we_vote_id='wvtestoff0').update(office_held_we_vote_id='wvtestofficeheld0')
+        ContestOffice.objects.filter(we_vote_id='wvotheroff0').update(office_held_we_vote_id='wvotherofficeheld0')
+        test_location = OfficesHeldForLocation.objects.create(
+            office_held_we_vote_id_01='wvtestofficeheld0', polling_location_we_vote_id='wvtestploc1', state_code='MS')
+        other_location = OfficesHeldForLocation.objects.create(
+            office_held_we_vote_id_02='wvotherofficeheld0', polling_location_we_vote_id='wvtestploc2', state_code='MS')
+        generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(BallotSnapshot.objects.filter(is_stale=False).count(), 4)
+
+        CandidateCampaign.objects.get(we_vote_id='wvtestcand0x0').save()
+        self.assertEqual(
+            set(BallotSnapshot.objects.filter(is_stale=True)
+                .values_list('ballot_returned_we_vote_id', 'offices_held_for_location_id')),
+            {('wvtestballot1', 0), (None, test_location.id)})
+        self.assertFalse(BallotSnapshot.objects.get(offices_held_for_location_id=other_location.id).is_stale)
+        self.assertFalse(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot2').is_stale)
+
+    def test_offices_held_snapshot_is_one_per_location(self):
+        self.create_ballot(number_of_offices=1, candidates_per_office=1)
+        ContestOffice.objects.filter(we_vote_id='wvtestoff0').update(office_held_we_vote_id='wvtestofficeheld0')
+        offices_held_for_location = OfficesHeldForLocation.objects.create(
+            office_held_we_vote_id_01='wvtestofficeheld0', polling_location_we_vote_id='wvtestploc1', state_code='MS')
+        # A location without any offices in our database still gets a snapshot, so it isn't rebuilt every run
+        empty_location = OfficesHeldForLocation.objects.create(
+            office_held_we_vote_id_01='wvtestofficeheldmissing', state_code='CA')
+        results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(results['ballot_snapshots_generated_count'], 2)
+        self.assertEqual(
+            BallotSnapshot.objects.get(offices_held_for_location_id=empty_location.id).ballot_item_list_serialized,
+            '[]')
+        results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(results['ballot_snapshots_generated_count'], 0)
+
+        # The office moves to a later election: the same snapshot is rebuilt with the new google_civic_election_id
+        ContestOffice.objects.filter(we_vote_id='wvtestoff0').update(google_civic_election_id='4186')
+        offices_held_for_location.save()
+        results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(results['ballot_snapshots_generated_count'], 1)
+        ballot_snapshot = BallotSnapshot.objects.get(offices_held_for_location_id=offices_held_for_location.id)
+        self.assertEqual(ballot_snapshot.google_civic_election_id, 4186)
+        self.assertFalse(ballot_snapshot.is_stale)
+
+        offices_held_for_location.delete()
+        self.assertFalse(BallotSnapshot.objects.filter(offices_held_for_location_id__gt=0)
+                         .exclude(offices_held_for_location_id=empty_location.id).exists())
+
+    def create_ballot_returned(self):
+        self.create_ballot(number_of_offices=1, candidates_per_office=1, polling_location_we_vote_id='wvtestploc1')
+        BallotReturned.objects.create(
+            we_vote_id='wvtestballot1',
+            google_civic_election_id=self.google_civic_election_id,
+            polling_location_we_vote_id='wvtestploc1',
+            state_code='MS')
+
+    def test_election_is_upcoming_is_worked_out_when_served(self):
+        self.create_ballot_returned()
+        CandidateCampaign.objects.filter(we_vote_id='wvtestcand0x0').update(candidate_ultimate_election_date=20261103)
+        generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+
+        for date_today_as_integer, election_is_upcoming in ((20261102, True), (20261104, False)):
+            with mock.patch.object(ballot.models, 'get_current_date_as_integer', return_value=date_today_as_integer):
+                results = BallotSnapshotManager.retrieve_ballot_snapshot(ballot_returned_we_vote_id='wvtestballot1')
+            self.assertTrue(results['ballot_snapshot_found'])
+            candidate_dict = results['ballot_item_list'][0]['candidate_list'][0]
+            self.assertEqual(candidate_dict['election_is_upcoming'], election_is_upcoming)
+
+    def test_bulk_updates_mark_snapshots_stale(self):
+        self.create_ballot_returned()
+        CandidateCampaign.objects.filter(we_vote_id='wvtestcand0x0').update(politician_we_vote_id='wvtestpol1')
+        generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertFalse(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1').is_stale)
+
+        CandidateListManager.update_politician_we_vote_id_in_all_candidates(
+            politician_we_vote_id='wvtestpol1', new_politician_id=2, new_politician_we_vote_id='wvtestpol2')
+        self.assertTrue(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1').is_stale)
+
+        generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertFalse(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1').is_stale)
+        ContestOffice.objects.filter(we_vote_id='wvtestoff0').update(office_name='Renamed Office')
+        BallotItemManager.refresh_all_ballot_item_office_entries(ContestOffice.objects.get(we_vote_id='wvtestoff0'))
+        self.assertTrue(BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1').is_stale)
+
+    def test_failed_snapshot_is_retried_with_backoff(self):
+        self.create_ballot_returned()
+        failed_results = {
+            'success':                  False,
+            'status':                   'BALLOT_SNAPSHOT_BALLOT_ITEMS_NOT_RETRIEVED ',
+            'ballot_snapshot_saved':    False,
+        }
+        with mock.patch.object(ballot.controllers_ballot_snapshot, 'generate_ballot_snapshot_for_ballot_returned',
+                               return_value=failed_results) as generate_ballot_snapshot:
+            results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+            self.assertIn('BALLOT_SNAPSHOT_GENERATION_RETRY_SCHEDULED', results['status'])
+            ballot_snapshot = BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1')
+            self.assertTrue(ballot_snapshot.is_stale)
+            self.assertEqual(ballot_snapshot.generation_failure_count, 1)
+            self.assertGreater(ballot_snapshot.date_generation_retry, now())
+
+            # Not tried again until the backoff is over
+            generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+            self.assertEqual(generate_ballot_snapshot.call_count, 1)
+            BallotSnapshot.objects.update(date_generation_retry=now() - timedelta(minutes=1))
+            generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+            self.assertEqual(generate_ballot_snapshot.call_count, 2)
+            ballot_snapshot = BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1')
+            self.assertEqual(ballot_snapshot.generation_failure_count, 2)
+            self.assertGreater(ballot_snapshot.date_generation_retry, now() + timedelta(minutes=29))
+
+            # Given up on, until the ballot changes
+            BallotSnapshot.objects.update(
+                generation_failure_count=BALLOT_SNAPSHOT_GENERATION_MAXIMUM_FAILURES,
+                date_generation_retry=now() - timedelta(minutes=1))
+            generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+            self.assertEqual(generate_ballot_snapshot.call_count, 2)
+            self.assertFalse(BallotSnapshotManager.retrieve_ballot_snapshot(
+                ballot_returned_we_vote_id='wvtestballot1')['ballot_snapshot_found'])
+
+        ContestOffice.objects.get(we_vote_id='wvtestoff0').save()
+        results = generate_ballot_snapshots_for_election(google_civic_election_id=self.google_civic_election_id)
+        self.assertEqual(results['ballot_snapshots_generated_count'], 1)
+        ballot_snapshot = BallotSnapshot.objects.get(ballot_returned_we_vote_id='wvtestballot1')
+        self.assertFalse(ballot_snapshot.is_stale)
+        self.assertEqual(ballot_snapshot.generation_failure_count, 0)
+        self.assertIsNone(ballot_snapshot.date_generation_retry)
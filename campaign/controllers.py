@@ -15,6 +15,7 @@ from io import BytesIO
 from PIL import Image, ImageOps
 import re
 from activity.controllers import update_or_create_activity_notice_seed_for_campaignx_supporter_initial_response
+from ballot.models import BallotSnapshotManager
 from candidate.models import CandidateCampaign
 from follow.models import FOLLOW_DISLIKE, FOLLOWING, FollowOrganization, FollowOrganizationManager
 from position.models import OPPOSE, SUPPORT
@@ -1275,6 +1276,9 @@ def refresh_campaignx_supporters_count_in_all_children(request=None, campaignx_w
         if len(candidate_bulk_update_list) > 0:
             try:
                 CandidateCampaign.objects.bulk_update(candidate_bulk_update_list, ['supporters_count'])
+                # bulk_update() doesn't send post_save, and supporters_count is shown on the ballot
+                BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                    candidate_we_vote_id_list=[candidate.we_vote_id for candidate in candidate_bulk_update_list])
                 update_message += \
                     "{candidate_bulk_updates_made:,} Candidate entries updated with fresh supporters_count, " \
                     "".format(candidate_bulk_updates_made=candidate_bulk_updates_made)
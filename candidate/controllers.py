@@ -10,7 +10,7 @@ from django.http import HttpResponse
 from django.utils.timezone import now
 import wevote_functions.admin
 from apis_v1.views.views_extension import process_pdf_to_html
-from ballot.models import CANDIDATE
+from ballot.models import BallotSnapshotManager, CANDIDATE
 from config.base import get_environment_variable
 from election.models import ElectionManager
 from exception.models import handle_exception
@@ -1050,6 +1050,18 @@ def move_candidates_to_another_politician(
             status += "FAILED_MOVE_CANDIDATES_BY_POLITICIAN_ID: " + str(e) + " "
             success = False
 
+    if positive_value_exists(candidate_entries_moved) and positive_value_exists(to_politician_we_vote_id):
+        # update() doesn't send post_save, and the politician is shown on the ballot
+        try:
+            candidate_we_vote_id_list = list(CandidateCampaign.objects
+                                             .filter(politician_we_vote_id=to_politician_we_vote_id)
+                                             .values_list('we_vote_id', flat=True))
+            results = BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                candidate_we_vote_id_list=candidate_we_vote_id_list)
+            status += results['status']
+        except Exception as e:
+            status += "FAILED_MOVE_CANDIDATES_MARK_BALLOT_SNAPSHOTS_STALE: " + str(e) + " "
+
     results = {
         'status':                   status,
         'success':                  success,
@@ -1814,6 +1826,102 @@ def generate_candidate_dict_list_from_candidate_object_list(
     return results
 
 
+def retrieve_candidate_data_for_office_list(office_we_vote_id_list=[], read_only=True):
+    """
+    Load everything generate_candidate_dict_from_candidate_object needs for all the candidates running for
+    a list of offices (i.e., one ballot) with a fixed number of queries, no matter how many offices are on the ballot.
+    :param office_we_vote_id_list:
+    :param read_only:
+    :return:
+    """
+    candidate_list_by_office = {}
+    candidate_to_office_link_list = []
+    election_dict = {}
+    office_dict = {}
+    status = ""
+    success = True
+
+    office_list_manager = ContestOfficeListManager()
+    if len(office_we_vote_id_list) > 0:
+        results = office_list_manager.retrieve_offices(
+            retrieve_from_this_office_we_vote_id_list=office_we_vote_id_list,
+            return_list_of_objects=True,
+            read_only=read_only)
+        if results['office_list_found']:
+            for one_office in results['office_list_objects']:
+                office_dict[one_office.we_vote_id] = one_office
+
+    candidate_list_manager = CandidateListManager()
+    results = candidate_list_manager.retrieve_all_candidates_for_office_list(
+        office_we_vote_id_list=office_we_vote_id_list,
+        read_only=read_only)
+    if not results['success']:
+        status += results['status']
+        success = False
+    candidate_list = results['candidate_list']
+    candidate_by_we_vote_id = {}
+    for one_candidate in candidate_list:
+        candidate_by_we_vote_id[one_candidate.we_vote_id] = one_candidate
+    # Keep the '-twitter_followers_count' order within each office
+    candidate_order = {}
+    for index, one_candidate in enumerate(candidate_list):
+        candidate_order[one_candidate.we_vote_id] = index
+    for office_we_vote_id, candidate_we_vote_id_list in results['candidate_we_vote_id_list_by_office'].items():
+        candidate_we_vote_id_list = [one_we_vote_id for one_we_vote_id in set(candidate_we_vote_id_list)
+                                     if one_we_vote_id in candidate_by_we_vote_id]
+        candidate_we_vote_id_list.sort(key=lambda one_we_vote_id: candidate_order[one_we_vote_id])
+        candidate_list_by_office[office_we_vote_id] = \
+            [candidate_by_we_vote_id[one_we_vote_id] for one_we_vote_id in candidate_we_vote_id_list]
+
+    if len(candidate_by_we_vote_id) > 0:
+        # All offices each candidate is running for, so we can fill in 'contest_office_list'
+        list_results = candidate_list_manager.retrieve_candidate_to_office_link_list(
+            candidate_we_vote_id_list=list(candidate_by_we_vote_id.keys()),
+            read_only=read_only)
+        candidate_to_office_link_list = list_results['candidate_to_office_link_list']
+        other_office_we_vote_id_list = []
+        election_id_list = []
+        for candidate_to_office_link in candidate_to_office_link_list:
+            if positive_value_exists(candidate_to_office_link.contest_office_we_vote_id) and \
+                    candidate_to_office_link.contest_office_we_vote_id not in office_dict and \
+                    candidate_to_office_link.contest_office_we_vote_id not in other_office_we_vote_id_list:
+                other_office_we_vote_id_list.append(candidate_to_office_link.contest_office_we_vote_id)
+            election_id_integer = convert_to_int(candidate_to_office_link.google_civic_election_id)
+            if positive_value_exists(election_id_integer) and election_id_integer not in election_id_list:
+                election_id_list.append(election_id_integer)
+        if len(other_office_we_vote_id_list) > 0:
+            results = office_list_manager.retrieve_offices(
+                retrieve_from_this_office_we_vote_id_list=other_office_we_vote_id_list,
+                return_list_of_objects=True,
+                read_only=read_only)
+            if results['office_list_found']:
+                for one_office in results['office_list_objects']:
+                    office_dict[one_office.we_vote_id] = one_office
+        if len(election_id_list) > 0:
+            election_manager = ElectionManager()
+            election_results = election_manager.retrieve_elections_by_google_civic_election_id_list(
+                google_civic_election_id_list=election_id_list,
+                read_only=read_only)
+            for one_election in election_results['election_list']:
+                election_dict[convert_to_int(one_election.google_civic_election_id)] = one_election
+
+    # Offices we couldn't find are stored as None, so generate_candidate_dict_from_candidate_object
+    #  doesn't go back to the database for each of them
+    for one_office_we_vote_id in office_we_vote_id_list:
+        if one_office_we_vote_id not in office_dict:
+            office_dict[one_office_we_vote_id] = None
+
+    results = {
+        'candidate_list_by_office':         candidate_list_by_office,
+        'candidate_to_office_link_list':    candidate_to_office_link_list,
+        'election_dict':                    election_dict,
+        'office_dict':                      office_dict,
+        'status':                           status,
+        'success':                          success,
+    }
+    return results
+
+
 def generate_candidate_dict_from_candidate_object(
         candidate=None,
         candidate_to_office_link_list_from_multiple_candidates=[],
@@ -322,6 +322,86 @@ class CandidateListManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def retrieve_all_candidates_for_office_list(office_we_vote_id_list=[], read_only=False):
+        """
+        Bulk version of retrieve_all_candidates_for_office: two queries for any number of offices.
+        :param office_we_vote_id_list:
+        :param read_only:
+        :return: candidate_list ordered by -twitter_followers_count, and candidate_we_vote_id_list_by_office,
+          a dict of office_we_vote_id -> candidate_we_vote_id list
+        """
+        candidate_list = []
+        candidate_list_found = False
+        candidate_we_vote_id_list_by_office = {}
+        status = ""
+        success = True
+
+        if not positive_value_exists(len(office_we_vote_id_list)):
+            status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-OFFICE_WE_VOTE_ID_LIST_MISSING '
+            results = {
+                'success':                              False,
+                'status':                               status,
+                'candidate_list_found':                 candidate_list_found,
+                'candidate_list':                       candidate_list,
+                'candidate_we_vote_id_list_by_office':  candidate_we_vote_id_list_by_office,
+            }
+            return results
+
+        candidate_list_manager = CandidateListManager()
+        link_results = candidate_list_manager.retrieve_candidate_to_office_link_list(
+            contest_office_we_vote_id_list=office_we_vote_id_list,
+            read_only=read_only)
+        if not positive_value_exists(link_results['success']):
+            status += link_results['status']
+            results = {
+                'success':                              False,
+                'status':                               status,
+                'candidate_list_found':                 candidate_list_found,
+                'candidate_list':                       candidate_list,
+                'candidate_we_vote_id_list_by_office':  candidate_we_vote_id_list_by_office,
+            }
+            return results
+        candidate_we_vote_id_list = []
+        for one_link in link_results['candidate_to_office_link_list']:
+            if not positive_value_exists(one_link.candidate_we_vote_id):
+                continue
+            if one_link.contest_office_we_vote_id not in candidate_we_vote_id_list_by_office:
+                candidate_we_vote_id_list_by_office[one_link.contest_office_we_vote_id] = []
+            candidate_we_vote_id_list_by_office[one_link.contest_office_we_vote_id].append(
+                one_link.candidate_we_vote_id)
+            candidate_we_vote_id_list.append(one_link.candidate_we_vote_id)
+
+        if len(candidate_we_vote_id_list):
+            try:
+                if read_only:
+                    candidate_query = CandidateCampaign.objects.using('readonly').all()
+                else:
+                    candidate_query = CandidateCampaign.objects.all()
+                candidate_query = candidate_query.filter(we_vote_id__in=list(set(candidate_we_vote_id_list)))
+                candidate_query = candidate_query.exclude(do_not_display_on_ballot=True)
+                candidate_query = candidate_query.order_by('-twitter_followers_count')
+                candidate_list = list(candidate_query)
+            except Exception as e:
+                handle_exception(e, logger=logger)
+                status += 'FAILED retrieve_all_candidates_for_office_list ' + str(e) + ' '
+                success = False
+
+        if len(candidate_list):
+            candidate_list_found = True
+            status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-CANDIDATES_RETRIEVED '
+        else:
+            status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-NO_CANDIDATES_RETRIEVED '
+
+        results = {
+            'success':                              success,
+            'status':                               status,
+            'candidate_list_found':                 candidate_list_found,
+            'candidate_list':                       candidate_list,
+            'candidate_we_vote_id_list_by_office':  candidate_we_vote_id_list_by_office,
+        }
+        return results
+
     @staticmethod
     def retrieve_candidate_list(
             candidate_id_list=None,
@@ -2484,31 +2564,45 @@ class CandidateListManager(models.Manager):
         success = True
         status = ''
         number_changed = 0
+        # update() doesn't send post_save, so we mark the ballot snapshots showing these candidates stale ourselves
+        changed_candidate_we_vote_id_list = []
 
         if positive_value_exists(candidate_we_vote_id):
-            number_changed += CandidateCampaign.objects.all().filter(
+            queryset = CandidateCampaign.objects.all().filter(
                 candidate_campaign_we_vote_id=candidate_we_vote_id,
-            ).update(
+            )
+            changed_candidate_we_vote_id_list += list(queryset.values_list('we_vote_id', flat=True))
+            number_changed += queryset.update(
                 politician_id=new_politician_id,
                 politician_we_vote_id=new_politician_we_vote_id,
             )
 
         if positive_value_exists(politician_id):
-            number_changed += CandidateCampaign.objects.all().filter(
+            queryset = CandidateCampaign.objects.all().filter(
                 politician_id=politician_id,
-            ).update(
+            )
+            changed_candidate_we_vote_id_list += list(queryset.values_list('we_vote_id', flat=True))
+            number_changed += queryset.update(
                 politician_id=new_politician_id,
                 politician_we_vote_id=new_politician_we_vote_id,
             )
 
         if positive_value_exists(politician_we_vote_id):
-            number_changed += CandidateCampaign.objects.all().filter(
+            queryset = CandidateCampaign.objects.all().filter(
                 politician_we_vote_id=politician_we_vote_id,
-            ).update(
+            )
+            changed_candidate_we_vote_id_list += list(queryset.values_list('we_vote_id', flat=True))
+            number_changed += queryset.update(
                 politician_id=new_politician_id,
                 politician_we_vote_id=new_politician_we_vote_id,
             )
 
+        if positive_value_exists(number_changed):
+            from ballot.models import BallotSnapshotManager
+            results = BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                candidate_we_vote_id_list=changed_candidate_we_vote_id_list)
+            status += results['status']
+
         results = {
             'success':          success,
             'status':           status,
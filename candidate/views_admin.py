@@ -24,7 +24,7 @@ from django.utils.timezone import localtime, now
 import wevote_functions.admin
 from import_export_wikipedia.controllers import retrieve_images_from_wikipedia
 from admin_tools.views import redirect_to_sign_in_page
-from ballot.models import BallotReturnedListManager
+from ballot.models import BallotReturnedListManager, BallotSnapshotManager
 from bookmark.models import BookmarkItemList
 from config.base import get_environment_variable
 from election.controllers import retrieve_election_id_list_by_year_list, retrieve_upcoming_election_id_list
@@ -547,6 +547,9 @@ def candidate_list_view(request):
                     candidate_bulk_update_list,
                     ['candidate_ultimate_election_date',
                      'candidate_year'])
+                # bulk_update() doesn't send post_save
+                BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                    candidate_we_vote_id_list=[candidate.we_vote_id for candidate in candidate_bulk_update_list])
             except Exception as e:
                 messages.add_message(request, messages.ERROR, "FAILED_BULK_UPDATE: " + str(e))
 
@@ -701,6 +704,9 @@ def candidate_list_view(request):
             try:
                 CandidateCampaign.objects.bulk_update(
                     candidate_bulk_update_list, ['contest_office_name', 'district_name', 'race_office_level'])
+                # bulk_update() doesn't send post_save
+                BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                    candidate_we_vote_id_list=[candidate.we_vote_id for candidate in candidate_bulk_update_list])
             except Exception as e:
                 messages.add_message(request, messages.ERROR, "FAILED_BULK_UPDATE: " + str(e))
 
@@ -780,6 +786,9 @@ def candidate_list_view(request):
         if updates_needed:
             CandidateCampaign.objects.bulk_update(
                 update_list, ['seo_friendly_path', 'seo_friendly_path_date_last_updated'])
+            # bulk_update() doesn't send post_save
+            BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                candidate_we_vote_id_list=[candidate.we_vote_id for candidate in update_list])
             seo_friendly_path_updates_status += \
                 "{updates_made:,} candidates updated with new seo_friendly_path. " \
                 "{total_to_convert_after:,} remaining." \
@@ -865,6 +874,9 @@ def candidate_list_view(request):
             try:
                 CandidateCampaign.objects.bulk_update(
                     update_list, ['linked_campaignx_we_vote_id', 'linked_campaignx_we_vote_id_date_last_updated'])
+                # bulk_update() doesn't send post_save
+                BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                    candidate_we_vote_id_list=[candidate.we_vote_id for candidate in update_list])
                 campaignx_we_vote_id_updates_status += \
                     "{updates_made:,} candidates updated with new linked_campaignx_we_vote_id. " \
                     "{total_to_convert_after:,} remaining." \
@@ -5655,6 +5667,9 @@ def update_candidates_from_politicians_view(request):  # This is related to goog
     if len(candidate_bulk_update_list) > 0:
         try:
             CandidateCampaign.objects.bulk_update(candidate_bulk_update_list, all_candidate_fields_updated)
+            # bulk_update() doesn't send post_save
+            BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                candidate_we_vote_id_list=[candidate.we_vote_id for candidate in candidate_bulk_update_list])
         except Exception as e:
             messages.add_message(request, messages.ERROR, "FAILED_BULK_UPDATE_OF_CANDIDATES: " + str(e))
 
@@ -5798,6 +5813,9 @@ def update_profile_image_background_color_view_for_candidates(request):
         CandidateCampaign.objects.bulk_update(
             bulk_update_list,
             ['profile_image_background_color', 'profile_image_background_color_needed'])
+        # bulk_update() doesn't send post_save
+        BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+            candidate_we_vote_id_list=[candidate.we_vote_id for candidate in bulk_update_list])
         message += \
             "Candidates updated: {candidates_updated:,}. " \
             "Candidates without picture URL:  {candidates_not_updated:,}. " \
@@ -195,6 +195,12 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = [
+    # Does nothing unless REQUEST_INSTRUMENTATION_ON is true, see "Request instrumentation" below
+    'admin_tools.middleware.RequestInstrumentationMiddleware',
+    # Does nothing unless READ_REPLICA_ROUTING_ON is true, see "Read replica routing" below
+    'config.database_router.ReadReplicaRoutingMiddleware',
+    # Remembers voter_device_id -> voter lookups for the rest of the request, see voter/models.py
+    'voter.middleware.VoterDeviceRequestMemoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     # 'corsheaders.middleware.CorsPostCsrfMiddleware',
@@ -415,6 +421,67 @@ SOCIAL_AUTH_FACEBOOK_EXTRA_DATA = [
     ('link', 'profile_url'),
 ]
 
+# ########## Cache configurations ###########
+# 'default' is process-local. 'shared' is an optional cache shared by all workers (used by api_internal_cache).
+#   SHARED_CACHE_REDIS_URL    e.g. "redis://localhost:6379/1" (requires `pip install redis`)
+#   SHARED_CACHE_FILE_PATH    file-based stand-in for local development, e.g. "/tmp/wevote_shared_cache"
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+SHARED_CACHE_REDIS_URL = get_environment_variable_default("SHARED_CACHE_REDIS_URL", "")
+SHARED_CACHE_FILE_PATH = get_environment_variable_default("SHARED_CACHE_FILE_PATH", "")
+if SHARED_CACHE_REDIS_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE_REDIS_URL,
+    }
+elif SHARED_CACHE_FILE_PATH:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_FILE_PATH,
+    }
+
+# ########## Read replica routing ###########
+# Reads without .using() go to the 'readonly' replica, unless the primary is needed to see a recent write
+#   READ_REPLICA_ROUTING_ON                 true to turn it on. Off by default, which reads everything from the primary
+#   READ_REPLICA_PIN_SECONDS                after a write, how long that voter_device_id (or thread) reads the primary
+#   READ_REPLICA_MAXIMUM_LAG_SECONDS        everything is read from the primary while the replica is further behind
+# Primary/replica query counts per endpoint are shown at /admin/request_instrumentation/
+DATABASE_ROUTERS = ['config.database_router.ReadReplicaRouter']
+READ_REPLICA_ROUTING_ON = \
+    str(get_environment_variable_default("READ_REPLICA_ROUTING_ON", False)).lower() == 'true'
+READ_REPLICA_PIN_SECONDS = float(get_environment_variable_default("READ_REPLICA_PIN_SECONDS", 5))
+READ_REPLICA_MAXIMUM_LAG_SECONDS = float(get_environment_variable_default("READ_REPLICA_MAXIMUM_LAG_SECONDS", 2))
+READ_REPLICA_LAG_CHECK_INTERVAL_SECONDS = 5
+
+# ########## Ballot retrieval from map points ###########
+# retrieve_ballots_for_polling_locations_api_v4_internal_view calls CTCL or Vote USA for several map points at once
+#   BALLOT_RETRIEVAL_FETCHER_COUNT          how many map points are fetched at the same time, 1 to fetch one by one
+#   CTCL_API_REQUESTS_PER_SECOND            most requests per second sent to CTCL by one process, 0 for no limit
+#   VOTE_USA_API_REQUESTS_PER_SECOND        most requests per second sent to Vote USA by one process, 0 for no limit
+BALLOT_RETRIEVAL_FETCHER_COUNT = int(get_environment_variable_default("BALLOT_RETRIEVAL_FETCHER_COUNT", 8))
+CTCL_API_REQUESTS_PER_SECOND = float(get_environment_variable_default("CTCL_API_REQUESTS_PER_SECOND", 10))
+VOTE_USA_API_REQUESTS_PER_SECOND = float(get_environment_variable_default("VOTE_USA_API_REQUESTS_PER_SECOND", 10))
+
+# ########## Request instrumentation ###########
+# Times and counts the SQL queries of API requests, to find slow endpoints and N+1 query patterns.
+#   REQUEST_INSTRUMENTATION_ON                  true to turn on admin_tools.middleware.RequestInstrumentationMiddleware
+#   REQUEST_INSTRUMENTATION_SAMPLE_RATE         share of requests logged with duplicate query details, e.g. 0.01
+#   REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS     requests slower than this are always logged (without the details)
+# Results are logged as "REQUEST_INSTRUMENTATION {json}" lines, and shown at /admin/request_instrumentation/
+REQUEST_INSTRUMENTATION_ON = \
+    str(get_environment_variable_default("REQUEST_INSTRUMENTATION_ON", False)).lower() == 'true'
+REQUEST_INSTRUMENTATION_PATH_PREFIX = \
+    get_environment_variable_default("REQUEST_INSTRUMENTATION_PATH_PREFIX", "/apis/v1/")
+REQUEST_INSTRUMENTATION_SAMPLE_RATE = \
+    float(get_environment_variable_default("REQUEST_INSTRUMENTATION_SAMPLE_RATE", 0.01))
+REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS = \
+    float(get_environment_variable_default("REQUEST_INSTRUMENTATION_SLOW_REQUEST_MS", 1000))
+REQUEST_INSTRUMENTATION_RING_BUFFER_SIZE = \
+    int(get_environment_variable_default("REQUEST_INSTRUMENTATION_RING_BUFFER_SIZE", 200))
+
 EMAIL_BACKEND = get_environment_variable("EMAIL_BACKEND")
 SENDGRID_API_KEY = get_environment_variable("SENDGRID_API_KEY")
 # ADMIN_EMAIL_ADDRESSES = get_environment_variable("ADMIN_EMAIL_ADDRESSES")
@@ -0,0 +1,327 @@
+# config/database_router.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Sends reads to the 'readonly' replica unless the primary is needed to see a recent write"""
+
+from collections import Counter
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import connections
+
+import wevote_functions.admin
+from wevote_functions.functions import get_voter_api_device_id
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+PRIMARY_DATABASE = 'default'
+REPLICA_DATABASE = 'readonly'
+# The most endpoints we keep primary/replica query counts for, so paths with ids in them can't grow this forever
+DATABASE_ROUTING_COUNTS_MAX_PATHS = 500
+DATABASE_ROUTING_COUNTS_OTHER_PATH = '(other)'
+# Sign-in, sessions and permissions are always read from the primary
+PRIMARY_ONLY_APP_LABELS = {'admin', 'auth', 'contenttypes', 'sessions', 'social_django'}
+# Zero when the replica is caught up, or isn't a replica. Otherwise, how long ago the last replayed transaction was
+#  committed on the primary.
+REPLICA_LAG_SQL = \
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 " \
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+
+
+def read_replica_routing_is_on():
+    # Test databases "mirror" the primary over a second connection, which can't see the test's open transaction
+    return getattr(settings, 'READ_REPLICA_ROUTING_ON', False) and 'test' not in sys.argv
+
+
+class DatabaseRoutingState(object):
+    """
+    What the router needs to know about one request (or, outside of requests, one thread)
+    """
+
+    def __init__(self, voter_device_id=''):
+        self.voter_device_id = voter_device_id
+        self.has_written = False
+        # This voter_device_id wrote in an earlier request, recently enough that the replica may not have it yet
+        self.is_pinned_to_primary = False
+        # time.monotonic() until which reads go to the primary. Only used outside of requests.
+        self.primary_until = 0.0
+
+
+# The state of the request being handled, set by ReadReplicaRoutingMiddleware
+database_routing_request_state = ContextVar('database_routing_request_state', default=None)
+# Set by use_primary_database
+primary_database_forced = ContextVar('primary_database_forced', default=False)
+database_routing_thread_local = threading.local()
+
+
+def fetch_database_routing_state():
+    database_routing_state = database_routing_request_state.get()
+    if database_routing_state is None:
+        database_routing_state = getattr(database_routing_thread_local, 'database_routing_state', None)
+        if database_routing_state is None:
+            database_routing_state = DatabaseRoutingState()
+            database_routing_thread_local.database_routing_state = database_routing_state
+    return database_routing_state
+
+
+@contextmanager
+def use_primary_database():
+    """
+    For reads that are about to be written back, or that must see another voter's write right away:
+        with use_primary_database():
+            current_friend_list = list(CurrentFriend.objects.filter(...))
+    """
+    token = primary_database_forced.set(True)
+    try:
+        yield
+    finally:
+        primary_database_forced.reset(token)
+
+
+class VoterDevicePrimaryPins(object):
+    """
+    voter_device_ids that wrote recently, whose reads go to the primary for READ_REPLICA_PIN_SECONDS. Kept in the
+    'shared' cache when there is one, so the pin follows the voter to other workers, and in this process otherwise.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pinned_until_by_voter_device_id = {}
+
+    @staticmethod
+    def shared_cache():
+        try:
+            return caches['shared']
+        except InvalidCacheBackendError:
+            return None
+
+    @staticmethod
+    def cache_key(voter_device_id):
+        return 'database_router_pin:' + str(voter_device_id)
+
+    def pin(self, voter_device_id, pin_seconds):
+        shared_cache = self.shared_cache()
+        if shared_cache is not None:
+            try:
+                shared_cache.set(self.cache_key(voter_device_id), True, pin_seconds)
+                return
+            except Exception as e:
+                logger.error('DATABASE_ROUTER_PIN_SET_ERROR: ' + str(e))
+        with self.lock:
+            self.pinned_until_by_voter_device_id[voter_device_id] = time.monotonic() + pin_seconds
+            if len(self.pinned_until_by_voter_device_id) > 10000:
+                right_now = time.monotonic()
+                self.pinned_until_by_voter_device_id = {
+                    one_voter_device_id: pinned_until
+                    for one_voter_device_id, pinned_until in self.pinned_until_by_voter_device_id.items()
+                    if pinned_until > right_now}
+
+    def is_pinned(self, voter_device_id):
+        shared_cache = self.shared_cache()
+        if shared_cache is not None:
+            try:
+                return bool(shared_cache.get(self.cache_key(voter_device_id)))
+            except Exception as e:
+                logger.error('DATABASE_ROUTER_PIN_GET_ERROR: ' + str(e))
+                # Can't tell, so play it safe
+                return True
+        with self.lock:
+            return self.pinned_until_by_voter_device_id.get(voter_device_id, 0) > time.monotonic()
+
+
+voter_device_primary_pins = VoterDevicePrimaryPins()
+
+
+class ReplicaLagMonitor(object):
+    """
+    Checks the replica's lag at most every READ_REPLICA_LAG_CHECK_INTERVAL_SECONDS per process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lag_seconds = 0.0
+        self.date_checked = None
+
+    def fetch_replica_lag_seconds(self):
+        check_interval_seconds = getattr(settings, 'READ_REPLICA_LAG_CHECK_INTERVAL_SECONDS', 5)
+        with self.lock:
+            if self.date_checked is not None and time.monotonic() - self.date_checked < check_interval_seconds:
+                return self.lag_seconds
+            self.date_checked = time.monotonic()
+            try:
+                connection = connections[REPLICA_DATABASE]
+                if connection.vendor != 'postgresql':
+                    self.lag_seconds = 0.0
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.execute(REPLICA_LAG_SQL)
+                        self.lag_seconds = float(cursor.fetchone()[0] or 0)
+            except Exception as e:
+                logger.error('DATABASE_ROUTER_REPLICA_LAG_CHECK_FAILED: ' + str(e))
+                self.lag_seconds = float('inf')
+            return self.lag_seconds
+
+
+replica_lag_monitor = ReplicaLagMonitor()
+
+
+def is_primary_database_needed():
+    if primary_database_forced.get() or connections[PRIMARY_DATABASE].in_atomic_block:
+        return True
+    database_routing_state = fetch_database_routing_state()
+    return database_routing_state.has_written or database_routing_state.is_pinned_to_primary or \
+        database_routing_state.primary_until > time.monotonic()
+
+
+class ReadReplicaRouter(object):
+    """
+    Reads that don't say .using() go to the replica, except:
+     - once the request has written (or a thread outside of a request, for READ_REPLICA_PIN_SECONDS),
+     - for READ_REPLICA_PIN_SECONDS after another request from the same voter_device_id wrote,
+     - inside a transaction, or inside use_primary_database(),
+     - while the replica is more than READ_REPLICA_MAXIMUM_LAG_SECONDS behind.
+    Explicit .using('readonly') and .using('analytics') are left as they are.
+    """
+
+    @staticmethod
+    def db_for_read(model, **hints):
+        if not read_replica_routing_is_on():
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APP_LABELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            # Related objects come from the database their instance came from, unless that is the replica and this
+            #  request or thread needs the primary
+            if instance._state.db == REPLICA_DATABASE and is_primary_database_needed():
+                return PRIMARY_DATABASE
+            return None
+        if is_primary_database_needed():
+            return PRIMARY_DATABASE
+        database_routing_state = fetch_database_routing_state()
+        if database_routing_state.voter_device_id and \
+                voter_device_primary_pins.is_pinned(database_routing_state.voter_device_id):
+            # Only checked once per request
+            database_routing_state.is_pinned_to_primary = True
+            return PRIMARY_DATABASE
+        if replica_lag_monitor.fetch_replica_lag_seconds() > \
+                getattr(settings, 'READ_REPLICA_MAXIMUM_LAG_SECONDS', 2):
+            return PRIMARY_DATABASE
+        return REPLICA_DATABASE
+
+    @staticmethod
+    def db_for_write(model, **hints):
+        """
+        Writes never go to the replica. Without a router, Django saves an instance to the database it was read from,
+        so a row read from 'readonly' (by this router, or with .using('readonly')) would be saved back to it.
+        Instances from another database ('analytics') are still saved there.
+        """
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, REPLICA_DATABASE):
+            database_alias = instance._state.db
+        else:
+            database_alias = PRIMARY_DATABASE
+        if read_replica_routing_is_on() and database_alias == PRIMARY_DATABASE:
+            database_routing_state = fetch_database_routing_state()
+            if database_routing_request_state.get() is None:
+                database_routing_state.primary_until = \
+                    time.monotonic() + getattr(settings, 'READ_REPLICA_PIN_SECONDS', 5)
+            else:
+                database_routing_state.has_written = True
+        return database_alias
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints):
+        # The replica holds the primary's rows, and what is written with either of them goes to the primary
+        database_set = {PRIMARY_DATABASE, REPLICA_DATABASE}
+        if obj1._state.db in database_set and obj2._state.db in database_set:
+            return True
+        return None
+
+    @staticmethod
+    def allow_migrate(db, app_label, model_name=None, **hints):
+        return None
+
+
+class DatabaseRoutingQueryCounter(object):
+    """
+    A database execute_wrapper counting the queries one request sends to one database
+    """
+
+    def __init__(self, query_counter, database_alias):
+        self.query_counter = query_counter
+        self.database_alias = database_alias
+
+    def __call__(self, execute, sql, params, many, context):
+        self.query_counter[self.database_alias] += 1
+        return execute(sql, params, many, context)
+
+
+# request.path -> Counter of queries per database, for requests served by this process
+database_routing_counts = {}
+database_routing_counts_lock = threading.Lock()
+
+
+def retrieve_database_routing_count_list():
+    """
+    Primary/replica query counts per endpoint for the admin page, most queries first
+    """
+    with database_routing_counts_lock:
+        database_routing_count_list = [
+            {
+                'path':             path,
+                'request_count':    query_counter['requests'],
+                'primary_count':    query_counter[PRIMARY_DATABASE],
+                'replica_count':    query_counter[REPLICA_DATABASE],
+            } for path, query_counter in database_routing_counts.items()]
+    database_routing_count_list.sort(
+        key=lambda one_path: one_path['primary_count'] + one_path['replica_count'], reverse=True)
+    return database_routing_count_list
+
+
+class ReadReplicaRoutingMiddleware(object):
+    """
+    Gives ReadReplicaRouter the request's voter_device_id, pins the voter_device_id to the primary after a request
+    that wrote, and counts each endpoint's queries to the primary and to the replica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not read_replica_routing_is_on():
+            return self.get_response(request)
+
+        database_routing_state = DatabaseRoutingState(voter_device_id=get_voter_api_device_id(request))
+        token = database_routing_request_state.set(database_routing_state)
+        query_counter = Counter()
+        try:
+            with ExitStack() as exit_stack:
+                for database_alias in (PRIMARY_DATABASE, REPLICA_DATABASE):
+                    exit_stack.enter_context(connections[database_alias].execute_wrapper(
+                        DatabaseRoutingQueryCounter(query_counter, database_alias)))
+                response = self.get_response(request)
+        finally:
+            database_routing_request_state.reset(token)
+
+        if database_routing_state.has_written and database_routing_state.voter_device_id:
+            voter_device_primary_pins.pin(
+                database_routing_state.voter_device_id, getattr(settings, 'READ_REPLICA_PIN_SECONDS', 5))
+        self.count_queries(request.path, query_counter)
+        return response
+
+    @staticmethod
+    def count_queries(path, query_counter):
+        query_counter['requests'] = 1
+        with database_routing_counts_lock:
+            if path not in database_routing_counts and \
+                    len(database_routing_counts) >= DATABASE_ROUTING_COUNTS_MAX_PATHS:
+                path = DATABASE_ROUTING_COUNTS_OTHER_PATH
+            database_routing_counts.setdefault(path, Counter()).update(query_counter)
@@ -16,7 +16,8 @@ DEBUG = get_environment_variable('SERVER_IN_DEBUG_MODE')
 
 # Multiple Databases
 # See https://docs.djangoproject.com/en/1.10/topics/db/multi-db/#defining-your-databases
-# August 2017: Not setting DATABASE_ROUTERS at this time, instead going with ".using('readonly')" on individual queries
+# Reads without .using() are sent to 'readonly' by config.database_router.ReadReplicaRouter (see config/base.py).
+#  Explicit .using('readonly') on individual queries still works as before.
 
 DATABASES = {
     'default': {
@@ -0,0 +1,159 @@
+# config/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.db import connections, transaction
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+import config.database_router
+from config.database_router import DatabaseRoutingState, PRIMARY_DATABASE, REPLICA_DATABASE, ReadReplicaRouter, \
+    ReadReplicaRoutingMiddleware, ReplicaLagMonitor, database_routing_thread_local, replica_lag_monitor, \
+    use_primary_database, voter_device_primary_pins
+from googlebot_site_map.models import GooglebotRequest
+
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'database_router_tests'},
+}
+
+
+@mock.patch('config.database_router.read_replica_routing_is_on', return_value=True)
+class ReadReplicaRouterTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        database_routing_thread_local.database_routing_state = DatabaseRoutingState()
+        self.googlebot_request = GooglebotRequest.objects.create(request_url_type='/sitemap_index.xml')
+        database_routing_thread_local.database_routing_state = DatabaseRoutingState()
+        self.addCleanup(setattr, database_routing_thread_local, 'database_routing_state', DatabaseRoutingState())
+
+    def test_write_after_router_read_goes_to_primary(self, _):
+        googlebot_request = GooglebotRequest.objects.get(id=self.googlebot_request.id)
+        self.assertEqual(googlebot_request._state.db, REPLICA_DATABASE)
+
+        googlebot_request.request_url_type = '/map0.xml'
+        with CaptureQueriesContext(connections[PRIMARY_DATABASE]) as primary_queries, \
+                CaptureQueriesContext(connections[REPLICA_DATABASE]) as replica_queries:
+            googlebot_request.save()
+        self.assertTrue(any(query['sql'].startswith('UPDATE') for query in primary_queries.captured_queries))
+        self.assertEqual(len(replica_queries.captured_queries), 0)
+        self.assertEqual(googlebot_request._state.db, PRIMARY_DATABASE)
+
+        # Having written, this thread reads from the primary
+        googlebot_request = GooglebotRequest.objects.get(id=self.googlebot_request.id)
+        self.assertEqual(googlebot_request._state.db, PRIMARY_DATABASE)
+        self.assertEqual(googlebot_request.request_url_type, '/map0.xml')
+
+    def test_db_for_write(self, _):
+        googlebot_request = GooglebotRequest(id=1)
+        googlebot_request._state.db = REPLICA_DATABASE
+        self.assertEqual(ReadReplicaRouter.db_for_write(GooglebotRequest, instance=googlebot_request),
+                         PRIMARY_DATABASE)
+        googlebot_request._state.db = 'analytics'
+        self.assertEqual(ReadReplicaRouter.db_for_write(GooglebotRequest, instance=googlebot_request), 'analytics')
+        self.assertEqual(ReadReplicaRouter.db_for_write(GooglebotRequest), PRIMARY_DATABASE)
+
+    def test_related_read_from_replica_instance_after_write(self, _):
+        googlebot_request = GooglebotRequest(id=1)
+        googlebot_request._state.db = REPLICA_DATABASE
+        self.assertIsNone(ReadReplicaRouter.db_for_read(GooglebotRequest, instance=googlebot_request))
+        ReadReplicaRouter.db_for_write(GooglebotRequest)
+        self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest, instance=googlebot_request),
+                         PRIMARY_DATABASE)
+
+    def test_thread_outside_of_a_request_reads_its_own_writes(self, _):
+        self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), REPLICA_DATABASE)
+        with override_settings(READ_REPLICA_PIN_SECONDS=60):
+            ReadReplicaRouter.db_for_write(GooglebotRequest)
+        self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), PRIMARY_DATABASE)
+
+        # Until READ_REPLICA_PIN_SECONDS are up
+        database_routing_thread_local.database_routing_state.primary_until -= 61
+        self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), REPLICA_DATABASE)
+
+    def test_transactions_and_use_primary_database_read_the_primary(self, _):
+        with transaction.atomic():
+            self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), PRIMARY_DATABASE)
+        with use_primary_database():
+            self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), PRIMARY_DATABASE)
+        self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), REPLICA_DATABASE)
+
+    def test_lagging_replica_falls_back_to_primary(self, _):
+        with mock.patch.object(replica_lag_monitor, 'fetch_replica_lag_seconds', return_value=3.0):
+            with override_settings(READ_REPLICA_MAXIMUM_LAG_SECONDS=2):
+                self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), PRIMARY_DATABASE)
+            with override_settings(READ_REPLICA_MAXIMUM_LAG_SECONDS=5):
+                self.assertEqual(ReadReplicaRouter.db_for_read(GooglebotRequest), REPLICA_DATABASE)
+
+    def test_replica_lag_is_checked_once_per_interval(self, _):
+        lag_monitor = ReplicaLagMonitor()
+        replica_connection = mock.MagicMock(vendor='postgresql')
+        replica_cursor = replica_connection.cursor.return_value.__enter__.return_value
+        replica_cursor.fetchone.return_value = (7.5,)
+        with mock.patch.object(config.database_router, 'connections', {REPLICA_DATABASE: replica_connection}), \
+                override_settings(READ_REPLICA_LAG_CHECK_INTERVAL_SECONDS=60):
+            self.assertEqual(lag_monitor.fetch_replica_lag_seconds(), 7.5)
+            replica_cursor.fetchone.return_value = (0,)
+            self.assertEqual(lag_monitor.fetch_replica_lag_seconds(), 7.5)
+            self.assertEqual(replica_cursor.execute.call_count, 1)
+
+            # When we can't tell how far behind the replica is, it is too far behind
+            lag_monitor.date_checked -= 61
+            replica_cursor.execute.side_effect = Exception("replica unreachable")
+            self.assertEqual(lag_monitor.fetch_replica_lag_seconds(), float('inf'))
+
+
+@mock.patch('config.database_router.read_replica_routing_is_on', return_value=True)
+class ReadYourWritesTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.request_factory = RequestFactory()
+        voter_device_primary_pins.pinned_until_by_voter_device_id.clear()
+        self.addCleanup(voter_device_primary_pins.pinned_until_by_voter_device_id.clear)
+
+    def request_database_list(self, voter_device_id, write=False):
+        """
+        Runs one request through ReadReplicaRoutingMiddleware, returning where its reads went before and after
+        it wrote, if it writes
+        """
+        database_list = []
+
+        def get_response(request):
+            database_list.append(ReadReplicaRouter.db_for_read(GooglebotRequest))
+            if write:
+                ReadReplicaRouter.db_for_write(GooglebotRequest)
+                database_list.append(ReadReplicaRouter.db_for_read(GooglebotRequest))
+            return 'response'
+
+        request = self.request_factory.get('/apis/v1/voterRetrieve/', {'voter_device_id': voter_device_id})
+        self.assertEqual(ReadReplicaRoutingMiddleware(get_response)(request), 'response')
+        return database_list
+
+    def check_voter_device_is_pinned_after_writing(self):
+        self.assertEqual(self.request_database_list('device1', write=True), [REPLICA_DATABASE, PRIMARY_DATABASE])
+        # The next request from the same device reads its write from the primary, other devices from the replica
+        self.assertEqual(self.request_database_list('device1'), [PRIMARY_DATABASE])
+        self.assertEqual(self.request_database_list('device2'), [REPLICA_DATABASE])
+
+    @override_settings(CACHES=LOCAL_CACHES, READ_REPLICA_PIN_SECONDS=60)
+    def test_voter_device_is_pinned_in_this_process(self, _):
+        self.check_voter_device_is_pinned_after_writing()
+        # Until READ_REPLICA_PIN_SECONDS are up
+        voter_device_primary_pins.pinned_until_by_voter_device_id['device1'] -= 61
+        self.assertEqual(self.request_database_list('device1'), [REPLICA_DATABASE])
+
+    @override_settings(CACHES=SHARED_CACHES, READ_REPLICA_PIN_SECONDS=60)
+    def test_voter_device_is_pinned_for_every_process(self, _):
+        self.check_voter_device_is_pinned_after_writing()
+        self.assertEqual(voter_device_primary_pins.pinned_until_by_voter_device_id, {})
+        self.assertTrue(voter_device_primary_pins.shared_cache().get(voter_device_primary_pins.cache_key('device1')))
+
+    @override_settings(CACHES=LOCAL_CACHES, READ_REPLICA_PIN_SECONDS=60)
+    def test_request_that_only_reads_is_not_pinned(self, _):
+        self.assertEqual(self.request_database_list('device1'), [REPLICA_DATABASE])
+        self.assertEqual(self.request_database_list('device1'), [REPLICA_DATABASE])
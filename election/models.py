@@ -2,11 +2,20 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import bisect
+import copy
 from datetime import datetime
+import threading
+import time
+import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
+from api_internal_cache.models import ApiInternalCacheSharedTier
+from config.base import get_environment_variable_default
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_state_from_ocd_division_id, positive_value_exists
 from wevote_functions.functions_date import convert_date_as_integer_to_date, convert_date_to_date_as_integer, \
@@ -24,6 +33,14 @@ TIME_SPAN_LIST = [
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# The election catalog is rebuilt in a process when an Election is saved there, when another process has bumped
+# the version in the shared cache (checked at most every ELECTION_CATALOG_VERSION_CHECK_SECONDS), and in any case
+# after ELECTION_CATALOG_MAX_AGE_SECONDS, which covers servers without a shared cache.
+ELECTION_CATALOG_MAX_AGE_SECONDS = int(get_environment_variable_default('ELECTION_CATALOG_MAX_AGE_SECONDS', 10 * 60))
+ELECTION_CATALOG_VERSION_CHECK_SECONDS = 15
+ELECTION_CATALOG_VERSION_KEY = 'election_catalog_version'
+ELECTION_CATALOG_VERSION_TTL_SECONDS = 60 * 60 * 24 * 30
+
 
 class BallotpediaElection(models.Model):
     ballotpedia_election_id = models.PositiveIntegerField(
@@ -616,7 +633,10 @@ class ElectionManager(models.Manager):
                 success = True
             elif positive_value_exists(google_civic_election_id):
                 if positive_value_exists(read_only):
-                    election = Election.objects.using('readonly').get(google_civic_election_id=google_civic_election_id)
+                    election = fetch_election_catalog().fetch_election(google_civic_election_id)
+                    if election is None:
+                        election = Election.objects.using('readonly').get(
+                            google_civic_election_id=google_civic_election_id)
                 else:
                     election = Election.objects.get(google_civic_election_id=google_civic_election_id)
                 if election.id:
@@ -719,9 +739,19 @@ class ElectionManager(models.Manager):
         we_vote_date_string = convert_date_to_we_vote_date_string(today)
         try:
             if positive_value_exists(read_only):
-                election_list_query = Election.objects.using('readonly').all()
-            else:
-                election_list_query = Election.objects.all()
+                upcoming_election_list = fetch_election_catalog().retrieve_upcoming_elections(
+                    state_code=state_code,
+                    without_state_code=without_state_code,
+                    require_include_in_list_for_voters=require_include_in_list_for_voters,
+                    include_test_election=include_test_election)
+                results = {
+                    'success':          True,
+                    'status':           'ELECTION_CATALOG_QUERY_COMPLETE ',
+                    'election_list':    upcoming_election_list,
+                    'election_list_found': positive_value_exists(len(upcoming_election_list)),
+                }
+                return results
+            election_list_query = Election.objects.all()
             election_list_query = election_list_query.filter(election_day_text__gte=we_vote_date_string)
             election_list_query = election_list_query.exclude(ignore_this_election=True)
             if positive_value_exists(require_include_in_list_for_voters):
@@ -1436,3 +1466,154 @@ def fetch_next_election_for_state(state_code, require_include_in_list_for_voters
         return election
     else:
         return Election()
+
+
+def is_election_catalog_national_election(election):
+    """
+    Mirrors the without_state_code filter in retrieve_upcoming_elections: no state_code, or 'na'
+    """
+    return not positive_value_exists(election.state_code) or election.state_code.lower() == 'na'
+
+
+class ElectionCatalog(object):
+    """
+    Immutable snapshot of the Election table, so election lookups on the API path don't go to the database.
+    Elections handed out are copies, so a caller changing one doesn't change the catalog.
+    """
+
+    def __init__(self, election_list, shared_version=None):
+        election_list = [election for election in election_list if positive_value_exists(election.election_day_text)]
+        election_list.sort(key=lambda election: (election.election_day_text, election.election_name))
+        self.election_list = tuple(election_list)
+        self.election_day_text_list = tuple(election.election_day_text for election in self.election_list)
+        self.election_by_google_civic_election_id = {}
+        for election in election_list:
+            google_civic_election_id = convert_to_int(election.google_civic_election_id)
+            if positive_value_exists(google_civic_election_id):
+                self.election_by_google_civic_election_id[google_civic_election_id] = election
+        # Like state_code__iexact, so state_code 'na' finds the elections stored with 'na'
+        election_list_by_state_code = {}
+        for election in self.election_list:
+            election_list_by_state_code.setdefault((election.state_code or '').lower(), []).append(election)
+        self.election_list_by_state_code = {
+            state_code: tuple(state_election_list)
+            for state_code, state_election_list in election_list_by_state_code.items()}
+        self.national_election_list = tuple(
+            election for election in self.election_list if is_election_catalog_national_election(election))
+        # Each list's election days, for finding where its upcoming elections start with bisect
+        self.election_day_text_list_by_state_code = {
+            state_code: tuple(election.election_day_text for election in state_election_list)
+            for state_code, state_election_list in self.election_list_by_state_code.items()}
+        self.national_election_day_text_list = tuple(
+            election.election_day_text for election in self.national_election_list)
+        self.shared_version = shared_version
+        self.date_built = time.monotonic()
+        self.date_version_checked = self.date_built
+
+    def fetch_election(self, google_civic_election_id):
+        election = self.election_by_google_civic_election_id.get(convert_to_int(google_civic_election_id))
+        return copy.copy(election) if election is not None else None
+
+    def retrieve_upcoming_elections(
+            self,
+            state_code="",
+            without_state_code=False,
+            require_include_in_list_for_voters=False,
+            include_test_election=False):
+        """
+        Same answer as ElectionManager.retrieve_upcoming_elections, in the same order.
+        """
+        if positive_value_exists(without_state_code):
+            election_list = self.national_election_list
+            election_day_text_list = self.national_election_day_text_list
+        elif positive_value_exists(state_code):
+            election_list = self.election_list_by_state_code.get(state_code.lower(), ())
+            election_day_text_list = self.election_day_text_list_by_state_code.get(state_code.lower(), ())
+        else:
+            election_list = self.election_list
+            election_day_text_list = self.election_day_text_list
+        we_vote_date_string = convert_date_to_we_vote_date_string(datetime.now().date())
+        upcoming_election_list = []
+        for election in election_list[bisect.bisect_left(election_day_text_list, we_vote_date_string):]:
+            if election.ignore_this_election:
+                continue
+            if positive_value_exists(require_include_in_list_for_voters) and not election.include_in_list_for_voters:
+                continue
+            if not positive_value_exists(include_test_election) \
+                    and convert_to_int(election.google_civic_election_id) == 2000:
+                continue
+            upcoming_election_list.append(copy.copy(election))
+        return upcoming_election_list
+
+    def fetch_next_national_election_day_text(self):
+        """
+        Election day of the next national election, or of the latest one if none is upcoming, as "YYYY-MM-DD".
+        """
+        upcoming_election_list = self.retrieve_upcoming_elections(without_state_code=True)
+        if len(upcoming_election_list):
+            return upcoming_election_list[0].election_day_text
+        national_election_list = [
+            election for election in self.national_election_list
+            if not election.ignore_this_election and convert_to_int(election.google_civic_election_id) != 2000]
+        if len(national_election_list):
+            return national_election_list[-1].election_day_text
+        return ''
+
+
+election_catalog = None
+election_catalog_lock = threading.Lock()
+election_catalog_shared_tier = ApiInternalCacheSharedTier()
+
+
+def fetch_election_catalog():
+    """
+    The current ElectionCatalog for this process, rebuilt from the database only when it is out of date.
+    :return:
+    """
+    global election_catalog
+    catalog = election_catalog
+    if catalog is not None:
+        time_now = time.monotonic()
+        if time_now - catalog.date_built < ELECTION_CATALOG_MAX_AGE_SECONDS:
+            if time_now - catalog.date_version_checked < ELECTION_CATALOG_VERSION_CHECK_SECONDS:
+                return catalog
+            catalog.date_version_checked = time_now
+            shared_version = election_catalog_shared_tier.get(ELECTION_CATALOG_VERSION_KEY)
+            if shared_version is None or shared_version == catalog.shared_version:
+                return catalog
+
+    with election_catalog_lock:
+        if election_catalog is not None and election_catalog is not catalog:
+            # Another thread rebuilt it while we were waiting
+            return election_catalog
+        shared_version = election_catalog_shared_tier.get(ELECTION_CATALOG_VERSION_KEY)
+        # Read from the primary, so an election just saved is not missed because of replication lag
+        election_catalog = ElectionCatalog(list(Election.objects.all()), shared_version=shared_version)
+        return election_catalog
+
+
+def bump_election_catalog_version():
+    """
+    Drop this process's catalog, and tell the other processes (through the shared cache) to drop theirs.
+    """
+    global election_catalog
+    election_catalog_shared_tier.set(
+        ELECTION_CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=ELECTION_CATALOG_VERSION_TTL_SECONDS)
+    with election_catalog_lock:
+        election_catalog = None
+
+
+def fetch_next_national_election_day_text():
+    try:
+        return fetch_election_catalog().fetch_next_national_election_day_text()
+    except Exception as e:
+        logger.error('FETCH_NEXT_NATIONAL_ELECTION_DAY_TEXT_FAILED: ' + str(e))
+        return ''
+
+
+@receiver(post_save, sender=Election)
+@receiver(post_delete, sender=Election)
+def election_changed_bump_election_catalog_version(sender, instance, **kwargs):
+    # Once now for this thread, and again after commit, so no process keeps a catalog built before the change landed
+    bump_election_catalog_version()
+    transaction.on_commit(bump_election_catalog_version)
@@ -0,0 +1,77 @@
+# election/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import TestCase, override_settings
+
+import election.models
+from election.models import ELECTION_CATALOG_VERSION_CHECK_SECONDS, ELECTION_CATALOG_VERSION_KEY, Election, \
+    election_catalog_shared_tier, fetch_election_catalog
+
+SHARED_CACHES = {
+    'default':  {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared':   {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'election_tests'},
+}
+
+
+def generate_election(google_civic_election_id, state_code, election_day_text='2099-11-03'):
+    return Election(
+        google_civic_election_id=str(google_civic_election_id),
+        election_name='Election ' + str(google_civic_election_id),
+        election_day_text=election_day_text,
+        state_code=state_code)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ElectionCatalogTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        election.models.election_catalog = None
+        self.addCleanup(setattr, election.models, 'election_catalog', None)
+        election_catalog_shared_tier.delete(ELECTION_CATALOG_VERSION_KEY)
+        # bulk_create skips the signals, so these don't bump the version
+        Election.objects.bulk_create([
+            generate_election(1000001, 'NA'),
+            generate_election(1000002, ''),
+            generate_election(1000003, 'CA'),
+            generate_election(1000004, 'CA', election_day_text='2000-11-07'),
+        ])
+
+    @staticmethod
+    def retrieve_upcoming_google_civic_election_id_list(**kwargs):
+        return [election.google_civic_election_id
+                for election in fetch_election_catalog().retrieve_upcoming_elections(**kwargs)]
+
+    def test_retrieve_upcoming_elections_by_state_code(self):
+        # Like state_code__iexact='na', which finds the national elections stored with 'na'
+        self.assertEqual(self.retrieve_upcoming_google_civic_election_id_list(state_code='na'), ['1000001'])
+        self.assertEqual(self.retrieve_upcoming_google_civic_election_id_list(state_code='CA'), ['1000003'])
+        self.assertEqual(self.retrieve_upcoming_google_civic_election_id_list(without_state_code=True),
+                         ['1000001', '1000002'])
+        self.assertEqual(self.retrieve_upcoming_google_civic_election_id_list(state_code='NY'), [])
+
+    def test_saving_an_election_rebuilds_the_catalog(self):
+        election_catalog = fetch_election_catalog()
+        self.assertIs(fetch_election_catalog(), election_catalog)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_election(1000005, 'CA').save()
+        self.assertIsNot(fetch_election_catalog(), election_catalog)
+        self.assertEqual(self.retrieve_upcoming_google_civic_election_id_list(state_code='CA'),
+                         ['1000003', '1000005'])
+
+    def test_version_bump_from_another_process_reloads_the_catalog(self):
+        election_catalog = fetch_election_catalog()
+        Election.objects.bulk_create([generate_election(1000005, 'CA')])
+        # Until the version is checked again, and while it hasn't changed, the catalog is kept
+        election_catalog.date_version_checked -= ELECTION_CATALOG_VERSION_CHECK_SECONDS + 1
+        self.assertIs(fetch_election_catalog(), election_catalog)
+        self.assertIsNone(election_catalog.fetch_election(1000005))
+
+        election_catalog_shared_tier.set(ELECTION_CATALOG_VERSION_KEY, 'bumped by another process')
+        self.assertIs(fetch_election_catalog(), election_catalog)
+        election_catalog.date_version_checked -= ELECTION_CATALOG_VERSION_CHECK_SECONDS + 1
+        new_election_catalog = fetch_election_catalog()
+        self.assertIsNot(new_election_catalog, election_catalog)
+        self.assertEqual(new_election_catalog.shared_version, 'bumped by another process')
+        self.assertEqual(new_election_catalog.fetch_election(1000005).election_name, 'Election 1000005')
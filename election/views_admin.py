@@ -7,7 +7,7 @@ from .models import Election
 from admin_tools.views import redirect_to_sign_in_page
 from analytics.models import AnalyticsManager
 from ballot.models import BallotItem, BallotItemListManager, \
-    BallotReturned, BallotReturnedListManager, BallotReturnedManager, \
+    BallotReturned, BallotReturnedListManager, BallotReturnedManager, BallotSnapshotManager, \
     VoterBallotSaved, VoterBallotSavedManager
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager, \
     CandidateToOfficeLink
@@ -2462,6 +2462,17 @@ def election_migration_view(request):
         error = True
         status += 'FAILED_TO_COUNT_HOSTED_OFFICES ' + str(e) + ' '
 
+    # ########################################
+    # Ballot Snapshots - the updates above don't send post_save, so mark the snapshots built from them stale
+    if positive_value_exists(change_now):
+        results = BallotSnapshotManager.mark_ballot_snapshots_stale(
+            google_civic_election_id_list=[from_election_id, to_election_id])
+        status += results['status']
+        results = BallotSnapshotManager.mark_ballot_snapshots_stale_for_contest_offices(
+            contest_office_we_vote_id_list=contest_office_we_vote_ids_migrated,
+            google_civic_election_id_list=[from_election_id, to_election_id])
+        status += results['status']
+
     # ########################################
     # Pledge to Vote
     from_election_pledge_to_vote_count = 0
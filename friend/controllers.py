@@ -2,8 +2,10 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from datetime import timedelta
 from django.db.models import F, Q
 from django.utils.timezone import localtime, now
+from .controllers_friend_graph import generate_mutual_friends_with_friend_graph
 from .models import ACCEPTED, CurrentFriend, FriendInvitationVoterLink, FriendManager, CURRENT_FRIENDS, FriendInvitationEmailLink, \
     DELETE_INVITATION_EMAIL_SENT_BY_ME, DELETE_INVITATION_VOTER_SENT_BY_ME, FRIEND_INVITATION_SECRET_KEY_LENGTH, \
     FRIEND_INVITATIONS_PROCESSED, \
@@ -30,6 +32,12 @@ from wevote_functions.functions_date import DATE_FORMAT_YMD_HMS
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
+# How many new friendships one UPDATE_SUGGESTED_FRIENDS batch process works through
+SUGGESTED_FRIENDS_UPDATE_FRIENDSHIP_LIMIT = 1000
+# After a failure, a friendship waits 15 minutes, then 30, 60 and so on, and is given up on after 8 failures (about
+#  two and a half days)
+SUGGESTED_FRIENDS_UPDATE_RETRY_MINUTES = 15
+SUGGESTED_FRIENDS_UPDATE_MAXIMUM_FAILURES = 8
 
 
 def delete_friend_invitations_for_voter(voter_to_delete_we_vote_id):
@@ -1532,8 +1540,8 @@ def friend_acceptance_email_should_be_sent(  # friendInvitationByEmailVerify
             }
             return error_results
 
-        friend_manager.update_suggested_friends_starting_with_one_voter(sender_voter_we_vote_id)
-        friend_manager.update_suggested_friends_starting_with_one_voter(voter_we_vote_id_accepting_invitation)
+        friend_manager.update_suggested_friends_for_new_friendship(
+            sender_voter_we_vote_id, voter_we_vote_id_accepting_invitation)
 
         if not positive_value_exists(friend_invitation_voter_link.invited_friend_accepted_notification_sent):
             accepting_voter_we_vote_id = voter_we_vote_id_accepting_invitation
@@ -1571,9 +1579,9 @@ def friend_acceptance_email_should_be_sent(  # friendInvitationByEmailVerify
             }
             return error_results
 
-        friend_manager.update_suggested_friends_starting_with_one_voter(sender_voter_we_vote_id)
+        friend_manager.update_suggested_friends_for_new_friendship(
+            sender_voter_we_vote_id, voter_we_vote_id_accepting_invitation)
         if positive_value_exists(voter_we_vote_id_accepting_invitation):
-            friend_manager.update_suggested_friends_starting_with_one_voter(voter_we_vote_id_accepting_invitation)
 
             if not positive_value_exists(friend_invitation_email_link.invited_friend_accepted_notification_sent):
                 accepting_voter_we_vote_id = voter_we_vote_id_accepting_invitation
@@ -2182,8 +2190,8 @@ def friend_invitation_by_facebook_verify_for_api(voter_device_id, facebook_reque
         sender_organization_we_vote_id=sender_organization_we_vote_id,
         recipient_organization_we_vote_id=voter.linked_organization_we_vote_id)
 
-    friend_manager.update_suggested_friends_starting_with_one_voter(sender_voter_we_vote_id)
-    friend_manager.update_suggested_friends_starting_with_one_voter(voter_we_vote_id_accepting_invitation)
+    friend_manager.update_suggested_friends_for_new_friendship(
+        sender_voter_we_vote_id, voter_we_vote_id_accepting_invitation)
 
     if friend_results['success']:
         try:
@@ -2682,78 +2690,16 @@ def friend_lists_all_for_api(voter_device_id,  # friendListsAll
     return results
 
 
-def generate_mutual_friends_for_all_voters():
-    total_mutual_friends_created_count = 0
-    total_mutual_friends_updated_count = 0
-    total_mutual_friends_update_suppressed_count = 0
-    status = ""
-    success = False
-
-    current_friend_queryset = CurrentFriend.objects.all()
-    current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
-    current_friend_list = list(current_friend_queryset)
-    # Loop through them CurrentFriend list
-    for one_current_friend in current_friend_list:
-        generate_results = generate_mutual_friends_for_current_friend(current_friend=one_current_friend)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    suggested_friend_queryset = SuggestedFriend.objects.all()
-    suggested_friend_queryset = suggested_friend_queryset.order_by('-date_last_changed')
-    suggested_friend_list = list(suggested_friend_queryset)
-    # Loop through them SuggestedFriend list
-    for one_suggested_friend in suggested_friend_list:
-        generate_results = generate_mutual_friends_for_suggested_friend(suggested_friend=one_suggested_friend)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    queryset = FriendInvitationVoterLink.objects.all()
-    queryset = queryset.filter(deleted=False)
-    queryset = queryset.order_by('-date_last_changed')
-    friend_invitation_voter_link_list = list(queryset)
-    # Loop through them SuggestedFriend list
-    for one_friend_invitation_voter_link in friend_invitation_voter_link_list:
-        generate_results = generate_mutual_friends_for_friend_invitation_voter_link(
-            friend_invitation_voter_link=one_friend_invitation_voter_link)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    if positive_value_exists(total_mutual_friends_created_count):
-        status += "created: " + str(total_mutual_friends_created_count) + " "
-    if positive_value_exists(total_mutual_friends_updated_count):
-        status += "updated: " + str(total_mutual_friends_updated_count) + " "
-    if positive_value_exists(total_mutual_friends_update_suppressed_count):
-        status += "update_suppressed: " + str(total_mutual_friends_update_suppressed_count) + " "
-
-    results = {
-        'success':                          success,
-        'status':                           status,
-    }
-    return results
+def generate_mutual_friends_for_all_voters(incremental=False, update_existing_data=False):
+    """
+    Computed from one in-memory copy of the CurrentFriend graph, see generate_mutual_friends_with_friend_graph
+    :param incremental: Only the pairs touched by friendships changed since the last run
+    :param update_existing_data:
+    :return:
+    """
+    return generate_mutual_friends_with_friend_graph(
+        incremental=incremental,
+        update_existing_data=update_existing_data)
 
 
 def generate_mutual_friends_for_one_voter(voter_we_vote_id='', update_existing_data=False):
@@ -4517,3 +4463,103 @@ def store_internal_friend_invitation_with_unknown_email(
     }
 
     return results
+
+
+def retrieve_suggested_friends_update_due_query(read_only=False):
+    """
+    Flagged friendships which haven't failed, or whose wait after failing is over
+    """
+    if read_only:
+        query = CurrentFriend.objects.using('readonly').all()
+    else:
+        query = CurrentFriend.objects.all()
+    return query.filter(suggested_friends_update_needed=True)\
+        .filter(Q(date_suggested_friends_update_retry__isnull=True) | Q(date_suggested_friends_update_retry__lte=now()))
+
+
+def update_suggested_friends_for_new_friendships(friendship_limit=SUGGESTED_FRIENDS_UPDATE_FRIENDSHIP_LIMIT):
+    """
+    Called by the UPDATE_SUGGESTED_FRIENDS batch process. Suggest friends for both voters in each friendship flagged
+    with suggested_friends_update_needed, once per voter even if the voter has several new friends.
+    Friendships which have never been tried come first, then the ones which have waited longest to be retried.
+    A friendship is cleared when both of its voters were updated, and otherwise waits longer after each failure.
+    :param friendship_limit:
+    :return:
+    """
+    status = ""
+    success = True
+    friend_manager = FriendManager()
+    suggested_friend_created_count = 0
+
+    try:
+        current_friend_list = list(retrieve_suggested_friends_update_due_query()
+                                   .order_by(F('date_suggested_friends_update_retry').asc(nulls_first=True), 'id')
+                                   .values_list('id', 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id',
+                                                'suggested_friends_update_failure_count')
+                                   [:friendship_limit])
+    except Exception as e:
+        status += "COULD_NOT_RETRIEVE_NEW_FRIENDSHIPS: " + str(e) + " "
+        results = {
+            'success':                          False,
+            'status':                           status,
+            'suggested_friend_created_count':   suggested_friend_created_count,
+            'voters_updated_count':             0,
+        }
+        return results
+
+    voter_we_vote_id_set = set()
+    for current_friend_id, viewer_voter_we_vote_id, viewee_voter_we_vote_id, failure_count in current_friend_list:
+        voter_we_vote_id_set.update([viewer_voter_we_vote_id, viewee_voter_we_vote_id])
+    voter_we_vote_id_set.discard(None)
+    voter_we_vote_id_set.discard('')
+
+    failed_voter_we_vote_id_set = set()
+    for voter_we_vote_id in sorted(voter_we_vote_id_set):
+        results = friend_manager.update_suggested_friends_starting_with_one_voter(voter_we_vote_id)
+        if results['success']:
+            suggested_friend_created_count += results['suggested_friend_created_count']
+        else:
+            status += results['status']
+            success = False
+            failed_voter_we_vote_id_set.add(voter_we_vote_id)
+
+    updated_current_friend_id_list = []
+    failed_current_friend_id_list_by_failure_count = {}
+    for current_friend_id, viewer_voter_we_vote_id, viewee_voter_we_vote_id, failure_count in current_friend_list:
+        if viewer_voter_we_vote_id in failed_voter_we_vote_id_set \
+                or viewee_voter_we_vote_id in failed_voter_we_vote_id_set:
+            failed_current_friend_id_list_by_failure_count.setdefault(failure_count + 1, []).append(current_friend_id)
+        else:
+            updated_current_friend_id_list.append(current_friend_id)
+
+    try:
+        CurrentFriend.objects.filter(id__in=updated_current_friend_id_list).update(
+            suggested_friends_update_needed=False,
+            suggested_friends_update_failure_count=0,
+            date_suggested_friends_update_retry=None)
+        for failure_count, current_friend_id_list in failed_current_friend_id_list_by_failure_count.items():
+            if failure_count >= SUGGESTED_FRIENDS_UPDATE_MAXIMUM_FAILURES:
+                status += "SUGGESTED_FRIENDS_UPDATE_GIVEN_UP: " + str(current_friend_id_list) + " "
+                CurrentFriend.objects.filter(id__in=current_friend_id_list).update(
+                    suggested_friends_update_needed=False,
+                    suggested_friends_update_failure_count=failure_count,
+                    date_suggested_friends_update_retry=None)
+            else:
+                CurrentFriend.objects.filter(id__in=current_friend_id_list).update(
+                    suggested_friends_update_failure_count=failure_count,
+                    date_suggested_friends_update_retry=now() + timedelta(
+                        minutes=SUGGESTED_FRIENDS_UPDATE_RETRY_MINUTES * 2 ** (failure_count - 1)))
+    except Exception as e:
+        status += "COULD_NOT_CLEAR_SUGGESTED_FRIENDS_UPDATE_NEEDED: " + str(e) + " "
+        success = False
+
+    status += "NEW_FRIENDSHIPS: " + str(len(current_friend_list)) + \
+        ", VOTERS_UPDATED: " + str(len(voter_we_vote_id_set)) + \
+        ", SUGGESTED_FRIENDS_CREATED: " + str(suggested_friend_created_count) + " "
+    results = {
+        'success':                          success,
+        'status':                           status,
+        'suggested_friend_created_count':   suggested_friend_created_count,
+        'voters_updated_count':             len(voter_we_vote_id_set),
+    }
+    return results
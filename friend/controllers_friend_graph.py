@@ -0,0 +1,422 @@
+# friend/controllers_friend_graph.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import json
+
+import numpy as np
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import localtime, now
+
+from voter.models import Voter
+from wevote_settings.models import WeVoteSetting, WeVoteSettingsManager
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+from .models import CurrentFriend, FriendInvitationVoterLink, MutualFriend, SuggestedFriend
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+FRIEND_GRAPH_QUERY_CHUNK_SIZE = 1000
+FRIEND_GRAPH_BULK_BATCH_SIZE = 1000
+MUTUAL_FRIEND_PREVIEW_LIST_MAXIMUM = 8
+# When the last generate_mutual_friends_with_friend_graph run started, so incremental runs know which edges are new
+MUTUAL_FRIENDS_GENERATED_THROUGH_SETTING = 'mutual_friends_generated_through'
+
+PAIR_MODEL_LIST = [CurrentFriend, SuggestedFriend, FriendInvitationVoterLink]
+PAIR_FIELD_LIST = [
+    'mutual_friend_count', 'mutual_friend_count_last_updated', 'mutual_friend_preview_list_serialized',
+    'mutual_friend_preview_list_update_needed']
+MUTUAL_FRIEND_INFO_FIELD_LIST = [
+    'mutual_friend_display_name', 'mutual_friend_display_name_exists',
+    'mutual_friend_we_vote_hosted_profile_image_url_medium', 'mutual_friend_profile_image_exists',
+    'viewer_to_mutual_friend_friend_count', 'viewee_to_mutual_friend_friend_count']
+
+
+def chunk_list(full_list, chunk_size=FRIEND_GRAPH_QUERY_CHUNK_SIZE):
+    for start in range(0, len(full_list), chunk_size):
+        yield full_list[start:start + chunk_size]
+
+
+class FriendGraph(object):
+    """
+    The CurrentFriend table held in memory: every voter with a friend gets an int index, and each voter's friends
+    are a sorted int32 slice of one neighbors array (compressed sparse rows), so intersecting two friend lists costs
+    no queries.
+    """
+
+    def __init__(self, edge_list):
+        self.voter_index_by_we_vote_id = {}
+        self.voter_we_vote_id_list = []
+        source_list = []
+        destination_list = []
+        for viewer_voter_we_vote_id, viewee_voter_we_vote_id in edge_list:
+            if not positive_value_exists(viewer_voter_we_vote_id) or \
+                    not positive_value_exists(viewee_voter_we_vote_id) or \
+                    viewer_voter_we_vote_id == viewee_voter_we_vote_id:
+                continue
+            viewer_index = self.add_voter(viewer_voter_we_vote_id)
+            viewee_index = self.add_voter(viewee_voter_we_vote_id)
+            # A friendship goes both ways
+            source_list += [viewer_index, viewee_index]
+            destination_list += [viewee_index, viewer_index]
+
+        voter_count = len(self.voter_we_vote_id_list)
+        source_array = np.array(source_list, dtype=np.int64)
+        destination_array = np.array(destination_list, dtype=np.int64)
+        # One entry per friendship even if CurrentFriend has it more than once, sorted by source then destination
+        edge_key_array = np.unique(source_array * max(voter_count, 1) + destination_array)
+        self.neighbors = (edge_key_array % max(voter_count, 1)).astype(np.int32)
+        self.offsets = np.zeros(voter_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_key_array // max(voter_count, 1), minlength=voter_count),
+                  out=self.offsets[1:])
+
+    @classmethod
+    def load(cls):
+        edge_list = CurrentFriend.objects.using('readonly')\
+            .values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')\
+            .iterator(chunk_size=10000)
+        return cls(edge_list)
+
+    def add_voter(self, voter_we_vote_id):
+        voter_index = self.voter_index_by_we_vote_id.get(voter_we_vote_id)
+        if voter_index is None:
+            voter_index = len(self.voter_we_vote_id_list)
+            self.voter_index_by_we_vote_id[voter_we_vote_id] = voter_index
+            self.voter_we_vote_id_list.append(voter_we_vote_id)
+        return voter_index
+
+    def friend_index_array(self, voter_index):
+        return self.neighbors[self.offsets[voter_index]:self.offsets[voter_index + 1]]
+
+    def mutual_friend_index_array(self, voter_we_vote_id, friend_voter_we_vote_id):
+        voter_index = self.voter_index_by_we_vote_id.get(voter_we_vote_id)
+        friend_voter_index = self.voter_index_by_we_vote_id.get(friend_voter_we_vote_id)
+        if voter_index is None or friend_voter_index is None:
+            return np.zeros(0, dtype=np.int32)
+        return np.intersect1d(
+            self.friend_index_array(voter_index), self.friend_index_array(friend_voter_index), assume_unique=True)
+
+    def mutual_friends_count(self, voter_index, friend_voter_index):
+        return len(np.intersect1d(
+            self.friend_index_array(voter_index), self.friend_index_array(friend_voter_index), assume_unique=True))
+
+
+def generate_mutual_friend_preview_list_serialized(mutual_friend_info_list):
+    """
+    The same preview generate_mutual_friend_preview_list_serialized_for_two_voters builds from the MutualFriend
+    table, built from the MutualFriend values we are about to save
+    """
+    mutual_friend_preview_list = []
+    mutual_friend_info_list = [one_info for one_info in mutual_friend_info_list
+                               if one_info['mutual_friend_display_name_exists'] or
+                               one_info['mutual_friend_profile_image_exists']]
+    mutual_friend_info_list.sort(
+        key=lambda one_info: (
+            -((one_info['viewer_to_mutual_friend_friend_count'] or 0) +
+              (one_info['viewee_to_mutual_friend_friend_count'] or 0)),
+            one_info['mutual_friend_voter_we_vote_id']))
+    for one_info in mutual_friend_info_list[:MUTUAL_FRIEND_PREVIEW_LIST_MAXIMUM]:
+        mutual_friend_preview_list.append({
+            "friend_display_name":      one_info['mutual_friend_display_name'],
+            "friend_photo_url_medium":  one_info['mutual_friend_we_vote_hosted_profile_image_url_medium'],
+        })
+    if len(mutual_friend_preview_list) > 0:
+        return json.dumps(mutual_friend_preview_list)
+    return None
+
+
+def retrieve_voter_display_info_dict(voter_we_vote_id_list):
+    voter_display_info_dict = {}
+    for voter_we_vote_id_chunk in chunk_list(voter_we_vote_id_list):
+        voter_list = Voter.objects.using('readonly')\
+            .filter(we_vote_id__in=voter_we_vote_id_chunk)\
+            .only('we_vote_id', 'first_name', 'last_name', 'twitter_name', 'twitter_screen_name', 'email',
+                  'we_vote_hosted_profile_image_url_medium')
+        for voter in voter_list:
+            mutual_friend_display_name = voter.get_full_name(real_name_only=True)
+            we_vote_hosted_profile_image_url_medium = voter.we_vote_hosted_profile_image_url_medium
+            voter_display_info_dict[voter.we_vote_id] = {
+                'mutual_friend_display_name':
+                    mutual_friend_display_name if positive_value_exists(mutual_friend_display_name) else None,
+                'mutual_friend_display_name_exists': positive_value_exists(mutual_friend_display_name),
+                'mutual_friend_we_vote_hosted_profile_image_url_medium':
+                    we_vote_hosted_profile_image_url_medium
+                    if positive_value_exists(we_vote_hosted_profile_image_url_medium) else None,
+                'mutual_friend_profile_image_exists': positive_value_exists(we_vote_hosted_profile_image_url_medium),
+            }
+    return voter_display_info_dict
+
+
+def retrieve_existing_mutual_friend_dict(pair_key_set, incremental=False):
+    """
+    :return: pair_key -> mutual_friend_voter_we_vote_id -> MutualFriend values, plus the ids of duplicate rows
+    """
+    existing_mutual_friend_dict = {}
+    duplicate_mutual_friend_id_list = []
+    value_field_list = ['id', 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id', 'mutual_friend_voter_we_vote_id'] \
+        + MUTUAL_FRIEND_INFO_FIELD_LIST
+
+    if incremental:
+        voter_we_vote_id_list = sorted(set(
+            voter_we_vote_id for pair_key in pair_key_set for voter_we_vote_id in pair_key))
+        queryset_list = []
+        for voter_we_vote_id_chunk in chunk_list(voter_we_vote_id_list):
+            queryset_list.append(MutualFriend.objects.filter(
+                Q(viewer_voter_we_vote_id__in=voter_we_vote_id_chunk) |
+                Q(viewee_voter_we_vote_id__in=voter_we_vote_id_chunk)).values(*value_field_list))
+    else:
+        queryset_list = [MutualFriend.objects.all().values(*value_field_list)]
+
+    seen_mutual_friend_id_set = set()
+    for queryset in queryset_list:
+        for one_mutual_friend in queryset.iterator(chunk_size=10000):
+            if one_mutual_friend['id'] in seen_mutual_friend_id_set:
+                continue
+            seen_mutual_friend_id_set.add(one_mutual_friend['id'])
+            pair_key = tuple(sorted([
+                one_mutual_friend['viewer_voter_we_vote_id'] or '',
+                one_mutual_friend['viewee_voter_we_vote_id'] or '']))
+            if pair_key not in pair_key_set:
+                continue
+            mutual_friend_dict_for_pair = existing_mutual_friend_dict.setdefault(pair_key, {})
+            if one_mutual_friend['mutual_friend_voter_we_vote_id'] in mutual_friend_dict_for_pair:
+                # The same mutual friend stored in both directions, or twice in one
+                duplicate_mutual_friend_id_list.append(one_mutual_friend['id'])
+                continue
+            mutual_friend_dict_for_pair[one_mutual_friend['mutual_friend_voter_we_vote_id']] = one_mutual_friend
+    return existing_mutual_friend_dict, duplicate_mutual_friend_id_list
+
+
+def generate_mutual_friends_with_friend_graph(incremental=False, update_existing_data=False):
+    """
+    Bring MutualFriend, and mutual_friend_count and mutual_friend_preview_list_serialized on every CurrentFriend,
+    SuggestedFriend and (not deleted) FriendInvitationVoterLink, up to date from one in-memory copy of the friend
+    graph, with bulk writes.
+    With incremental, only pairs that need it are rewritten: pairs flagged mutual_friend_preview_list_update_needed
+    (new rows start flagged), pairs with a voter on a CurrentFriend row changed since the last run, and pairs whose
+    mutual_friend_count no longer matches the graph (which is how friendships deleted since then show up).
+    :param incremental:
+    :param update_existing_data: Refresh the names, images and counts on MutualFriend rows we keep
+    :return:
+    """
+    status = ""
+    success = True
+    mutual_friends_created_count = 0
+    mutual_friends_deleted_count = 0
+    mutual_friends_updated_count = 0
+    pair_rows_updated_count = 0
+    we_vote_settings_manager = WeVoteSettingsManager()
+    date_started = now()
+
+    friend_graph = FriendGraph.load()
+
+    changed_voter_we_vote_id_set = set()
+    if incremental:
+        generated_through = parse_datetime(
+            str(we_vote_settings_manager.fetch_setting(MUTUAL_FRIENDS_GENERATED_THROUGH_SETTING) or ''))
+        if generated_through is None:
+            status += "NO_PREVIOUS_MUTUAL_FRIENDS_RUN-GENERATING_ALL "
+            incremental = False
+        else:
+            changed_edge_list = CurrentFriend.objects.using('readonly')\
+                .filter(date_last_changed__gte=generated_through)\
+                .values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+            for viewer_voter_we_vote_id, viewee_voter_we_vote_id in changed_edge_list:
+                changed_voter_we_vote_id_set.update([viewer_voter_we_vote_id, viewee_voter_we_vote_id])
+
+    # ######################
+    # Every pair of voters we show mutual friends for, and the rows that show them
+    pair_row_list_by_model = {}
+    mutual_friend_index_array_by_pair_key = {}
+    pair_key_to_generate_set = set()
+    for pair_model in PAIR_MODEL_LIST:
+        if pair_model == FriendInvitationVoterLink:
+            queryset = pair_model.objects.using('readonly').filter(deleted=False)
+            first_field, second_field = 'sender_voter_we_vote_id', 'recipient_voter_we_vote_id'
+        else:
+            queryset = pair_model.objects.using('readonly').all()
+            first_field, second_field = 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'
+        pair_row_list = []
+        for pair_row in queryset.values('id', first_field, second_field, *PAIR_FIELD_LIST).iterator(chunk_size=10000):
+            first_voter_we_vote_id = pair_row[first_field]
+            second_voter_we_vote_id = pair_row[second_field]
+            if not positive_value_exists(first_voter_we_vote_id) or \
+                    not positive_value_exists(second_voter_we_vote_id):
+                continue
+            pair_key = tuple(sorted([first_voter_we_vote_id, second_voter_we_vote_id]))
+            if pair_key not in mutual_friend_index_array_by_pair_key:
+                mutual_friend_index_array_by_pair_key[pair_key] = \
+                    friend_graph.mutual_friend_index_array(*pair_key)
+            pair_row['pair_key'] = pair_key
+            pair_row['first_voter_we_vote_id'] = first_voter_we_vote_id
+            pair_row['second_voter_we_vote_id'] = second_voter_we_vote_id
+            if not incremental or \
+                    pair_row['mutual_friend_preview_list_update_needed'] or \
+                    first_voter_we_vote_id in changed_voter_we_vote_id_set or \
+                    second_voter_we_vote_id in changed_voter_we_vote_id_set or \
+                    (pair_row['mutual_friend_count'] or 0) != len(mutual_friend_index_array_by_pair_key[pair_key]):
+                pair_key_to_generate_set.add(pair_key)
+            pair_row_list.append(pair_row)
+        pair_row_list_by_model[pair_model] = pair_row_list
+
+    # ######################
+    # The MutualFriend rows these pairs should have, compared with what is saved
+    existing_mutual_friend_dict, mutual_friend_id_to_delete_list = \
+        retrieve_existing_mutual_friend_dict(pair_key_to_generate_set, incremental=incremental)
+
+    mutual_friend_voter_we_vote_id_set = set()
+    for pair_key in pair_key_to_generate_set:
+        mutual_friend_voter_we_vote_id_set.update(
+            friend_graph.voter_we_vote_id_list[mutual_friend_index] for mutual_friend_index in
+            mutual_friend_index_array_by_pair_key[pair_key])
+    voter_display_info_dict = retrieve_voter_display_info_dict(sorted(mutual_friend_voter_we_vote_id_set))
+
+    mutual_friend_to_create_list = []
+    mutual_friend_to_update_list = []
+    mutual_friend_info_list_by_pair_key = {}
+    mutual_friends_count_by_index_pair = {}
+    first_voter_we_vote_id_by_pair_key = {}
+    for pair_model in PAIR_MODEL_LIST:
+        for pair_row in pair_row_list_by_model[pair_model]:
+            # MutualFriend rows we create take their direction from the first row we see for the pair
+            first_voter_we_vote_id_by_pair_key.setdefault(pair_row['pair_key'], pair_row['first_voter_we_vote_id'])
+
+    def fetch_mutual_friends_count(voter_index, friend_voter_index):
+        index_pair = (min(voter_index, friend_voter_index), max(voter_index, friend_voter_index))
+        if index_pair not in mutual_friends_count_by_index_pair:
+            mutual_friends_count_by_index_pair[index_pair] = \
+                friend_graph.mutual_friends_count(voter_index, friend_voter_index)
+        return mutual_friends_count_by_index_pair[index_pair]
+
+    for pair_key in pair_key_to_generate_set:
+        existing_mutual_friend_dict_for_pair = existing_mutual_friend_dict.get(pair_key, {})
+        viewer_voter_we_vote_id = first_voter_we_vote_id_by_pair_key[pair_key]
+        viewee_voter_we_vote_id = pair_key[1] if pair_key[0] == viewer_voter_we_vote_id else pair_key[0]
+        viewer_index = friend_graph.voter_index_by_we_vote_id.get(viewer_voter_we_vote_id)
+        viewee_index = friend_graph.voter_index_by_we_vote_id.get(viewee_voter_we_vote_id)
+        mutual_friend_info_list = []
+        mutual_friend_voter_we_vote_id_kept_set = set()
+        for mutual_friend_index in mutual_friend_index_array_by_pair_key[pair_key]:
+            mutual_friend_voter_we_vote_id = friend_graph.voter_we_vote_id_list[mutual_friend_index]
+            existing_mutual_friend = existing_mutual_friend_dict_for_pair.get(mutual_friend_voter_we_vote_id)
+            if existing_mutual_friend is not None and not update_existing_data:
+                mutual_friend_voter_we_vote_id_kept_set.add(mutual_friend_voter_we_vote_id)
+                mutual_friend_info_list.append(existing_mutual_friend)
+                continue
+            voter_display_info = voter_display_info_dict.get(mutual_friend_voter_we_vote_id)
+            if voter_display_info is None:
+                # The mutual friend's voter is gone, so there's no name or image to show
+                continue
+            mutual_friend_voter_we_vote_id_kept_set.add(mutual_friend_voter_we_vote_id)
+            mutual_friend_info = dict(voter_display_info)
+            mutual_friend_info['mutual_friend_voter_we_vote_id'] = mutual_friend_voter_we_vote_id
+            if existing_mutual_friend is not None:
+                # Keep the saved direction, so the counts line up with viewer and viewee
+                viewer_index_for_row = friend_graph.voter_index_by_we_vote_id.get(
+                    existing_mutual_friend['viewer_voter_we_vote_id'], viewer_index)
+                viewee_index_for_row = viewee_index if viewer_index_for_row == viewer_index else viewer_index
+            else:
+                viewer_index_for_row, viewee_index_for_row = viewer_index, viewee_index
+            mutual_friend_info['viewer_to_mutual_friend_friend_count'] = \
+                fetch_mutual_friends_count(viewer_index_for_row, mutual_friend_index)
+            mutual_friend_info['viewee_to_mutual_friend_friend_count'] = \
+                fetch_mutual_friends_count(viewee_index_for_row, mutual_friend_index)
+            mutual_friend_info_list.append(mutual_friend_info)
+            if existing_mutual_friend is None:
+                mutual_friend_to_create_list.append(MutualFriend(
+                    viewer_voter_we_vote_id=viewer_voter_we_vote_id,
+                    viewee_voter_we_vote_id=viewee_voter_we_vote_id,
+                    **mutual_friend_info))
+            elif any(existing_mutual_friend[field] != mutual_friend_info[field]
+                     for field in MUTUAL_FRIEND_INFO_FIELD_LIST):
+                mutual_friend_to_update_list.append(MutualFriend(
+                    id=existing_mutual_friend['id'],
+                    **{field: mutual_friend_info[field] for field in MUTUAL_FRIEND_INFO_FIELD_LIST}))
+        mutual_friend_info_list_by_pair_key[pair_key] = mutual_friend_info_list
+
+        for mutual_friend_voter_we_vote_id, existing_mutual_friend in existing_mutual_friend_dict_for_pair.items():
+            if mutual_friend_voter_we_vote_id not in mutual_friend_voter_we_vote_id_kept_set:
+                mutual_friend_id_to_delete_list.append(existing_mutual_friend['id'])
+
+    try:
+        MutualFriend.objects.bulk_create(mutual_friend_to_create_list, batch_size=FRIEND_GRAPH_BULK_BATCH_SIZE)
+        mutual_friends_created_count = len(mutual_friend_to_create_list)
+        MutualFriend.objects.bulk_update(
+            mutual_friend_to_update_list, MUTUAL_FRIEND_INFO_FIELD_LIST, batch_size=FRIEND_GRAPH_BULK_BATCH_SIZE)
+        mutual_friends_updated_count = len(mutual_friend_to_update_list)
+        for mutual_friend_id_chunk in chunk_list(mutual_friend_id_to_delete_list):
+            MutualFriend.objects.filter(id__in=mutual_friend_id_chunk).delete()
+        mutual_friends_deleted_count = len(mutual_friend_id_to_delete_list)
+    except Exception as e:
+        status += "FAILED_SAVING_MUTUAL_FRIENDS: " + str(e) + " "
+        results = {
+            'success':                          False,
+            'status':                           status,
+            'mutual_friends_created_count':     mutual_friends_created_count,
+            'mutual_friends_deleted_count':     mutual_friends_deleted_count,
+            'mutual_friends_updated_count':     mutual_friends_updated_count,
+            'pair_rows_updated_count':          pair_rows_updated_count,
+        }
+        return results
+
+    # ######################
+    # mutual_friend_count and mutual_friend_preview_list_serialized on CurrentFriend, SuggestedFriend and
+    #  FriendInvitationVoterLink
+    mutual_friend_preview_list_serialized_by_pair_key = {}
+    for pair_key in pair_key_to_generate_set:
+        mutual_friend_preview_list_serialized_by_pair_key[pair_key] = \
+            generate_mutual_friend_preview_list_serialized(mutual_friend_info_list_by_pair_key[pair_key])
+
+    for pair_model in PAIR_MODEL_LIST:
+        pair_to_update_list = []
+        for pair_row in pair_row_list_by_model[pair_model]:
+            pair_key = pair_row['pair_key']
+            if pair_key not in pair_key_to_generate_set:
+                continue
+            mutual_friend_count = len(mutual_friend_index_array_by_pair_key[pair_key])
+            mutual_friend_preview_list_serialized = mutual_friend_preview_list_serialized_by_pair_key[pair_key]
+            pair_to_update = pair_model(id=pair_row['id'], **{field: pair_row[field] for field in PAIR_FIELD_LIST})
+            change_to_save = pair_row['mutual_friend_preview_list_update_needed']
+            if not positive_value_exists(mutual_friend_count) and pair_row['mutual_friend_count'] is None:
+                pass
+            elif pair_row['mutual_friend_count'] != mutual_friend_count:
+                pair_to_update.mutual_friend_count = mutual_friend_count
+                pair_to_update.mutual_friend_count_last_updated = localtime(now()).date()  # We Vote uses Pacific Time
+                change_to_save = True
+            if pair_row['mutual_friend_preview_list_serialized'] != mutual_friend_preview_list_serialized:
+                pair_to_update.mutual_friend_preview_list_serialized = mutual_friend_preview_list_serialized
+                change_to_save = True
+            pair_to_update.mutual_friend_preview_list_update_needed = False
+            if change_to_save:
+                pair_to_update_list.append(pair_to_update)
+        try:
+            pair_model.objects.bulk_update(
+                pair_to_update_list, PAIR_FIELD_LIST, batch_size=FRIEND_GRAPH_BULK_BATCH_SIZE)
+            pair_rows_updated_count += len(pair_to_update_list)
+        except Exception as e:
+            status += "FAILED_UPDATING_" + pair_model.__name__.upper() + "_MUTUAL_FRIENDS: " + str(e) + " "
+            success = False
+
+    if success:
+        we_vote_settings_manager.save_setting(
+            setting_name=MUTUAL_FRIENDS_GENERATED_THROUGH_SETTING,
+            setting_value=date_started.isoformat(),
+            value_type=WeVoteSetting.STRING)
+
+    status += "PAIRS_GENERATED: " + str(len(pair_key_to_generate_set)) + " "
+    if positive_value_exists(mutual_friends_created_count):
+        status += "created: " + str(mutual_friends_created_count) + " "
+    if positive_value_exists(mutual_friends_updated_count):
+        status += "updated: " + str(mutual_friends_updated_count) + " "
+    if positive_value_exists(mutual_friends_deleted_count):
+        status += "deleted: " + str(mutual_friends_deleted_count) + " "
+    results = {
+        'success':                          success,
+        'status':                           status,
+        'mutual_friends_created_count':     mutual_friends_created_count,
+        'mutual_friends_deleted_count':     mutual_friends_deleted_count,
+        'mutual_friends_updated_count':     mutual_friends_updated_count,
+        'pair_rows_updated_count':          pair_rows_updated_count,
+    }
+    return results
@@ -2,11 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from contextlib import nullcontext
+from itertools import combinations
 import json
 import psycopg2
 from django.db import models
 from django.db.models import Q
 from config.base import get_environment_variable
+from config.database_router import use_primary_database
 from email_outbound.models import EmailManager
 from voter.models import VoterManager
 from wevote_functions.functions import positive_value_exists
@@ -48,6 +51,8 @@ SUGGESTED_FRIEND_LIST = 'SUGGESTED_FRIEND_LIST'
 
 FRIEND_INVITATION_SECRET_KEY_LENGTH = 12
 
+SUGGESTED_FRIEND_BULK_CREATE_BATCH_SIZE = 1000
+
 
 class CurrentFriend(models.Model):
     """
@@ -69,6 +74,14 @@ class CurrentFriend(models.Model):
     mutual_friend_preview_list_serialized = models.TextField(default=None, null=True)
     mutual_friend_preview_list_update_needed = models.BooleanField(default=True)
 
+    # Set when this friendship is new, until the UPDATE_SUGGESTED_FRIENDS batch process has suggested each
+    #  voter's friends to each other. See FriendManager.update_suggested_friends_for_new_friendship
+    suggested_friends_update_needed = models.BooleanField(default=False, db_index=True)
+    # When an update fails, the batch process tries this friendship again after date_suggested_friends_update_retry,
+    #  waiting twice as long after each failure
+    suggested_friends_update_failure_count = models.PositiveSmallIntegerField(default=0)
+    date_suggested_friends_update_retry = models.DateTimeField(null=True)
+
     date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
 
     class Meta:
@@ -656,8 +669,8 @@ class FriendManager(models.Manager):
                 success = results['success']
                 status += results['status']
 
-                friend_manager.update_suggested_friends_starting_with_one_voter(sender_voter.we_vote_id)
-                friend_manager.update_suggested_friends_starting_with_one_voter(recipient_voter.we_vote_id)
+                friend_manager.update_suggested_friends_for_new_friendship(
+                    sender_voter.we_vote_id, recipient_voter.we_vote_id)
 
                 if results['current_friend_created']:
                     friend_invitation_accepted = True
@@ -2418,49 +2431,124 @@ class FriendManager(models.Manager):
         }
         return results
 
+    def update_suggested_friends_for_new_friendship(self, sender_voter_we_vote_id, recipient_voter_we_vote_id):
+        """
+        Two voters just became friends, so each one's friends should be suggested to each other. If the
+        UPDATE_SUGGESTED_FRIENDS batch process is on, we only flag the friendship here and the batch process does the
+        work, so the API call that accepted the invitation doesn't wait for it.
+        :param sender_voter_we_vote_id:
+        :param recipient_voter_we_vote_id:
+        :return:
+        """
+        from wevote_settings.models import fetch_batch_process_system_general_maintenance_on, \
+            fetch_batch_process_system_on, fetch_batch_process_system_update_suggested_friends_on
+        status = ""
+        success = True
+        if fetch_batch_process_system_on() and fetch_batch_process_system_general_maintenance_on() \
+                and fetch_batch_process_system_update_suggested_friends_on():
+            try:
+                CurrentFriend.objects.filter(
+                    Q(viewer_voter_we_vote_id=sender_voter_we_vote_id,
+                      viewee_voter_we_vote_id=recipient_voter_we_vote_id) |
+                    Q(viewer_voter_we_vote_id=recipient_voter_we_vote_id,
+                      viewee_voter_we_vote_id=sender_voter_we_vote_id)
+                ).update(
+                    suggested_friends_update_needed=True,
+                    suggested_friends_update_failure_count=0,
+                    date_suggested_friends_update_retry=None)
+                status += "SUGGESTED_FRIENDS_UPDATE_SCHEDULED "
+            except Exception as e:
+                success = False
+                status += "SUGGESTED_FRIENDS_UPDATE_NOT_SCHEDULED: " + str(e) + " "
+        else:
+            for voter_we_vote_id in [sender_voter_we_vote_id, recipient_voter_we_vote_id]:
+                if positive_value_exists(voter_we_vote_id):
+                    results = self.update_suggested_friends_starting_with_one_voter(voter_we_vote_id)
+                    status += results['status']
+                    if not results['success']:
+                        success = False
+
+        results = {
+            'status':   status,
+            'success':  success,
+        }
+        return results
+
     def update_suggested_friends_starting_with_one_voter(self, starting_voter_we_vote_id, read_only=False):
         """
         Note that we default to "read_only=False" (that is, the live db) since usually we are doing this update
         right after adding a friend, and we want the new friend to be returned in "retrieve_current_friend_list".
         We use the live database ("read_only=False") because we don't want to create a race condition with
         the replicated read_only not being caught up with the master fast enough (since a friend
-        was just created above.)
+        was just created above.) With read_only=False everything here is read inside use_primary_database(),
+        so the read replica router doesn't send it to the replica either.
+
+        Every pair of this voter's friends who aren't friends yet, and don't already have a SuggestedFriend, gets one.
+        The friendships and suggestions among this voter's friends are read with one query each, and the new
+        SuggestedFriend entries are saved with bulk_create.
 
         :param starting_voter_we_vote_id:
         :param read_only:
         :return:
         """
-        all_friends_one_person_results = self.retrieve_current_friend_list(
-            starting_voter_we_vote_id,
-            read_only=read_only
-        )
+        status = ""
+        success = True
         suggested_friend_created_count = 0
-        if all_friends_one_person_results['current_friend_list_found']:
-            current_friend_list = all_friends_one_person_results['current_friend_list']
+        # Reads without .using() would otherwise go to the replica, see config/database_router.py
+        with nullcontext() if positive_value_exists(read_only) else use_primary_database():
+            all_friends_one_person_results = self.retrieve_current_friend_list(
+                starting_voter_we_vote_id,
+                read_only=read_only
+            )
+            status += all_friends_one_person_results['status']
+            if not all_friends_one_person_results['success']:
+                success = False
+            friend_we_vote_id_set = set()
+            if all_friends_one_person_results['current_friend_list_found']:
+                for one_current_friend in all_friends_one_person_results['current_friend_list']:
+                    friend_we_vote_id = one_current_friend.fetch_other_voter_we_vote_id(starting_voter_we_vote_id)
+                    if positive_value_exists(friend_we_vote_id):
+                        friend_we_vote_id_set.add(friend_we_vote_id)
+
             # For each friend on this list, suggest every other friend as a possible friend
             # Ex/ You have the friends Jo and Pat. This routine makes sure they both see each other as suggested friends
-            for one_current_friend_to_suggest in current_friend_list:
-                first_voter_we_vote_id = one_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                    starting_voter_we_vote_id)
-                for second_current_friend_to_suggest in current_friend_list:
-                    second_voter_we_vote_id = second_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                        starting_voter_we_vote_id)
-                    if positive_value_exists(first_voter_we_vote_id) and \
-                            positive_value_exists(second_voter_we_vote_id) and \
-                            first_voter_we_vote_id != second_voter_we_vote_id:
-                        # Are they already friends?
-                        already_friend_results = self.retrieve_current_friend(first_voter_we_vote_id,
-                                                                              second_voter_we_vote_id)
-                        if not already_friend_results['current_friend_found']:
-                            suggested_friend_results = self.update_or_create_suggested_friend(first_voter_we_vote_id,
-                                                                                              second_voter_we_vote_id)
-                            if suggested_friend_results['suggested_friend_created'] or \
-                                    suggested_friend_results['suggested_friend_found']:
-                                suggested_friend_created_count += 1
+            if len(friend_we_vote_id_set) > 1:
+                friend_we_vote_id_list = sorted(friend_we_vote_id_set)
+                try:
+                    if positive_value_exists(read_only):
+                        current_friend_queryset = CurrentFriend.objects.using('readonly').all()
+                        suggested_friend_queryset = SuggestedFriend.objects.using('readonly').all()
+                    else:
+                        current_friend_queryset = CurrentFriend.objects.all()
+                        suggested_friend_queryset = SuggestedFriend.objects.all()
+                    # The direction of a friendship or suggestion doesn't matter, so we compare unordered pairs
+                    voter_pair_already_linked_set = set()
+                    for queryset in [current_friend_queryset, suggested_friend_queryset]:
+                        voter_pair_list = queryset.filter(
+                            viewer_voter_we_vote_id__in=friend_we_vote_id_list,
+                            viewee_voter_we_vote_id__in=friend_we_vote_id_list,
+                        ).values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+                        voter_pair_already_linked_set.update(frozenset(voter_pair) for voter_pair in voter_pair_list)
+
+                    suggested_friend_list = []
+                    for first_voter_we_vote_id, second_voter_we_vote_id in combinations(friend_we_vote_id_list, 2):
+                        if frozenset((first_voter_we_vote_id, second_voter_we_vote_id)) \
+                                not in voter_pair_already_linked_set:
+                            suggested_friend_list.append(SuggestedFriend(
+                                viewer_voter_we_vote_id=first_voter_we_vote_id,
+                                viewee_voter_we_vote_id=second_voter_we_vote_id,
+                            ))
+                    SuggestedFriend.objects.bulk_create(
+                        suggested_friend_list, batch_size=SUGGESTED_FRIEND_BULK_CREATE_BATCH_SIZE)
+                    suggested_friend_created_count = len(suggested_friend_list)
+                except Exception as e:
+                    success = False
+                    status += "UPDATE_SUGGESTED_FRIENDS_FAILED: " + str(e) + " "
 
+        status += "UPDATE_SUGGESTED_FRIENDS_COMPLETED "
         results = {
-            'status':                           "UPDATE_SUGGESTED_FRIENDS_COMPLETED ",
-            'success':                          True,
+            'status':                           status,
+            'success':                          success,
             'suggested_friend_created_count':   suggested_friend_created_count,
         }
         return results
@@ -0,0 +1,221 @@
+# friend/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils.timezone import now
+
+import wevote_settings.models
+from friend.controllers import SUGGESTED_FRIENDS_UPDATE_MAXIMUM_FAILURES, SUGGESTED_FRIENDS_UPDATE_RETRY_MINUTES, \
+    update_suggested_friends_for_new_friendships
+from friend.controllers_friend_graph import FriendGraph, generate_mutual_friends_with_friend_graph
+from friend.models import CurrentFriend, FriendManager, MutualFriend, SuggestedFriend
+from voter.models import Voter
+
+
+def suggested_voter_pair_set():
+    return {frozenset(voter_pair) for voter_pair in
+            SuggestedFriend.objects.values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')}
+
+
+class SuggestedFriendTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.voter_we_vote_id = 'wv01voter1'
+        for friend_we_vote_id in ['wv01voter2', 'wv01voter3', 'wv01voter4']:
+            CurrentFriend.objects.create(
+                viewer_voter_we_vote_id=self.voter_we_vote_id, viewee_voter_we_vote_id=friend_we_vote_id)
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='wv01voter3', viewee_voter_we_vote_id='wv01voter2')
+        SuggestedFriend.objects.create(viewer_voter_we_vote_id='wv01voter4', viewee_voter_we_vote_id='wv01voter3')
+
+    def test_friends_are_suggested_to_each_other_once(self):
+        results = FriendManager().update_suggested_friends_starting_with_one_voter(self.voter_we_vote_id)
+        self.assertTrue(results['success'])
+        # 2 and 3 are already friends, and 3 and 4 already suggested, whichever way around
+        self.assertEqual(results['suggested_friend_created_count'], 1)
+        self.assertEqual(suggested_voter_pair_set(), {
+            frozenset(('wv01voter2', 'wv01voter4')), frozenset(('wv01voter3', 'wv01voter4'))})
+
+        results = FriendManager().update_suggested_friends_starting_with_one_voter(self.voter_we_vote_id)
+        self.assertEqual(results['suggested_friend_created_count'], 0)
+        self.assertEqual(SuggestedFriend.objects.count(), 2)
+
+    def test_new_friendship_is_left_to_the_batch_process(self):
+        CurrentFriend.objects.filter(viewee_voter_we_vote_id='wv01voter4').update(
+            suggested_friends_update_failure_count=3, date_suggested_friends_update_retry=now())
+        with mock.patch.object(wevote_settings.models, 'fetch_batch_process_system_on', return_value=True), \
+                mock.patch.object(wevote_settings.models, 'fetch_batch_process_system_general_maintenance_on',
+                                  return_value=True), \
+                mock.patch.object(wevote_settings.models, 'fetch_batch_process_system_update_suggested_friends_on',
+                                  return_value=True):
+            results = FriendManager().update_suggested_friends_for_new_friendship('wv01voter4', self.voter_we_vote_id)
+        self.assertIn('SUGGESTED_FRIENDS_UPDATE_SCHEDULED', results['status'])
+        self.assertEqual(SuggestedFriend.objects.count(), 1)
+        current_friend = CurrentFriend.objects.get(viewee_voter_we_vote_id='wv01voter4')
+        self.assertTrue(current_friend.suggested_friends_update_needed)
+        self.assertEqual(current_friend.suggested_friends_update_failure_count, 0)
+        self.assertIsNone(current_friend.date_suggested_friends_update_retry)
+
+    def test_new_friendship_is_updated_inline_without_the_batch_process(self):
+        with mock.patch.object(wevote_settings.models, 'fetch_batch_process_system_on', return_value=False):
+            results = FriendManager().update_suggested_friends_for_new_friendship('wv01voter4', self.voter_we_vote_id)
+        self.assertTrue(results['success'])
+        self.assertIn(frozenset(('wv01voter2', 'wv01voter4')), suggested_voter_pair_set())
+        self.assertFalse(CurrentFriend.objects.filter(suggested_friends_update_needed=True).exists())
+
+
+class SuggestedFriendsUpdateBackoffTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.working_friendship = CurrentFriend.objects.create(
+            viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter2',
+            suggested_friends_update_needed=True)
+        self.failing_friendship = CurrentFriend.objects.create(
+            viewer_voter_we_vote_id='wv01voter3', viewee_voter_we_vote_id='wv01voter4',
+            suggested_friends_update_needed=True)
+
+    @staticmethod
+    def update_with_failing_voter(failing_voter_we_vote_id, friendship_limit=1000):
+        def update_one_voter(voter_we_vote_id):
+            success = voter_we_vote_id != failing_voter_we_vote_id
+            return {'success': success, 'status': "" if success else "FAILED ", 'suggested_friend_created_count': 0}
+
+        with mock.patch.object(FriendManager, 'update_suggested_friends_starting_with_one_voter',
+                               side_effect=update_one_voter) as update_suggested_friends:
+            results = update_suggested_friends_for_new_friendships(friendship_limit=friendship_limit)
+        return results, sorted(one_call.args[0] for one_call in update_suggested_friends.call_args_list)
+
+    def test_failed_friendship_waits_without_holding_up_the_rest(self):
+        results, updated_voter_we_vote_id_list = self.update_with_failing_voter('wv01voter3')
+        self.assertFalse(results['success'])
+        self.assertEqual(updated_voter_we_vote_id_list, ['wv01voter1', 'wv01voter2', 'wv01voter3', 'wv01voter4'])
+
+        self.working_friendship.refresh_from_db()
+        self.assertFalse(self.working_friendship.suggested_friends_update_needed)
+        self.failing_friendship.refresh_from_db()
+        self.assertTrue(self.failing_friendship.suggested_friends_update_needed)
+        self.assertEqual(self.failing_friendship.suggested_friends_update_failure_count, 1)
+        retry_minutes = (self.failing_friendship.date_suggested_friends_update_retry - now()).total_seconds() / 60
+        self.assertAlmostEqual(retry_minutes, SUGGESTED_FRIENDS_UPDATE_RETRY_MINUTES, delta=1)
+
+        # Not due yet
+        results, updated_voter_we_vote_id_list = self.update_with_failing_voter('wv01voter3')
+        self.assertEqual(updated_voter_we_vote_id_list, [])
+
+    def test_retry_waits_longer_then_gives_up(self):
+        CurrentFriend.objects.filter(id=self.failing_friendship.id).update(
+            suggested_friends_update_failure_count=2, date_suggested_friends_update_retry=now() - timedelta(seconds=1))
+        self.update_with_failing_voter('wv01voter3')
+        self.failing_friendship.refresh_from_db()
+        self.assertEqual(self.failing_friendship.suggested_friends_update_failure_count, 3)
+        retry_minutes = (self.failing_friendship.date_suggested_friends_update_retry - now()).total_seconds() / 60
+        self.assertAlmostEqual(retry_minutes, SUGGESTED_FRIENDS_UPDATE_RETRY_MINUTES * 4, delta=1)
+
+        CurrentFriend.objects.filter(id=self.failing_friendship.id).update(
+            suggested_friends_update_failure_count=SUGGESTED_FRIENDS_UPDATE_MAXIMUM_FAILURES - 1,
+            date_suggested_friends_update_retry=now() - timedelta(seconds=1))
+        results, updated_voter_we_vote_id_list = self.update_with_failing_voter('wv01voter3')
+        self.assertIn('SUGGESTED_FRIENDS_UPDATE_GIVEN_UP', results['status'])
+        self.failing_friendship.refresh_from_db()
+        self.assertFalse(self.failing_friendship.suggested_friends_update_needed)
+        self.assertIsNone(self.failing_friendship.date_suggested_friends_update_retry)
+
+    def test_untried_friendships_come_before_retries(self):
+        CurrentFriend.objects.filter(id=self.working_friendship.id).update(
+            suggested_friends_update_failure_count=1, date_suggested_friends_update_retry=now() - timedelta(seconds=1))
+        results, updated_voter_we_vote_id_list = self.update_with_failing_voter('', friendship_limit=1)
+        self.assertEqual(updated_voter_we_vote_id_list, ['wv01voter3', 'wv01voter4'])
+        self.assertEqual(list(CurrentFriend.objects.filter(suggested_friends_update_needed=True)
+                              .values_list('id', flat=True)), [self.working_friendship.id])
+
+
+class FriendGraphTestCase(SimpleTestCase):
+
+    def test_friend_lists_go_both_ways_once(self):
+        friend_graph = FriendGraph([
+            ('wv01voter1', 'wv01voter2'), ('wv01voter2', 'wv01voter1'), ('wv01voter1', 'wv01voter3'),
+            ('wv01voter3', 'wv01voter2'), ('wv01voter4', 'wv01voter4'), ('wv01voter4', None), ('', 'wv01voter5')])
+        self.assertEqual(friend_graph.voter_we_vote_id_list, ['wv01voter1', 'wv01voter2', 'wv01voter3'])
+        friend_we_vote_id_list_by_voter = {
+            voter_we_vote_id: [friend_graph.voter_we_vote_id_list[friend_index]
+                               for friend_index in friend_graph.friend_index_array(voter_index)]
+            for voter_index, voter_we_vote_id in enumerate(friend_graph.voter_we_vote_id_list)}
+        self.assertEqual(friend_we_vote_id_list_by_voter, {
+            'wv01voter1': ['wv01voter2', 'wv01voter3'],
+            'wv01voter2': ['wv01voter1', 'wv01voter3'],
+            'wv01voter3': ['wv01voter1', 'wv01voter2'],
+        })
+        self.assertEqual(friend_graph.mutual_friend_index_array('wv01voter1', 'wv01voter2').tolist(), [2])
+        self.assertEqual(friend_graph.mutual_friends_count(0, 1), 1)
+        self.assertEqual(len(friend_graph.mutual_friend_index_array('wv01voter1', 'wv01voter9')), 0)
+
+
+class MutualFriendsFromFriendGraphTestCase(TransactionTestCase):
+    # The friend graph is read from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        for voter_number, first_name in enumerate(['Ann', 'Bo', 'Cy', 'Di', 'Ed'], start=1):
+            Voter.objects.create(we_vote_id='wv01voter' + str(voter_number), first_name=first_name)
+        self.current_friend_dict = {}
+        for viewer_number, viewee_number in [(1, 2), (1, 3), (2, 3), (1, 4), (2, 4), (4, 5)]:
+            self.current_friend_dict[(viewer_number, viewee_number)] = CurrentFriend.objects.create(
+                viewer_voter_we_vote_id='wv01voter' + str(viewer_number),
+                viewee_voter_we_vote_id='wv01voter' + str(viewee_number))
+
+    @staticmethod
+    def mutual_friend_we_vote_id_list(viewer_voter_we_vote_id, viewee_voter_we_vote_id):
+        return sorted(MutualFriend.objects.filter(
+            viewer_voter_we_vote_id=viewer_voter_we_vote_id, viewee_voter_we_vote_id=viewee_voter_we_vote_id)
+            .values_list('mutual_friend_voter_we_vote_id', flat=True))
+
+    def test_mutual_friends_are_generated(self):
+        results = generate_mutual_friends_with_friend_graph()
+        self.assertTrue(results['success'])
+        self.assertEqual(self.mutual_friend_we_vote_id_list('wv01voter1', 'wv01voter2'), ['wv01voter3', 'wv01voter4'])
+        self.assertEqual(self.mutual_friend_we_vote_id_list('wv01voter4', 'wv01voter5'), [])
+
+        current_friend = CurrentFriend.objects.get(id=self.current_friend_dict[(1, 2)].id)
+        self.assertEqual(current_friend.mutual_friend_count, 2)
+        self.assertFalse(current_friend.mutual_friend_preview_list_update_needed)
+        # Cy and Di each share 2 friends with Ann and Bo, so by name
+        self.assertEqual([one_preview['friend_display_name'] for one_preview in
+                          json.loads(current_friend.mutual_friend_preview_list_serialized)], ['Cy', 'Di'])
+        mutual_friend = MutualFriend.objects.get(
+            viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter2',
+            mutual_friend_voter_we_vote_id='wv01voter4')
+        # Ann and Di share Bo, while Bo and Di share Ann
+        self.assertEqual(mutual_friend.viewer_to_mutual_friend_friend_count, 1)
+        self.assertEqual(mutual_friend.viewee_to_mutual_friend_friend_count, 1)
+
+        # Nothing changed, so nothing is rewritten
+        results = generate_mutual_friends_with_friend_graph()
+        self.assertEqual(results['mutual_friends_created_count'], 0)
+        self.assertEqual(results['pair_rows_updated_count'], 0)
+
+    def test_incremental_run_catches_new_and_deleted_friendships(self):
+        results = generate_mutual_friends_with_friend_graph(incremental=True)
+        self.assertIn('NO_PREVIOUS_MUTUAL_FRIENDS_RUN-GENERATING_ALL', results['status'])
+
+        # A deleted friendship leaves no date_last_changed behind, only a count that no longer matches
+        self.current_friend_dict[(2, 4)].delete()
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='wv01voter5', viewee_voter_we_vote_id='wv01voter1')
+        results = generate_mutual_friends_with_friend_graph(incremental=True)
+        self.assertTrue(results['success'])
+        self.assertNotIn('NO_PREVIOUS_MUTUAL_FRIENDS_RUN', results['status'])
+        self.assertEqual(self.mutual_friend_we_vote_id_list('wv01voter1', 'wv01voter2'), ['wv01voter3'])
+        self.assertEqual(CurrentFriend.objects.get(id=self.current_friend_dict[(1, 2)].id).mutual_friend_count, 1)
+        self.assertEqual(self.mutual_friend_we_vote_id_list('wv01voter4', 'wv01voter5'), ['wv01voter1'])
+        self.assertEqual(self.mutual_friend_we_vote_id_list('wv01voter5', 'wv01voter1'), ['wv01voter4'])
+
+        # The incremental run ends up where a full run would
+        results = generate_mutual_friends_with_friend_graph()
+        self.assertEqual(results['mutual_friends_created_count'], 0)
+        self.assertEqual(results['mutual_friends_deleted_count'], 0)
+        self.assertEqual(results['pair_rows_updated_count'], 0)
@@ -83,7 +83,12 @@ def generate_mutual_friends_for_all_voters_view(request):
     if not voter_has_authority(request, authority_required):
         return redirect_to_sign_in_page(request, authority_required)
 
-    results = generate_mutual_friends_for_all_voters()
+    incremental = positive_value_exists(request.GET.get('incremental', False))
+    update_existing_data = positive_value_exists(request.GET.get('update_existing_data', False))
+
+    results = generate_mutual_friends_for_all_voters(
+        incremental=incremental,
+        update_existing_data=update_existing_data)
     status += results['status']
     messages.add_message(request, messages.INFO, 'status: ' + str(status))
 
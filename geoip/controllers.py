@@ -2,75 +2,100 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import os
 import sys
+import threading
+import time
 from ipaddress import IPv4Address
 import geoip2.database
 import wevote_functions.admin
+from api_internal_cache.models import ApiInternalCacheLocalTier
 from config.base import get_environment_variable_default
 from wevote_functions.functions import get_ip_from_headers, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+GEOLITE2_DATABASE_LOCATION = \
+    get_environment_variable_default('GEOLITE2_DATABASE_LOCATION', 'geoip2/city-db/GeoLite2-City.mmdb')
+# How often each process checks whether the .mmdb file was replaced
+GEOIP_DATABASE_CHECK_INTERVAL_SECONDS = 60
+GEOIP_LOOKUP_CACHE_MAX_ENTRIES = int(get_environment_variable_default('GEOIP_LOOKUP_CACHE_MAX_ENTRIES', 50000))
+# Entries are dropped when the database is reopened, so they don't need to expire before that
+GEOIP_LOOKUP_CACHE_TTL_SECONDS = 86400
 
-def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
+# Locations by /24 prefix ('73.158.32'). GeoLite2 City doesn't locate addresses more finely than that, in practice.
+geoip_lookup_cache = ApiInternalCacheLocalTier(
+    max_entries=GEOIP_LOOKUP_CACHE_MAX_ENTRIES, ttl_seconds=GEOIP_LOOKUP_CACHE_TTL_SECONDS)
+
+
+class GeoIPCityReader(object):
     """
-    Used by the api voterLocationRetrieveFromIP
-    https://www.maxmind.com/en/geoip2-databases
-    https://geoip2.readthedocs.io/en/latest/#city-database
-    https://www.maxmind.com/en/geoip-demo
-    :param request:
-    :param ip_address:
-    :return:
+    The GeoLite2 City database, opened once per process. It is memory-mapped, so the processes on a server share
+    one copy of it in the page cache. When the .mmdb file is replaced on disk, the next lookup after
+    GEOIP_DATABASE_CHECK_INTERVAL_SECONDS opens the new one.
     """
-    x_forwarded_for = request.META.get('X-Forwarded-For')
-    http_x_forwarded_for = request.headers.get('x-forwarded-for')
 
-    valid_ip_address = None
-    value = ip_address
-
-    try:
-        valid_ip_address = IPv4Address(value)
-    except:
-        value = get_ip_from_headers(request)
-        try:
-            valid_ip_address = IPv4Address(value)
-        except:
-            # None of the IP addresses are valid
-            response_content = {
-                'success':              False,
-                'status':               'LOCATION_RETRIEVE_IP_ADDRESS_REQUEST_PARAMETER_MISSING',
-                'voter_location_found': False,
-                'voter_location':       '',
-                'city':                 '',
-                'region':               '',
-                'postal_code':          '',
-                'country_code':         '',
-                'ip_address':           value,
-                'x_forwarded_for':      x_forwarded_for,
-                'http_x_forwarded_for': http_x_forwarded_for,
-            }
-            return response_content
+    def __init__(self, database_location=GEOLITE2_DATABASE_LOCATION):
+        self.database_location = database_location
+        self.lock = threading.Lock()
+        self.reader = None
+        self.file_signature = None
+        self.date_checked = 0.0
+
+    def fetch_reader(self):
+        if self.reader is not None and \
+                time.monotonic() - self.date_checked < GEOIP_DATABASE_CHECK_INTERVAL_SECONDS:
+            return self.reader
+        with self.lock:
+            if self.reader is not None and \
+                    time.monotonic() - self.date_checked < GEOIP_DATABASE_CHECK_INTERVAL_SECONDS:
+                return self.reader
+            file_stat = os.stat(self.database_location)
+            file_signature = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+            if self.reader is None or file_signature != self.file_signature:
+                # Lookups already running on the old reader finish on it. Its memory map is closed once they are
+                #  done with it, and it is garbage collected.
+                self.reader = geoip2.database.Reader(self.database_location, mode=geoip2.database.MODE_MMAP)
+                if self.file_signature is not None:
+                    logger.info("GeoIP database reopened: " + self.database_location)
+                self.file_signature = file_signature
+                geoip_lookup_cache.clear()
+            self.date_checked = time.monotonic()
+            return self.reader
+
+
+geoip_city_reader = GeoIPCityReader()
+
+
+def retrieve_geoip_lookup_cache_counts():
+    return {
+        'entries':  len(geoip_lookup_cache.entries),
+        'hits':     geoip_lookup_cache.hits,
+        'misses':   geoip_lookup_cache.misses,
+    }
 
 
-    if valid_ip_address.is_private and 'test' not in sys.argv:
-        value = '73.158.32.221'
-        try:
-            if 'only_log_ip_substitution_once' not in sys.argv:
-                sys.argv.append('only_log_ip_substitution_once')
-                print("Detected a private IP address, so we are providing a valid Oakland IP address 73.158.32.221 for geolocation purposes...")
-        except Exception as e:
-            pass
+def retrieve_location_from_geoip_database(ip_address):
+    """
+    The location fields of voterLocationRetrieveFromIP for this IPv4 address, from geoip_lookup_cache when
+    another address in its /24 was looked up recently
+    :param ip_address:
+    :return:
+    """
+    # First, so a replaced database also clears the cached locations
+    reader = geoip_city_reader.fetch_reader()
+    ip_address_prefix = ip_address.rsplit('.', 1)[0]
+    location_results = geoip_lookup_cache.get(ip_address_prefix)
+    if location_results is not None:
+        return location_results
 
     try:
-        database_location = get_environment_variable_default('GEOLITE2_DATABASE_LOCATION', 'geoip2/city-db/GeoLite2-City.mmdb')
-        reader = geoip2.database.Reader(database_location)
-        response = reader.city(value)
-
+        response = reader.city(ip_address)
     except geoip2.errors.AddressNotFoundError as e:
         if 'test' not in sys.argv:
-            logger.error("voter_location_retrieve_from_ip_for_api ip " + value + " not found: " + str(e))
+            logger.error("voter_location_retrieve_from_ip_for_api ip " + ip_address + " not found: " + str(e))
 
-        response_content = {
+        location_results = {
             'success':              True,
             'status':               'LOCATION_NOT_FOUND',
             'voter_location_found': False,
@@ -79,12 +104,9 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
             'region':               '',
             'postal_code':          '',
             'country_code':         '',
-            'ip_address':           value,
-            'x_forwarded_for':      x_forwarded_for,
-            'http_x_forwarded_for': http_x_forwarded_for,
         }
-
-        return response_content
+        geoip_lookup_cache.set(ip_address_prefix, location_results)
+        return location_results
 
     voter_location = ''
     city = ''
@@ -117,11 +139,11 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
             voter_location_found = False
 
     except Exception as e:
-        logger.error("voter_location_retrieve_from_ip_for_api ip " + value + " parse error: " + str(e))
+        logger.error("voter_location_retrieve_from_ip_for_api ip " + ip_address + " parse error: " + str(e))
         status = str(e)
         success = False
 
-    response_content = {
+    location_results = {
         'success':              success,
         'status':               status,
         'voter_location_found': voter_location_found,
@@ -130,6 +152,72 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
         'region':               region,
         'postal_code':          postal_code,
         'country_code':         country_code,
+    }
+    if success:
+        geoip_lookup_cache.set(ip_address_prefix, location_results)
+    return location_results
+
+
+def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
+    """
+    Used by the api voterLocationRetrieveFromIP
+    https://www.maxmind.com/en/geoip2-databases
+    https://geoip2.readthedocs.io/en/latest/#city-database
+    https://www.maxmind.com/en/geoip-demo
+    :param request:
+    :param ip_address:
+    :return:
+    """
+    x_forwarded_for = request.META.get('X-Forwarded-For')
+    http_x_forwarded_for = request.headers.get('x-forwarded-for')
+
+    valid_ip_address = None
+    value = ip_address
+
+    try:
+        valid_ip_address = IPv4Address(value)
+    except:
+        value = get_ip_from_headers(request)
+        try:
+            valid_ip_address = IPv4Address(value)
+        except:
+            # None of the IP addresses are valid
+            response_content = {
+                'success':              False,
+                'status':               'LOCATION_RETRIEVE_IP_ADDRESS_REQUEST_PARAMETER_MISSING',
+                'voter_location_found': False,
+                'voter_location':       '',
+                'city':                 '',
+                'region':               '',
+                'postal_code':          '',
+                'country_code':         '',
+                'ip_address':           value,
+                'x_forwarded_for':      x_forwarded_for,
+                'http_x_forwarded_for': http_x_forwarded_for,
+            }
+            return response_content
+
+
+    if valid_ip_address.is_private and 'test' not in sys.argv:
+        value = '73.158.32.221'
+        try:
+            if 'only_log_ip_substitution_once' not in sys.argv:
+                sys.argv.append('only_log_ip_substitution_once')
+                print("Detected a private IP address, so we are providing a valid Oakland IP address 73.158.32.221 for geolocation purposes...")
+        except Exception as e:
+            pass
+
+    location_results = retrieve_location_from_geoip_database(value)
+
+    response_content = {
+        'success':              location_results['success'],
+        'status':               location_results['status'],
+        'voter_location_found': location_results['voter_location_found'],
+        'voter_location':       location_results['voter_location'],
+        'city':                 location_results['city'],
+        'region':               location_results['region'],
+        'postal_code':          location_results['postal_code'],
+        'country_code':         location_results['country_code'],
         'ip_address':           value,
         'x_forwarded_for':      x_forwarded_for,
         'http_x_forwarded_for': http_x_forwarded_for,
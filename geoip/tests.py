@@ -1,3 +1,89 @@
-from django.test import TestCase
+# geoip/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
 
-# Create your tests here.
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import geoip2.database
+import geoip2.errors
+from django.test import SimpleTestCase
+
+import geoip.controllers
+from geoip.controllers import GEOIP_DATABASE_CHECK_INTERVAL_SECONDS, GeoIPCityReader, geoip_lookup_cache, \
+    retrieve_location_from_geoip_database
+
+
+def generate_city_response(city_name, region, postal_code):
+    return SimpleNamespace(
+        city=SimpleNamespace(name=city_name),
+        subdivisions=SimpleNamespace(most_specific=SimpleNamespace(iso_code=region)),
+        postal=SimpleNamespace(code=postal_code),
+        country=SimpleNamespace(iso_code='US'))
+
+
+class GeoIPLookupTestCase(SimpleTestCase):
+
+    def setUp(self):
+        database_file = tempfile.NamedTemporaryFile(suffix='.mmdb', delete=False)
+        database_file.write(b'first')
+        database_file.close()
+        self.database_location = database_file.name
+        self.addCleanup(os.remove, self.database_location)
+
+        geoip_lookup_cache.clear()
+        self.addCleanup(geoip_lookup_cache.clear)
+        self.geoip_city_reader = GeoIPCityReader(database_location=self.database_location)
+        reader_patch = mock.patch.object(geoip2.database, 'Reader')
+        self.reader_class = reader_patch.start()
+        self.addCleanup(reader_patch.stop)
+        self.reader_class.return_value.city.return_value = generate_city_response('Oakland', 'CA', '94612')
+        city_reader_patch = mock.patch.object(geoip.controllers, 'geoip_city_reader', self.geoip_city_reader)
+        city_reader_patch.start()
+        self.addCleanup(city_reader_patch.stop)
+
+    def let_check_interval_pass(self):
+        self.geoip_city_reader.date_checked -= GEOIP_DATABASE_CHECK_INTERVAL_SECONDS + 1
+
+    def test_lookups_are_cached_by_24_prefix(self):
+        location_results = retrieve_location_from_geoip_database('73.158.32.221')
+        self.assertEqual(location_results['voter_location'], 'Oakland, CA 94612')
+        self.assertEqual(retrieve_location_from_geoip_database('73.158.32.7'), location_results)
+        self.assertEqual(self.reader_class.return_value.city.call_count, 1)
+
+        retrieve_location_from_geoip_database('73.158.33.221')
+        self.assertEqual(self.reader_class.return_value.city.call_count, 2)
+        # The database is opened once
+        self.assertEqual(self.reader_class.call_count, 1)
+
+    def test_address_not_found_is_cached(self):
+        self.reader_class.return_value.city.side_effect = geoip2.errors.AddressNotFoundError("not in database")
+        self.assertEqual(retrieve_location_from_geoip_database('10.1.2.3')['status'], 'LOCATION_NOT_FOUND')
+        self.assertEqual(retrieve_location_from_geoip_database('10.1.2.4')['status'], 'LOCATION_NOT_FOUND')
+        self.assertEqual(self.reader_class.return_value.city.call_count, 1)
+
+    def test_replaced_database_is_reopened(self):
+        retrieve_location_from_geoip_database('73.158.32.221')
+        self.let_check_interval_pass()
+        # The same file is kept open, and its lookups stay cached
+        retrieve_location_from_geoip_database('73.158.32.221')
+        self.assertEqual(self.reader_class.call_count, 1)
+        self.assertEqual(self.reader_class.return_value.city.call_count, 1)
+
+        # A new database moved over the old one
+        new_database_location = self.database_location + '.new'
+        with open(new_database_location, 'wb') as new_database_file:
+            new_database_file.write(b'second, with new locations')
+        os.replace(new_database_location, self.database_location)
+        self.reader_class.return_value.city.return_value = generate_city_response('Berkeley', 'CA', '94704')
+
+        # Not until the check interval has passed
+        self.assertEqual(
+            retrieve_location_from_geoip_database('73.158.32.221')['voter_location'], 'Oakland, CA 94612')
+        self.let_check_interval_pass()
+        self.assertEqual(
+            retrieve_location_from_geoip_database('73.158.32.221')['voter_location'], 'Berkeley, CA 94704')
+        self.assertEqual(self.reader_class.call_count, 2)
+        self.reader_class.assert_called_with(self.database_location, mode=geoip2.database.MODE_MMAP)
@@ -0,0 +1,222 @@
+# googlebot_site_map/controllers.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import calendar
+import gzip
+import hashlib
+import zlib
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.db.models import Max, Q
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.timezone import now
+
+import wevote_functions.admin
+from googlebot_site_map import supplemental_urls
+from googlebot_site_map.models import GooglebotSiteMapFile
+from politician.models import Politician
+from wevote_functions.functions_date import DATE_FORMAT_YMD
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+GOOGLEBOT_SITE_MAP_HTTPS_ROOT = "https://wevote.us/"
+GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME = 'sitemap_index.xml'
+# Each mapN file lists the politicians with ids from N * GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP up to (not including)
+#  (N + 1) * GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP
+GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP = 40000
+GOOGLEBOT_SITE_MAP_STREAMING_CHUNK_SIZE = 64 * 1024
+# Before the files are first generated
+GOOGLEBOT_SITE_MAP_RETRY_AFTER_SECONDS = 3600
+# process_next_general_maintenance renders the files again once they are this old
+GOOGLEBOT_SITE_MAP_GENERATE_INTERVAL_HOURS = 24
+
+
+def save_googlebot_site_map_file(file_name, content, content_type, date_generated):
+    """
+    Stores the file gzip-compressed. date_last_modified (and so the Last-Modified header) only changes when the
+    content does.
+    :return: The file's date_last_modified
+    """
+    content_bytes = content.encode('utf-8')
+    etag = hashlib.md5(content_bytes).hexdigest()
+    site_map_file = GooglebotSiteMapFile.objects.filter(file_name=file_name)\
+        .only('id', 'etag', 'date_last_modified').first()
+    if site_map_file is not None and site_map_file.etag == etag:
+        GooglebotSiteMapFile.objects.filter(id=site_map_file.id).update(date_generated=date_generated)
+        return site_map_file.date_last_modified
+
+    GooglebotSiteMapFile.objects.update_or_create(
+        file_name=file_name,
+        defaults={
+            'content_type':         content_type,
+            'content_gzip':         gzip.compress(content_bytes, mtime=0),
+            'content_length':       len(content_bytes),
+            'etag':                 etag,
+            'date_last_modified':   date_generated,
+            'date_generated':       date_generated,
+        })
+    return date_generated
+
+
+def generate_googlebot_site_map_files():
+    """
+    Renders sitemap_index.xml and every mapN.xml and mapN.html, from each politician's seo_friendly_path and
+    date_last_updated only. Run by process_next_general_maintenance when is_googlebot_site_map_generation_due, and
+    by "python manage.py generate_googlebot_site_maps".
+    :return:
+    """
+    status = ""
+    success = True
+    site_map_count = 0
+    date_generated = now()
+    try:
+        max_politician_id = Politician.objects.using('readonly').aggregate(Max('id'))['id__max'] or 0
+        site_map_count = max_politician_id // GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP + 1
+        site_map_date_last_modified_list = []
+        for site_map_number in range(site_map_count):
+            xml_part_list = [
+                '<?xml version="1.0" encoding="UTF-8"?>\n',
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n',
+            ]
+            html_part_list = ['<html><body>']
+            if site_map_number == 0:
+                for loc in supplemental_urls.crawlable_urls:
+                    # We don't know when these pages last changed, and <lastmod> is optional
+                    xml_part_list.append('  <url>\n    <loc>' + escape(loc) + '</loc>\n  </url>\n')
+                    html_part_list.append(loc + '<br>')
+
+            queryset = Politician.objects.using('readonly')\
+                .filter(id__gte=site_map_number * GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP,
+                        id__lt=(site_map_number + 1) * GOOGLEBOT_SITE_MAP_POLITICIANS_PER_MAP)\
+                .exclude(Q(seo_friendly_path__isnull=True) | Q(seo_friendly_path=''))\
+                .order_by('id')\
+                .values_list('seo_friendly_path', 'date_last_updated')
+            for seo_friendly_path, date_last_updated in queryset.iterator(chunk_size=2000):
+                loc = GOOGLEBOT_SITE_MAP_HTTPS_ROOT + seo_friendly_path + '/-/'
+                xml_part_list.append('  <url>\n    <loc>' + escape(loc) + '</loc>\n')
+                if date_last_updated:
+                    xml_part_list.append('    <lastmod>' + date_last_updated.strftime(DATE_FORMAT_YMD) + '</lastmod>\n')
+                xml_part_list.append('  </url>\n')
+                html_part_list.append(loc + '<br>')
+            xml_part_list.append('</urlset>')
+            html_part_list.append('</html></body><br>')
+
+            site_map_date_last_modified_list.append(save_googlebot_site_map_file(
+                'map' + str(site_map_number) + '.xml', ''.join(xml_part_list), 'application/xml', date_generated))
+            save_googlebot_site_map_file(
+                'map' + str(site_map_number) + '.html', ''.join(html_part_list), 'text/html', date_generated)
+
+        index_part_list = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n',
+            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n',
+        ]
+        for site_map_number, date_last_modified in enumerate(site_map_date_last_modified_list):
+            index_part_list.append(
+                '  <sitemap>\n'
+                '    <loc>' + GOOGLEBOT_SITE_MAP_HTTPS_ROOT + 'map' + str(site_map_number) + '.xml</loc>\n'
+                '    <lastmod>' + date_last_modified.strftime(DATE_FORMAT_YMD) + '</lastmod>\n'
+                '  </sitemap>\n')
+        index_part_list.append('</sitemapindex>')
+        save_googlebot_site_map_file(
+            GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, ''.join(index_part_list), 'application/xml', date_generated)
+
+        # Maps left over from when there were more politician ids. Go by name rather than date_generated, so an
+        #  overlapping run can't delete the files this run just saved, or the other way around.
+        file_name_list = [GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME]
+        for site_map_number in range(site_map_count):
+            file_name_list += ['map' + str(site_map_number) + '.xml', 'map' + str(site_map_number) + '.html']
+        GooglebotSiteMapFile.objects.exclude(file_name__in=file_name_list).delete()
+        status += "GOOGLEBOT_SITE_MAPS_GENERATED: " + str(site_map_count) + " "
+    except Exception as e:
+        success = False
+        status += "GOOGLEBOT_SITE_MAPS_NOT_GENERATED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':          success,
+        'status':           status,
+        'site_map_count':   site_map_count,
+    }
+    return results
+
+
+def is_googlebot_site_map_generation_due():
+    """
+    True before the files are first generated, and once the last generation is
+    GOOGLEBOT_SITE_MAP_GENERATE_INTERVAL_HOURS old
+    """
+    date_generated = GooglebotSiteMapFile.objects.aggregate(Max('date_generated'))['date_generated__max']
+    return date_generated is None or \
+        date_generated < now() - timedelta(hours=GOOGLEBOT_SITE_MAP_GENERATE_INTERVAL_HOURS)
+
+
+def stream_googlebot_site_map_content(content_gzip, decompress=False):
+    if not decompress:
+        for start in range(0, len(content_gzip), GOOGLEBOT_SITE_MAP_STREAMING_CHUNK_SIZE):
+            yield content_gzip[start:start + GOOGLEBOT_SITE_MAP_STREAMING_CHUNK_SIZE]
+        return
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)  # gzip header
+    for start in range(0, len(content_gzip), GOOGLEBOT_SITE_MAP_STREAMING_CHUNK_SIZE):
+        yield decompressor.decompress(content_gzip[start:start + GOOGLEBOT_SITE_MAP_STREAMING_CHUNK_SIZE])
+    yield decompressor.flush()
+
+
+def retrieve_googlebot_site_map_file(file_name):
+    """
+    From readonly, and from the primary database if the file isn't on readonly, since a file saved by
+    generate_googlebot_site_maps may not have replicated yet.
+    :return: (database alias, GooglebotSiteMapFile without content_gzip) or (None, None)
+    """
+    for database_alias in ('readonly', 'default'):
+        site_map_file = GooglebotSiteMapFile.objects.using(database_alias).filter(file_name=file_name)\
+            .only('id', 'content_type', 'content_length', 'etag', 'date_last_modified').first()
+        if site_map_file is not None:
+            return database_alias, site_map_file
+    return None, None
+
+
+def googlebot_site_map_file_response(request, file_name):
+    """
+    Serves a pre-rendered sitemap file. Answers 304 Not Modified to If-None-Match and If-Modified-Since, and sends
+    the stored gzip as it is to clients which accept it. Files are only rendered by process_next_general_maintenance
+    (or generate_googlebot_site_maps), never on the request path: until they are first rendered we answer 503, so
+    crawlers come back later.
+    """
+    database_alias, site_map_file = retrieve_googlebot_site_map_file(file_name)
+    if site_map_file is None:
+        if not GooglebotSiteMapFile.objects.using('readonly').exists():
+            response = HttpResponse("Site maps are being generated", status=503, content_type='text/plain')
+            response['Retry-After'] = str(GOOGLEBOT_SITE_MAP_RETRY_AFTER_SECONDS)
+            return response
+        return HttpResponseNotFound()
+
+    etag = '"' + site_map_file.etag + '"'
+    last_modified = calendar.timegm(site_map_file.date_last_modified.utctimetuple())
+    not_modified_response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified_response is None:
+        content_gzip = GooglebotSiteMapFile.objects.using(database_alias)\
+            .filter(id=site_map_file.id).values_list('content_gzip', flat=True).first()
+        if content_gzip is None:
+            # Removed by generate_googlebot_site_maps since we looked it up
+            return HttpResponseNotFound()
+        content_gzip = bytes(content_gzip)
+        if 'gzip' in request.headers.get('accept-encoding', ''):
+            response = StreamingHttpResponse(
+                stream_googlebot_site_map_content(content_gzip), content_type=site_map_file.content_type)
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = len(content_gzip)
+        else:
+            response = StreamingHttpResponse(
+                stream_googlebot_site_map_content(content_gzip, decompress=True),
+                content_type=site_map_file.content_type)
+            response['Content-Length'] = site_map_file.content_length
+    else:
+        response = not_modified_response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,266 @@
+# googlebot_site_map/controllers_request_log.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import atexit
+import ipaddress
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+import wevote_functions.admin
+from api_internal_cache.models import ApiInternalCacheLocalTier
+from config.base import get_environment_variable_default
+from googlebot_site_map.models import GooglebotRequest
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# log_request puts each sitemap request in an in-process buffer. A writer thread checks who sent them with
+#  forward-confirmed reverse DNS, and saves them with one bulk_create every GOOGLEBOT_REQUEST_LOG_FLUSH_SIZE requests
+#  or GOOGLEBOT_REQUEST_LOG_FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+GOOGLEBOT_REQUEST_LOG_BUFFER_ON = \
+    str(get_environment_variable_default('GOOGLEBOT_REQUEST_LOG_BUFFER_ON', True)).lower() == 'true'
+GOOGLEBOT_REQUEST_LOG_FLUSH_SIZE = 100
+GOOGLEBOT_REQUEST_LOG_FLUSH_INTERVAL_MS = 5000
+# If the database is unreachable for a while, we stop logging rather than keep every request in memory
+GOOGLEBOT_REQUEST_LOG_MAX_BUFFERED = 10000
+# How long one flush waits for the reverse DNS lookups of its requests. Lookups which take longer are saved with
+#  is_from_google False, and keep running so their answer is cached for the next request from that address.
+GOOGLEBOT_REVERSE_DNS_TIMEOUT_SECONDS = 2.0
+GOOGLEBOT_REVERSE_DNS_RESOLVER_COUNT = 4
+GOOGLEBOT_REVERSE_DNS_CACHE_MAX_ENTRIES = 10000
+GOOGLEBOT_REVERSE_DNS_CACHE_TTL_SECONDS = 86400
+# Addresses with no PTR record, or a resolver error, are tried again sooner
+GOOGLEBOT_REVERSE_DNS_FAILED_CACHE_TTL_SECONDS = 300
+# https://developers.google.com/search/docs/crawling-indexing/verifying-googlebot
+GOOGLE_CRAWLER_DOMAIN_LIST = ['googlebot.com', 'google.com', 'googleusercontent.com']
+
+# Reverse DNS results by IP address
+googlebot_reverse_dns_cache = ApiInternalCacheLocalTier(
+    max_entries=GOOGLEBOT_REVERSE_DNS_CACHE_MAX_ENTRIES, ttl_seconds=GOOGLEBOT_REVERSE_DNS_CACHE_TTL_SECONDS)
+googlebot_reverse_dns_failed_cache = ApiInternalCacheLocalTier(
+    max_entries=GOOGLEBOT_REVERSE_DNS_CACHE_MAX_ENTRIES, ttl_seconds=GOOGLEBOT_REVERSE_DNS_FAILED_CACHE_TTL_SECONDS)
+
+
+def retrieve_googlebot_reverse_dns_cache_counts():
+    return {
+        'entries':  len(googlebot_reverse_dns_cache.entries) + len(googlebot_reverse_dns_failed_cache.entries),
+        'hits':     googlebot_reverse_dns_cache.hits + googlebot_reverse_dns_failed_cache.hits,
+        'misses':   googlebot_reverse_dns_failed_cache.misses,
+    }
+
+
+def is_google_crawler_host(host):
+    host = host.lower().rstrip('.')
+    return any(host == domain or host.endswith('.' + domain) for domain in GOOGLE_CRAWLER_DOMAIN_LIST)
+
+
+def lookup_forward_confirmed_reverse_dns(ip):
+    """
+    The host name in ip's PTR record, confirmed by that host name resolving back to ip. Anyone can put
+    "crawl.googlebot.com" in the PTR record of their own address, but only Google can make it resolve to that address.
+    Blocks for as long as the system resolver takes, so it runs on the resolver threads.
+    :param ip:
+    :return:
+    """
+    status = ""
+    remote_dns = ''
+    is_forward_confirmed = False
+    try:
+        remote_dns, _, _ = socket.gethostbyaddr(ip)
+        address_info_list = socket.getaddrinfo(remote_dns, None, proto=socket.IPPROTO_TCP)
+        ip_address = ipaddress.ip_address(ip)
+        is_forward_confirmed = any(ipaddress.ip_address(address_info[4][0]) == ip_address
+                                   for address_info in address_info_list)
+        status += "REVERSE_DNS_FORWARD_CONFIRMED " if is_forward_confirmed else "REVERSE_DNS_NOT_FORWARD_CONFIRMED "
+        success = True
+    except (OSError, UnicodeError, ValueError) as e:
+        status += "REVERSE_DNS_NOT_FOUND: " + str(e) + " "
+        success = False
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'remote_dns':           remote_dns,
+        'is_forward_confirmed': is_forward_confirmed,
+        'is_from_google':       is_forward_confirmed and is_google_crawler_host(remote_dns),
+    }
+    if success:
+        googlebot_reverse_dns_cache.set(ip, results)
+    else:
+        googlebot_reverse_dns_failed_cache.set(ip, results)
+    return results
+
+
+def retrieve_cached_googlebot_reverse_dns(ip):
+    results = googlebot_reverse_dns_cache.get(ip)
+    if results is None:
+        results = googlebot_reverse_dns_failed_cache.get(ip)
+    return results
+
+
+def is_resolvable_ip(ip):
+    # get_ip_from_headers can return whatever a client put in X-Forwarded-For
+    try:
+        ip_address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return not (ip_address.is_loopback or ip_address.is_private or ip_address.is_unspecified)
+
+
+def generate_googlebot_request(request_dict, reverse_dns_results):
+    """
+    :param request_dict: From buffer_googlebot_request
+    :param reverse_dns_results: From lookup_forward_confirmed_reverse_dns, or None if there is no answer (yet)
+    :return:
+    """
+    ip = request_dict['remote_address']
+    if ip in ('127.0.0.1', '::1'):
+        remote_dns = 'localhost'
+        is_from_google = False
+    elif reverse_dns_results is None:
+        remote_dns = ''
+        is_from_google = False
+    else:
+        remote_dns = reverse_dns_results['remote_dns']
+        is_from_google = reverse_dns_results['is_from_google']
+    return GooglebotRequest(
+        date_requested=request_dict['date_requested'],
+        request_url_type=request_dict['request_url_type'],
+        remote_address=ip,
+        remote_dns=remote_dns,
+        is_from_google=is_from_google,
+        user_agent=request_dict['user_agent'],
+    )
+
+
+class GooglebotRequestLogBuffer(object):
+    """
+    One per process. Requests are only held in memory, so the ones buffered when a process is killed aren't logged.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # The writer thread and atexit can both flush
+        self.flush_lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.request_list = []
+        self.dropped_count = 0
+        self.resolver_executor = ThreadPoolExecutor(
+            max_workers=GOOGLEBOT_REVERSE_DNS_RESOLVER_COUNT, thread_name_prefix='googlebot_reverse_dns')
+        # Lookups still running, by ip, so a slow address isn't looked up again by every flush while we wait
+        self.lookup_future_by_ip = {}
+        self.writer_thread = threading.Thread(target=self.run_writer, name='GooglebotRequestLogWriter', daemon=True)
+        self.writer_thread.start()
+        atexit.register(self.flush, reverse_dns_timeout_seconds=0)
+
+    def append(self, request_dict):
+        with self.lock:
+            if len(self.request_list) >= GOOGLEBOT_REQUEST_LOG_MAX_BUFFERED:
+                self.dropped_count += 1
+                return
+            self.request_list.append(request_dict)
+            if len(self.request_list) >= GOOGLEBOT_REQUEST_LOG_FLUSH_SIZE:
+                self.flush_requested.set()
+
+    def retrieve_reverse_dns_by_ip(self, ip_list, reverse_dns_timeout_seconds):
+        reverse_dns_by_ip = {}
+        for ip in ip_list:
+            cached_results = retrieve_cached_googlebot_reverse_dns(ip)
+            if cached_results is not None:
+                reverse_dns_by_ip[ip] = cached_results
+            elif ip not in self.lookup_future_by_ip:
+                self.lookup_future_by_ip[ip] = self.resolver_executor.submit(lookup_forward_confirmed_reverse_dns, ip)
+
+        if self.lookup_future_by_ip:
+            wait(list(self.lookup_future_by_ip.values()), timeout=reverse_dns_timeout_seconds)
+        for ip, future in list(self.lookup_future_by_ip.items()):
+            if not future.done():
+                continue
+            del self.lookup_future_by_ip[ip]
+            try:
+                reverse_dns_by_ip[ip] = future.result()
+            except Exception as e:
+                logger.error("GooglebotRequestLogBuffer reverse DNS of " + ip + " failed: " + str(e))
+        return reverse_dns_by_ip
+
+    def flush(self, reverse_dns_timeout_seconds=GOOGLEBOT_REVERSE_DNS_TIMEOUT_SECONDS):
+        with self.lock:
+            request_list = self.request_list
+            self.request_list = []
+            dropped_count = self.dropped_count
+            self.dropped_count = 0
+        if dropped_count:
+            logger.error("GooglebotRequestLogBuffer dropped " + str(dropped_count) + " requests, buffer was full")
+        if not request_list:
+            return 0
+
+        with self.flush_lock:
+            return self.save_request_list(request_list, reverse_dns_timeout_seconds)
+
+    def save_request_list(self, request_list, reverse_dns_timeout_seconds):
+        ip_list = list({request_dict['remote_address'] for request_dict in request_list
+                        if is_resolvable_ip(request_dict['remote_address'])})
+        reverse_dns_by_ip = self.retrieve_reverse_dns_by_ip(ip_list, reverse_dns_timeout_seconds)
+        googlebot_request_list = [
+            generate_googlebot_request(request_dict, reverse_dns_by_ip.get(request_dict['remote_address']))
+            for request_dict in request_list]
+        try:
+            GooglebotRequest.objects.bulk_create(googlebot_request_list)
+        except Exception as e:
+            logger.error("GooglebotRequestLogBuffer flush of " + str(len(googlebot_request_list)) +
+                         " requests failed: " + str(e))
+        return len(googlebot_request_list)
+
+    def run_writer(self):
+        while True:
+            self.flush_requested.wait(GOOGLEBOT_REQUEST_LOG_FLUSH_INTERVAL_MS / 1000)
+            self.flush_requested.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("GooglebotRequestLogBuffer writer: " + str(e))
+
+
+googlebot_request_log_buffer = None
+googlebot_request_log_buffer_lock = threading.Lock()
+
+
+def fetch_googlebot_request_log_buffer():
+    """
+    The buffer for this process, started on first use. A forked child (a new gunicorn worker) gets its own buffer,
+    writer thread and resolver threads rather than the parent's.
+    """
+    global googlebot_request_log_buffer
+    with googlebot_request_log_buffer_lock:
+        if googlebot_request_log_buffer is None or googlebot_request_log_buffer.pid != os.getpid():
+            googlebot_request_log_buffer = GooglebotRequestLogBuffer()
+        return googlebot_request_log_buffer
+
+
+def buffer_googlebot_request(remote_address='', request_url_type='', user_agent=''):
+    """
+    Queue one GooglebotRequest to be verified and saved by the writer thread. date_requested is set now.
+    """
+    request_dict = {
+        'date_requested':   now(),
+        'request_url_type': request_url_type,
+        'remote_address':   remote_address,
+        'user_agent':       user_agent,
+    }
+    if GOOGLEBOT_REQUEST_LOG_BUFFER_ON:
+        fetch_googlebot_request_log_buffer().append(request_dict)
+        return
+
+    # Saved on the request path, with no timeout on the lookup
+    reverse_dns_results = None
+    if is_resolvable_ip(remote_address):
+        reverse_dns_results = retrieve_cached_googlebot_reverse_dns(remote_address) or \
+            lookup_forward_confirmed_reverse_dns(remote_address)
+    generate_googlebot_request(request_dict, reverse_dns_results).save()
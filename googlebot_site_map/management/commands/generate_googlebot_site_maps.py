@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from googlebot_site_map.controllers import generate_googlebot_site_map_files
+
+# Renders the files served at /apis/v1/googlebotSiteMap/ into GooglebotSiteMapFile:
+#      python manage.py generate_googlebot_site_maps
+# process_next_general_maintenance already renders them once a day, so crawler requests never have to read the
+#  politician table. Run this to render them again right away.
+
+
+class Command(BaseCommand):
+    help = 'Render sitemap_index.xml and the mapN.xml and mapN.html files for googlebotSiteMap'
+
+    def handle(self, *args, **options):
+        results = generate_googlebot_site_map_files()
+        if results['success']:
+            self.stdout.write(results['status'])
+        else:
+            self.stderr.write(results['status'])
@@ -3,11 +3,13 @@
 # -*- coding: UTF-8 -*-
 
 from django.db import models
+from django.utils.timezone import now
 
 
 class GooglebotRequest(models.Model):
     objects = None
-    date_requested = models.DateTimeField(verbose_name='date requested', null=False, auto_now_add=True)
+    # Set by buffer_googlebot_request when the request comes in, not when the writer thread saves it
+    date_requested = models.DateTimeField(verbose_name='date requested', null=False, default=now)
     request_url_type = models.CharField(
         verbose_name="Request URL end string", max_length=255, null=True, blank=True)
     is_from_google = models.BooleanField(default=False, verbose_name='is remote address registered as Google\'s')
@@ -16,3 +18,17 @@ class GooglebotRequest(models.Model):
     remote_dns = models.CharField(
         verbose_name="Remote reverse DNS", max_length=255, null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
+
+
+class GooglebotSiteMapFile(models.Model):
+    """
+    A sitemap file served at /apis/v1/googlebotSiteMap/, rendered ahead of time by generate_googlebot_site_map_files
+    """
+    file_name = models.CharField(max_length=255, unique=True)  # 'sitemap_index.xml', 'map0.xml', 'map0.html'
+    content_type = models.CharField(max_length=255, default='application/xml')
+    content_gzip = models.BinaryField()
+    content_length = models.PositiveIntegerField(default=0)  # Before compression
+    etag = models.CharField(max_length=64)
+    # When the content last changed, not when it was last rendered
+    date_last_modified = models.DateTimeField(null=True)
+    date_generated = models.DateTimeField(null=True)
@@ -0,0 +1,277 @@
+# googlebot_site_map/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import gzip
+import socket
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.utils.http import http_date
+from django.utils.timezone import now
+
+import googlebot_site_map.controllers_request_log
+
+from googlebot_site_map.controllers import GOOGLEBOT_SITE_MAP_GENERATE_INTERVAL_HOURS, \
+    GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, generate_googlebot_site_map_files, googlebot_site_map_file_response, \
+    is_googlebot_site_map_generation_due
+from googlebot_site_map.controllers_request_log import GooglebotRequestLogBuffer, googlebot_reverse_dns_cache, \
+    googlebot_reverse_dns_failed_cache, is_google_crawler_host, lookup_forward_confirmed_reverse_dns, \
+    retrieve_cached_googlebot_reverse_dns
+from googlebot_site_map.models import GooglebotRequest, GooglebotSiteMapFile
+from politician.models import Politician
+
+
+def read_response_content(response):
+    return b''.join(response.streaming_content)
+
+
+class GooglebotSiteMapFileTestCase(TransactionTestCase):
+    # The files are served from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        Politician.objects.create(
+            we_vote_id='wv01pol1', politician_name="Kamala Harris", seo_friendly_path='kamala-harris-politician')
+        Politician.objects.create(we_vote_id='wv01pol2', politician_name="No Path")
+        self.request_factory = RequestFactory()
+
+    def get(self, file_name, **headers):
+        return googlebot_site_map_file_response(self.request_factory.get('/', headers=headers), file_name)
+
+    def test_site_maps_are_unavailable_until_generated(self):
+        self.assertTrue(is_googlebot_site_map_generation_due())
+        response = self.get(GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+        results = generate_googlebot_site_map_files()
+        self.assertTrue(results['success'])
+        self.assertEqual(results['site_map_count'], 1)
+        self.assertFalse(is_googlebot_site_map_generation_due())
+        self.assertEqual(self.get('map7.xml').status_code, 404)
+
+        GooglebotSiteMapFile.objects.update(
+            date_generated=GooglebotSiteMapFile.objects.first().date_generated
+            - timedelta(hours=GOOGLEBOT_SITE_MAP_GENERATE_INTERVAL_HOURS + 1))
+        self.assertTrue(is_googlebot_site_map_generation_due())
+
+    def test_site_maps_are_rendered(self):
+        generate_googlebot_site_map_files()
+        self.assertCountEqual(GooglebotSiteMapFile.objects.values_list('file_name', flat=True),
+                              [GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, 'map0.xml', 'map0.html'])
+
+        index_content = read_response_content(self.get(GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME)).decode('utf-8')
+        self.assertIn('<loc>https://wevote.us/map0.xml</loc>', index_content)
+        response = self.get('map0.xml')
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        xml_content = read_response_content(response).decode('utf-8')
+        self.assertIn('<loc>https://wevote.us/kamala-harris-politician/-/</loc>', xml_content)
+        self.assertIn('<lastmod>', xml_content)
+        self.assertEqual(xml_content.count('-politician/-/'), 1)
+        html_content = read_response_content(self.get('map0.html')).decode('utf-8')
+        self.assertIn('https://wevote.us/kamala-harris-politician/-/<br>', html_content)
+
+    def test_last_modified_only_changes_with_the_content(self):
+        generate_googlebot_site_map_files()
+        site_map_file = GooglebotSiteMapFile.objects.get(file_name='map0.xml')
+        generate_googlebot_site_map_files()
+        self.assertEqual(GooglebotSiteMapFile.objects.get(file_name='map0.xml').date_last_modified,
+                         site_map_file.date_last_modified)
+
+        Politician.objects.filter(we_vote_id='wv01pol2').update(seo_friendly_path='no-path-politician')
+        generate_googlebot_site_map_files()
+        changed_site_map_file = GooglebotSiteMapFile.objects.get(file_name='map0.xml')
+        self.assertNotEqual(changed_site_map_file.etag, site_map_file.etag)
+        self.assertGreater(changed_site_map_file.date_last_modified, site_map_file.date_last_modified)
+
+    def test_not_modified(self):
+        generate_googlebot_site_map_files()
+        response = self.get('map0.xml')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.get('map0.xml', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get('map0.xml', if_modified_since=last_modified).status_code, 304)
+
+        self.assertEqual(self.get('map0.xml', if_none_match='"stale"').status_code, 200)
+        site_map_file = GooglebotSiteMapFile.objects.get(file_name='map0.xml')
+        earlier_date = http_date(site_map_file.date_last_modified.timestamp() - 60)
+        self.assertEqual(self.get('map0.xml', if_modified_since=earlier_date).status_code, 200)
+
+    def test_gzip_and_identity_responses(self):
+        generate_googlebot_site_map_files()
+        site_map_file = GooglebotSiteMapFile.objects.get(file_name='map0.xml')
+
+        response = self.get('map0.xml', accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        gzip_content = read_response_content(response)
+        self.assertEqual(int(response['Content-Length']), len(gzip_content))
+        content = gzip.decompress(gzip_content)
+
+        response = self.get('map0.xml')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(read_response_content(response), content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        self.assertEqual(len(content), site_map_file.content_length)
+
+
+def generate_address_info_list(ip_list):
+    return [(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (ip, 0))
+            for ip in ip_list]
+
+
+class ForwardConfirmedReverseDNSTestCase(SimpleTestCase):
+
+    def setUp(self):
+        for reverse_dns_cache in [googlebot_reverse_dns_cache, googlebot_reverse_dns_failed_cache]:
+            reverse_dns_cache.clear()
+            self.addCleanup(reverse_dns_cache.clear)
+
+    def lookup(self, ip, remote_dns, forward_ip_list):
+        with mock.patch.object(socket, 'gethostbyaddr', return_value=(remote_dns, [], [ip])) as gethostbyaddr, \
+                mock.patch.object(socket, 'getaddrinfo',
+                                  return_value=generate_address_info_list(forward_ip_list)) as getaddrinfo:
+            results = lookup_forward_confirmed_reverse_dns(ip)
+        self.assertEqual(gethostbyaddr.call_args, mock.call(ip))
+        self.assertEqual(getaddrinfo.call_args.args[0], remote_dns)
+        return results
+
+    def test_googlebot_is_forward_confirmed(self):
+        results = self.lookup('66.249.66.1', 'crawl-66-249-66-1.googlebot.com', ['66.249.66.1'])
+        self.assertTrue(results['is_forward_confirmed'])
+        self.assertTrue(results['is_from_google'])
+        self.assertEqual(retrieve_cached_googlebot_reverse_dns('66.249.66.1'), results)
+
+        # The same address, written differently
+        results = self.lookup('2001:4860:4801:10::1', 'crawl.googlebot.com.', ['2001:4860:4801:0010:0:0:0:1'])
+        self.assertTrue(results['is_from_google'])
+
+    def test_spoofed_reverse_dns_is_not_google(self):
+        # Anyone can put a Google host name in the PTR record of their own address
+        results = self.lookup('203.0.113.7', 'crawl-66-249-66-1.googlebot.com', ['66.249.66.1'])
+        self.assertTrue(results['success'])
+        self.assertFalse(results['is_forward_confirmed'])
+        self.assertFalse(results['is_from_google'])
+
+        results = self.lookup('203.0.113.8', 'crawl.googlebot.com.example.net', ['203.0.113.8'])
+        self.assertTrue(results['is_forward_confirmed'])
+        self.assertFalse(results['is_from_google'])
+        self.assertFalse(is_google_crawler_host('notgooglebot.com'))
+        self.assertTrue(is_google_crawler_host('rate-limited-proxy-66-249-90-77.google.com'))
+
+    def test_failed_lookup_is_cached_separately(self):
+        with mock.patch.object(socket, 'gethostbyaddr', side_effect=socket.herror(1, "Unknown host")):
+            results = lookup_forward_confirmed_reverse_dns('203.0.113.9')
+        self.assertFalse(results['success'])
+        self.assertFalse(results['is_from_google'])
+        self.assertIsNone(googlebot_reverse_dns_cache.get('203.0.113.9'))
+        self.assertEqual(retrieve_cached_googlebot_reverse_dns('203.0.113.9'), results)
+
+
+class GooglebotRequestLogBufferTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        module = googlebot_site_map.controllers_request_log
+        for reverse_dns_cache in [googlebot_reverse_dns_cache, googlebot_reverse_dns_failed_cache]:
+            reverse_dns_cache.clear()
+            self.addCleanup(reverse_dns_cache.clear)
+        atexit_patch = mock.patch.object(module.atexit, 'register')
+        atexit_patch.start()
+        self.addCleanup(atexit_patch.stop)
+        self.lookup_ip_list = []
+        self.lookup_released = threading.Event()
+        self.lookup_released.set()
+        lookup_patch = mock.patch.object(
+            module, 'lookup_forward_confirmed_reverse_dns', side_effect=self.lookup_forward_confirmed_reverse_dns)
+        lookup_patch.start()
+        self.addCleanup(lookup_patch.stop)
+
+    def lookup_forward_confirmed_reverse_dns(self, ip):
+        self.lookup_ip_list.append(ip)
+        self.lookup_released.wait(5)
+        return {
+            'success':              True,
+            'status':               "",
+            'remote_dns':           'crawl.googlebot.com' if ip.startswith('66.249.') else 'example.net',
+            'is_forward_confirmed': True,
+            'is_from_google':       ip.startswith('66.249.'),
+        }
+
+    @staticmethod
+    def generate_request_dict(remote_address):
+        return {
+            'date_requested':   now(),
+            'request_url_type': '/map0.xml',
+            'remote_address':   remote_address,
+            'user_agent':       'Googlebot/2.1',
+        }
+
+    @staticmethod
+    def start_buffer_without_writer():
+        with mock.patch.object(GooglebotRequestLogBuffer, 'run_writer'):
+            return GooglebotRequestLogBuffer()
+
+    def test_flush_saves_requests_in_bulk(self):
+        googlebot_request_log_buffer = self.start_buffer_without_writer()
+        for remote_address in ['66.249.66.1', '66.249.66.1', '93.184.216.34', '10.0.0.2', '127.0.0.1', 'unknown']:
+            googlebot_request_log_buffer.append(self.generate_request_dict(remote_address))
+        with mock.patch.object(GooglebotRequest.objects, 'bulk_create',
+                               wraps=GooglebotRequest.objects.bulk_create) as bulk_create:
+            self.assertEqual(googlebot_request_log_buffer.flush(), 6)
+        self.assertEqual(bulk_create.call_count, 1)
+        # Each public address is looked up once
+        self.assertCountEqual(self.lookup_ip_list, ['66.249.66.1', '93.184.216.34'])
+        self.assertEqual(list(GooglebotRequest.objects.order_by('id').values_list('remote_dns', 'is_from_google')), [
+            ('crawl.googlebot.com', True), ('crawl.googlebot.com', True), ('example.net', False), ('', False),
+            ('localhost', False), ('', False)])
+        self.assertEqual(googlebot_request_log_buffer.flush(), 0)
+
+    def test_slow_lookup_does_not_hold_up_the_flush(self):
+        googlebot_request_log_buffer = self.start_buffer_without_writer()
+        self.lookup_released.clear()
+        googlebot_request_log_buffer.append(self.generate_request_dict('66.249.66.1'))
+        googlebot_request_log_buffer.flush(reverse_dns_timeout_seconds=0.05)
+        self.assertFalse(GooglebotRequest.objects.get().is_from_google)
+
+        # The lookup kept running, and the next flush uses its answer without starting another
+        self.lookup_released.set()
+        googlebot_request_log_buffer.lookup_future_by_ip['66.249.66.1'].result(timeout=5)
+        googlebot_request_log_buffer.append(self.generate_request_dict('66.249.66.1'))
+        googlebot_request_log_buffer.flush()
+        self.assertTrue(GooglebotRequest.objects.order_by('-id').first().is_from_google)
+        self.assertEqual(self.lookup_ip_list, ['66.249.66.1'])
+
+    def test_full_buffer_drops_requests(self):
+        module = googlebot_site_map.controllers_request_log
+        googlebot_request_log_buffer = self.start_buffer_without_writer()
+        with mock.patch.object(module, 'GOOGLEBOT_REQUEST_LOG_MAX_BUFFERED', 2):
+            for remote_address in ['203.0.113.1', '203.0.113.2', '203.0.113.3']:
+                googlebot_request_log_buffer.append(self.generate_request_dict(remote_address))
+        self.assertEqual(googlebot_request_log_buffer.dropped_count, 1)
+        self.assertEqual(googlebot_request_log_buffer.flush(), 2)
+        self.assertEqual(googlebot_request_log_buffer.dropped_count, 0)
+
+    def test_writer_thread_flushes_a_full_batch(self):
+        module = googlebot_site_map.controllers_request_log
+        with mock.patch.object(module, 'GOOGLEBOT_REQUEST_LOG_FLUSH_SIZE', 2):
+            googlebot_request_log_buffer = GooglebotRequestLogBuffer()
+            googlebot_request_log_buffer.append(self.generate_request_dict('66.249.66.1'))
+            self.assertFalse(googlebot_request_log_buffer.flush_requested.is_set())
+            googlebot_request_log_buffer.append(self.generate_request_dict('66.249.66.2'))
+
+        # Long before the flush interval is up
+        time_out = time.monotonic() + 2
+        while GooglebotRequest.objects.count() < 2 and time.monotonic() < time_out:
+            time.sleep(0.01)
+        self.assertEqual(GooglebotRequest.objects.filter(is_from_google=True).count(), 2)
+        self.assertEqual(googlebot_request_log_buffer.request_list, [])
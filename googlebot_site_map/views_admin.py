@@ -3,8 +3,6 @@
 # -*- coding: UTF-8 -*-
 
 import datetime
-import re
-import subprocess
 
 import pytz
 from django.contrib.auth.decorators import login_required
@@ -12,100 +10,29 @@ from django.shortcuts import render
 
 import wevote_functions.admin
 from admin_tools.views import redirect_to_sign_in_page
-from googlebot_site_map import supplemental_urls
+from googlebot_site_map.controllers_request_log import buffer_googlebot_request
 from googlebot_site_map.models import GooglebotRequest
-from politician.models import Politician
 from voter.models import voter_has_authority
-from wevote_functions.functions import get_ip_from_headers, positive_value_exists
-from wevote_functions.functions_date import DATE_FORMAT_YMD
+from wevote_functions.functions import get_ip_from_headers
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 
 def log_request(request):
-    ip = get_ip_from_headers(request)
-    user_agent = request.headers['user-agent']
-    host = googlebot_reverse_dns(ip)
+    """
+    Queues the request for the writer thread in controllers_request_log, which checks whether it came from Google
+    and saves it. Nothing here waits on DNS or the database.
+    """
     path = request.path
     url_bits = path.split('/')
     request_url_type = '/' + url_bits[-1]
-
-    is_from_google = "googlebot.com" in host or "google.com" in host or \
-                     "googleusercontent.com" in host
-
-    obj = GooglebotRequest.objects.create(
+    buffer_googlebot_request(
+        remote_address=get_ip_from_headers(request),
         request_url_type=request_url_type,
-        remote_address=ip,
-        remote_dns=host,
-        is_from_google=is_from_google,
-        user_agent=user_agent
+        user_agent=request.headers.get('user-agent', ''),
     )
 
 
-def googlebot_reverse_dns(ip):
-    host = 'localhost'
-    # ip = '66.249.66.9'
-    if ip != '127.0.0.1':
-        run_cmd = 'host ' + ip
-        process = subprocess.run([run_cmd], shell=True, stdout=subprocess.PIPE)
-        output_raw = process.stdout
-        host = output_raw.decode("utf-8")
-        if positive_value_exists(host):
-            host = host.replace('\n', '')
-
-    logger.error('Not an error: host ip: ' + ip + ', raw output from host cmd: ' + host)
-
-    return host
-
-
-# https://localhost:8000/apis/v1/googlebotSiteMap/sitemap_index.xml
-def get_googlebot_map_file_body(request):
-    map_num_result = re.findall(r'googlebotSiteMap\/map(\d+)', request.path)
-    num = int(map_num_result[0])
-    https_root = "https://wevote.us/"
-    map_text = ''
-    if num == 0:
-        for u in supplemental_urls.crawlable_urls:
-            map_text += u + '<br>'
-
-    # Retrieve Politicians, 40,000 at a time
-    queryset = Politician.objects.using('readonly').order_by('id').filter(id__range=(num * 40000, (num + 1) * 40000))
-    politician_list = list(queryset)
-    for pol in politician_list:
-        map_text += https_root + pol.seo_friendly_path + '/-/<br>'
-
-    return map_text
-
-
-def xml_chunk(loc, lastmod):
-    chunk = '  <url>\n'
-    chunk += '    <loc>' + loc + '</loc>\n'
-    chunk += '    <lastmod>' + lastmod + '</lastmod>\n'
-    chunk += '  </url>\n'
-
-    return chunk
-
-
-def get_googlebot_map_xml_body(request):
-    map_num_result = re.findall(r'googlebotSiteMap\/map(\d+)', request.path)
-    num = int(map_num_result[0])
-    https_root = "https://wevote.us/"
-    dt = datetime.date.today()
-    lastmod = dt.strftime(DATE_FORMAT_YMD)  # "%Y-%m-%d"
-    map_xml = ''
-    if num == 0:
-        for loc in supplemental_urls.crawlable_urls:
-            map_xml += xml_chunk(loc, lastmod)
-
-    # Retrieve Politicians, 40,000 at a time
-    queryset = Politician.objects.using('readonly').order_by('id').filter(id__range=(num * 40000, (num + 1) * 40000))
-    politician_list = list(queryset)
-    for pol in politician_list:
-        map_xml += xml_chunk(https_root + pol.seo_friendly_path + "/-/", lastmod)
-
-    return map_xml
-
-
 @login_required
 def googlebot_site_map_list_view(request):
     authority_required = {'admin'}
@@ -12,7 +12,7 @@ from .models import BatchManager, BatchDescription, BatchHeaderMap, BatchRow, Ba
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_OFFICES_HELD, BATCH_IMPORT_KEYS_ACCEPTED_FOR_MEASURES, \
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_ORGANIZATIONS, BATCH_IMPORT_KEYS_ACCEPTED_FOR_POLITICIANS, \
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_POLLING_LOCATIONS, BATCH_IMPORT_KEYS_ACCEPTED_FOR_POSITIONS, \
-    BATCH_IMPORT_KEYS_ACCEPTED_FOR_REPRESENTATIVES
+    BATCH_IMPORT_KEYS_ACCEPTED_FOR_REPRESENTATIVES, clear_office_held_names_for_batch_set
 from ballot.models import BallotItem, BallotItemListManager, BallotItemManager, BallotReturnedManager
 from candidate.controllers import retrieve_next_or_most_recent_office_for_candidate
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager
@@ -169,6 +169,10 @@ def create_batch_row_actions(
     batch_row_action_list = []
     start_create_batch_row_action_time_tracker = []
     if batch_description_found and batch_header_map_found and batch_row_action_list_found and not delete_analysis_only:
+        if kind_of_batch == CONTEST_OFFICE:
+            # Office names are kept in a dict for this batch set while we analyze it, and no longer, so the
+            #  next analysis reads any changes to the OFFICE_HELD rows
+            clear_office_held_names_for_batch_set(batch_description.batch_set_id)
         for one_batch_row in batch_row_list:
             start_create_batch_row_action_time_tracker.append(now().strftime("%H:%M:%S:%f"))
             if kind_of_batch == CANDIDATE:
@@ -319,6 +323,8 @@ def create_batch_row_actions(
                 voter_id = batch_row_action_ballot_item.voter_id
 
                 batch_row_action_list.append(batch_row_action_ballot_item)
+        if kind_of_batch == CONTEST_OFFICE:
+            clear_office_held_names_for_batch_set(batch_description.batch_set_id)
     else:
         status += "CREATE_BATCH_ROW_CONDITIONS_NOT_MET " \
                   "[batch_description_found and batch_header_map_found and batch_row_action_list_found " \
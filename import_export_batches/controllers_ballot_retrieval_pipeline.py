@@ -0,0 +1,181 @@
+# import_export_batches/controllers_ballot_retrieval_pipeline.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Calls a ballot data provider for many map points at once, while the caller stores the ballots one at a time"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+
+from import_export_ctcl.controllers import fetch_ctcl_ballot_json_from_polling_location_api
+from import_export_vote_usa.controllers import fetch_vote_usa_ballot_json_from_polling_location_api
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+PROVIDER_CTCL = 'CTCL'
+PROVIDER_VOTE_USA = 'VOTE_USA'
+# How many map points may be fetched ahead of the caller, per fetcher
+FETCHED_AHEAD_PER_FETCHER = 2
+
+
+class ProviderRateLimiter(object):
+    """
+    Spaces out the requests all the fetchers in this process send to one provider
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_request_time = 0.0
+
+    def wait_for_turn(self, requests_per_second):
+        if not positive_value_exists(requests_per_second):
+            return
+        with self.lock:
+            right_now = time.monotonic()
+            request_time = max(right_now, self.next_request_time)
+            self.next_request_time = request_time + 1.0 / requests_per_second
+        if request_time > right_now:
+            time.sleep(request_time - right_now)
+
+
+class ProviderSessions(object):
+    """
+    One requests.Session per provider, kept between chunks so the fetchers reuse their connections. The fetchers
+    only send GETs without cookies, which is safe to do from several threads over one Session.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session_by_provider = {}
+        self.rate_limiter_by_provider = {}
+
+    def fetch_session(self, provider, pool_size):
+        with self.lock:
+            session, session_pool_size = self.session_by_provider.get(provider, (None, 0))
+            if session is None or session_pool_size < pool_size:
+                if session is not None:
+                    session.close()
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.session_by_provider[provider] = (session, pool_size)
+            return session
+
+    def fetch_rate_limiter(self, provider):
+        with self.lock:
+            if provider not in self.rate_limiter_by_provider:
+                self.rate_limiter_by_provider[provider] = ProviderRateLimiter()
+            return self.rate_limiter_by_provider[provider]
+
+
+provider_sessions = ProviderSessions()
+
+
+def fetch_provider_requests_per_second(provider):
+    if provider == PROVIDER_CTCL:
+        return getattr(settings, 'CTCL_API_REQUESTS_PER_SECOND', 0)
+    elif provider == PROVIDER_VOTE_USA:
+        return getattr(settings, 'VOTE_USA_API_REQUESTS_PER_SECOND', 0)
+    return 0
+
+
+def fetch_ballot_json_for_one_polling_location(
+        provider='',
+        polling_location=None,
+        ctcl_election_uuid='',
+        election_day_text='',
+        state_code='',
+        session=None,
+        rate_limiter=None):
+    """
+    Runs on a fetcher thread, so it must not touch the database.
+    Returns None when the map point is missing what the provider needs. The retrieve function then stops before
+    calling the provider, with the same status as when it is called without fetched_ballot_results.
+    """
+    if provider == PROVIDER_CTCL:
+        text_for_map_search = polling_location.get_text_for_map_search()
+        if not positive_value_exists(text_for_map_search):
+            return None
+        rate_limiter.wait_for_turn(fetch_provider_requests_per_second(provider))
+        return fetch_ctcl_ballot_json_from_polling_location_api(
+            ctcl_election_uuid=ctcl_election_uuid,
+            text_for_map_search=text_for_map_search,
+            session=session)
+    elif provider == PROVIDER_VOTE_USA:
+        if not positive_value_exists(polling_location.get_text_for_map_search()) or \
+                not polling_location.latitude or not polling_location.longitude:
+            return None
+        if not positive_value_exists(state_code):
+            state_code = polling_location.state if positive_value_exists(polling_location.state) else "na"
+        rate_limiter.wait_for_turn(fetch_provider_requests_per_second(provider))
+        return fetch_vote_usa_ballot_json_from_polling_location_api(
+            election_day_text=election_day_text,
+            latitude=polling_location.latitude,
+            longitude=polling_location.longitude,
+            state_code=state_code,
+            session=session)
+    return None
+
+
+def fetch_ballots_for_polling_location_list(
+        provider='',
+        polling_location_list=[],
+        ctcl_election_uuid='',
+        election_day_text='',
+        state_code=''):
+    """
+    Yields (polling_location, fetched_ballot_results) as the provider answers, which is not necessarily in the order
+    of polling_location_list. BALLOT_RETRIEVAL_FETCHER_COUNT fetchers call the provider, each provider limited to
+    its *_REQUESTS_PER_SECOND setting, while the caller stores what was fetched by passing fetched_ballot_results
+    to retrieve_ctcl_ballot_items_from_polling_location_api or retrieve_vote_usa_ballot_items_from_polling_location_api.
+    Storing stays in the caller's thread, so existing_offices_by_election_dict and the other caches passed from
+    one map point to the next are only ever used by one thread.
+    """
+    fetcher_count = max(1, int(getattr(settings, 'BALLOT_RETRIEVAL_FETCHER_COUNT', 1)))
+    session = provider_sessions.fetch_session(provider, fetcher_count)
+    rate_limiter = provider_sessions.fetch_rate_limiter(provider)
+    polling_location_iterator = iter(polling_location_list)
+    polling_location_by_future = {}
+    executor = ThreadPoolExecutor(max_workers=fetcher_count, thread_name_prefix='ballot_retrieval_fetcher')
+
+    def fetch_next_polling_location():
+        polling_location = next(polling_location_iterator, None)
+        if polling_location is None:
+            return
+        future = executor.submit(
+            fetch_ballot_json_for_one_polling_location,
+            provider=provider,
+            polling_location=polling_location,
+            ctcl_election_uuid=ctcl_election_uuid,
+            election_day_text=election_day_text,
+            state_code=state_code,
+            session=session,
+            rate_limiter=rate_limiter)
+        polling_location_by_future[future] = polling_location
+
+    try:
+        for _ in range(fetcher_count * FETCHED_AHEAD_PER_FETCHER):
+            fetch_next_polling_location()
+        while polling_location_by_future:
+            done_future_set, _ = wait(polling_location_by_future, return_when=FIRST_COMPLETED)
+            for future in done_future_set:
+                polling_location = polling_location_by_future.pop(future)
+                fetch_next_polling_location()
+                try:
+                    fetched_ballot_results = future.result()
+                except Exception as e:
+                    # The retrieve function will call the provider again, and log the error if it happens again
+                    logger.error('BALLOT_RETRIEVAL_FETCHER_FAILED: ' + str(e))
+                    fetched_ballot_results = None
+                yield polling_location, fetched_ballot_results
+    finally:
+        # If the caller stops early, don't wait on the map points fetched ahead
+        executor.shutdown(wait=False, cancel_futures=True)
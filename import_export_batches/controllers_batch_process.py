@@ -3,37 +3,45 @@
 # -*- coding: UTF-8 -*-
 
 from .controllers import create_batch_row_actions, import_data_from_batch_row_actions
+from .controllers_map_point_queue import delete_map_point_queue_for_batch_process, \
+    delete_map_point_queues_of_completed_batch_processes
 from .controllers_representatives import process_one_representatives_batch_process
 from .models import ACTIVITY_NOTICE_PROCESS, API_REFRESH_REQUEST, \
     AUGMENT_ANALYTICS_ACTION_WITH_ELECTION_ID, AUGMENT_ANALYTICS_ACTION_WITH_FIRST_VISIT, \
-    BatchDescription, BatchManager, BatchProcessManager, \
+    batch_process_worker_is_alive, BatchDescription, BatchManager, BatchProcess, BatchProcessManager, \
     CALCULATE_ORGANIZATION_DAILY_METRICS, \
     CALCULATE_ORGANIZATION_ELECTION_METRICS, \
     CALCULATE_SITEWIDE_DAILY_METRICS, \
     CALCULATE_SITEWIDE_ELECTION_METRICS, \
     CALCULATE_SITEWIDE_VOTER_METRICS, \
-    GENERATE_VOTER_GUIDES, IMPORT_CREATE, IMPORT_DELETE, MATCH_POLITICIANS_TO_ORGANIZATIONS, \
+    GENERATE_BALLOT_SNAPSHOTS, GENERATE_VOTER_GUIDES, IMPORT_CREATE, IMPORT_DELETE, MATCH_POLITICIANS_TO_ORGANIZATIONS, \
     REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS, \
     RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, RETRIEVE_FROM_BALLOTPEDIA, \
     RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS, \
-    SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE, UPDATE_TWITTER_DATA_FROM_TWITTER
+    SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE, UPDATE_POLITICIAN_RECOMMENDATIONS, UPDATE_SUGGESTED_FRIENDS, \
+    UPDATE_TWITTER_DATA_FROM_TWITTER
 from activity.controllers import process_activity_notice_seeds_triggered_by_batch_process
 from analytics.controllers import calculate_sitewide_daily_metrics, \
     process_one_analytics_batch_process_augment_with_election_id, \
     process_one_analytics_batch_process_augment_with_first_visit, process_sitewide_voter_metrics, \
     retrieve_analytics_processing_next_step
+from analytics.controllers_rollup import backfill_analytics_rollup_sketches, fetch_analytics_rollup_watermark
 from analytics.models import AnalyticsManager
 from api_internal_cache.models import ApiInternalCacheManager
-from ballot.models import BallotReturnedListManager
+from ballot.controllers_ballot_snapshot import generate_ballot_snapshots_for_election
+from ballot.models import BallotReturned, BallotReturnedListManager, BallotSnapshot, BallotSnapshotManager
 from campaign.controllers import update_campaignx_entries_from_politician_list
 from candidate.controllers import fetch_ballotpedia_urls_to_retrieve_for_links_count, \
     fetch_ballotpedia_urls_to_retrieve_for_photos_count
 from candidate.models import CandidateListManager
 from datetime import timedelta
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils.timezone import localtime, now
 from election.models import ElectionManager
 from exception.models import handle_exception
+from friend.controllers import retrieve_suggested_friends_update_due_query, \
+    update_suggested_friends_for_new_friendships
+from googlebot_site_map.controllers import generate_googlebot_site_map_files, is_googlebot_site_map_generation_due
 from import_export_twitter.controllers import fetch_number_of_candidates_needing_twitter_search, \
     fetch_number_of_candidates_needing_twitter_update, fetch_number_of_organizations_needing_twitter_update, \
     fetch_number_of_representatives_needing_twitter_update, \
@@ -41,20 +49,24 @@ from import_export_twitter.controllers import fetch_number_of_candidates_needing
     retrieve_and_update_representatives_needing_twitter_update, retrieve_possible_twitter_handles_in_bulk
 from issue.controllers import update_issue_statistics
 import json
+from office_held.models import OfficesHeldForLocation
 from politician.controllers import fetch_number_of_politicians_to_match_to_organizations
+from politician.controllers_recommendation import update_politician_recommendations_with_memory_limit
 from position.models import PositionEntered
 from voter_guide.controllers import voter_guides_upcoming_retrieve_for_api
 from voter_guide.models import VoterGuideManager, VoterGuidesGenerated
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions_date import convert_date_to_date_as_integer
 from wevote_settings.models import fetch_batch_process_system_on, fetch_batch_process_system_activity_notices_on, \
     fetch_batch_process_system_api_refresh_on, fetch_batch_process_system_ballot_items_on, \
     fetch_batch_process_system_general_maintenance_on, \
     fetch_batch_process_system_match_politicians_to_organizations_on, \
     fetch_batch_process_system_representatives_on, \
-    fetch_batch_process_system_calculate_analytics_on, fetch_batch_process_system_generate_voter_guides_on, \
-    fetch_batch_process_system_retrieve_from_ballotpedia_on, \
-    fetch_batch_process_system_search_twitter_on, fetch_batch_process_system_update_twitter_on
+    fetch_batch_process_system_calculate_analytics_on, fetch_batch_process_system_generate_ballot_snapshots_on, \
+    fetch_batch_process_system_generate_voter_guides_on, fetch_batch_process_system_retrieve_from_ballotpedia_on, \
+    fetch_batch_process_system_search_twitter_on, fetch_batch_process_system_update_politician_recommendations_on, \
+    fetch_batch_process_system_update_suggested_friends_on, fetch_batch_process_system_update_twitter_on
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -76,6 +88,7 @@ NUMBER_OF_SIMULTANEOUS_BATCH_PROCESSES = 4  # Four processes at a time
 NUMBER_OF_SIMULTANEOUS_BALLOT_ITEM_BATCH_PROCESSES = 4  # Four processes at a time
 NUMBER_OF_SIMULTANEOUS_GENERAL_MAINTENANCE_BATCH_PROCESSES = 1
 NUMBER_OF_SIMULTANEOUS_REPRESENTATIVE_BATCH_PROCESSES = 1  # One processes at a time because of rate limiting
+UPDATE_POLITICIAN_RECOMMENDATIONS_EVERY_HOURS = 24
 
 
 def pass_through_batch_list_incoming_variables(request):
@@ -256,6 +269,9 @@ def process_next_ballot_items():
         }
         return results
 
+    queue_results = delete_map_point_queues_of_completed_batch_processes()
+    status += queue_results['status']
+
     batch_process_manager = BatchProcessManager()
     # If we have more than NUMBER_OF_SIMULTANEOUS_BALLOT_ITEM_BATCH_PROCESSES batch_processes that are still active,
     # don't start a new import ballot item batch_process
@@ -295,6 +311,10 @@ def process_next_ballot_items():
     process_restarted = False
     if batch_process_list and len(batch_process_list) > 0:
         for batch_process in batch_process_list:
+            if batch_process_worker_is_alive(batch_process):
+                # A runballotitemworkers worker is running this one right now
+                status += "BATCH_PROCESS_HELD_BY_WORKER "
+                continue
             if batch_process.kind_of_process in \
                     [REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS,
                      RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]:
@@ -460,6 +480,9 @@ def process_next_general_maintenance():
             CALCULATE_ORGANIZATION_DAILY_METRICS,
             CALCULATE_ORGANIZATION_ELECTION_METRICS]
         kind_of_processes_to_run = kind_of_processes_to_run + analytics_process_list
+    if fetch_batch_process_system_generate_ballot_snapshots_on():
+        generate_ballot_snapshots_process_list = [GENERATE_BALLOT_SNAPSHOTS]
+        kind_of_processes_to_run = kind_of_processes_to_run + generate_ballot_snapshots_process_list
     if fetch_batch_process_system_generate_voter_guides_on():
         generate_voter_guides_process_list = [GENERATE_VOTER_GUIDES]
         kind_of_processes_to_run = kind_of_processes_to_run + generate_voter_guides_process_list
@@ -475,6 +498,12 @@ def process_next_general_maintenance():
     if fetch_batch_process_system_match_politicians_to_organizations_on():
         match_politicians_to_organizations_process_list = [MATCH_POLITICIANS_TO_ORGANIZATIONS]
         kind_of_processes_to_run = kind_of_processes_to_run + match_politicians_to_organizations_process_list
+    if fetch_batch_process_system_update_politician_recommendations_on():
+        update_politician_recommendations_process_list = [UPDATE_POLITICIAN_RECOMMENDATIONS]
+        kind_of_processes_to_run = kind_of_processes_to_run + update_politician_recommendations_process_list
+    if fetch_batch_process_system_update_suggested_friends_on():
+        update_suggested_friends_process_list = [UPDATE_SUGGESTED_FRIENDS]
+        kind_of_processes_to_run = kind_of_processes_to_run + update_suggested_friends_process_list
 
     if not fetch_batch_process_system_on():
         status += "BATCH_PROCESS_SYSTEM_TURNED_OFF-GENERAL "
@@ -663,6 +692,186 @@ def process_next_general_maintenance():
                         status=status,
                     )
 
+    # ############################
+    # Generate ballot snapshots - make sure every map point ballot in an upcoming election has a fresh
+    #  BallotSnapshot, so voterBallotItemsRetrieve doesn't have to rebuild the ballot for each voter
+    if not fetch_batch_process_system_generate_ballot_snapshots_on():
+        status += "BATCH_PROCESS_SYSTEM_GENERATE_BALLOT_SNAPSHOTS_TURNED_OFF "
+    else:
+        # We only want one GENERATE_BALLOT_SNAPSHOTS process to be running at a time
+        generate_ballot_snapshots_process_is_already_in_queue = False
+        for batch_process in batch_process_list_already_scheduled:
+            if batch_process.kind_of_process in [GENERATE_BALLOT_SNAPSHOTS]:
+                status += "GENERATE_BALLOT_SNAPSHOTS_ALREADY_SCHEDULED(" + str(batch_process.id) + ") "
+                generate_ballot_snapshots_process_is_already_in_queue = True
+        for batch_process in batch_process_list_already_running:
+            if batch_process.kind_of_process in [GENERATE_BALLOT_SNAPSHOTS]:
+                status += "GENERATE_BALLOT_SNAPSHOTS_ALREADY_RUNNING(" + str(batch_process.id) + ") "
+                generate_ballot_snapshots_process_is_already_in_queue = True
+        if generate_ballot_snapshots_process_is_already_in_queue:
+            pass
+        else:
+            # Get list of upcoming elections which have stale snapshots due to be generated (not waiting out a
+            #  backoff after failing), or map point ballots without a snapshot.
+            #  If there are none, but an office-held snapshot is stale or missing, use the first upcoming election.
+            election_ids_that_need_ballot_snapshots_generated = []
+            election_manager = ElectionManager()
+            results = election_manager.retrieve_upcoming_google_civic_election_id_list()
+            if results['upcoming_google_civic_election_id_list_found']:
+                upcoming_google_civic_election_id_list = []
+                for one_google_civic_election_id in results['upcoming_google_civic_election_id_list']:
+                    upcoming_google_civic_election_id_list.append(convert_to_int(one_google_civic_election_id))
+                if positive_value_exists(len(upcoming_google_civic_election_id_list)):
+                    query = BallotSnapshotManager.retrieve_ballot_snapshots_due_query()
+                    query = query.filter(google_civic_election_id__in=upcoming_google_civic_election_id_list)
+                    election_ids_with_stale_snapshots_list = \
+                        list(query.values_list('google_civic_election_id', flat=True).distinct())
+                    query = BallotSnapshot.objects.using('readonly').all()
+                    query = query.filter(google_civic_election_id__in=upcoming_google_civic_election_id_list)
+                    query = query.filter(ballot_returned_we_vote_id__isnull=False)
+                    query = query.values('google_civic_election_id').annotate(snapshot_count=Count('id'))
+                    snapshot_count_by_election = \
+                        {one_row['google_civic_election_id']: one_row['snapshot_count'] for one_row in query}
+                    query = BallotReturned.objects.using('readonly').all()
+                    query = query.filter(google_civic_election_id__in=upcoming_google_civic_election_id_list)
+                    query = query.exclude(Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=''))
+                    query = query.values('google_civic_election_id').annotate(ballot_returned_count=Count('id'))
+                    ballot_returned_count_by_election = \
+                        {one_row['google_civic_election_id']: one_row['ballot_returned_count'] for one_row in query}
+                    for one_google_civic_election_id in upcoming_google_civic_election_id_list:
+                        if one_google_civic_election_id in election_ids_with_stale_snapshots_list \
+                                or ballot_returned_count_by_election.get(one_google_civic_election_id, 0) > \
+                                snapshot_count_by_election.get(one_google_civic_election_id, 0):
+                            election_ids_that_need_ballot_snapshots_generated.append(one_google_civic_election_id)
+                    if not positive_value_exists(len(election_ids_that_need_ballot_snapshots_generated)):
+                        # Office-held snapshots don't belong to one election, and any election's run refreshes them
+                        query = BallotSnapshot.objects.using('readonly').filter(offices_held_for_location_id__gt=0)
+                        offices_held_snapshot_count = query.count()
+                        query = BallotSnapshotManager.retrieve_ballot_snapshots_due_query()
+                        offices_held_stale_snapshot_found = query.filter(offices_held_for_location_id__gt=0).exists()
+                        offices_held_for_location_count = OfficesHeldForLocation.objects.using('readonly').count()
+                        if offices_held_stale_snapshot_found \
+                                or offices_held_for_location_count > offices_held_snapshot_count:
+                            election_ids_that_need_ballot_snapshots_generated.append(
+                                upcoming_google_civic_election_id_list[0])
+
+            if positive_value_exists(len(election_ids_that_need_ballot_snapshots_generated)):
+                first_election_id = election_ids_that_need_ballot_snapshots_generated[0]
+                status += "CREATING_GENERATE_BALLOT_SNAPSHOTS_BATCH_PROCESS_FOR_ELECTION-" + \
+                    str(first_election_id) + " "
+                results = batch_process_manager.create_batch_process(
+                    google_civic_election_id=first_election_id,
+                    kind_of_process=GENERATE_BALLOT_SNAPSHOTS)
+                status += results['status']
+                success = results['success']
+                if results['batch_process_saved']:
+                    batch_process = results['batch_process']
+                    status += "SCHEDULED_NEW_GENERATE_BALLOT_SNAPSHOTS "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=batch_process.id,
+                        kind_of_process=batch_process.kind_of_process,
+                        google_civic_election_id=batch_process.google_civic_election_id,
+                        status=status,
+                    )
+                else:
+                    status += "FAILED_TO_SCHEDULE-" + str(GENERATE_BALLOT_SNAPSHOTS) + " "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=0,
+                        kind_of_process=GENERATE_BALLOT_SNAPSHOTS,
+                        google_civic_election_id=first_election_id,
+                        status=status,
+                    )
+
+    # ############################
+    # Update politician recommendations - rebuild RecommendedPoliticianLinkByPolitician once a day
+    if not fetch_batch_process_system_update_politician_recommendations_on():
+        status += "BATCH_PROCESS_SYSTEM_UPDATE_POLITICIAN_RECOMMENDATIONS_TURNED_OFF "
+    else:
+        # We only want one UPDATE_POLITICIAN_RECOMMENDATIONS process to be running at a time
+        update_politician_recommendations_is_already_in_queue = False
+        for batch_process in batch_process_list_already_scheduled:
+            if batch_process.kind_of_process in [UPDATE_POLITICIAN_RECOMMENDATIONS]:
+                status += "UPDATE_POLITICIAN_RECOMMENDATIONS_ALREADY_SCHEDULED(" + str(batch_process.id) + ") "
+                update_politician_recommendations_is_already_in_queue = True
+        for batch_process in batch_process_list_already_running:
+            if batch_process.kind_of_process in [UPDATE_POLITICIAN_RECOMMENDATIONS]:
+                status += "UPDATE_POLITICIAN_RECOMMENDATIONS_ALREADY_RUNNING(" + str(batch_process.id) + ") "
+                update_politician_recommendations_is_already_in_queue = True
+        if not update_politician_recommendations_is_already_in_queue:
+            try:
+                update_politician_recommendations_completed_recently = BatchProcess.objects.using('readonly')\
+                    .filter(kind_of_process=UPDATE_POLITICIAN_RECOMMENDATIONS,
+                            date_completed__gt=now() - timedelta(hours=UPDATE_POLITICIAN_RECOMMENDATIONS_EVERY_HOURS))\
+                    .exists()
+            except Exception as e:
+                status += "UPDATE_POLITICIAN_RECOMMENDATIONS_QUERY_FAILED: " + str(e) + " "
+                update_politician_recommendations_completed_recently = True
+            if update_politician_recommendations_completed_recently:
+                status += "UPDATE_POLITICIAN_RECOMMENDATIONS_COMPLETED_RECENTLY "
+            else:
+                results = batch_process_manager.create_batch_process(
+                    kind_of_process=UPDATE_POLITICIAN_RECOMMENDATIONS)
+                status += results['status']
+                success = results['success']
+                if results['batch_process_saved']:
+                    batch_process = results['batch_process']
+                    status += "SCHEDULED_NEW_UPDATE_POLITICIAN_RECOMMENDATIONS "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=batch_process.id,
+                        kind_of_process=batch_process.kind_of_process,
+                        status=status,
+                    )
+                else:
+                    status += "FAILED_TO_SCHEDULE-" + str(UPDATE_POLITICIAN_RECOMMENDATIONS) + " "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=0,
+                        kind_of_process=UPDATE_POLITICIAN_RECOMMENDATIONS,
+                        status=status,
+                    )
+
+    # ############################
+    # Update suggested friends - suggest each voter's friends to each other for friendships accepted since the last run
+    if not fetch_batch_process_system_update_suggested_friends_on():
+        status += "BATCH_PROCESS_SYSTEM_UPDATE_SUGGESTED_FRIENDS_TURNED_OFF "
+    else:
+        # We only want one UPDATE_SUGGESTED_FRIENDS process to be running at a time
+        update_suggested_friends_is_already_in_queue = False
+        for batch_process in batch_process_list_already_scheduled:
+            if batch_process.kind_of_process in [UPDATE_SUGGESTED_FRIENDS]:
+                status += "UPDATE_SUGGESTED_FRIENDS_ALREADY_SCHEDULED(" + str(batch_process.id) + ") "
+                update_suggested_friends_is_already_in_queue = True
+        for batch_process in batch_process_list_already_running:
+            if batch_process.kind_of_process in [UPDATE_SUGGESTED_FRIENDS]:
+                status += "UPDATE_SUGGESTED_FRIENDS_ALREADY_RUNNING(" + str(batch_process.id) + ") "
+                update_suggested_friends_is_already_in_queue = True
+        if not update_suggested_friends_is_already_in_queue:
+            try:
+                # Friendships waiting to be retried after a failure don't need a new batch process yet
+                new_friendships_exist = retrieve_suggested_friends_update_due_query(read_only=True).exists()
+            except Exception as e:
+                status += "UPDATE_SUGGESTED_FRIENDS_QUERY_FAILED: " + str(e) + " "
+                new_friendships_exist = False
+            if new_friendships_exist:
+                results = batch_process_manager.create_batch_process(
+                    kind_of_process=UPDATE_SUGGESTED_FRIENDS)
+                status += results['status']
+                success = results['success']
+                if results['batch_process_saved']:
+                    batch_process = results['batch_process']
+                    status += "SCHEDULED_NEW_UPDATE_SUGGESTED_FRIENDS "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=batch_process.id,
+                        kind_of_process=batch_process.kind_of_process,
+                        status=status,
+                    )
+                else:
+                    status += "FAILED_TO_SCHEDULE-" + str(UPDATE_SUGGESTED_FRIENDS) + " "
+                    batch_process_manager.create_batch_process_log_entry(
+                        batch_process_id=0,
+                        kind_of_process=UPDATE_SUGGESTED_FRIENDS,
+                        status=status,
+                    )
+
     # ############################
     # MATCH_POLITICIANS_TO_ORGANIZATIONS
     if not fetch_batch_process_system_match_politicians_to_organizations_on():
@@ -864,6 +1073,13 @@ def process_next_general_maintenance():
     if not fetch_batch_process_system_calculate_analytics_on():
         status += "BATCH_PROCESS_SYSTEM_CALCULATE_ANALYTICS_TURNED_OFF "
     else:
+        # Catch the running total sketches up on history, a few weeks at a time, so the daily metrics
+        #  don't have to count their totals from all of AnalyticsAction
+        yesterday_as_integer = convert_date_to_date_as_integer(localtime(now()).date() - timedelta(days=1))
+        if fetch_analytics_rollup_watermark() < yesterday_as_integer:
+            results = backfill_analytics_rollup_sketches(through_date_as_integer=yesterday_as_integer)
+            status += results['status']
+
         # We only want one analytics process to be running at a time
         # Check to see if one of the existing batches is for analytics. If so,
         analytics_process_is_already_in_queue = False
@@ -937,6 +1153,12 @@ def process_next_general_maintenance():
                             status=status,
                         )
 
+    # ############################
+    # Render the googlebotSiteMap files again once a day, so crawler requests never read the politician table
+    if is_googlebot_site_map_generation_due():
+        results = generate_googlebot_site_map_files()
+        status += results['status']
+
     # Finally, retrieve the General Maintenance BatchProcess to run, and only use the first one returned
     results = batch_process_manager.retrieve_batch_process_list(
         kind_of_process_list=kind_of_processes_to_run,
@@ -985,12 +1207,21 @@ def process_next_general_maintenance():
         elif batch_process.kind_of_process in [CALCULATE_SITEWIDE_DAILY_METRICS]:
             results = process_one_sitewide_daily_analytics_batch_process(batch_process)
             status += results['status']
+        elif batch_process.kind_of_process in [GENERATE_BALLOT_SNAPSHOTS]:
+            results = process_one_generate_ballot_snapshots_batch_process(batch_process)
+            status += results['status']
         elif batch_process.kind_of_process in [GENERATE_VOTER_GUIDES]:
             results = process_one_generate_voter_guides_batch_process(batch_process)
             status += results['status']
         elif batch_process.kind_of_process in [MATCH_POLITICIANS_TO_ORGANIZATIONS]:
             results = process_one_match_politicians_to_organizations_batch_process(batch_process)
             status += results['status']
+        elif batch_process.kind_of_process in [UPDATE_POLITICIAN_RECOMMENDATIONS]:
+            results = process_one_update_politician_recommendations_batch_process(batch_process)
+            status += results['status']
+        elif batch_process.kind_of_process in [UPDATE_SUGGESTED_FRIENDS]:
+            results = process_one_update_suggested_friends_batch_process(batch_process)
+            status += results['status']
         elif batch_process.kind_of_process in [RETRIEVE_FROM_BALLOTPEDIA]:
             results = process_one_retrieve_from_ballotpedia_batch_process(batch_process)
             status += results['status']
@@ -1565,7 +1796,15 @@ def process_one_api_refresh_request_batch_process(batch_process):
     return results
 
 
-def process_one_ballot_item_batch_process(batch_process):
+def process_one_ballot_item_batch_process(batch_process, batch_process_ballot_item_chunk=None):
+    """
+    Runs the next step (retrieve, analyze or create) of the batch_process's active chunk, or starts a new chunk.
+    :param batch_process:
+    :param batch_process_ballot_item_chunk: A chunk claimed by a runballotitemworkers worker. A step of it which was
+        started and not completed was abandoned by a worker that stopped heartbeating, so it is picked up right away
+        instead of after the time out.
+    :return:
+    """
     status = ""
     success = True
     batch_manager = BatchManager()
@@ -1594,8 +1833,11 @@ def process_one_ballot_item_batch_process(batch_process):
         if positive_value_exists(batch_process_results['batch_process_found']):
             batch_process = batch_process_results['batch_process']
 
-        batch_process.date_checked_out = now()
-        batch_process.save()
+        if batch_process_ballot_item_chunk is None:
+            batch_process.date_checked_out = now()
+            # We only get here once no worker is running it, so a stale heartbeat must not look like a worker's claim
+            batch_process.date_worker_heartbeat = None
+            batch_process.save(update_fields=['date_checked_out', 'date_worker_heartbeat'])
         batch_process_id = batch_process.id
     except Exception as e:
         status += "ERROR-CHECKED_OUT_TIME_NOT_SAVED: " + str(e) + " "
@@ -1613,9 +1855,18 @@ def process_one_ballot_item_batch_process(batch_process):
         }
         return results
 
-    # Retrieve BatchProcessBallotItemChunk that has started but not completed
-    results = batch_process_manager.retrieve_active_ballot_item_chunk_not_completed(
-        batch_process_id=batch_process_id)
+    claimed_by_worker = batch_process_ballot_item_chunk is not None
+    if claimed_by_worker:
+        results = {
+            'success':                                  True,
+            'status':                                   "BALLOT_ITEM_CHUNK_CLAIMED_BY_WORKER ",
+            'batch_process_ballot_item_chunk':          batch_process_ballot_item_chunk,
+            'batch_process_ballot_item_chunk_found':    True,
+        }
+    else:
+        # Retrieve BatchProcessBallotItemChunk that has started but not completed
+        results = batch_process_manager.retrieve_active_ballot_item_chunk_not_completed(
+            batch_process_id=batch_process_id)
     if not results['success']:
         batch_process_manager.create_batch_process_log_entry(
             batch_process_id=batch_process_id,
@@ -1664,7 +1915,7 @@ def process_one_ballot_item_batch_process(batch_process):
         try:
             # If here, we are about to retrieve ballot items
             batch_process_ballot_item_chunk.retrieve_date_started = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=['retrieve_date_started'])
             status += "RETRIEVE_DATE_STARTED_SAVED "
             batch_process_manager.create_batch_process_log_entry(
                 batch_process_id=batch_process_id,
@@ -1767,7 +2018,8 @@ def process_one_ballot_item_batch_process(batch_process):
                     batch_process_ballot_item_chunk.batch_set_id = batch_set_id
                     batch_process_ballot_item_chunk.retrieve_row_count = retrieve_row_count
                     batch_process_ballot_item_chunk.retrieve_date_completed = now()
-                    batch_process_ballot_item_chunk.save()
+                    batch_process_ballot_item_chunk.save(
+                        update_fields=['batch_set_id', 'retrieve_row_count', 'retrieve_date_completed'])
                     status += "RETRIEVE_DATE_STARTED-RETRIEVE_DATE_COMPLETED_SAVED "
                     batch_process_manager.create_batch_process_log_entry(
                         batch_process_id=batch_process_id,
@@ -1799,7 +2051,7 @@ def process_one_ballot_item_batch_process(batch_process):
                 # Now clear out date_checked_out so it can be picked up by the next step
                 try:
                     batch_process.date_checked_out = None
-                    batch_process.save()
+                    batch_process.save(update_fields=['date_checked_out'])
                 except Exception as e:
                     status += "CANNOT_CLEAR_OUT_DATE_CHECKED_OUT: " + str(e) + " "
 
@@ -1825,8 +2077,15 @@ def process_one_ballot_item_batch_process(batch_process):
                 #         return results
             else:
                 status += "RETRIEVE_DATE_STARTED-NO_BATCH_SET_ID_FOUND-BATCH_IS_COMPLETE "
+                # With workers, other chunks of this batch_process may still be running. The process is complete
+                #  once the last of them is done, and a new chunk finds nothing left to retrieve.
+                chunks_not_completed_count = batch_process_manager.count_ballot_item_chunks_not_completed(
+                    batch_process_id=batch_process_id,
+                    excluded_batch_process_ballot_item_chunk_id=batch_process_ballot_item_chunk.id)
+                if positive_value_exists(chunks_not_completed_count):
+                    status += "OTHER_BALLOT_ITEM_CHUNKS_NOT_COMPLETED: " + str(chunks_not_completed_count) + " "
                 results = mark_batch_process_as_complete(
-                    batch_process=batch_process,
+                    batch_process=None if positive_value_exists(chunks_not_completed_count) else batch_process,
                     batch_process_ballot_item_chunk=batch_process_ballot_item_chunk,
                     google_civic_election_id=google_civic_election_id,
                     kind_of_process=kind_of_process,
@@ -1844,7 +2103,7 @@ def process_one_ballot_item_batch_process(batch_process):
                 try:
                     status += results['status']
                     batch_process_ballot_item_chunk.retrieve_date_started = None
-                    batch_process_ballot_item_chunk.save()
+                    batch_process_ballot_item_chunk.save(update_fields=['retrieve_date_started'])
                     batch_process_manager.create_batch_process_log_entry(
                         batch_process_id=batch_process_id,
                         batch_process_ballot_item_chunk_id=batch_process_ballot_item_chunk.id,
@@ -1893,7 +2152,7 @@ def process_one_ballot_item_batch_process(batch_process):
         # Check to see if retrieve process has timed out
         date_when_retrieve_has_timed_out = \
             batch_process_ballot_item_chunk.retrieve_date_started + timedelta(seconds=retrieve_time_out_duration)
-        if now() > date_when_retrieve_has_timed_out:
+        if claimed_by_worker or now() > date_when_retrieve_has_timed_out:
             # If so, set retrieve_date_completed to now and set retrieve_timed_out to True
             # But first, see if any rows were found
             # Were there batches created in the batch set from the retrieve?
@@ -1940,7 +2199,8 @@ def process_one_ballot_item_batch_process(batch_process):
                     batch_process_ballot_item_chunk.retrieve_row_count = number_of_batches
                 batch_process_ballot_item_chunk.retrieve_date_completed = now()
                 batch_process_ballot_item_chunk.retrieve_timed_out = True
-                batch_process_ballot_item_chunk.save()
+                batch_process_ballot_item_chunk.save(
+                    update_fields=['retrieve_row_count', 'retrieve_date_completed', 'retrieve_timed_out'])
             except Exception as e:
                 status += "ERROR-RETRIEVE_DATE_COMPLETED-CANNOT_SAVE_RETRIEVE_DATE_COMPLETED: " + str(e) + " "
                 handle_exception(e, logger=logger, exception_message=status)
@@ -1975,7 +2235,7 @@ def process_one_ballot_item_batch_process(batch_process):
             try:
                 batch_process_ballot_item_chunk.analyze_date_started = now()
                 batch_process_ballot_item_chunk.analyze_date_completed = now()
-                batch_process_ballot_item_chunk.save()
+                batch_process_ballot_item_chunk.save(update_fields=['analyze_date_started', 'analyze_date_completed'])
                 batch_process_manager.create_batch_process_log_entry(
                     batch_process_id=batch_process_id,
                     batch_process_ballot_item_chunk_id=batch_process_ballot_item_chunk.id,
@@ -2014,7 +2274,7 @@ def process_one_ballot_item_batch_process(batch_process):
                 # Were there batches created in the batch set from the retrieve?
                 batch_process_ballot_item_chunk.retrieve_row_count = number_of_batches
             batch_process_ballot_item_chunk.analyze_date_started = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=['retrieve_row_count', 'analyze_date_started'])
             status += "ANALYZE_DATE_STARTED-ANALYZE_DATE_STARTED_SAVED "
             batch_process_manager.create_batch_process_log_entry(
                 batch_process_id=batch_process_id,
@@ -2091,7 +2351,7 @@ def process_one_ballot_item_batch_process(batch_process):
         try:
             batch_process_ballot_item_chunk.analyze_row_count = analyze_row_count
             batch_process_ballot_item_chunk.analyze_date_completed = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=['analyze_row_count', 'analyze_date_completed'])
             status += "ANALYZE_DATE_STARTED-ANALYZE_DATE_COMPLETED_SAVED "
             batch_process_manager.create_batch_process_log_entry(
                 batch_process_id=batch_process_id,
@@ -2129,7 +2389,7 @@ def process_one_ballot_item_batch_process(batch_process):
             status += "MISSING_BALLOT_ITEM_CHUNK_BATCH_SET_ID "
             try:
                 batch_process_ballot_item_chunk.analyze_date_completed = now()
-                batch_process_ballot_item_chunk.save()
+                batch_process_ballot_item_chunk.save(update_fields=['analyze_date_completed'])
                 batch_process_manager.create_batch_process_log_entry(
                     batch_process_id=batch_process_id,
                     batch_process_ballot_item_chunk_id=batch_process_ballot_item_chunk.id,
@@ -2160,7 +2420,7 @@ def process_one_ballot_item_batch_process(batch_process):
         # Check to see if analyze process has timed out
         date_when_analyze_has_timed_out = \
             batch_process_ballot_item_chunk.analyze_date_started + timedelta(seconds=analyze_time_out_duration)
-        if now() > date_when_analyze_has_timed_out:
+        if claimed_by_worker or now() > date_when_analyze_has_timed_out:
             # Continue processing where we left off
             # We have time for this to run before the time out check above is run again,
             # since we have this batch checked out
@@ -2218,7 +2478,8 @@ def process_one_ballot_item_batch_process(batch_process):
                             batch_set_id=batch_process_ballot_item_chunk.batch_set_id, batch_row_analyzed=True)
                         batch_process_ballot_item_chunk.analyze_row_count = analyze_row_count
                         batch_process_ballot_item_chunk.analyze_date_completed = now()
-                        batch_process_ballot_item_chunk.save()
+                        batch_process_ballot_item_chunk.save(
+                            update_fields=['analyze_row_count', 'analyze_date_completed'])
                         status += "ANALYZE_DATE_COMPLETED-ANALYZE_DATE_COMPLETED_SAVED "
                         batch_process_manager.create_batch_process_log_entry(
                             batch_process_id=batch_process_id,
@@ -2265,7 +2526,7 @@ def process_one_ballot_item_batch_process(batch_process):
         try:
             # If here, we know that the analyze_date_completed has a value
             batch_process_ballot_item_chunk.create_date_started = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=['create_date_started'])
             status += "CREATE_DATE_STARTED-SAVED "
             batch_process_manager.create_batch_process_log_entry(
                 batch_process_id=batch_process_id,
@@ -2336,7 +2597,7 @@ def process_one_ballot_item_batch_process(batch_process):
         try:
             batch_process_ballot_item_chunk.create_row_count = create_row_count
             batch_process_ballot_item_chunk.create_date_completed = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=['create_row_count', 'create_date_completed'])
 
             if positive_value_exists(google_civic_election_id):
                 results = election_manager.retrieve_election(
@@ -2391,7 +2652,7 @@ def process_one_ballot_item_batch_process(batch_process):
     elif batch_process_ballot_item_chunk.create_date_completed is None:
         date_when_create_has_timed_out = \
             batch_process_ballot_item_chunk.create_date_started + timedelta(seconds=create_time_out_duration)
-        if now() > date_when_create_has_timed_out:
+        if claimed_by_worker or now() > date_when_create_has_timed_out:
             if not positive_value_exists(batch_process_ballot_item_chunk.create_row_count):
                 # Were there batches created in the batch set from the retrieve?
                 if positive_value_exists(batch_process_ballot_item_chunk.batch_set_id):
@@ -2402,7 +2663,8 @@ def process_one_ballot_item_batch_process(batch_process):
                 # If here, set create_date_completed to now and set create_timed_out to True
                 batch_process_ballot_item_chunk.create_date_completed = now()
                 batch_process_ballot_item_chunk.create_timed_out = True
-                batch_process_ballot_item_chunk.save()
+                batch_process_ballot_item_chunk.save(
+                    update_fields=['create_row_count', 'create_date_completed', 'create_timed_out'])
 
                 if positive_value_exists(google_civic_election_id):
                     results = election_manager.retrieve_election(
@@ -2573,6 +2835,176 @@ def process_activity_notice_batch_process(batch_process):
     return results
 
 
+def process_one_generate_ballot_snapshots_batch_process(batch_process):
+    status = ""
+    success = True
+    batch_process_manager = BatchProcessManager()
+
+    kind_of_process = batch_process.kind_of_process
+    google_civic_election_id = batch_process.google_civic_election_id
+
+    # When a batch_process is running, we mark when it was "taken off the shelf" to be worked on.
+    #  When the process is complete, we should reset this to "NULL"
+    try:
+        batch_process.date_started = now()
+        batch_process.date_checked_out = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-GENERATE_BALLOT_SNAPSHOTS-CHECKED_OUT_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+        batch_process_manager.create_batch_process_log_entry(
+            batch_process_id=batch_process.id,
+            kind_of_process=kind_of_process,
+            google_civic_election_id=google_civic_election_id,
+            status=status,
+        )
+        results = {
+            'success': success,
+            'status': status,
+        }
+        return results
+
+    # If more snapshots remain than one run is allowed to build, the next general maintenance pass
+    #  will schedule this election again because its snapshots are still stale or missing
+    results = generate_ballot_snapshots_for_election(google_civic_election_id=google_civic_election_id)
+    status += results['status']
+    success = results['success']
+
+    try:
+        batch_process.completion_summary = status
+        batch_process.date_checked_out = None
+        batch_process.date_completed = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-GENERATE_BALLOT_SNAPSHOTS-DATE_COMPLETED_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+
+    batch_process_manager.create_batch_process_log_entry(
+        batch_process_id=batch_process.id,
+        kind_of_process=kind_of_process,
+        google_civic_election_id=google_civic_election_id,
+        status=status,
+    )
+
+    results = {
+        'success':              success,
+        'status':               status,
+    }
+    return results
+
+
+def process_one_update_politician_recommendations_batch_process(batch_process):
+    status = ""
+    success = True
+    batch_process_manager = BatchProcessManager()
+
+    kind_of_process = batch_process.kind_of_process
+
+    # When a batch_process is running, we mark when it was "taken off the shelf" to be worked on.
+    #  When the process is complete, we should reset this to "NULL"
+    try:
+        batch_process.date_started = now()
+        batch_process.date_checked_out = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-UPDATE_POLITICIAN_RECOMMENDATIONS-CHECKED_OUT_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+        batch_process_manager.create_batch_process_log_entry(
+            batch_process_id=batch_process.id,
+            kind_of_process=kind_of_process,
+            status=status,
+        )
+        results = {
+            'success': success,
+            'status': status,
+        }
+        return results
+
+    results = update_politician_recommendations_with_memory_limit()
+    status += results['status']
+    success = results['success']
+
+    try:
+        batch_process.completion_summary = status
+        batch_process.date_checked_out = None
+        batch_process.date_completed = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-UPDATE_POLITICIAN_RECOMMENDATIONS-DATE_COMPLETED_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+
+    batch_process_manager.create_batch_process_log_entry(
+        batch_process_id=batch_process.id,
+        kind_of_process=kind_of_process,
+        status=status,
+    )
+
+    results = {
+        'success':              success,
+        'status':               status,
+    }
+    return results
+
+
+def process_one_update_suggested_friends_batch_process(batch_process):
+    status = ""
+    success = True
+    batch_process_manager = BatchProcessManager()
+
+    kind_of_process = batch_process.kind_of_process
+
+    # When a batch_process is running, we mark when it was "taken off the shelf" to be worked on.
+    #  When the process is complete, we should reset this to "NULL"
+    try:
+        batch_process.date_started = now()
+        batch_process.date_checked_out = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-UPDATE_SUGGESTED_FRIENDS-CHECKED_OUT_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+        batch_process_manager.create_batch_process_log_entry(
+            batch_process_id=batch_process.id,
+            kind_of_process=kind_of_process,
+            status=status,
+        )
+        results = {
+            'success': success,
+            'status': status,
+        }
+        return results
+
+    results = update_suggested_friends_for_new_friendships()
+    status += results['status']
+    success = results['success']
+
+    try:
+        batch_process.completion_summary = status
+        batch_process.date_checked_out = None
+        batch_process.date_completed = now()
+        batch_process.save()
+    except Exception as e:
+        status += "ERROR-UPDATE_SUGGESTED_FRIENDS-DATE_COMPLETED_TIME_NOT_SAVED: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        success = False
+
+    batch_process_manager.create_batch_process_log_entry(
+        batch_process_id=batch_process.id,
+        kind_of_process=kind_of_process,
+        status=status,
+    )
+
+    results = {
+        'success':              success,
+        'status':               status,
+    }
+    return results
+
+
 def process_one_generate_voter_guides_batch_process(batch_process):
     status = ""
     success = True
@@ -3523,9 +3955,13 @@ def mark_batch_process_as_complete(
             if batch_process.date_completed is None:
                 batch_process.date_checked_out = None
                 batch_process.date_completed = now()
-            batch_process.save()
+            # Only these, so a worker's heartbeat saved since retrieve_batch_process isn't overwritten
+            batch_process.save(update_fields=['date_started', 'date_checked_out', 'date_completed'])
             batch_process_updated = True
             status += "BATCH_PROCESS_MARKED_COMPLETE "
+            if batch_process.kind_of_process == RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS:
+                queue_results = delete_map_point_queue_for_batch_process(batch_process_id=batch_process_id)
+                status += queue_results['status']
         except Exception as e:
             success = False
             status += "ERROR-CANNOT_MARK_BATCH_PROCESS_AS_COMPLETE: " + str(e) + " "
@@ -3556,7 +3992,9 @@ def mark_batch_process_as_complete(
                 batch_process_ballot_item_chunk.create_date_started = now()
             if batch_process_ballot_item_chunk.create_date_completed is None:
                 batch_process_ballot_item_chunk.create_date_completed = now()
-            batch_process_ballot_item_chunk.save()
+            batch_process_ballot_item_chunk.save(update_fields=[
+                'retrieve_date_started', 'retrieve_date_completed', 'analyze_date_started', 'analyze_date_completed',
+                'create_date_started', 'create_date_completed'])
             batch_process_ballot_item_chunk_updated = True
             status += "BATCH_PROCESS_BALLOT_ITEM_CHUNK_MARKED_COMPLETE "
         except Exception as e:
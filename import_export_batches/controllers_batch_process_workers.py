@@ -0,0 +1,173 @@
+# import_export_batches/controllers_batch_process_workers.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, connections
+
+from .controllers_batch_process import process_one_ballot_item_batch_process
+from .models import BATCH_PROCESS_WORKER_HEARTBEAT_INTERVAL, BatchProcessManager, \
+    REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS, \
+    RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
+import wevote_functions.admin
+from wevote_settings.models import fetch_batch_process_system_ballot_items_on, fetch_batch_process_system_on
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+BALLOT_ITEM_KIND_OF_PROCESS_LIST = [
+    REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
+    REFRESH_BALLOT_ITEMS_FROM_VOTERS,
+    RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]
+NUMBER_OF_BALLOT_ITEM_WORKERS = 4
+# Workers stop claiming new steps after this long, so a cron-started pool never overlaps the next one for long
+BALLOT_ITEM_WORKER_MAXIMUM_RUN_TIME = 55 * 60  # 55 minutes * 60 seconds
+# How long a worker which found nothing to claim waits before trying again
+BALLOT_ITEM_WORKER_IDLE_SLEEP_SECONDS = 10
+
+
+class BatchProcessWorkerHeartbeat(threading.Thread):
+    """
+    Keeps date_worker_heartbeat fresh while one step of a claimed chunk runs, which can take many minutes.
+    """
+
+    def __init__(self, batch_process_ballot_item_chunk_id, batch_process_id, worker_id):
+        super().__init__(daemon=True)
+        self.batch_process_ballot_item_chunk_id = batch_process_ballot_item_chunk_id
+        self.batch_process_id = batch_process_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(BATCH_PROCESS_WORKER_HEARTBEAT_INTERVAL):
+                if not BatchProcessManager.update_ballot_item_chunk_worker_heartbeat(
+                        self.batch_process_ballot_item_chunk_id, self.batch_process_id, self.worker_id):
+                    logger.error("BatchProcessWorkerHeartbeat lost batch_process_ballot_item_chunk " +
+                                 str(self.batch_process_ballot_item_chunk_id) + " held by " + self.worker_id)
+                    break
+        finally:
+            # This thread has its own database connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_ballot_item_batch_process_worker(worker_number=0, maximum_run_time=BALLOT_ITEM_WORKER_MAXIMUM_RUN_TIME):
+    """
+    Claim and run one step (retrieve, analyze or create) of a ballot item chunk at a time, until every ballot item
+    batch process is completed or maximum_run_time has passed. Meant to run in its own process.
+    Finding nothing to claim doesn't mean we're done: with SKIP LOCKED, workers started together skip what their
+    peers hold, so a worker waits and tries again while there is work left.
+    :param worker_number:
+    :param maximum_run_time:
+    :return:
+    """
+    status = ""
+    success = True
+    batch_process_manager = BatchProcessManager()
+    worker_id = socket.gethostname() + "-" + str(os.getpid()) + "-" + str(worker_number)
+    worker_steps_completed = 0
+    time_started = time.monotonic()
+
+    while time.monotonic() - time_started < maximum_run_time:
+        if not fetch_batch_process_system_on() or not fetch_batch_process_system_ballot_items_on():
+            status += "BATCH_PROCESS_SYSTEM_BALLOT_ITEMS_TURNED_OFF "
+            break
+
+        results = batch_process_manager.claim_next_ballot_item_chunk_for_worker(
+            worker_id, kind_of_process_list=BALLOT_ITEM_KIND_OF_PROCESS_LIST)
+        if not results['success']:
+            success = False
+            status += results['status']
+            break
+        if not results['batch_process_ballot_item_chunk_found']:
+            if not batch_process_manager.is_ballot_item_work_left_for_workers(
+                    kind_of_process_list=BALLOT_ITEM_KIND_OF_PROCESS_LIST):
+                status += "NO_MORE_BALLOT_ITEM_CHUNKS_TO_CLAIM "
+                break
+            time.sleep(min(BALLOT_ITEM_WORKER_IDLE_SLEEP_SECONDS,
+                           max(0, maximum_run_time - (time.monotonic() - time_started))))
+            continue
+        batch_process = results['batch_process']
+        batch_process_ballot_item_chunk = results['batch_process_ballot_item_chunk']
+
+        heartbeat = BatchProcessWorkerHeartbeat(batch_process_ballot_item_chunk.id, batch_process.id, worker_id)
+        heartbeat.start()
+        try:
+            process_one_ballot_item_batch_process(
+                batch_process, batch_process_ballot_item_chunk=batch_process_ballot_item_chunk)
+            worker_steps_completed += 1
+        except Exception as e:
+            status += "BALLOT_ITEM_WORKER_STEP_FAILED: " + str(e) + " "
+            logger.error("run_ballot_item_batch_process_worker " + worker_id + " failed on ballot item chunk " +
+                         str(batch_process_ballot_item_chunk.id) + ": " + str(e))
+        finally:
+            heartbeat.stop()
+            batch_process_manager.release_ballot_item_chunk_from_worker(
+                batch_process_ballot_item_chunk.id, batch_process.id, worker_id)
+
+    worker_run_time_seconds = time.monotonic() - time_started
+    status += "BALLOT_ITEM_WORKER_STEPS_COMPLETED: " + str(worker_steps_completed) + " "
+    batch_process_manager.create_batch_process_log_entry(
+        kind_of_process="BALLOT_ITEM_WORKER",
+        status=status,
+        worker_id=worker_id,
+        worker_steps_completed=worker_steps_completed,
+        worker_run_time_seconds=worker_run_time_seconds,
+    )
+    connection.close()
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'worker_id':                worker_id,
+        'worker_steps_completed':   worker_steps_completed,
+        'worker_run_time_seconds':  worker_run_time_seconds,
+    }
+    return results
+
+
+def run_ballot_item_batch_process_workers(
+        number_of_workers=NUMBER_OF_BALLOT_ITEM_WORKERS,
+        maximum_run_time=BALLOT_ITEM_WORKER_MAXIMUM_RUN_TIME):
+    """
+    Run ballot item batch processes across number_of_workers local processes. Each worker claims one chunk at a time
+    with SELECT ... FOR UPDATE SKIP LOCKED, so the chunks of one batch_process run in parallel, and this can run next
+    to process_next_ballot_items, and on several servers.
+    :param number_of_workers:
+    :param maximum_run_time:
+    :return:
+    """
+    status = ""
+    success = True
+    worker_results_list = []
+
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=number_of_workers,
+                             mp_context=multiprocessing.get_context('fork')) as executor:
+        future_list = [executor.submit(run_ballot_item_batch_process_worker, worker_number, maximum_run_time)
+                       for worker_number in range(number_of_workers)]
+        for future in future_list:
+            try:
+                worker_results = future.result()
+                worker_results_list.append(worker_results)
+                status += worker_results['worker_id'] + ": " + worker_results['status']
+            except Exception as e:
+                success = False
+                status += "BALLOT_ITEM_WORKER_CRASHED: " + str(e) + " "
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'worker_results_list':  worker_results_list,
+    }
+    return results
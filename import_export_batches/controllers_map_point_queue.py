@@ -0,0 +1,310 @@
+# import_export_batches/controllers_map_point_queue.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from .models import BatchProcess, BatchProcessMapPoint, MAP_POINT_QUEUE_CLAIM_TIME_OUT, MAP_POINT_QUEUE_CLAIMED, \
+    MAP_POINT_QUEUE_EMPTY, MAP_POINT_QUEUE_FAILED, MAP_POINT_QUEUE_MAX_ATTEMPTS, MAP_POINT_QUEUE_PENDING, \
+    MAP_POINT_QUEUE_RETRIEVED, RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
+from ballot.models import BallotReturned, BallotReturnedEmpty
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.utils.timezone import now
+from polling_location.models import KIND_OF_LOG_ENTRY_BALLOT_RECEIVED, PollingLocation, PollingLocationManager
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+MAP_POINT_QUEUE_BULK_CREATE_BATCH_SIZE = 2000
+# delete_map_point_queues_of_completed_batch_processes looks back this far, for queues left when the delete in
+#  mark_batch_process_as_complete failed
+MAP_POINT_QUEUE_CLEAN_UP_DAYS = 7
+
+
+def seed_map_point_queue_for_batch_process(
+        batch_process_id=0,
+        batch_process_date_started=None,
+        google_civic_election_id=0,
+        state_code='',
+        use_ctcl=False,
+        use_vote_usa=False):
+    """
+    The first chunk of a batch_process queues every map point in the state that doesn't have a ballot yet. Later
+    chunks find the queue already there, and only claim from it.
+    :param batch_process_id:
+    :param batch_process_date_started:
+    :param google_civic_election_id:
+    :param state_code:
+    :param use_ctcl:
+    :param use_vote_usa:
+    :return:
+    """
+    status = ""
+    success = True
+    map_point_queue_created = False
+    map_point_count = 0
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+
+    if not positive_value_exists(batch_process_id):
+        status += "SEED_MAP_POINT_QUEUE-MISSING_BATCH_PROCESS_ID "
+        results = {
+            'success':                  False,
+            'status':                   status,
+            'map_point_count':          map_point_count,
+            'map_point_queue_created':  map_point_queue_created,
+        }
+        return results
+
+    if BatchProcessMapPoint.objects.filter(batch_process_id=batch_process_id).exists():
+        status += "MAP_POINT_QUEUE_ALREADY_SEEDED "
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'map_point_count':          map_point_count,
+            'map_point_queue_created':  map_point_queue_created,
+        }
+        return results
+
+    try:
+        # Map points with a ballot for this election, or which came up empty since this batch_process started, are
+        #  left out with NOT EXISTS, instead of sending their we_vote_ids back to the database
+        ballot_returned_query = BallotReturned.objects.using('readonly').filter(
+            google_civic_election_id=google_civic_election_id,
+            polling_location_we_vote_id=OuterRef('we_vote_id'))
+        if positive_value_exists(state_code):
+            ballot_returned_query = ballot_returned_query.filter(normalized_state__iexact=state_code)
+        ballot_returned_empty_query = BallotReturnedEmpty.objects.using('readonly').filter(
+            google_civic_election_id=google_civic_election_id,
+            polling_location_we_vote_id=OuterRef('we_vote_id'))
+        if batch_process_date_started:
+            ballot_returned_empty_query = \
+                ballot_returned_empty_query.filter(date_last_updated__gt=batch_process_date_started)
+        if positive_value_exists(use_ctcl):
+            ballot_returned_empty_query = ballot_returned_empty_query.filter(is_from_ctcl=True)
+        if positive_value_exists(use_vote_usa):
+            ballot_returned_empty_query = ballot_returned_empty_query.filter(is_from_vote_usa=True)
+        if positive_value_exists(state_code):
+            ballot_returned_empty_query = ballot_returned_empty_query.filter(state_code__iexact=state_code)
+
+        polling_location_query = PollingLocation.objects.using('readonly').all()
+        polling_location_query = \
+            polling_location_query.exclude(Q(latitude__isnull=True) | Q(latitude__exact=0.0))
+        polling_location_query = \
+            polling_location_query.exclude(Q(zip_long__isnull=True) | Q(zip_long__exact='0') | Q(zip_long__exact=''))
+        polling_location_query = polling_location_query.filter(state__iexact=state_code)
+        polling_location_query = polling_location_query.exclude(polling_location_deleted=True)
+        if positive_value_exists(use_ctcl):
+            # CTCL only supports full addresses, so don't bother trying to pass addresses without line1
+            polling_location_query = polling_location_query.exclude(Q(line1__isnull=True) | Q(line1__exact=''))
+        polling_location_query = polling_location_query\
+            .exclude(Exists(ballot_returned_query))\
+            .exclude(Exists(ballot_returned_empty_query))
+        polling_location_we_vote_id_list = \
+            list(polling_location_query.order_by('id').values_list('we_vote_id', flat=True))
+
+        # The log entries can be in another database, so these can't be part of the query above. This only matters
+        #  when the queue is seeded for a batch_process which was already running.
+        log_results = PollingLocationManager().retrieve_polling_location_log_entry_list(
+            batch_process_id=batch_process_id,
+            is_from_ctcl=use_ctcl,
+            is_from_vote_usa=use_vote_usa,
+            kind_of_log_entry_list=[KIND_OF_LOG_ENTRY_BALLOT_RECEIVED],
+            only_return_polling_location_we_vote_id=True,
+            read_only=True,
+        )
+        if log_results['success'] and log_results['polling_location_we_vote_id_list']:
+            already_retrieved_set = set(log_results['polling_location_we_vote_id_list'])
+            polling_location_we_vote_id_list = [
+                polling_location_we_vote_id for polling_location_we_vote_id in polling_location_we_vote_id_list
+                if polling_location_we_vote_id not in already_retrieved_set]
+
+        # All or nothing, since a partly seeded queue would look seeded to the next chunk
+        with transaction.atomic():
+            BatchProcessMapPoint.objects.bulk_create(
+                [BatchProcessMapPoint(
+                    batch_process_id=batch_process_id,
+                    polling_location_we_vote_id=polling_location_we_vote_id)
+                 for polling_location_we_vote_id in polling_location_we_vote_id_list],
+                batch_size=MAP_POINT_QUEUE_BULK_CREATE_BATCH_SIZE,
+                ignore_conflicts=True)
+        map_point_count = len(polling_location_we_vote_id_list)
+        map_point_queue_created = True
+        status += "MAP_POINT_QUEUE_SEEDED: " + str(map_point_count) + " "
+    except Exception as e:
+        success = False
+        status += "SEED_MAP_POINT_QUEUE_FAILED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'map_point_count':          map_point_count,
+        'map_point_queue_created':  map_point_queue_created,
+    }
+    return results
+
+
+def claim_map_points_from_queue(batch_process_id=0, limit=0):
+    """
+    Claim the next map points of this batch_process's queue. Rows being claimed by another chunk are skipped
+    (SELECT ... FOR UPDATE SKIP LOCKED), so two chunks never get the same map point.
+    :param batch_process_id:
+    :param limit:
+    :return:
+    """
+    status = ""
+    success = True
+    polling_location_we_vote_id_list = []
+    date_claimed_time_out = now() - timedelta(seconds=MAP_POINT_QUEUE_CLAIM_TIME_OUT)
+    try:
+        with transaction.atomic():
+            queue_query = BatchProcessMapPoint.objects.select_for_update(skip_locked=True)\
+                .filter(batch_process_id=batch_process_id)\
+                .filter(Q(queue_status=MAP_POINT_QUEUE_PENDING) |
+                        Q(queue_status=MAP_POINT_QUEUE_CLAIMED, date_claimed__lt=date_claimed_time_out))\
+                .order_by('id')
+            if positive_value_exists(limit):
+                queue_query = queue_query[:limit]
+            claimed_list = list(queue_query.values_list('id', 'polling_location_we_vote_id'))
+            if len(claimed_list):
+                BatchProcessMapPoint.objects\
+                    .filter(id__in=[batch_process_map_point_id for batch_process_map_point_id, _ in claimed_list])\
+                    .update(queue_status=MAP_POINT_QUEUE_CLAIMED, date_claimed=now())
+            polling_location_we_vote_id_list = \
+                [polling_location_we_vote_id for _, polling_location_we_vote_id in claimed_list]
+        status += "MAP_POINTS_CLAIMED: " + str(len(polling_location_we_vote_id_list)) + " "
+    except Exception as e:
+        success = False
+        status += "CLAIM_MAP_POINTS_FROM_QUEUE_FAILED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':                          success,
+        'status':                           status,
+        'polling_location_we_vote_id_list': polling_location_we_vote_id_list,
+    }
+    return results
+
+
+def retrieve_polling_location_we_vote_ids_returned_empty(
+        google_civic_election_id=0,
+        polling_location_we_vote_id_list=[],
+        date_returned_empty_after=None,
+        use_ctcl=False,
+        use_vote_usa=False):
+    """
+    Of these map points, the ones a BallotReturnedEmpty was saved for after date_returned_empty_after. Read from the
+    primary database, since the chunk saved them moments ago.
+    :return: set of polling_location_we_vote_ids
+    """
+    if not len(polling_location_we_vote_id_list):
+        return set()
+    queryset = BallotReturnedEmpty.objects.filter(
+        google_civic_election_id=convert_to_int(google_civic_election_id),
+        polling_location_we_vote_id__in=polling_location_we_vote_id_list)
+    if date_returned_empty_after:
+        queryset = queryset.filter(date_last_updated__gte=date_returned_empty_after)
+    if positive_value_exists(use_ctcl):
+        queryset = queryset.filter(is_from_ctcl=True)
+    if positive_value_exists(use_vote_usa):
+        queryset = queryset.filter(is_from_vote_usa=True)
+    return set(queryset.values_list('polling_location_we_vote_id', flat=True))
+
+
+def mark_map_points_in_queue(
+        batch_process_id=0,
+        retrieved_polling_location_we_vote_id_list=[],
+        empty_polling_location_we_vote_id_list=[],
+        failed_polling_location_we_vote_id_list=[]):
+    """
+    Once a chunk is done with the map points it claimed, they leave the queue as RETRIEVED or EMPTY. Failed ones go
+    back to PENDING for another chunk to try, until they have failed MAP_POINT_QUEUE_MAX_ATTEMPTS times.
+    :param batch_process_id:
+    :param retrieved_polling_location_we_vote_id_list:
+    :param empty_polling_location_we_vote_id_list: Only map points the data source had no ballot for
+    :param failed_polling_location_we_vote_id_list:
+    :return:
+    """
+    status = ""
+    success = True
+    try:
+        for queue_status, polling_location_we_vote_id_list in (
+                (MAP_POINT_QUEUE_RETRIEVED, retrieved_polling_location_we_vote_id_list),
+                (MAP_POINT_QUEUE_EMPTY, empty_polling_location_we_vote_id_list)):
+            if len(polling_location_we_vote_id_list):
+                number_updated = BatchProcessMapPoint.objects\
+                    .filter(batch_process_id=batch_process_id,
+                            polling_location_we_vote_id__in=polling_location_we_vote_id_list)\
+                    .update(queue_status=queue_status)
+                status += "MAP_POINTS_MARKED_" + queue_status + ": " + str(number_updated) + " "
+        if len(failed_polling_location_we_vote_id_list):
+            number_updated = BatchProcessMapPoint.objects\
+                .filter(batch_process_id=batch_process_id,
+                        polling_location_we_vote_id__in=failed_polling_location_we_vote_id_list)\
+                .update(
+                    queue_status=Case(
+                        When(retry_count__gte=MAP_POINT_QUEUE_MAX_ATTEMPTS - 1, then=Value(MAP_POINT_QUEUE_FAILED)),
+                        default=Value(MAP_POINT_QUEUE_PENDING)),
+                    retry_count=F('retry_count') + 1,
+                    date_claimed=None)
+            status += "MAP_POINTS_MARKED_FAILED_OR_RETRY: " + str(number_updated) + " "
+    except Exception as e:
+        success = False
+        status += "MARK_MAP_POINTS_IN_QUEUE_FAILED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':  success,
+        'status':   status,
+    }
+    return results
+
+
+def delete_map_point_queue_for_batch_process(batch_process_id=0):
+    status = ""
+    success = True
+    try:
+        number_deleted, _ = BatchProcessMapPoint.objects.filter(batch_process_id=batch_process_id).delete()
+        if positive_value_exists(number_deleted):
+            status += "MAP_POINT_QUEUE_DELETED: " + str(number_deleted) + " "
+    except Exception as e:
+        success = False
+        status += "DELETE_MAP_POINT_QUEUE_FAILED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':  success,
+        'status':   status,
+    }
+    return results
+
+
+def delete_map_point_queues_of_completed_batch_processes():
+    """
+    Clean up after batch_processes which completed in the last MAP_POINT_QUEUE_CLEAN_UP_DAYS without their queue
+    being deleted
+    :return:
+    """
+    status = ""
+    success = True
+    try:
+        completed_batch_process_id_query = BatchProcess.objects\
+            .filter(kind_of_process=RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
+                    date_completed__gte=now() - timedelta(days=MAP_POINT_QUEUE_CLEAN_UP_DAYS))\
+            .values('id')
+        number_deleted, _ = BatchProcessMapPoint.objects\
+            .filter(batch_process_id__in=completed_batch_process_id_query)\
+            .delete()
+        if positive_value_exists(number_deleted):
+            status += "MAP_POINT_QUEUES_OF_COMPLETED_BATCH_PROCESSES_DELETED: " + str(number_deleted) + " "
+    except Exception as e:
+        success = False
+        status += "DELETE_MAP_POINT_QUEUES_OF_COMPLETED_BATCH_PROCESSES_FAILED: " + str(e) + " "
+        logger.error(status)
+
+    results = {
+        'success':  success,
+        'status':   status,
+    }
+    return results
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from import_export_batches.controllers_batch_process_workers import BALLOT_ITEM_WORKER_MAXIMUM_RUN_TIME, \
+    NUMBER_OF_BALLOT_ITEM_WORKERS, run_ballot_item_batch_process_workers
+
+# Retrieves, analyzes and creates ballot items for the active (and then queued) ballot item batch processes, with
+#  several local worker processes instead of one step per process_next_ballot_items cron call:
+#      python manage.py runballotitemworkers --workers 8
+# Each step of a chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so the chunks of one batch process run in
+#  parallel, and this can run on more than one server at once.
+# Per-worker throughput is written to BatchProcessLogEntry (worker_id, worker_steps_completed,
+#  worker_run_time_seconds).
+
+
+class Command(BaseCommand):
+    help = 'Run ballot item batch processes across a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=NUMBER_OF_BALLOT_ITEM_WORKERS)
+        parser.add_argument('--max-run-time', type=int, default=BALLOT_ITEM_WORKER_MAXIMUM_RUN_TIME,
+                            help='Seconds after which workers stop claiming new steps')
+
+    def handle(self, *args, **options):
+        results = run_ballot_item_batch_process_workers(
+            number_of_workers=options['workers'],
+            maximum_run_time=options['max_run_time'])
+        for worker_results in results['worker_results_list']:
+            self.stdout.write(worker_results['worker_id'] + ": " + str(worker_results['worker_steps_completed']) +
+                              " steps in " + str(round(worker_results['worker_run_time_seconds'], 1)) + " seconds")
+        if not results['success']:
+            self.stderr.write(results['status'])
@@ -3,7 +3,10 @@
 # -*- coding: UTF-8 -*-
 
 import codecs
+import copy
 import csv
+import io
+import itertools
 import json
 import urllib
 import xml.etree.ElementTree as ElementTree
@@ -12,8 +15,9 @@ from urllib.parse import quote
 from urllib.request import Request, urlopen
 
 import magic
-from django.db import models
-from django.db.models import Q
+from django.db import connection, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
 
 import wevote_functions.admin
@@ -642,6 +646,7 @@ CALCULATE_ORGANIZATION_ELECTION_METRICS = "CALCULATE_ORGANIZATION_ELECTION_METRI
 CALCULATE_SITEWIDE_DAILY_METRICS = "CALCULATE_SITEWIDE_DAILY_METRICS"
 CALCULATE_SITEWIDE_ELECTION_METRICS = "CALCULATE_SITEWIDE_ELECTION_METRICS"
 CALCULATE_SITEWIDE_VOTER_METRICS = "CALCULATE_SITEWIDE_VOTER_METRICS"
+GENERATE_BALLOT_SNAPSHOTS = "GENERATE_BALLOT_SNAPSHOTS"
 GENERATE_VOTER_GUIDES = "GENERATE_VOTER_GUIDES"
 MATCH_POLITICIANS_TO_ORGANIZATIONS = "MATCH_POLITICIANS_TO_ORGANIZATIONS"
 REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS = "REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS"
@@ -650,6 +655,8 @@ RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS = "RETRIEVE_BALLOT_ITEMS_FROM_POLLI
 RETRIEVE_FROM_BALLOTPEDIA = "RETRIEVE_FROM_BALLOTPEDIA"
 RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS = "RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS"
 SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE = "SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE"
+UPDATE_POLITICIAN_RECOMMENDATIONS = "UPDATE_POLITICIAN_RECOMMENDATIONS"
+UPDATE_SUGGESTED_FRIENDS = "UPDATE_SUGGESTED_FRIENDS"
 UPDATE_TWITTER_DATA_FROM_TWITTER = "UPDATE_TWITTER_DATA_FROM_TWITTER"
 
 KIND_OF_PROCESS_CHOICES = (
@@ -662,6 +669,7 @@ KIND_OF_PROCESS_CHOICES = (
     (CALCULATE_SITEWIDE_ELECTION_METRICS,  'Sitewide election metrics'),
     (CALCULATE_ORGANIZATION_DAILY_METRICS,  'Organization specific daily metrics'),
     (CALCULATE_ORGANIZATION_ELECTION_METRICS,  'Organization specific election metrics'),
+    (GENERATE_BALLOT_SNAPSHOTS,  'Generate ballot snapshots'),
     (GENERATE_VOTER_GUIDES,  'Generate voter guides'),
     (MATCH_POLITICIANS_TO_ORGANIZATIONS,  'Match politicians to organizations'),
     (RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,  'Retrieve Ballot Items from Map Points'),
@@ -669,11 +677,43 @@ KIND_OF_PROCESS_CHOICES = (
     (REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, 'Refresh Ballot Items from BallotReturned Map Points'),
     (REFRESH_BALLOT_ITEMS_FROM_VOTERS, 'Refresh Ballot Items from Voter Custom Addresses'),
     (SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE, 'Search for Candidate Twitter Handles'),
+    (UPDATE_POLITICIAN_RECOMMENDATIONS, 'Update recommended politicians'),
+    (UPDATE_SUGGESTED_FRIENDS, 'Suggest friends of new friends'),
 )
 
+# Workers refresh date_worker_heartbeat every BATCH_PROCESS_WORKER_HEARTBEAT_INTERVAL seconds. A claim whose heartbeat
+#  is older than BATCH_PROCESS_WORKER_HEARTBEAT_TIME_OUT belongs to a worker that died, and can be claimed again.
+BATCH_PROCESS_WORKER_HEARTBEAT_INTERVAL = 30
+BATCH_PROCESS_WORKER_HEARTBEAT_TIME_OUT = 120
+# Processes checked out by the cron-driven path (without a heartbeat) keep the old checkout time out
+BATCH_PROCESS_WORKER_LEGACY_CHECKED_OUT_TIME_OUT = 1800
+# How many chunks of one RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS batch_process workers run at once
+BALLOT_ITEM_CHUNKS_RUNNING_PER_BATCH_PROCESS = 4
+# Chunks with a step still to start or finish
+BALLOT_ITEM_CHUNK_NOT_COMPLETED_FILTER = \
+    Q(retrieve_date_completed__isnull=True) | Q(analyze_date_completed__isnull=True) | \
+    Q(create_date_completed__isnull=True)
+
+# BatchProcessMapPoint.queue_status
+MAP_POINT_QUEUE_PENDING = 'PENDING'
+MAP_POINT_QUEUE_CLAIMED = 'CLAIMED'
+MAP_POINT_QUEUE_RETRIEVED = 'RETRIEVED'
+MAP_POINT_QUEUE_EMPTY = 'EMPTY'
+MAP_POINT_QUEUE_FAILED = 'FAILED'
+# A chunk that claimed map points and didn't mark them within this time crashed, so they can be claimed again
+MAP_POINT_QUEUE_CLAIM_TIME_OUT = 1800
+# A map point whose retrieve failed goes back in the queue, until it has failed this many times
+MAP_POINT_QUEUE_MAX_ATTEMPTS = 3
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
+def batch_process_worker_is_alive(batch_process):
+    if batch_process.date_worker_heartbeat is None:
+        return False
+    return now() < batch_process.date_worker_heartbeat + timedelta(seconds=BATCH_PROCESS_WORKER_HEARTBEAT_TIME_OUT)
+
+
 def get_value_if_index_in_list(incoming_list, index):
     try:
         return incoming_list[index]
@@ -710,6 +750,509 @@ def get_header_map_value_if_index_in_list(incoming_list, index, kind_of_batch=""
         return ""
 
 
+BATCH_ROW_NUMBER_OF_COLUMNS = 51  # batch_row_000 through batch_row_050
+BATCH_ROW_COLUMN_NAMES = ['batch_row_{index:03}'.format(index=index) for index in range(BATCH_ROW_NUMBER_OF_COLUMNS)]
+BATCH_ROW_BULK_CREATE_CHUNK_SIZE = 2000
+
+
+def get_batch_row_values_from_csv_line(line):
+    """
+    Map one CSV line onto batch_row_000 ... batch_row_050. Extra columns are dropped, missing ones are ""
+    :param line:
+    :return:
+    """
+    number_of_values = len(line)
+    return {
+        column_name: line[index] if index < number_of_values else ""
+        for index, column_name in enumerate(BATCH_ROW_COLUMN_NAMES)}
+
+
+def get_batch_row_values_from_json_dict(one_dict, remote_source_keys):
+    number_of_keys = len(remote_source_keys)
+    return {
+        column_name: get_value_from_dict(one_dict, remote_source_keys[index] if index < number_of_keys else "")
+        for index, column_name in enumerate(BATCH_ROW_COLUMN_NAMES)}
+
+
+def copy_batch_rows_to_postgres(batch_row_list):
+    """
+    Write one chunk of unsaved BatchRow objects with a single Postgres COPY, which is much faster than INSERT
+    :param batch_row_list:
+    :return:
+    """
+    field_list = [field for field in BatchRow._meta.concrete_fields if not field.primary_key]
+    csv_file = io.StringIO()
+    for batch_row in batch_row_list:
+        value_list = []
+        for field in field_list:
+            value = field.get_db_prep_save(field.pre_save(batch_row, True), connection)
+            if value is None:
+                # An unquoted empty value is NULL in COPY's csv format, while "" stays an empty string
+                value_list.append('')
+            else:
+                value_list.append('"' + str(value).replace('"', '""') + '"')
+        csv_file.write(','.join(value_list) + '\n')
+    csv_file.seek(0)
+    sql = 'COPY {table_name} ({column_names}) FROM STDIN WITH (FORMAT csv)'.format(
+        table_name=connection.ops.quote_name(BatchRow._meta.db_table),
+        column_names=', '.join(connection.ops.quote_name(field.column) for field in field_list))
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, csv_file)
+
+
+def save_batch_rows_one_at_a_time(batch_row_list):
+    """
+    Save a chunk whose bulk insert failed row by row, stopping at the first row that can't be saved, so every row
+    before it still makes it in
+    :param batch_row_list:
+    :return:
+    """
+    number_of_batch_rows = 0
+    status = ""
+    success = True
+    for batch_row in batch_row_list:
+        # A failed bulk insert can leave ids on rows it never saved
+        batch_row.pk = None
+        batch_row._state.adding = True
+        try:
+            with transaction.atomic():
+                batch_row.save()
+        except Exception as e:
+            # Stop trying to save rows
+            status += "EXCEPTION_BATCH_ROW: " + str(e) + " "
+            success = False
+            break
+        number_of_batch_rows += 1
+    results = {
+        'success':              success,
+        'status':               status,
+        'number_of_batch_rows': number_of_batch_rows,
+    }
+    return results
+
+
+def save_batch_rows_in_bulk(batch_row_iterator, batch_header_id=0, chunk_size=BATCH_ROW_BULK_CREATE_CHUNK_SIZE):
+    """
+    Save unsaved BatchRow objects in chunks. batch_row_iterator is consumed lazily, so at most chunk_size rows are
+    held in memory no matter how large the incoming file is. On Postgres each chunk is written with COPY, and
+    everywhere else (or if COPY fails) with bulk_create. A chunk that can't be inserted in bulk is saved one row at
+    a time, up to the first bad row, like we did before rows were saved in bulk.
+    :param batch_row_iterator:
+    :param batch_header_id: Only used for the progress log
+    :param chunk_size:
+    :return:
+    """
+    number_of_batch_rows = 0
+    status = ""
+    success = True
+    use_copy = connection.vendor == 'postgresql'
+
+    batch_row_iterator = iter(batch_row_iterator)
+    while True:
+        batch_row_chunk = list(itertools.islice(batch_row_iterator, chunk_size))
+        if not len(batch_row_chunk):
+            break
+        chunk_saved = False
+        if use_copy:
+            try:
+                # The savepoints let us fall back inside an outer transaction
+                with transaction.atomic():
+                    copy_batch_rows_to_postgres(batch_row_chunk)
+                chunk_saved = True
+            except Exception as e:
+                status += "BATCH_ROW_COPY_FAILED_USING_BULK_CREATE: " + str(e) + " "
+                use_copy = False
+        if not chunk_saved:
+            try:
+                with transaction.atomic():
+                    BatchRow.objects.bulk_create(batch_row_chunk)
+                chunk_saved = True
+            except Exception as e:
+                status += "BATCH_ROW_BULK_CREATE_FAILED_SAVING_ONE_AT_A_TIME: " + str(e) + " "
+        if chunk_saved:
+            number_of_batch_rows += len(batch_row_chunk)
+        else:
+            results = save_batch_rows_one_at_a_time(batch_row_chunk)
+            number_of_batch_rows += results['number_of_batch_rows']
+            if not results['success']:
+                status += results['status']
+                success = False
+                break
+        logger.info("SAVE_BATCH_ROWS_IN_BULK batch_header_id: " + str(batch_header_id) +
+                    ", rows saved so far: " + str(number_of_batch_rows))
+
+    status += "BATCH_ROWS_SAVED_IN_BULK: " + str(number_of_batch_rows) + " "
+    results = {
+        'success':              success,
+        'status':               status,
+        'number_of_batch_rows': number_of_batch_rows,
+    }
+    return results
+
+
+# Contest office analysis asks for office names one row at a time, so we keep each batch set's names in a dict
+#  while create_batch_row_actions analyzes it
+office_held_name_by_ctcl_id_by_batch_set_id = {}
+OFFICE_HELD_NAME_BATCH_SETS_TO_CACHE = 10
+
+VIP_XML_CTCL_UUID_PATH = "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value"
+VIP_XML_CANDIDATE_SELECTION_ID_LIMIT = 10  # We assume a contest office has at most 10 ballot selection ids
+VIP_XML_IMPORT_CHUNK_SIZE = 500  # ElectoralDistrict and Party elements are imported this many at a time
+
+VIP_XML_MEASURE_HEADER_COLUMN_LIST = [
+    'id', 'BallotSubTitle', 'BallotTitle', 'ElectoralDistrictId', 'other::ctcl-uuid', 'Name']
+VIP_XML_MEASURE_HEADER_MAP_LIST = [
+    'measure_batch_id', 'measure_subtitle', 'measure_title', 'electoral_district_id', 'measure_ctcl_uuid',
+    'measure_name']
+VIP_XML_OFFICE_HELD_HEADER_COLUMN_LIST = [
+    'id', 'NameEnglish', 'NameSpanish', 'DescriptionEnglish', 'DescriptionSpanish', 'ElectoralDistrictId',
+    'IsPartisan', 'other::ctcl-uuid']
+VIP_XML_OFFICE_HELD_HEADER_MAP_LIST = [
+    'office_held_batch_id', 'office_held_name', 'office_held_name_es', 'office_held_description',
+    'office_held_description_es', 'electoral_district_id', 'office_held_is_partisan', 'office_held_ctcl_uuid']
+VIP_XML_CONTEST_OFFICE_HEADER_COLUMN_LIST = [
+    'id', 'Name', 'OfficeIds', 'ElectoralDistrictId', 'VotesAllowed', 'NumberElected', 'other::ctcl-uuid'] + \
+    ['CandidateSelectionId' + str(number) for number in range(1, VIP_XML_CANDIDATE_SELECTION_ID_LIMIT + 1)]
+VIP_XML_CONTEST_OFFICE_HEADER_MAP_LIST = [
+    'contest_office_batch_id', 'contest_office_name', 'office_held_id', 'electoral_district_id',
+    'contest_office_votes_allowed', 'contest_office_number_elected', 'contest_office_ctcl_uuid'] + \
+    ['candidate_selection_id' + str(number) for number in range(1, VIP_XML_CANDIDATE_SELECTION_ID_LIMIT + 1)]
+VIP_XML_POLITICIAN_HEADER_COLUMN_LIST = [
+    'id', 'FullName', 'FirstName', 'MiddleName', 'LastName', 'PartyName', 'Email', 'Phone', 'uri::website',
+    'uri::facebook', 'uri::twitter', 'uri::youtube', 'uri::googleplus', 'other::ctcl-uuid']
+VIP_XML_POLITICIAN_HEADER_MAP_LIST = [
+    'politician_batch_id', 'politician_full_name', 'politician_first_name', 'politician_middle_name',
+    'politician_last_name', 'politician_party_name', 'politician_email', 'politician_phone_number',
+    'politician_website_url', 'politician_facebook_id', 'politician_twitter_url', 'politician_youtube_id',
+    'politician_googleplus_id', 'politician_ctcl_uuid']
+VIP_XML_CANDIDATE_HEADER_COLUMN_LIST = [
+    'id', 'PersonId', 'Name', 'PartyName', 'IsTopTicket', 'other::ctcl-uuid', 'other::CandidateSelectionId']
+VIP_XML_CANDIDATE_HEADER_MAP_LIST = [
+    'candidate_batch_id', 'candidate_ctcl_person_id', 'candidate_name', 'candidate_party_name',
+    'candidate_is_top_ticket', 'candidate_ctcl_uuid', 'candidate_selection_id']
+
+
+def iterate_vip_xml_elements(xml_source, tag_set=None):
+    """
+    Walk the direct children of VipObject with iterparse. Each child is yielded once it has been read completely,
+    and cleared as soon as the caller moves on, so memory use stays flat no matter how large the feed is.
+    Callers that need to keep an element must copy it.
+    :param xml_source: A file name or file-like object
+    :param tag_set: Only yield children with these tags. None yields every child.
+    :return:
+    """
+    depth = 0
+    xml_root = None
+    for event, element in ElementTree.iterparse(xml_source, events=('start', 'end')):
+        if event == 'start':
+            if xml_root is None:
+                xml_root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        if tag_set is None or element.tag in tag_set:
+            yield element
+        element.clear()
+        # The root still holds a reference to every finished child
+        xml_root.clear()
+
+
+def cache_office_held_names_for_batch_set(batch_set_id, office_held_name_by_ctcl_id):
+    if not positive_value_exists(batch_set_id) or not len(office_held_name_by_ctcl_id):
+        return
+    if len(office_held_name_by_ctcl_id_by_batch_set_id) >= OFFICE_HELD_NAME_BATCH_SETS_TO_CACHE:
+        office_held_name_by_ctcl_id_by_batch_set_id.clear()
+    office_held_name_by_ctcl_id_by_batch_set_id[batch_set_id] = office_held_name_by_ctcl_id
+
+
+def clear_office_held_names_for_batch_set(batch_set_id):
+    office_held_name_by_ctcl_id_by_batch_set_id.pop(batch_set_id, None)
+
+
+def get_vip_xml_text(element, path, default=''):
+    node = element.find(path)
+    if node is not None:
+        return node.text
+    return default
+
+
+def get_vip_xml_measure_row(one_ballot_measure):
+    """
+    Read one BallotMeasureContest element. Returns the BatchRow values, or None if the measure can't be imported.
+    :param one_ballot_measure:
+    :return:
+    """
+    # look for relevant child nodes under BallotMeasureContest: id, BallotTitle, BallotSubTitle,
+    # ElectoralDistrictId, other::ctcl-uid
+    ballot_measure_id = one_ballot_measure.attrib['id']
+    ballot_measure_subtitle = get_vip_xml_text(one_ballot_measure, 'BallotSubTitle/Text')
+    ballot_measure_title = get_vip_xml_text(one_ballot_measure, 'BallotTitle/Text')
+    electoral_district_id = get_vip_xml_text(one_ballot_measure, 'ElectoralDistrictId')
+    ctcl_uuid = get_vip_xml_text(one_ballot_measure, VIP_XML_CTCL_UUID_PATH)
+    ballot_measure_name = get_vip_xml_text(one_ballot_measure, 'Name')
+
+    # check for measure_id, title OR subtitle or name AND ctcl_uuid
+    if positive_value_exists(ballot_measure_id) and positive_value_exists(ctcl_uuid) and \
+            (positive_value_exists(ballot_measure_subtitle) or positive_value_exists(ballot_measure_title) or
+             positive_value_exists(ballot_measure_name)):
+        return [ballot_measure_id, ballot_measure_subtitle, ballot_measure_title, electoral_district_id, ctcl_uuid,
+                ballot_measure_name]
+    return None
+
+
+def get_vip_xml_office_held_row(one_office_held):
+    """
+    Read one Office element. Returns the BatchRow values, or None if the office can't be imported.
+    :param one_office_held:
+    :return:
+    """
+    # look for relevant child nodes under Office: id, Name, Description, ElectoralDistrictId,
+    # IsPartisan, other::ctcl-uid
+    office_held_id = one_office_held.attrib['id']
+    office_held_name = get_vip_xml_text(one_office_held, "./Name/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+    office_held_name_es = get_vip_xml_text(one_office_held, "./Name/Text/[@language='" + LANGUAGE_CODE_SPANISH + "']")
+    office_held_description = get_vip_xml_text(
+        one_office_held, "Description/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+    office_held_description_es = get_vip_xml_text(
+        one_office_held, "Description/Text/[@language='" + LANGUAGE_CODE_SPANISH + "']")
+    electoral_district_id = get_vip_xml_text(one_office_held, 'ElectoralDistrictId')
+    office_held_is_partisan = get_vip_xml_text(one_office_held, 'IsPartisan')
+    ctcl_uuid = get_vip_xml_text(one_office_held, VIP_XML_CTCL_UUID_PATH)
+
+    # check for office_batch_id or electoral_district or name AND ctcl_uuid
+    if positive_value_exists(office_held_id) and positive_value_exists(ctcl_uuid) and \
+            (positive_value_exists(electoral_district_id) or positive_value_exists(office_held_name)) or \
+            positive_value_exists(office_held_name_es):
+        return [office_held_id, office_held_name, office_held_name_es, office_held_description,
+                office_held_description_es, electoral_district_id, office_held_is_partisan, ctcl_uuid]
+    return None
+
+
+def get_vip_xml_contest_office_row(one_contest_office):
+    """
+    Read one CandidateContest element. Returns the BatchRow values without the candidate columns, plus the
+    BallotSelectionIds, which are turned into candidate ids with add_candidate_ids_to_vip_xml_contest_office_row once
+    the CandidateSelection elements have been read. Returns (None, []) if the contest can't be imported.
+    :param one_contest_office:
+    :return:
+    """
+    # look for relevant child nodes under CandidateContest: id, Name, OfficeId, ElectoralDistrictId,
+    # other::ctcl-uid, VotesAllowed, NumberElected
+    contest_office_id = one_contest_office.attrib['id']
+    contest_office_name = get_vip_xml_text(one_contest_office, 'Name')
+    contest_office_number_elected = get_vip_xml_text(one_contest_office, 'NumberElected')
+    electoral_district_id = get_vip_xml_text(one_contest_office, 'ElectoralDistrictId')
+    contest_office_votes_allowed = get_vip_xml_text(one_contest_office, 'VotesAllowed')
+    office_held_id = get_vip_xml_text(one_contest_office, 'OfficeIds')
+    ctcl_uuid = get_vip_xml_text(one_contest_office, VIP_XML_CTCL_UUID_PATH)
+    ballot_selection_ids_str = get_vip_xml_text(one_contest_office, './BallotSelectionIds')
+    ballot_selection_id_list = ballot_selection_ids_str.split() if ballot_selection_ids_str else []
+
+    # check for contest_office_batch_id or electoral_district or name AND ctcl_uuid
+    if positive_value_exists(contest_office_id) and positive_value_exists(ctcl_uuid) and \
+            (positive_value_exists(electoral_district_id) or positive_value_exists(contest_office_name)):
+        batch_row_value_list = [contest_office_id, contest_office_name, office_held_id, electoral_district_id,
+                                contest_office_votes_allowed, contest_office_number_elected, ctcl_uuid]
+        return batch_row_value_list, ballot_selection_id_list[:VIP_XML_CANDIDATE_SELECTION_ID_LIMIT]
+    return None, []
+
+
+def add_candidate_ids_to_vip_xml_contest_office_row(
+        batch_row_value_list, ballot_selection_id_list, candidate_id_by_candidate_selection_id):
+    candidate_id_list = [candidate_id_by_candidate_selection_id[ballot_selection_id]
+                         for ballot_selection_id in ballot_selection_id_list
+                         if ballot_selection_id in candidate_id_by_candidate_selection_id]
+    candidate_id_list += [''] * (VIP_XML_CANDIDATE_SELECTION_ID_LIMIT - len(candidate_id_list))
+    return batch_row_value_list + candidate_id_list
+
+
+def get_vip_xml_politician_row(one_person):
+    """
+    Read one Person element. Returns the BatchRow values with the PartyId in the PartyName column (see
+    add_party_name_to_vip_xml_row), or None if the person can't be imported.
+    :param one_person:
+    :return:
+    """
+    # look for relevant child nodes under Person: id, FullName, FirstName, LastName, MiddleName, PartyId, Email,
+    # PhoneNumber, Website, Twitter, ctcl-uuid
+    person_id = one_person.attrib['id']
+    person_full_name = get_vip_xml_text(one_person, "./FullName/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+    person_first_name = get_vip_xml_text(one_person, 'FirstName')
+    person_middle_name = get_vip_xml_text(one_person, 'MiddleName')
+    person_last_name = get_vip_xml_text(one_person, 'LastName')
+    person_party_id = get_vip_xml_text(one_person, 'PartyId')
+    person_email_id = get_vip_xml_text(one_person, './ContactInformation/Email')
+    person_phone_number = get_vip_xml_text(one_person, './ContactInformation/Phone')
+    person_website_url = get_vip_xml_text(one_person, "./ContactInformation/Uri/[@annotation='website']")
+    person_facebook_id = get_vip_xml_text(one_person, "./ContactInformation/Uri/[@annotation='facebook']")
+    person_twitter_id = get_vip_xml_text(one_person, "./ContactInformation/Uri/[@annotation='twitter']")
+    person_youtube_id = get_vip_xml_text(one_person, "./ContactInformation/Uri/[@annotation='youtube']")
+    person_googleplus_id = get_vip_xml_text(one_person, "./ContactInformation/Uri/[@annotation='googleplus']")
+    ctcl_uuid = get_vip_xml_text(one_person, VIP_XML_CTCL_UUID_PATH)
+
+    if positive_value_exists(person_id) and positive_value_exists(ctcl_uuid) and \
+            (positive_value_exists(person_full_name) or positive_value_exists(person_first_name)):
+        return [person_id, person_full_name, person_first_name, person_middle_name, person_last_name,
+                person_party_id, person_email_id, person_phone_number, person_website_url, person_facebook_id,
+                person_twitter_id, person_youtube_id, person_googleplus_id, ctcl_uuid]
+    return None
+
+
+def get_vip_xml_candidate_row(one_candidate):
+    """
+    Read one Candidate element. Returns the BatchRow values with the PartyId in the PartyName column (see
+    add_party_name_to_vip_xml_row), or None if the candidate can't be imported.
+    :param one_candidate:
+    :return:
+    """
+    # look for relevant child nodes under Candidate: id, BallotName, personId, PartyId, isTopTicket,
+    # other::ctcl-uid
+    candidate_id = one_candidate.attrib['id']
+    candidate_selection_id = get_vip_xml_text(one_candidate, './BallotSelectionIds', default=None)
+    candidate_name_english = get_vip_xml_text(
+        one_candidate, "./BallotName/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']", default=None)
+    candidate_ctcl_person_id = get_vip_xml_text(one_candidate, './PersonId')
+    candidate_party_id = get_vip_xml_text(one_candidate, './PartyId')
+    candidate_is_top_ticket = get_vip_xml_text(one_candidate, 'IsTopTicket')
+    ctcl_uuid = get_vip_xml_text(one_candidate, VIP_XML_CTCL_UUID_PATH)
+
+    # check for candidate_id or candidate_ctcl_person_id or name AND ctcl_uuid
+    if positive_value_exists(candidate_id) and positive_value_exists(ctcl_uuid) and \
+            (positive_value_exists(candidate_ctcl_person_id) or positive_value_exists(candidate_name_english)):
+        return [candidate_id, candidate_ctcl_person_id, candidate_name_english, candidate_party_id,
+                candidate_is_top_ticket, ctcl_uuid, candidate_selection_id]
+    return None
+
+
+def add_party_name_to_vip_xml_row(batch_row_value_list, party_name_column_index, party_name_by_party_id):
+    party_id = batch_row_value_list[party_name_column_index]
+    batch_row_value_list[party_name_column_index] = party_name_by_party_id.get(party_id, '') if party_id else ''
+    return batch_row_value_list
+
+
+def retrieve_party_name_by_party_id_dict():
+    """
+    Get party names keyed by the party ids used in VIP XML, so Person and Candidate rows don't rescan the party list.
+    :return:
+    """
+    party_name_by_party_id = {}
+    party_details_list = retrieve_all_party_names_and_ids_api()
+    if isinstance(party_details_list, dict):
+        # The party retrieve failed
+        return party_name_by_party_id
+    for one_party in party_details_list:
+        party_id_temp = one_party.get('party_id_temp')
+        if party_id_temp and party_id_temp not in party_name_by_party_id:
+            party_name_by_party_id[party_id_temp] = one_party.get('party_name')
+    return party_name_by_party_id
+
+
+class VipXmlBatchRowWriter(object):
+    """
+    Saves the BatchRows for one kind_of_batch from a VIP XML feed. The BatchHeader, BatchHeaderMap and
+    BatchDescription are created when the first element arrives, and rows are saved in chunks as they come in.
+    """
+
+    def __init__(self, kind_of_batch, header_column_list, header_map_list, batch_uri, google_civic_election_id,
+                 organization_we_vote_id, batch_set_id=0, success_if_no_elements=True):
+        self.kind_of_batch = kind_of_batch
+        self.header_column_list = header_column_list
+        self.header_map_list = header_map_list
+        self.batch_uri = batch_uri
+        self.google_civic_election_id = google_civic_election_id
+        self.organization_we_vote_id = organization_we_vote_id
+        self.batch_set_id = batch_set_id
+        self.batch_header_id = 0
+        self.batch_row_list = []
+        self.element_found = False
+        self.number_of_batch_rows = 0
+        self.status = ''
+        self.success = success_if_no_elements
+
+    def start_batch(self):
+        """
+        Create the batch the first time an element arrives. Returns False if the batch could not be created.
+        :return:
+        """
+        if self.element_found:
+            return positive_value_exists(self.batch_header_id)
+        self.element_found = True
+        try:
+            batch_header = BatchHeader.objects.create(**{
+                'batch_header_column_{index:03}'.format(index=index): header_column
+                for index, header_column in enumerate(self.header_column_list)})
+            batch_header_map = BatchHeaderMap.objects.create(batch_header_id=batch_header.id, **{
+                'batch_header_map_{index:03}'.format(index=index): header_map
+                for index, header_map in enumerate(self.header_map_list)})
+            self.status += " BATCH_HEADER_MAP_SAVED "
+            BatchDescription.objects.create(
+                batch_header_id=batch_header.id,
+                batch_header_map_id=batch_header_map.id,
+                batch_name=self.kind_of_batch + " " + " batch_header_id: " + str(batch_header.id),
+                batch_description_text="",
+                google_civic_election_id=self.google_civic_election_id,
+                kind_of_batch=self.kind_of_batch,
+                organization_we_vote_id=self.organization_we_vote_id,
+                source_uri=self.batch_uri,
+                batch_set_id=self.batch_set_id,
+            )
+            self.batch_header_id = batch_header.id
+            self.status += " BATCH_DESCRIPTION_SAVED "
+            self.success = True
+        except Exception as e:
+            # Stop trying to save rows
+            self.batch_header_id = 0
+            self.success = False
+            self.status += " EXCEPTION_BATCH_HEADER: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=self.status)
+            return False
+        return True
+
+    def add_row(self, batch_row_value_list):
+        """
+        Add the values read from one element. batch_row_value_list is None for elements that can't be imported.
+        Returns False once rows can no longer be saved.
+        :param batch_row_value_list:
+        :return:
+        """
+        if not self.start_batch():
+            return False
+        if batch_row_value_list is None:
+            return True
+        batch_row = BatchRow(batch_header_id=self.batch_header_id)
+        for column_name, value in zip(BATCH_ROW_COLUMN_NAMES, batch_row_value_list):
+            setattr(batch_row, column_name, value)
+        self.batch_row_list.append(batch_row)
+        if len(self.batch_row_list) >= BATCH_ROW_BULK_CREATE_CHUNK_SIZE:
+            return self.save_batch_rows()
+        return True
+
+    def save_batch_rows(self):
+        if not len(self.batch_row_list):
+            return True
+        results = save_batch_rows_in_bulk(self.batch_row_list, self.batch_header_id)
+        self.batch_row_list = []
+        self.number_of_batch_rows += results['number_of_batch_rows']
+        if not results['success']:
+            self.status += results['status']
+            self.success = False
+            return False
+        return True
+
+    def finish(self):
+        self.save_batch_rows()
+        results = {
+            'success': self.success,
+            'status': self.status,
+            'batch_header_id': self.batch_header_id,
+            'batch_saved': self.success,
+            'number_of_batch_rows': self.number_of_batch_rows,
+        }
+        return results
+
+
 class BatchManager(models.Manager):
 
     def __unicode__(self):
@@ -873,7 +1416,6 @@ class BatchManager(models.Manager):
 
     def create_batch_from_csv_data(self, file_name, csv_data, kind_of_batch, google_civic_election_id=0,
                                    organization_we_vote_id="", polling_location_we_vote_id=""):
-        first_line = True
         success = False
         status = ""
         number_of_batch_rows = 0
@@ -889,218 +1431,164 @@ class BatchManager(models.Manager):
 
         batch_header_id = 0
         batch_header_map_id = 0
-        for line in csv_data:
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000=get_value_if_index_in_list(line, 0),
-                        batch_header_column_001=get_value_if_index_in_list(line, 1),
-                        batch_header_column_002=get_value_if_index_in_list(line, 2),
-                        batch_header_column_003=get_value_if_index_in_list(line, 3),
-                        batch_header_column_004=get_value_if_index_in_list(line, 4),
-                        batch_header_column_005=get_value_if_index_in_list(line, 5),
-                        batch_header_column_006=get_value_if_index_in_list(line, 6),
-                        batch_header_column_007=get_value_if_index_in_list(line, 7),
-                        batch_header_column_008=get_value_if_index_in_list(line, 8),
-                        batch_header_column_009=get_value_if_index_in_list(line, 9),
-                        batch_header_column_010=get_value_if_index_in_list(line, 10),
-                        batch_header_column_011=get_value_if_index_in_list(line, 11),
-                        batch_header_column_012=get_value_if_index_in_list(line, 12),
-                        batch_header_column_013=get_value_if_index_in_list(line, 13),
-                        batch_header_column_014=get_value_if_index_in_list(line, 14),
-                        batch_header_column_015=get_value_if_index_in_list(line, 15),
-                        batch_header_column_016=get_value_if_index_in_list(line, 16),
-                        batch_header_column_017=get_value_if_index_in_list(line, 17),
-                        batch_header_column_018=get_value_if_index_in_list(line, 18),
-                        batch_header_column_019=get_value_if_index_in_list(line, 19),
-                        batch_header_column_020=get_value_if_index_in_list(line, 20),
-                        batch_header_column_021=get_value_if_index_in_list(line, 21),
-                        batch_header_column_022=get_value_if_index_in_list(line, 22),
-                        batch_header_column_023=get_value_if_index_in_list(line, 23),
-                        batch_header_column_024=get_value_if_index_in_list(line, 24),
-                        batch_header_column_025=get_value_if_index_in_list(line, 25),
-                        batch_header_column_026=get_value_if_index_in_list(line, 26),
-                        batch_header_column_027=get_value_if_index_in_list(line, 27),
-                        batch_header_column_028=get_value_if_index_in_list(line, 28),
-                        batch_header_column_029=get_value_if_index_in_list(line, 29),
-                        batch_header_column_030=get_value_if_index_in_list(line, 30),
-                        batch_header_column_031=get_value_if_index_in_list(line, 31),
-                        batch_header_column_032=get_value_if_index_in_list(line, 32),
-                        batch_header_column_033=get_value_if_index_in_list(line, 33),
-                        batch_header_column_034=get_value_if_index_in_list(line, 34),
-                        batch_header_column_035=get_value_if_index_in_list(line, 35),
-                        batch_header_column_036=get_value_if_index_in_list(line, 36),
-                        batch_header_column_037=get_value_if_index_in_list(line, 37),
-                        batch_header_column_038=get_value_if_index_in_list(line, 38),
-                        batch_header_column_039=get_value_if_index_in_list(line, 39),
-                        batch_header_column_040=get_value_if_index_in_list(line, 40),
-                        batch_header_column_041=get_value_if_index_in_list(line, 41),
-                        batch_header_column_042=get_value_if_index_in_list(line, 42),
-                        batch_header_column_043=get_value_if_index_in_list(line, 43),
-                        batch_header_column_044=get_value_if_index_in_list(line, 44),
-                        batch_header_column_045=get_value_if_index_in_list(line, 45),
-                        batch_header_column_046=get_value_if_index_in_list(line, 46),
-                        batch_header_column_047=get_value_if_index_in_list(line, 47),
-                        batch_header_column_048=get_value_if_index_in_list(line, 48),
-                        batch_header_column_049=get_value_if_index_in_list(line, 49),
-                        batch_header_column_050=get_value_if_index_in_list(line, 50),
-                        )
-                    batch_header_id = batch_header.id
+        csv_data_iterator = iter(csv_data)
+        line = next(csv_data_iterator, None)
+        if line is not None:
+            try:
+                batch_header = BatchHeader.objects.create(
+                    batch_header_column_000=get_value_if_index_in_list(line, 0),
+                    batch_header_column_001=get_value_if_index_in_list(line, 1),
+                    batch_header_column_002=get_value_if_index_in_list(line, 2),
+                    batch_header_column_003=get_value_if_index_in_list(line, 3),
+                    batch_header_column_004=get_value_if_index_in_list(line, 4),
+                    batch_header_column_005=get_value_if_index_in_list(line, 5),
+                    batch_header_column_006=get_value_if_index_in_list(line, 6),
+                    batch_header_column_007=get_value_if_index_in_list(line, 7),
+                    batch_header_column_008=get_value_if_index_in_list(line, 8),
+                    batch_header_column_009=get_value_if_index_in_list(line, 9),
+                    batch_header_column_010=get_value_if_index_in_list(line, 10),
+                    batch_header_column_011=get_value_if_index_in_list(line, 11),
+                    batch_header_column_012=get_value_if_index_in_list(line, 12),
+                    batch_header_column_013=get_value_if_index_in_list(line, 13),
+                    batch_header_column_014=get_value_if_index_in_list(line, 14),
+                    batch_header_column_015=get_value_if_index_in_list(line, 15),
+                    batch_header_column_016=get_value_if_index_in_list(line, 16),
+                    batch_header_column_017=get_value_if_index_in_list(line, 17),
+                    batch_header_column_018=get_value_if_index_in_list(line, 18),
+                    batch_header_column_019=get_value_if_index_in_list(line, 19),
+                    batch_header_column_020=get_value_if_index_in_list(line, 20),
+                    batch_header_column_021=get_value_if_index_in_list(line, 21),
+                    batch_header_column_022=get_value_if_index_in_list(line, 22),
+                    batch_header_column_023=get_value_if_index_in_list(line, 23),
+                    batch_header_column_024=get_value_if_index_in_list(line, 24),
+                    batch_header_column_025=get_value_if_index_in_list(line, 25),
+                    batch_header_column_026=get_value_if_index_in_list(line, 26),
+                    batch_header_column_027=get_value_if_index_in_list(line, 27),
+                    batch_header_column_028=get_value_if_index_in_list(line, 28),
+                    batch_header_column_029=get_value_if_index_in_list(line, 29),
+                    batch_header_column_030=get_value_if_index_in_list(line, 30),
+                    batch_header_column_031=get_value_if_index_in_list(line, 31),
+                    batch_header_column_032=get_value_if_index_in_list(line, 32),
+                    batch_header_column_033=get_value_if_index_in_list(line, 33),
+                    batch_header_column_034=get_value_if_index_in_list(line, 34),
+                    batch_header_column_035=get_value_if_index_in_list(line, 35),
+                    batch_header_column_036=get_value_if_index_in_list(line, 36),
+                    batch_header_column_037=get_value_if_index_in_list(line, 37),
+                    batch_header_column_038=get_value_if_index_in_list(line, 38),
+                    batch_header_column_039=get_value_if_index_in_list(line, 39),
+                    batch_header_column_040=get_value_if_index_in_list(line, 40),
+                    batch_header_column_041=get_value_if_index_in_list(line, 41),
+                    batch_header_column_042=get_value_if_index_in_list(line, 42),
+                    batch_header_column_043=get_value_if_index_in_list(line, 43),
+                    batch_header_column_044=get_value_if_index_in_list(line, 44),
+                    batch_header_column_045=get_value_if_index_in_list(line, 45),
+                    batch_header_column_046=get_value_if_index_in_list(line, 46),
+                    batch_header_column_047=get_value_if_index_in_list(line, 47),
+                    batch_header_column_048=get_value_if_index_in_list(line, 48),
+                    batch_header_column_049=get_value_if_index_in_list(line, 49),
+                    batch_header_column_050=get_value_if_index_in_list(line, 50),
+                    )
+                batch_header_id = batch_header.id
 
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
+                if positive_value_exists(batch_header_id):
+                    # Save an initial BatchHeaderMap
 
-                        # For each line, check for translation suggestions
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000=get_header_map_value_if_index_in_list(line, 0, kind_of_batch),
-                            batch_header_map_001=get_header_map_value_if_index_in_list(line, 1, kind_of_batch),
-                            batch_header_map_002=get_header_map_value_if_index_in_list(line, 2, kind_of_batch),
-                            batch_header_map_003=get_header_map_value_if_index_in_list(line, 3, kind_of_batch),
-                            batch_header_map_004=get_header_map_value_if_index_in_list(line, 4, kind_of_batch),
-                            batch_header_map_005=get_header_map_value_if_index_in_list(line, 5, kind_of_batch),
-                            batch_header_map_006=get_header_map_value_if_index_in_list(line, 6, kind_of_batch),
-                            batch_header_map_007=get_header_map_value_if_index_in_list(line, 7, kind_of_batch),
-                            batch_header_map_008=get_header_map_value_if_index_in_list(line, 8, kind_of_batch),
-                            batch_header_map_009=get_header_map_value_if_index_in_list(line, 9, kind_of_batch),
-                            batch_header_map_010=get_header_map_value_if_index_in_list(line, 10, kind_of_batch),
-                            batch_header_map_011=get_header_map_value_if_index_in_list(line, 11, kind_of_batch),
-                            batch_header_map_012=get_header_map_value_if_index_in_list(line, 12, kind_of_batch),
-                            batch_header_map_013=get_header_map_value_if_index_in_list(line, 13, kind_of_batch),
-                            batch_header_map_014=get_header_map_value_if_index_in_list(line, 14, kind_of_batch),
-                            batch_header_map_015=get_header_map_value_if_index_in_list(line, 15, kind_of_batch),
-                            batch_header_map_016=get_header_map_value_if_index_in_list(line, 16, kind_of_batch),
-                            batch_header_map_017=get_header_map_value_if_index_in_list(line, 17, kind_of_batch),
-                            batch_header_map_018=get_header_map_value_if_index_in_list(line, 18, kind_of_batch),
-                            batch_header_map_019=get_header_map_value_if_index_in_list(line, 19, kind_of_batch),
-                            batch_header_map_020=get_header_map_value_if_index_in_list(line, 20, kind_of_batch),
-                            batch_header_map_021=get_header_map_value_if_index_in_list(line, 21, kind_of_batch),
-                            batch_header_map_022=get_header_map_value_if_index_in_list(line, 22, kind_of_batch),
-                            batch_header_map_023=get_header_map_value_if_index_in_list(line, 23, kind_of_batch),
-                            batch_header_map_024=get_header_map_value_if_index_in_list(line, 24, kind_of_batch),
-                            batch_header_map_025=get_header_map_value_if_index_in_list(line, 25, kind_of_batch),
-                            batch_header_map_026=get_header_map_value_if_index_in_list(line, 26, kind_of_batch),
-                            batch_header_map_027=get_header_map_value_if_index_in_list(line, 27, kind_of_batch),
-                            batch_header_map_028=get_header_map_value_if_index_in_list(line, 28, kind_of_batch),
-                            batch_header_map_029=get_header_map_value_if_index_in_list(line, 29, kind_of_batch),
-                            batch_header_map_030=get_header_map_value_if_index_in_list(line, 30, kind_of_batch),
-                            batch_header_map_031=get_header_map_value_if_index_in_list(line, 31, kind_of_batch),
-                            batch_header_map_032=get_header_map_value_if_index_in_list(line, 32, kind_of_batch),
-                            batch_header_map_033=get_header_map_value_if_index_in_list(line, 33, kind_of_batch),
-                            batch_header_map_034=get_header_map_value_if_index_in_list(line, 34, kind_of_batch),
-                            batch_header_map_035=get_header_map_value_if_index_in_list(line, 35, kind_of_batch),
-                            batch_header_map_036=get_header_map_value_if_index_in_list(line, 36, kind_of_batch),
-                            batch_header_map_037=get_header_map_value_if_index_in_list(line, 37, kind_of_batch),
-                            batch_header_map_038=get_header_map_value_if_index_in_list(line, 38, kind_of_batch),
-                            batch_header_map_039=get_header_map_value_if_index_in_list(line, 39, kind_of_batch),
-                            batch_header_map_040=get_header_map_value_if_index_in_list(line, 40, kind_of_batch),
-                            batch_header_map_041=get_header_map_value_if_index_in_list(line, 41, kind_of_batch),
-                            batch_header_map_042=get_header_map_value_if_index_in_list(line, 42, kind_of_batch),
-                            batch_header_map_043=get_header_map_value_if_index_in_list(line, 43, kind_of_batch),
-                            batch_header_map_044=get_header_map_value_if_index_in_list(line, 44, kind_of_batch),
-                            batch_header_map_045=get_header_map_value_if_index_in_list(line, 45, kind_of_batch),
-                            batch_header_map_046=get_header_map_value_if_index_in_list(line, 46, kind_of_batch),
-                            batch_header_map_047=get_header_map_value_if_index_in_list(line, 47, kind_of_batch),
-                            batch_header_map_048=get_header_map_value_if_index_in_list(line, 48, kind_of_batch),
-                            batch_header_map_049=get_header_map_value_if_index_in_list(line, 49, kind_of_batch),
-                            batch_header_map_050=get_header_map_value_if_index_in_list(line, 50, kind_of_batch),
+                    # For each line, check for translation suggestions
+                    batch_header_map = BatchHeaderMap.objects.create(
+                        batch_header_id=batch_header_id,
+                        batch_header_map_000=get_header_map_value_if_index_in_list(line, 0, kind_of_batch),
+                        batch_header_map_001=get_header_map_value_if_index_in_list(line, 1, kind_of_batch),
+                        batch_header_map_002=get_header_map_value_if_index_in_list(line, 2, kind_of_batch),
+                        batch_header_map_003=get_header_map_value_if_index_in_list(line, 3, kind_of_batch),
+                        batch_header_map_004=get_header_map_value_if_index_in_list(line, 4, kind_of_batch),
+                        batch_header_map_005=get_header_map_value_if_index_in_list(line, 5, kind_of_batch),
+                        batch_header_map_006=get_header_map_value_if_index_in_list(line, 6, kind_of_batch),
+                        batch_header_map_007=get_header_map_value_if_index_in_list(line, 7, kind_of_batch),
+                        batch_header_map_008=get_header_map_value_if_index_in_list(line, 8, kind_of_batch),
+                        batch_header_map_009=get_header_map_value_if_index_in_list(line, 9, kind_of_batch),
+                        batch_header_map_010=get_header_map_value_if_index_in_list(line, 10, kind_of_batch),
+                        batch_header_map_011=get_header_map_value_if_index_in_list(line, 11, kind_of_batch),
+                        batch_header_map_012=get_header_map_value_if_index_in_list(line, 12, kind_of_batch),
+                        batch_header_map_013=get_header_map_value_if_index_in_list(line, 13, kind_of_batch),
+                        batch_header_map_014=get_header_map_value_if_index_in_list(line, 14, kind_of_batch),
+                        batch_header_map_015=get_header_map_value_if_index_in_list(line, 15, kind_of_batch),
+                        batch_header_map_016=get_header_map_value_if_index_in_list(line, 16, kind_of_batch),
+                        batch_header_map_017=get_header_map_value_if_index_in_list(line, 17, kind_of_batch),
+                        batch_header_map_018=get_header_map_value_if_index_in_list(line, 18, kind_of_batch),
+                        batch_header_map_019=get_header_map_value_if_index_in_list(line, 19, kind_of_batch),
+                        batch_header_map_020=get_header_map_value_if_index_in_list(line, 20, kind_of_batch),
+                        batch_header_map_021=get_header_map_value_if_index_in_list(line, 21, kind_of_batch),
+                        batch_header_map_022=get_header_map_value_if_index_in_list(line, 22, kind_of_batch),
+                        batch_header_map_023=get_header_map_value_if_index_in_list(line, 23, kind_of_batch),
+                        batch_header_map_024=get_header_map_value_if_index_in_list(line, 24, kind_of_batch),
+                        batch_header_map_025=get_header_map_value_if_index_in_list(line, 25, kind_of_batch),
+                        batch_header_map_026=get_header_map_value_if_index_in_list(line, 26, kind_of_batch),
+                        batch_header_map_027=get_header_map_value_if_index_in_list(line, 27, kind_of_batch),
+                        batch_header_map_028=get_header_map_value_if_index_in_list(line, 28, kind_of_batch),
+                        batch_header_map_029=get_header_map_value_if_index_in_list(line, 29, kind_of_batch),
+                        batch_header_map_030=get_header_map_value_if_index_in_list(line, 30, kind_of_batch),
+                        batch_header_map_031=get_header_map_value_if_index_in_list(line, 31, kind_of_batch),
+                        batch_header_map_032=get_header_map_value_if_index_in_list(line, 32, kind_of_batch),
+                        batch_header_map_033=get_header_map_value_if_index_in_list(line, 33, kind_of_batch),
+                        batch_header_map_034=get_header_map_value_if_index_in_list(line, 34, kind_of_batch),
+                        batch_header_map_035=get_header_map_value_if_index_in_list(line, 35, kind_of_batch),
+                        batch_header_map_036=get_header_map_value_if_index_in_list(line, 36, kind_of_batch),
+                        batch_header_map_037=get_header_map_value_if_index_in_list(line, 37, kind_of_batch),
+                        batch_header_map_038=get_header_map_value_if_index_in_list(line, 38, kind_of_batch),
+                        batch_header_map_039=get_header_map_value_if_index_in_list(line, 39, kind_of_batch),
+                        batch_header_map_040=get_header_map_value_if_index_in_list(line, 40, kind_of_batch),
+                        batch_header_map_041=get_header_map_value_if_index_in_list(line, 41, kind_of_batch),
+                        batch_header_map_042=get_header_map_value_if_index_in_list(line, 42, kind_of_batch),
+                        batch_header_map_043=get_header_map_value_if_index_in_list(line, 43, kind_of_batch),
+                        batch_header_map_044=get_header_map_value_if_index_in_list(line, 44, kind_of_batch),
+                        batch_header_map_045=get_header_map_value_if_index_in_list(line, 45, kind_of_batch),
+                        batch_header_map_046=get_header_map_value_if_index_in_list(line, 46, kind_of_batch),
+                        batch_header_map_047=get_header_map_value_if_index_in_list(line, 47, kind_of_batch),
+                        batch_header_map_048=get_header_map_value_if_index_in_list(line, 48, kind_of_batch),
+                        batch_header_map_049=get_header_map_value_if_index_in_list(line, 49, kind_of_batch),
+                        batch_header_map_050=get_header_map_value_if_index_in_list(line, 50, kind_of_batch),
+                    )
+                    batch_header_map_id = batch_header_map.id
+                    status += "BATCH_HEADER_MAP_SAVED "
+
+                if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
+                    # Now save the BatchDescription
+                    if positive_value_exists(file_name):
+                        batch_name = str(batch_header_id) + ": " + file_name
+                    if not positive_value_exists(batch_name):
+                        batch_name = str(batch_header_id) + ": " + kind_of_batch
+                    batch_description_text = ""
+                    batch_description = BatchDescription.objects.create(
+                        batch_header_id=batch_header_id,
+                        batch_header_map_id=batch_header_map_id,
+                        batch_name=batch_name,
+                        batch_description_text=batch_description_text,
+                        google_civic_election_id=google_civic_election_id,
+                        kind_of_batch=kind_of_batch,
+                        organization_we_vote_id=organization_we_vote_id,
+                        polling_location_we_vote_id=polling_location_we_vote_id,
+                        # source_uri=batch_uri,
                         )
-                        batch_header_map_id = batch_header_map.id
-                        status += "BATCH_HEADER_MAP_SAVED "
+                    status += "BATCH_DESCRIPTION_SAVED "
+                    success = True
+            except Exception as e:
+                # Without a header there is nowhere to attach the rows
+                batch_header_id = 0
+                status += "EXCEPTION_BATCH_HEADER: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
 
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        if positive_value_exists(file_name):
-                            batch_name = str(batch_header_id) + ": " + file_name
-                        if not positive_value_exists(batch_name):
-                            batch_name = str(batch_header_id) + ": " + kind_of_batch
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch=kind_of_batch,
-                            organization_we_vote_id=organization_we_vote_id,
-                            polling_location_we_vote_id=polling_location_we_vote_id,
-                            # source_uri=batch_uri,
-                            )
-                        status += "BATCH_DESCRIPTION_SAVED "
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += "EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            else:
-                # if number_of_batch_rows >= limit_for_testing:
-                #     break
-                if positive_value_exists(batch_header_id):
-                    try:
-                        batch_row = BatchRow.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_row_000=get_value_if_index_in_list(line, 0),
-                            batch_row_001=get_value_if_index_in_list(line, 1),
-                            batch_row_002=get_value_if_index_in_list(line, 2),
-                            batch_row_003=get_value_if_index_in_list(line, 3),
-                            batch_row_004=get_value_if_index_in_list(line, 4),
-                            batch_row_005=get_value_if_index_in_list(line, 5),
-                            batch_row_006=get_value_if_index_in_list(line, 6),
-                            batch_row_007=get_value_if_index_in_list(line, 7),
-                            batch_row_008=get_value_if_index_in_list(line, 8),
-                            batch_row_009=get_value_if_index_in_list(line, 9),
-                            batch_row_010=get_value_if_index_in_list(line, 10),
-                            batch_row_011=get_value_if_index_in_list(line, 11),
-                            batch_row_012=get_value_if_index_in_list(line, 12),
-                            batch_row_013=get_value_if_index_in_list(line, 13),
-                            batch_row_014=get_value_if_index_in_list(line, 14),
-                            batch_row_015=get_value_if_index_in_list(line, 15),
-                            batch_row_016=get_value_if_index_in_list(line, 16),
-                            batch_row_017=get_value_if_index_in_list(line, 17),
-                            batch_row_018=get_value_if_index_in_list(line, 18),
-                            batch_row_019=get_value_if_index_in_list(line, 19),
-                            batch_row_020=get_value_if_index_in_list(line, 20),
-                            batch_row_021=get_value_if_index_in_list(line, 21),
-                            batch_row_022=get_value_if_index_in_list(line, 22),
-                            batch_row_023=get_value_if_index_in_list(line, 23),
-                            batch_row_024=get_value_if_index_in_list(line, 24),
-                            batch_row_025=get_value_if_index_in_list(line, 25),
-                            batch_row_026=get_value_if_index_in_list(line, 26),
-                            batch_row_027=get_value_if_index_in_list(line, 27),
-                            batch_row_028=get_value_if_index_in_list(line, 28),
-                            batch_row_029=get_value_if_index_in_list(line, 29),
-                            batch_row_030=get_value_if_index_in_list(line, 30),
-                            batch_row_031=get_value_if_index_in_list(line, 31),
-                            batch_row_032=get_value_if_index_in_list(line, 32),
-                            batch_row_033=get_value_if_index_in_list(line, 33),
-                            batch_row_034=get_value_if_index_in_list(line, 34),
-                            batch_row_035=get_value_if_index_in_list(line, 35),
-                            batch_row_036=get_value_if_index_in_list(line, 36),
-                            batch_row_037=get_value_if_index_in_list(line, 37),
-                            batch_row_038=get_value_if_index_in_list(line, 38),
-                            batch_row_039=get_value_if_index_in_list(line, 39),
-                            batch_row_040=get_value_if_index_in_list(line, 40),
-                            batch_row_041=get_value_if_index_in_list(line, 41),
-                            batch_row_042=get_value_if_index_in_list(line, 42),
-                            batch_row_043=get_value_if_index_in_list(line, 43),
-                            batch_row_044=get_value_if_index_in_list(line, 44),
-                            batch_row_045=get_value_if_index_in_list(line, 45),
-                            batch_row_046=get_value_if_index_in_list(line, 46),
-                            batch_row_047=get_value_if_index_in_list(line, 47),
-                            batch_row_048=get_value_if_index_in_list(line, 48),
-                            batch_row_049=get_value_if_index_in_list(line, 49),
-                            batch_row_050=get_value_if_index_in_list(line, 50),
-                            google_civic_election_id=google_civic_election_id,
-                            polling_location_we_vote_id=polling_location_we_vote_id,
-                        )
-                        number_of_batch_rows += 1
-                    except Exception as e:
-                        # Stop trying to save rows -- break out of the for loop
-                        status += "EXCEPTION_BATCH_ROW: " + str(e) + " "
-                        break
+        if positive_value_exists(batch_header_id):
+            # The remaining lines are streamed into BatchRow in chunks, so memory use does not grow with the file
+            batch_row_generator = (
+                BatchRow(
+                    batch_header_id=batch_header_id,
+                    google_civic_election_id=google_civic_election_id,
+                    polling_location_we_vote_id=polling_location_we_vote_id,
+                    **get_batch_row_values_from_csv_line(line))
+                for line in csv_data_iterator)
+            results = save_batch_rows_in_bulk(batch_row_generator, batch_header_id=batch_header_id)
+            status += results['status']
+            number_of_batch_rows = results['number_of_batch_rows']
 
         results = {
             'success':              success,
@@ -1123,7 +1611,10 @@ class BatchManager(models.Manager):
         batch_header_map_id = 0
         batch_name = ""
 
-        if not len(structured_json_list):
+        # structured_json_list can be a list or any iterator (ex/ a generator reading a large file incrementally)
+        structured_json_iterator = iter(structured_json_list)
+        first_dict = next(structured_json_iterator, None)
+        if first_dict is None:
             # If there aren't any values, don't create a batch
             results = {
                 'success': success,
@@ -1283,9 +1774,7 @@ class BatchManager(models.Manager):
             handle_exception(e, logger=logger, exception_message=status)
 
         if positive_value_exists(batch_header_id):
-            for one_dict in structured_json_list:
-                # if number_of_batch_rows >= limit_for_testing:
-                #     break
+            def build_batch_row(one_dict):
                 local_google_civic_election_id = google_civic_election_id  # Use it if it came in to this function
                 if not positive_value_exists(google_civic_election_id):
                     local_google_civic_election_id = get_value_from_dict(one_dict, 'google_civic_election_id')
@@ -1295,69 +1784,18 @@ class BatchManager(models.Manager):
                 local_state_code = state_code  # Use it if it came in to this function
                 if not positive_value_exists(state_code):
                     local_state_code = get_value_from_dict(one_dict, 'state_code')
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 0)),
-                        batch_row_001=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 1)),
-                        batch_row_002=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 2)),
-                        batch_row_003=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 3)),
-                        batch_row_004=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 4)),
-                        batch_row_005=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 5)),
-                        batch_row_006=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 6)),
-                        batch_row_007=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 7)),
-                        batch_row_008=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 8)),
-                        batch_row_009=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 9)),
-                        batch_row_010=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 10)),
-                        batch_row_011=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 11)),
-                        batch_row_012=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 12)),
-                        batch_row_013=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 13)),
-                        batch_row_014=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 14)),
-                        batch_row_015=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 15)),
-                        batch_row_016=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 16)),
-                        batch_row_017=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 17)),
-                        batch_row_018=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 18)),
-                        batch_row_019=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 19)),
-                        batch_row_020=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 20)),
-                        batch_row_021=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 21)),
-                        batch_row_022=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 22)),
-                        batch_row_023=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 23)),
-                        batch_row_024=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 24)),
-                        batch_row_025=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 25)),
-                        batch_row_026=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 26)),
-                        batch_row_027=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 27)),
-                        batch_row_028=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 28)),
-                        batch_row_029=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 29)),
-                        batch_row_030=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 30)),
-                        batch_row_031=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 31)),
-                        batch_row_032=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 32)),
-                        batch_row_033=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 33)),
-                        batch_row_034=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 34)),
-                        batch_row_035=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 35)),
-                        batch_row_036=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 36)),
-                        batch_row_037=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 37)),
-                        batch_row_038=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 38)),
-                        batch_row_039=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 39)),
-                        batch_row_040=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 40)),
-                        batch_row_041=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 41)),
-                        batch_row_042=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 42)),
-                        batch_row_043=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 43)),
-                        batch_row_044=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 44)),
-                        batch_row_045=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 45)),
-                        batch_row_046=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 46)),
-                        batch_row_047=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 47)),
-                        batch_row_048=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 48)),
-                        batch_row_049=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 49)),
-                        batch_row_050=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 50)),
-                        google_civic_election_id=local_google_civic_election_id,
-                        polling_location_we_vote_id=local_polling_location_we_vote_id,
-                        state_code=local_state_code,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += "EXCEPTION_BATCH_ROW_FOR_JSON: " + str(e) + " "
-                    break
+                return BatchRow(
+                    batch_header_id=batch_header_id,
+                    google_civic_election_id=local_google_civic_election_id,
+                    polling_location_we_vote_id=local_polling_location_we_vote_id,
+                    state_code=local_state_code,
+                    **get_batch_row_values_from_json_dict(one_dict, remote_source_keys))
+
+            batch_row_generator = (build_batch_row(one_dict)
+                                   for one_dict in itertools.chain([first_dict], structured_json_iterator))
+            results = save_batch_rows_in_bulk(batch_row_generator, batch_header_id=batch_header_id)
+            status += results['status']
+            number_of_batch_rows = results['number_of_batch_rows']
         else:
             status += "NO_BATCH_HEADER_ID "
 
@@ -2207,41 +2645,34 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :return:
         """
-        # Retrieve from XML
-        request = urllib.request.urlopen(batch_uri)
-        # xml_data = request.read()
-        # xml_data = xmltodict.parse(xml_data)
-        # # xml_data_list_json = list(xml_data)
-        # structured_json = json.dumps(xml_data)
-
-        xml_tree = ElementTree.parse(request)
-        request.close()
-        xml_root = xml_tree.getroot()
+        store_function_and_tag_by_kind = {
+            MEASURE:        (self.store_measure_xml, 'BallotMeasureContest'),
+            OFFICE_HELD:    (self.store_office_held_xml, 'Office'),
+            CONTEST_OFFICE: (self.store_contest_office_xml, 'CandidateContest'),
+            CANDIDATE:      (self.store_candidate_xml, 'Candidate'),
+            POLITICIAN:     (self.store_politician_xml, 'Person'),
+        }
+        if kind_of_batch not in store_function_and_tag_by_kind:
+            results = {
+                'success': False,
+                'status': '',
+                'batch_header_id': 0,
+                'batch_saved': False,
+                'number_of_batch_rows': 0,
+            }
+            return results
 
-        if xml_root:
-            if kind_of_batch == MEASURE:
-                return self.store_measure_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == OFFICE_HELD:
-                return self.store_office_held_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CONTEST_OFFICE:
-                return self.store_contest_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CANDIDATE:
-                return self.store_candidate_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == POLITICIAN:
-                return self.store_politician_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            else:
-                results = {
-                    'success': False,
-                    'status': '',
-                    'batch_header_id': 0,
-                    'batch_saved': False,
-                    'number_of_batch_rows': 0,
-                }
-                return results
+        # Stream the feed instead of building the whole tree, since we only need one kind of element
+        store_function, tag = store_function_and_tag_by_kind[kind_of_batch]
+        request = urllib.request.urlopen(batch_uri)
+        try:
+            return store_function(batch_uri, google_civic_election_id, organization_we_vote_id, None,
+                                  xml_element_list=iterate_vip_xml_elements(request, {tag}))
+        finally:
+            request.close()
 
-    def store_measure_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id=0):
+    def store_measure_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id=0,
+                          xml_element_list=None):
         """
         Retrieves Measure data from CTCL xml file
         :param batch_uri:
@@ -2249,905 +2680,130 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id:
+        :param xml_element_list: BallotMeasureContest elements to use instead of searching xml_root
         :return:
         """
-        # Process BallotMeasureContest data
-
-        number_of_batch_rows = 0
-        first_line = True
-        success = True
-        status = ''
-        limit_for_testing = 0
-        batch_header_id = 0
-
-        # Look for BallotMeasureContest and create the batch_header first. BallotMeasureContest is the direct child node
-        # of VipObject
-        ballot_measure_xml_node = xml_root.findall('BallotMeasureContest')
-        # if ballot_measure_xml_node is not None:
-        for one_ballot_measure in ballot_measure_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+        # BallotMeasureContest is the direct child node of VipObject
+        if xml_element_list is None:
+            xml_element_list = xml_root.findall('BallotMeasureContest')
+        batch_row_writer = VipXmlBatchRowWriter(
+            MEASURE, VIP_XML_MEASURE_HEADER_COLUMN_LIST, VIP_XML_MEASURE_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+        for one_ballot_measure in xml_element_list:
+            if not batch_row_writer.add_row(get_vip_xml_measure_row(one_ballot_measure)):
                 break
-
-            # look for relevant child nodes under BallotMeasureContest: id, BallotTitle, BallotSubTitle,
-            # ElectoralDistrictId, other::ctcl-uid
-            ballot_measure_id = one_ballot_measure.attrib['id']
-
-            ballot_measure_subtitle_node = one_ballot_measure.find('BallotSubTitle/Text')
-            if ballot_measure_subtitle_node is not None:
-                ballot_measure_subtitle = ballot_measure_subtitle_node.text
-            else:
-                ballot_measure_subtitle = ''
-
-            ballot_measure_title_node = one_ballot_measure.find('BallotTitle')
-            if ballot_measure_title_node is not None:
-                ballot_measure_title = one_ballot_measure.find('BallotTitle/Text').text
-            else:
-                ballot_measure_title = ''
-
-            electoral_district_id_node = one_ballot_measure.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-            else:
-                electoral_district_id = ''
-
-            ctcl_uuid_node = one_ballot_measure.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_ballot_measure.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-            else:
-                ctcl_uuid = ''
-
-            ballot_measure_name_node = one_ballot_measure.find('Name')
-            if ballot_measure_name_node is not None:
-                ballot_measure_name = ballot_measure_name_node.text
-            else:
-                ballot_measure_name = ''
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='BallotSubTitle',
-                        batch_header_column_002='BallotTitle',
-                        batch_header_column_003='ElectoralDistrictId',
-                        batch_header_column_004='other::ctcl-uuid',
-                        batch_header_column_005='Name',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='measure_batch_id',
-                            batch_header_map_001='measure_subtitle',
-                            batch_header_map_002='measure_title',
-                            batch_header_map_003='electoral_district_id',
-                            batch_header_map_004='measure_ctcl_uuid',
-                            batch_header_map_005='measure_name'
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED "
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "MEASURE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='MEASURE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED "
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for measure_id, title OR subtitle or name AND ctcl_uuid
-            if (positive_value_exists(ballot_measure_id) and positive_value_exists(ctcl_uuid) and
-                    (positive_value_exists(ballot_measure_subtitle) or positive_value_exists(ballot_measure_title) or
-                         positive_value_exists(ballot_measure_name))):
-
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=ballot_measure_id,
-                        batch_row_001=ballot_measure_subtitle,
-                        batch_row_002=ballot_measure_title,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=ctcl_uuid,
-                        batch_row_005=ballot_measure_name
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return batch_row_writer.finish()
 
     def store_office_held_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                 batch_set_id=0):
+                              batch_set_id=0, xml_element_list=None):
         """
         Retrieves Office data from CTCL xml file
         :param batch_uri:
         :param google_civic_election_id:
         :param organization_we_vote_id:
         :param xml_root:
-        :param batch_set_id
+        :param batch_set_id:
+        :param xml_element_list: Office elements to use instead of searching xml_root
         :return:
         """
-        # Process VIP Office data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 0
-        batch_header_id = 0
-
-        # Look for Office and create the batch_header first. Office is the direct child node
-        # of VipObject
-        office_held_xml_node = xml_root.findall('Office')
-        # if ballot_measure_xml_node is not None:
-        for one_office_held in office_held_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+        # Office is the direct child node of VipObject
+        if xml_element_list is None:
+            xml_element_list = xml_root.findall('Office')
+        batch_row_writer = VipXmlBatchRowWriter(
+            OFFICE_HELD, VIP_XML_OFFICE_HELD_HEADER_COLUMN_LIST, VIP_XML_OFFICE_HELD_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id, success_if_no_elements=False)
+        for one_office_held in xml_element_list:
+            if not batch_row_writer.add_row(get_vip_xml_office_held_row(one_office_held)):
                 break
-
-            # look for relevant child nodes under Office: id, Name, Description, ElectoralDistrictId,
-            # IsPartisan, other::ctcl-uid
-            office_held_id = one_office_held.attrib['id']
-
-            office_held_name_node = one_office_held.find("./Name/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if office_held_name_node is not None:
-                office_held_name = office_held_name_node.text
-            else:
-                office_held_name = ""
-
-            office_held_name_es_node = one_office_held.find("./Name/Text/[@language='"+LANGUAGE_CODE_SPANISH+"']")
-            if office_held_name_es_node is not None:
-                office_held_name_es = office_held_name_es_node.text
-            else:
-                office_held_name_es = ""
-
-            office_held_description_node = one_office_held.find(
-                "Description/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if office_held_description_node is not None:
-                office_held_description = office_held_description_node.text
-            else:
-                office_held_description = ""
-
-            office_held_description_es_node = one_office_held.find(
-                "Description/Text/[@language='"+LANGUAGE_CODE_SPANISH+"']")
-            if office_held_description_es_node is not None:
-                office_held_description_es = office_held_description_es_node.text
-            else:
-                office_held_description_es = ""
-
-            electoral_district_id_node = one_office_held.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-            else:
-                electoral_district_id = ""
-
-            office_held_is_partisan_node = one_office_held.find('IsPartisan')
-            if office_held_is_partisan_node is not None:
-                office_held_is_partisan = office_held_is_partisan_node.text
-            else:
-                office_held_is_partisan = ""
-
-            ctcl_uuid = ""
-            ctcl_uuid_node = one_office_held.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_office_held.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='NameEnglish',
-                        batch_header_column_002='NameSpanish',
-                        batch_header_column_003='DescriptionEnglish',
-                        batch_header_column_004='DescriptionSpanish',
-                        batch_header_column_005='ElectoralDistrictId',
-                        batch_header_column_006='IsPartisan',
-                        batch_header_column_007='other::ctcl-uuid',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='office_held_batch_id',
-                            batch_header_map_001='office_held_name',
-                            batch_header_map_002='office_held_name_es',
-                            batch_header_map_003='office_held_description',
-                            batch_header_map_004='office_held_description_es',
-                            batch_header_map_005='electoral_district_id',
-                            batch_header_map_006='office_held_is_partisan',
-                            batch_header_map_007='office_held_ctcl_uuid',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "OFFICE_HELD " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='OFFICE_HELD',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for office_batch_id or electoral_district or name AND ctcl_uuid
-            if positive_value_exists(office_held_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(electoral_district_id) or positive_value_exists(office_held_name)) or \
-                    positive_value_exists(office_held_name_es):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=office_held_id,
-                        batch_row_001=office_held_name,
-                        batch_row_002=office_held_name_es,
-                        batch_row_003=office_held_description,
-                        batch_row_004=office_held_description_es,
-                        batch_row_005=electoral_district_id,
-                        batch_row_006=office_held_is_partisan,
-                        batch_row_007=ctcl_uuid
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return batch_row_writer.finish()
 
     def store_contest_office_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                 batch_set_id=0):
+                                 batch_set_id=0, xml_element_list=None, candidate_id_by_candidate_selection_id=None):
         """
         Retrieves ContestOffice data from CTCL xml file
         :param batch_uri:
         :param google_civic_election_id:
         :param organization_we_vote_id:
         :param xml_root:
-        :param batch_set_id
+        :param batch_set_id:
+        :param xml_element_list: CandidateContest elements to use instead of searching xml_root
+        :param candidate_id_by_candidate_selection_id: If not passed in, read from the batch set's CandidateSelections
         :return:
         """
-        from import_export_ctcl.controllers import retrieve_candidate_from_candidate_selection
-        # Process VIP CandidateContest data
-        number_of_batch_rows = 0
-        first_line = True
-        success = True
-        status = ''
-        limit_for_testing = 0
-        batch_header_id = 0
-
-        candidate_selection_id_key_list = [
-            'candidate_selection_id_1', 'candidate_selection_id_2', 'candidate_selection_id_3',
-            'candidate_selection_id_4', 'candidate_selection_id_5', 'candidate_selection_id_6',
-            'candidate_selection_id_7', 'candidate_selection_id_8', 'candidate_selection_id_9',
-            'candidate_selection_id_10']
-        # Look for CandidateContest and create the batch_header first. CandidateContest is the direct child node
-        # of VipObject
-        contest_office_xml_node = xml_root.findall('CandidateContest')
-        # if contest_office_xml_node is not None:
-        for one_contest_office in contest_office_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
-                break
-
-            # look for relevant child nodes under CandidateContest: id, Name, OfficeId, ElectoralDistrictId,
-            # other::ctcl-uid, VotesAllowed, NumberElected
-            contest_office_id = one_contest_office.attrib['id']
-
-            contest_office_name_node = one_contest_office.find('Name')
-            if contest_office_name_node is not None:
-                contest_office_name = contest_office_name_node.text
-            else:
-                contest_office_name = ""
-
-            contest_office_number_elected_node = one_contest_office.find('NumberElected')
-            if contest_office_number_elected_node is not None:
-                contest_office_number_elected = contest_office_number_elected_node.text
-            else:
-                contest_office_number_elected = ""
-
-            electoral_district_id_node = one_contest_office.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-            else:
-                electoral_district_id = ""
-
-            contest_office_votes_allowed_node = one_contest_office.find('VotesAllowed')
-            if contest_office_votes_allowed_node is not None:
-                contest_office_votes_allowed = contest_office_votes_allowed_node.text
-            else:
-                contest_office_votes_allowed = ""
-
-            office_held_id_node = one_contest_office.find('OfficeIds')
-            if office_held_id_node is not None:
-                office_held_id = office_held_id_node.text
-            else:
-                office_held_id = ""
-
-            ctcl_uuid = ""
-            ctcl_uuid_node = one_contest_office.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_contest_office.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            candidate_selection_ids_dict = {}
-            ballot_selection_ids_node = one_contest_office.find('./BallotSelectionIds')
-            if ballot_selection_ids_node is not None:
-                ballot_selection_ids_str = ballot_selection_ids_node.text
-                if ballot_selection_ids_str:
-                    ballot_selection_ids_value_list = ballot_selection_ids_str.split()
-                    # for len in ballot_selection_ids_list words,
-                    # Assuming that there are maximum 10 ballot selection ids for a given contest office
-                    ballot_selection_ids_dict = dict(
-                        zip(candidate_selection_id_key_list, ballot_selection_ids_value_list))
-
-                    # move this to batchrowactionContestOffice create if we run into performance/load issue
-                    candidate_selection_list = []
-                    for key, value in ballot_selection_ids_dict.items():
-                        results = retrieve_candidate_from_candidate_selection(value, batch_set_id)
-                        if results['candidate_id_found']:
-                            candidate_selection_item = results['candidate_selection']
-                            candidate_value = candidate_selection_item.contest_office_id
-                            candidate_selection_list.append(candidate_value)
-
-                    candidate_selection_ids_dict = dict(zip(candidate_selection_id_key_list, candidate_selection_list))
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='Name',
-                        batch_header_column_002='OfficeIds',
-                        batch_header_column_003='ElectoralDistrictId',
-                        batch_header_column_004='VotesAllowed',
-                        batch_header_column_005='NumberElected',
-                        batch_header_column_006='other::ctcl-uuid',
-                        batch_header_column_007='CandidateSelectionId1',
-                        batch_header_column_008='CandidateSelectionId2',
-                        batch_header_column_009='CandidateSelectionId3',
-                        batch_header_column_010='CandidateSelectionId4',
-                        batch_header_column_011='CandidateSelectionId5',
-                        batch_header_column_012='CandidateSelectionId6',
-                        batch_header_column_013='CandidateSelectionId7',
-                        batch_header_column_014='CandidateSelectionId8',
-                        batch_header_column_015='CandidateSelectionId9',
-                        batch_header_column_016='CandidateSelectionId10',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='contest_office_batch_id',
-                            batch_header_map_001='contest_office_name',
-                            batch_header_map_002='office_held_id',
-                            batch_header_map_003='electoral_district_id',
-                            batch_header_map_004='contest_office_votes_allowed',
-                            batch_header_map_005='contest_office_number_elected',
-                            batch_header_map_006='contest_office_ctcl_uuid',
-                            batch_header_map_007='candidate_selection_id1',
-                            batch_header_map_008='candidate_selection_id2',
-                            batch_header_map_009='candidate_selection_id3',
-                            batch_header_map_010='candidate_selection_id4',
-                            batch_header_map_011='candidate_selection_id5',
-                            batch_header_map_012='candidate_selection_id6',
-                            batch_header_map_013='candidate_selection_id7',
-                            batch_header_map_014='candidate_selection_id8',
-                            batch_header_map_015='candidate_selection_id9',
-                            batch_header_map_016='candidate_selection_id10',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "CONTEST_OFFICE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='CONTEST_OFFICE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED "
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
+        from import_export_ctcl.controllers import retrieve_candidate_id_by_candidate_selection_id_dict
+        if candidate_id_by_candidate_selection_id is None:
+            candidate_id_by_candidate_selection_id = retrieve_candidate_id_by_candidate_selection_id_dict(batch_set_id)
+
+        # CandidateContest is the direct child node of VipObject
+        if xml_element_list is None:
+            xml_element_list = xml_root.findall('CandidateContest')
+        batch_row_writer = VipXmlBatchRowWriter(
+            CONTEST_OFFICE, VIP_XML_CONTEST_OFFICE_HEADER_COLUMN_LIST, VIP_XML_CONTEST_OFFICE_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+        for one_contest_office in xml_element_list:
+            batch_row_value_list, ballot_selection_id_list = get_vip_xml_contest_office_row(one_contest_office)
+            if batch_row_value_list is not None:
+                batch_row_value_list = add_candidate_ids_to_vip_xml_contest_office_row(
+                    batch_row_value_list, ballot_selection_id_list, candidate_id_by_candidate_selection_id)
+            if not batch_row_writer.add_row(batch_row_value_list):
                 break
-
-            # check for contest_office_batch_id or electoral_district or name AND ctcl_uuid
-            if positive_value_exists(contest_office_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(electoral_district_id) or positive_value_exists(contest_office_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=contest_office_id,
-                        batch_row_001=contest_office_name,
-                        batch_row_002=office_held_id,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=contest_office_votes_allowed,
-                        batch_row_005=contest_office_number_elected,
-                        batch_row_006=ctcl_uuid,
-                        batch_row_007=candidate_selection_ids_dict.get('candidate_selection_id_1', ''),
-                        batch_row_008=candidate_selection_ids_dict.get('candidate_selection_id_2', ''),
-                        batch_row_009=candidate_selection_ids_dict.get('candidate_selection_id_3', ''),
-                        batch_row_010=candidate_selection_ids_dict.get('candidate_selection_id_4', ''),
-                        batch_row_011=candidate_selection_ids_dict.get('candidate_selection_id_5', ''),
-                        batch_row_012=candidate_selection_ids_dict.get('candidate_selection_id_6', ''),
-                        batch_row_013=candidate_selection_ids_dict.get('candidate_selection_id_7', ''),
-                        batch_row_014=candidate_selection_ids_dict.get('candidate_selection_id_8', ''),
-                        batch_row_015=candidate_selection_ids_dict.get('candidate_selection_id_9', ''),
-                        batch_row_016=candidate_selection_ids_dict.get('candidate_selection_id_10', ''),
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return batch_row_writer.finish()
 
     def store_politician_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                             batch_set_id=0):
-        """
-        Retrieves Politician data from CTCL xml file
-        :param batch_uri:
-        :param google_civic_election_id:
-        :param organization_we_vote_id:
-        :param xml_root:
-        :param batch_set_id
-        :return:
-        """
-        # Process VIP Person data
-        number_of_batch_rows = 0
-        first_line = True
-        success = True
-        status = ''
-        limit_for_testing = 0
-        batch_header_id = 0
-
-        # Get party names and their corresponding party ids
-        party_details_list = retrieve_all_party_names_and_ids_api()
-
-        # Look for Person and create the batch_header first. Person is the direct child node
-        # of VipObject
-        person_xml_node = xml_root.findall('Person')
-        for one_person in person_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
-                break
-
-            # look for relevant child nodes under Person: id, FullName, FirstName, LastName, MiddleName, PartyId, Email,
-            # PhoneNumber, Website, Twitter, ctcl-uuid
-            person_id = one_person.attrib['id']
-
-            person_full_name_node = one_person.find("./FullName/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if person_full_name_node is not None:
-                person_full_name = person_full_name_node.text
-            else:
-                person_full_name = ''
-
-            person_first_name_node = one_person.find('FirstName')
-            if person_first_name_node is not None:
-                person_first_name = person_first_name_node.text
-            else:
-                person_first_name = ''
-
-            person_middle_name_node = one_person.find('MiddleName')
-            if person_middle_name_node is not None:
-                person_middle_name = person_middle_name_node.text
-            else:
-                person_middle_name = ''
-
-            person_last_name_node = one_person.find('LastName')
-            if person_last_name_node is not None:
-                person_last_name = person_last_name_node.text
-            else:
-                person_last_name = ''
-
-            person_party_name = ''
-            person_party_id_node = one_person.find('PartyId')
-            if person_party_id_node is not None:
-                person_party_id = person_party_id_node.text
-                # get party name from candidate_party_id
-                if party_details_list is not None:
-                    # party_details_dict =  [entry for entry in party_details_list]
-                    for one_party in party_details_list:
-                        # get the party name matching person_party_id
-                        try:
-                            party_id_temp = one_party.get('party_id_temp')
-                            if person_party_id == party_id_temp:
-                                person_party_name = one_party.get('party_name')
-                                break
-                        except Exception as e:
-                            pass
-
-            person_email_id_node = one_person.find('./ContactInformation/Email')
-            if person_email_id_node is not None:
-                person_email_id = person_email_id_node.text
-            else:
-                person_email_id = ''
-
-            person_phone_number_node = one_person.find('./ContactInformation/Phone')
-            if person_phone_number_node is not None:
-                person_phone_number = person_phone_number_node.text
-            else:
-                person_phone_number = ''
-
-            person_website_url_node = one_person.find("./ContactInformation/Uri/[@annotation='website']")
-            if person_website_url_node is not None:
-                person_website_url = person_website_url_node.text
-            else:
-                person_website_url = ''
-
-            person_facebook_id_node = one_person.find("./ContactInformation/Uri/[@annotation='facebook']")
-            if person_facebook_id_node is not None:
-                person_facebook_id = person_facebook_id_node.text
-            else:
-                person_facebook_id = ''
-
-            person_twitter_id_node = one_person.find("./ContactInformation/Uri/[@annotation='twitter']")
-            if person_twitter_id_node is not None:
-                person_twitter_id = person_twitter_id_node.text
-            else:
-                person_twitter_id = ''
-
-            person_youtube_id_node = one_person.find("./ContactInformation/Uri/[@annotation='youtube']")
-            if person_youtube_id_node is not None:
-                person_youtube_id = person_youtube_id_node.text
-            else:
-                person_youtube_id = ''
-
-            person_googleplus_id_node = one_person.find("./ContactInformation/Uri/[@annotation='googleplus']")
-            if person_googleplus_id_node is not None:
-                person_googleplus_id = person_googleplus_id_node.text
-            else:
-                person_googleplus_id = ''
-
-            ctcl_uuid = ""
-            ctcl_uuid_node = one_person.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_person.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='FullName',
-                        batch_header_column_002='FirstName',
-                        batch_header_column_003='MiddleName',
-                        batch_header_column_004='LastName',
-                        batch_header_column_005='PartyName',
-                        batch_header_column_006='Email',
-                        batch_header_column_007='Phone',
-                        batch_header_column_008='uri::website',
-                        batch_header_column_009='uri::facebook',
-                        batch_header_column_010='uri::twitter',
-                        batch_header_column_011='uri::youtube',
-                        batch_header_column_012='uri::googleplus',
-                        batch_header_column_013='other::ctcl-uuid',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='politician_batch_id',
-                            batch_header_map_001='politician_full_name',
-                            batch_header_map_002='politician_first_name',
-                            batch_header_map_003='politician_middle_name',
-                            batch_header_map_004='politician_last_name',
-                            batch_header_map_005='politician_party_name',
-                            batch_header_map_006='politician_email',
-                            batch_header_map_007='politician_phone_number',
-                            batch_header_map_008='politician_website_url',
-                            batch_header_map_009='politician_facebook_id',
-                            batch_header_map_010='politician_twitter_url',
-                            batch_header_map_011='politician_youtube_id',
-                            batch_header_map_012='politician_googleplus_id',
-                            batch_header_map_013='politician_ctcl_uuid',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "POLITICIAN " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='POLITICIAN',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED "
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for office_batch_id or electoral_district or name AND ctcl_uuid
-            # if positive_value_exists(person_id) and ctcl_uuid is not None or person_full_name is not None or \
-            #                 person_first_name is not None:
-            if positive_value_exists(person_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(person_full_name) or positive_value_exists(person_first_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=person_id,
-                        batch_row_001=person_full_name,
-                        batch_row_002=person_first_name,
-                        batch_row_003=person_middle_name,
-                        batch_row_004=person_last_name,
-                        batch_row_005=person_party_name,
-                        batch_row_006=person_email_id,
-                        batch_row_007=person_phone_number,
-                        batch_row_008=person_website_url,
-                        batch_row_009=person_facebook_id,
-                        batch_row_010=person_twitter_id,
-                        batch_row_011=person_youtube_id,
-                        batch_row_012=person_googleplus_id,
-                        batch_row_013=ctcl_uuid,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+                             batch_set_id=0, xml_element_list=None):
+        """
+        Retrieves Politician data from CTCL xml file
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param xml_root:
+        :param batch_set_id:
+        :param xml_element_list: Person elements to use instead of searching xml_root
+        :return:
+        """
+        party_name_by_party_id = retrieve_party_name_by_party_id_dict()
+
+        # Person is the direct child node of VipObject
+        if xml_element_list is None:
+            xml_element_list = xml_root.findall('Person')
+        batch_row_writer = VipXmlBatchRowWriter(
+            POLITICIAN, VIP_XML_POLITICIAN_HEADER_COLUMN_LIST, VIP_XML_POLITICIAN_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+        for one_person in xml_element_list:
+            batch_row_value_list = get_vip_xml_politician_row(one_person)
+            if batch_row_value_list is not None:
+                batch_row_value_list = add_party_name_to_vip_xml_row(batch_row_value_list, 5, party_name_by_party_id)
+            if not batch_row_writer.add_row(batch_row_value_list):
+                break
+        return batch_row_writer.finish()
 
     def store_candidate_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                            batch_set_id=0):
+                            batch_set_id=0, xml_element_list=None):
         """
         Retrieves Candidate data from CTCL xml file
         :param batch_uri:
         :param google_civic_election_id:
         :param organization_we_vote_id:
         :param xml_root:
-        :param batch_set_id
+        :param batch_set_id:
+        :param xml_element_list: Candidate elements to use instead of searching xml_root
         :return:
         """
-        # Process VIP Candidate data
-        number_of_batch_rows = 0
-        first_line = True
-        success = True
-        status = ''
-        limit_for_testing = 0
-        batch_header_id = 0
-
-        # Call party api to get corresponding party name from party id
-        party_details_list = retrieve_all_party_names_and_ids_api()
-
-        # Look for Candidate and create the batch_header first. Candidate is the direct child node
-        # of VipObject
-        candidate_xml_node = xml_root.findall('Candidate')
-        for one_candidate in candidate_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
-                break
-
-            candidate_name_english = None
-            candidate_ctcl_person_id = ""
-            candidate_party_name = ""
-            ctcl_uuid = ""
-
-            # look for relevant child nodes under Candidate: id, BallotName, personId, PartyId, isTopTicket,
-            # other::ctcl-uid
-            candidate_id = one_candidate.attrib['id']
-
-            candidate_selection_id = one_candidate.find("./BallotSelectionIds")
-
-            candidate_name_node_english = one_candidate.find("./BallotName/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if candidate_name_node_english is not None:
-                candidate_name_english = candidate_name_node_english.text
-
-            candidate_ctcl_person_id_node = one_candidate.find('./PersonId')
-            if candidate_ctcl_person_id_node is not None:
-                candidate_ctcl_person_id = candidate_ctcl_person_id_node.text
-
-            candidate_party_id_node = one_candidate.find('./PartyId')
-            if candidate_party_id_node is not None:
-                candidate_party_id = candidate_party_id_node.text
-                # get party name from candidate_party_id
-                if party_details_list is not None:
-                    # party_details_dict =  [entry for entry in party_details_list]
-                    for one_party in party_details_list:
-                        # get the candidate party name matching candidate_party_id
-                        if candidate_party_id == one_party.get('party_id_temp'):
-                            candidate_party_name = one_party.get('party_name')
-                            break
-            else:
-                candidate_party_name = ''
-
-            candidate_is_top_ticket_node = one_candidate.find('IsTopTicket')
-            if candidate_is_top_ticket_node is not None:
-                candidate_is_top_ticket = candidate_is_top_ticket_node.text
-            else:
-                candidate_is_top_ticket = ''
-
-            ctcl_uuid_node = one_candidate.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_candidate.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='PersonId',
-                        batch_header_column_002='Name',
-                        batch_header_column_003='PartyName',
-                        batch_header_column_004='IsTopTicket',
-                        batch_header_column_005='other::ctcl-uuid',
-                        batch_header_column_006='other::CandidateSelectionId',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='candidate_batch_id',
-                            batch_header_map_001='candidate_ctcl_person_id',
-                            batch_header_map_002='candidate_name',
-                            batch_header_map_003='candidate_party_name',
-                            batch_header_map_004='candidate_is_top_ticket',
-                            batch_header_map_005='candidate_ctcl_uuid',
-                            batch_header_map_006='candidate_selection_id',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "CANDIDATE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='CANDIDATE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
+        party_name_by_party_id = retrieve_party_name_by_party_id_dict()
+
+        # Candidate is the direct child node of VipObject
+        if xml_element_list is None:
+            xml_element_list = xml_root.findall('Candidate')
+        batch_row_writer = VipXmlBatchRowWriter(
+            CANDIDATE, VIP_XML_CANDIDATE_HEADER_COLUMN_LIST, VIP_XML_CANDIDATE_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+        for one_candidate in xml_element_list:
+            batch_row_value_list = get_vip_xml_candidate_row(one_candidate)
+            if batch_row_value_list is not None:
+                batch_row_value_list = add_party_name_to_vip_xml_row(batch_row_value_list, 3, party_name_by_party_id)
+            if not batch_row_writer.add_row(batch_row_value_list):
                 break
-
-            # check for candidate_id or candidate_ctcl_person_id or name AND ctcl_uuid
-            if positive_value_exists(candidate_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(candidate_ctcl_person_id) or positive_value_exists(candidate_name_english)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=candidate_id,
-                        batch_row_001=candidate_ctcl_person_id,
-                        batch_row_002=candidate_name_english,
-                        batch_row_003=candidate_party_name,
-                        batch_row_004=candidate_is_top_ticket,
-                        batch_row_005=ctcl_uuid,
-                        batch_row_006=candidate_selection_id
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    success = False
-
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return batch_row_writer.finish()
 
     def store_state_data_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
                                   batch_set_id=0):
@@ -3500,234 +3156,312 @@ class BatchManager(models.Manager):
     def create_batch_set_vip_xml(self, batch_file, batch_uri, google_civic_election_id, organization_we_vote_id):
         """
         Retrieves CTCL Batch Set data from an xml file - Measure, Office, Candidate, Politician
+        The feed is read once with iterparse, so we never hold the whole tree. Office and BallotMeasureContest rows
+        are saved as they stream past. CandidateContest, Person and Candidate rows refer to CandidateSelection and
+        Party elements which can come later in the file, so we keep their values (not the elements) until the end.
         :param batch_file:
         :param batch_uri:
         :param google_civic_election_id:
         :param organization_we_vote_id:
         :return:
         """
-        from import_export_ctcl.controllers import create_candidate_selection_rows
+        from import_export_ctcl.controllers import create_candidate_selection_rows_from_list
         import_date = date.today()
 
         # Retrieve from XML
         if batch_file:
-            xml_tree = ElementTree.parse(batch_file)
+            xml_source = batch_file
             batch_set_name = batch_file.name + " - " + str(import_date)
-
         else:
-            request = urllib.request.urlopen(batch_uri)
-            # xml_data = request.read()
-            # xml_data = xmltodict.parse(xml_data)
-            # # xml_data_list_json = list(xml_data)
-            # structured_json = json.dumps(xml_data)
-
-            xml_tree = ElementTree.parse(request)
-            request.close()
+            xml_source = urllib.request.urlopen(batch_uri)
 
             # set batch_set_name as file_name
             batch_set_name_list = batch_uri.split('/')
             batch_set_name = batch_set_name_list[len(batch_set_name_list) - 1] + " - " + str(import_date)
 
-        xml_root = xml_tree.getroot()
-
         status = ''
         success = False
         number_of_batch_rows = 0
         batch_set_id = 0
         continue_batch_set_processing = True  # Set to False if we run into a problem that requires we stop processing
 
-        if xml_root:
-            # create batch_set object
-            try:
-                batch_set = BatchSet.objects.create(batch_set_description_text="", batch_set_name=batch_set_name,
-                                                    batch_set_source=BATCH_SET_SOURCE_CTCL,
-                                                    google_civic_election_id=google_civic_election_id,
-                                                    source_uri=batch_uri, import_date=import_date)
-                batch_set_id = batch_set.id
-                if positive_value_exists(batch_set_id):
-                    status += " BATCH_SET_SAVED-VIP_XML "
-                    success = True
-            except Exception as e:
-                # Stop trying to save rows -- break out of the for loop
-                continue_batch_set_processing = False
-                batch_set_id = 0
-                status += " EXCEPTION_BATCH_SET-VIP_XML: " + str(e) + " "
-                handle_exception(e, logger=logger, exception_message=status)
+        # create batch_set object
+        try:
+            batch_set = BatchSet.objects.create(batch_set_description_text="", batch_set_name=batch_set_name,
+                                                batch_set_source=BATCH_SET_SOURCE_CTCL,
+                                                google_civic_election_id=google_civic_election_id,
+                                                source_uri=batch_uri, import_date=import_date)
+            batch_set_id = batch_set.id
+            if positive_value_exists(batch_set_id):
+                status += " BATCH_SET_SAVED-VIP_XML "
+                success = True
+        except Exception as e:
+            continue_batch_set_processing = False
+            batch_set_id = 0
+            status += " EXCEPTION_BATCH_SET-VIP_XML: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
 
-            # import Electoral District
-            skip_electoral_district = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_electoral_district:
-                electoral_district_list_found = False
-                electoral_district_item_list = xml_root.findall('ElectoralDistrict')
-                if not len(electoral_district_item_list):
-                    continue_batch_set_processing = False
-                else:
-                    results = electoral_district_import_from_xml_data(electoral_district_item_list)
-                    if results['success']:
-                        status += "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED-VIP_XML "
-                        number_of_batch_rows += results['saved']
-                        # TODO check this whether it should be only saved or updated Electoral districts
-                        number_of_batch_rows += results['updated']
-                        electoral_district_list_found = True
-                    else:
-                        continue_batch_set_processing = False
-                        status += results['status']
-                        status += " CREATE_BATCH_SET_ELECTORAL_DISTRICT_ERRORS-VIP_XML "
-
-            # import Party
-            skip_party = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_party:
-                party_list_found = False
-                party_item_list = xml_root.findall('Party')
-                if not len(party_item_list):
-                    continue_batch_set_processing = False
-                    status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-NO_party_item_list "
-                else:
-                    results = party_import_from_xml_data(party_item_list)
-                    if results['success']:
-                        status += "CREATE_BATCH_SET_PARTY_IMPORTED-VIP_XML "
-                        number_of_batch_rows += results['saved']
-                        number_of_batch_rows += results['updated']
-                        # TODO check this whether it should be only saved or updated Electoral districts
-                        party_list_found = True
-                        # A given data source may not always have electoral district and/or party data,
-                        # but the referenced electoral district id or party id might be already present
-                        # in the master database tables, hence commenting out below code
-                        # if not electoral_district_list_found or not party_list_found:
-                        #     results = {
-                        #         'success': False,
-                        #         'status': status,
-                        #         'batch_header_id': 0,
-                        #         'batch_saved': False,
-                        #         'number_of_batch_rows': 0,
-                        #     }
-                        #     return results
-                    else:
-                        continue_batch_set_processing = False
-                        status += results['status']
-                        status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-VIP_XML "
-
-            # look for different data sets in the XML - OfficeHeld, ContestOffice, Candidate, Politician, Measure
-
-            # Office Held
-            skip_office_held = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_office_held:
-                results = self.store_office_held_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                        xml_root, batch_set_id)
-                if results['success']:
-                    # Office Held data found
-                    status += 'CREATE_BATCH_SET_OFFICE_HELD_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS "
-
-            # Candidate-to-office-mappings
-            skip_candidate_mapping = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_candidate_mapping:
-                results = create_candidate_selection_rows(xml_root, batch_set_id)
-                if results['success']:
-                    # Office Held data found
-                    status += 'CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CANDIDATE_SELECTION_ERRORS "
-
-            # ContestOffice entries
-            skip_contest_office = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_contest_office:
-                results = self.store_contest_office_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    # Contest Office data found
-                    status += 'CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CONTEST_OFFICE_ERRORS "
-
-            # Politician entries
-            skip_politician = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_politician:
-                results = self.store_politician_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_POLITICIAN_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-POLITICIAN_ERRORS "
-
-            # Candidate entries
-            skip_candidate = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_candidate:
-                results = self.store_candidate_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_CANDIDATE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CANDIDATE_ERRORS "
-
-            # Measure entries
-            skip_measure = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_measure:
-                results = self.store_measure_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_MEASURE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                    success = True
-                else:
+        if not continue_batch_set_processing:
+            if not batch_file:
+                xml_source.close()
+            results = {
+                'success':                  False,
+                'status':                   status,
+                'batch_set_id':             batch_set_id,
+                'batch_saved':              False,
+                'number_of_batch_rows':     number_of_batch_rows,
+            }
+            return results
+
+        office_held_batch_row_writer = VipXmlBatchRowWriter(
+            OFFICE_HELD, VIP_XML_OFFICE_HELD_HEADER_COLUMN_LIST, VIP_XML_OFFICE_HELD_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id, success_if_no_elements=False)
+        measure_batch_row_writer = VipXmlBatchRowWriter(
+            MEASURE, VIP_XML_MEASURE_HEADER_COLUMN_LIST, VIP_XML_MEASURE_HEADER_MAP_LIST,
+            batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+        candidate_selection_value_list = []
+        contest_office_value_list = []
+        politician_value_list = []
+        candidate_value_list = []
+        # ElectoralDistrict and Party elements are imported in chunks, and the few State, Election and Source
+        # elements are kept for the store functions that read them
+        electoral_district_item_list = []
+        electoral_district_found = False
+        party_item_list = []
+        party_found = False
+        metadata_xml_root = ElementTree.Element('VipObject')
+
+        def import_electoral_districts():
+            import_results = electoral_district_import_from_xml_data(electoral_district_item_list)
+            electoral_district_item_list.clear()
+            if not import_results['success']:
+                return import_results['status'] + " CREATE_BATCH_SET_ELECTORAL_DISTRICT_ERRORS-VIP_XML ", 0
+            # TODO check this whether it should be only saved or updated Electoral districts
+            return '', import_results['saved'] + import_results['updated']
+
+        def import_parties():
+            import_results = party_import_from_xml_data(party_item_list)
+            party_item_list.clear()
+            if not import_results['success']:
+                return import_results['status'] + " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-VIP_XML ", 0
+            return '', import_results['saved'] + import_results['updated']
+
+        try:
+            for element in iterate_vip_xml_elements(xml_source):
+                import_error_status = ''
+                if element.tag == 'ElectoralDistrict':
+                    electoral_district_found = True
+                    # The element is cleared once we move on, so the chunk holds copies
+                    electoral_district_item_list.append(copy.deepcopy(element))
+                    if len(electoral_district_item_list) >= VIP_XML_IMPORT_CHUNK_SIZE:
+                        import_error_status, number_imported = import_electoral_districts()
+                        number_of_batch_rows += number_imported
+                elif element.tag == 'Party':
+                    party_found = True
+                    party_item_list.append(copy.deepcopy(element))
+                    if len(party_item_list) >= VIP_XML_IMPORT_CHUNK_SIZE:
+                        import_error_status, number_imported = import_parties()
+                        number_of_batch_rows += number_imported
+                elif element.tag == 'Office':
+                    office_held_batch_row_writer.add_row(get_vip_xml_office_held_row(element))
+                elif element.tag == 'BallotMeasureContest':
+                    measure_batch_row_writer.add_row(get_vip_xml_measure_row(element))
+                elif element.tag == 'CandidateSelection':
+                    candidate_selection_value_list.append(
+                        (element.attrib['id'], get_vip_xml_text(element, './CandidateIds', default=None)))
+                elif element.tag == 'CandidateContest':
+                    contest_office_value_list.append(get_vip_xml_contest_office_row(element))
+                elif element.tag == 'Person':
+                    politician_value_list.append(get_vip_xml_politician_row(element))
+                elif element.tag == 'Candidate':
+                    candidate_value_list.append(get_vip_xml_candidate_row(element))
+                elif element.tag in ('State', 'Election', 'Source'):
+                    metadata_xml_root.append(copy.deepcopy(element))
+                if positive_value_exists(import_error_status):
                     continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-MEASURE_ERRORS "
-
-            # State data entries
-            if continue_batch_set_processing:
-                results = self.store_state_data_from_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                         xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_STATE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                    success = True
-                else:
+                    status += import_error_status
+                    break
+        except ElementTree.ParseError as e:
+            continue_batch_set_processing = False
+            status += " VIP_XML_PARSE_ERROR: " + str(e) + " "
+        finally:
+            if not batch_file:
+                xml_source.close()
+
+        office_held_results = office_held_batch_row_writer.finish()
+        measure_results = measure_batch_row_writer.finish()
+
+        # import Electoral District
+        if continue_batch_set_processing:
+            if not electoral_district_found:
+                continue_batch_set_processing = False
+            else:
+                import_error_status, number_imported = import_electoral_districts() \
+                    if len(electoral_district_item_list) else ('', 0)
+                if positive_value_exists(import_error_status):
                     continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-STATE_DATA_ERRORS "
-
-            # Election metadata entries
-            if continue_batch_set_processing:
-                results = self.store_election_metadata_from_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += ' CREATE_BATCH_SET_ELECTION_METADATA_FOUND '
-                    number_of_batch_rows += 1
-                    success = True
+                    status += import_error_status
                 else:
+                    status += "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED-VIP_XML "
+                    number_of_batch_rows += number_imported
+
+        # import Party
+        if continue_batch_set_processing:
+            if not party_found:
+                continue_batch_set_processing = False
+                status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-NO_party_item_list "
+            else:
+                import_error_status, number_imported = import_parties() if len(party_item_list) else ('', 0)
+                if positive_value_exists(import_error_status):
                     continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-ELECTION_METADATA_ERRORS "
-
-            # Source metadata entries
-            if continue_batch_set_processing:
-                results = self.store_source_metadata_from_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += ' CREATE_BATCH_SET_SOURCE_METADATA_FOUND '
-                    number_of_batch_rows += 1
-                    success = True
+                    status += import_error_status
                 else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-SOURCE_METADATA_ERRORS "
+                    status += "CREATE_BATCH_SET_PARTY_IMPORTED-VIP_XML "
+                    number_of_batch_rows += number_imported
+
+        # look for different data sets in the XML - OfficeHeld, ContestOffice, Candidate, Politician, Measure
+
+        # Office Held
+        if continue_batch_set_processing:
+            if office_held_results['success']:
+                # Office Held data found
+                status += 'CREATE_BATCH_SET_OFFICE_HELD_DATA_FOUND'
+                number_of_batch_rows += office_held_results['number_of_batch_rows']
+            else:
+                continue_batch_set_processing = False
+                status += office_held_results['status']
+                status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS "
+
+        # Candidate-to-office-mappings
+        candidate_id_by_candidate_selection_id = {}
+        if continue_batch_set_processing:
+            results = create_candidate_selection_rows_from_list(candidate_selection_value_list, batch_set_id)
+            if results['success']:
+                status += 'CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND'
+                number_of_batch_rows += results['number_of_batch_rows']
+                candidate_id_by_candidate_selection_id = dict(candidate_selection_value_list)
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-CANDIDATE_SELECTION_ERRORS "
+        candidate_selection_value_list = []
+
+        # ContestOffice entries
+        if continue_batch_set_processing:
+            batch_row_writer = VipXmlBatchRowWriter(
+                CONTEST_OFFICE, VIP_XML_CONTEST_OFFICE_HEADER_COLUMN_LIST, VIP_XML_CONTEST_OFFICE_HEADER_MAP_LIST,
+                batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+            for batch_row_value_list, ballot_selection_id_list in contest_office_value_list:
+                if batch_row_value_list is not None:
+                    batch_row_value_list = add_candidate_ids_to_vip_xml_contest_office_row(
+                        batch_row_value_list, ballot_selection_id_list, candidate_id_by_candidate_selection_id)
+                if not batch_row_writer.add_row(batch_row_value_list):
+                    break
+            results = batch_row_writer.finish()
+            if results['success']:
+                # Contest Office data found
+                status += 'CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND'
+                number_of_batch_rows += results['number_of_batch_rows']
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-CONTEST_OFFICE_ERRORS "
+        contest_office_value_list = []
+
+        # The parties are all imported now, so Person and Candidate rows can get their party names
+        party_name_by_party_id = retrieve_party_name_by_party_id_dict() if continue_batch_set_processing else {}
+
+        # Politician entries
+        if continue_batch_set_processing:
+            batch_row_writer = VipXmlBatchRowWriter(
+                POLITICIAN, VIP_XML_POLITICIAN_HEADER_COLUMN_LIST, VIP_XML_POLITICIAN_HEADER_MAP_LIST,
+                batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+            for batch_row_value_list in politician_value_list:
+                if batch_row_value_list is not None:
+                    batch_row_value_list = add_party_name_to_vip_xml_row(
+                        batch_row_value_list, 5, party_name_by_party_id)
+                if not batch_row_writer.add_row(batch_row_value_list):
+                    break
+            results = batch_row_writer.finish()
+            if results['success']:
+                status += 'CREATE_BATCH_SET_POLITICIAN_DATA_FOUND'
+                number_of_batch_rows += results['number_of_batch_rows']
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-POLITICIAN_ERRORS "
+        politician_value_list = []
+
+        # Candidate entries
+        if continue_batch_set_processing:
+            batch_row_writer = VipXmlBatchRowWriter(
+                CANDIDATE, VIP_XML_CANDIDATE_HEADER_COLUMN_LIST, VIP_XML_CANDIDATE_HEADER_MAP_LIST,
+                batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id)
+            for batch_row_value_list in candidate_value_list:
+                if batch_row_value_list is not None:
+                    batch_row_value_list = add_party_name_to_vip_xml_row(
+                        batch_row_value_list, 3, party_name_by_party_id)
+                if not batch_row_writer.add_row(batch_row_value_list):
+                    break
+            results = batch_row_writer.finish()
+            if results['success']:
+                status += 'CREATE_BATCH_SET_CANDIDATE_DATA_FOUND'
+                number_of_batch_rows += results['number_of_batch_rows']
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-CANDIDATE_ERRORS "
+        candidate_value_list = []
+
+        # Measure entries
+        if continue_batch_set_processing:
+            if measure_results['success']:
+                status += 'CREATE_BATCH_SET_MEASURE_DATA_FOUND'
+                number_of_batch_rows += measure_results['number_of_batch_rows']
+                success = True
+            else:
+                continue_batch_set_processing = False
+                status += measure_results['status']
+                status += " CREATE_BATCH_SET-MEASURE_ERRORS "
+
+        # State data entries
+        if continue_batch_set_processing:
+            results = self.store_state_data_from_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
+                                                     metadata_xml_root, batch_set_id)
+            if results['success']:
+                status += 'CREATE_BATCH_SET_STATE_DATA_FOUND'
+                number_of_batch_rows += results['number_of_batch_rows']
+                success = True
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-STATE_DATA_ERRORS "
+
+        # Election metadata entries
+        if continue_batch_set_processing:
+            results = self.store_election_metadata_from_xml(
+                batch_uri, google_civic_election_id, organization_we_vote_id, metadata_xml_root, batch_set_id)
+            if results['success']:
+                status += ' CREATE_BATCH_SET_ELECTION_METADATA_FOUND '
+                number_of_batch_rows += 1
+                success = True
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-ELECTION_METADATA_ERRORS "
+
+        # Source metadata entries
+        if continue_batch_set_processing:
+            results = self.store_source_metadata_from_xml(
+                batch_uri, google_civic_election_id, organization_we_vote_id, metadata_xml_root, batch_set_id)
+            if results['success']:
+                status += ' CREATE_BATCH_SET_SOURCE_METADATA_FOUND '
+                number_of_batch_rows += 1
+                success = True
+            else:
+                continue_batch_set_processing = False
+                status += results['status']
+                status += " CREATE_BATCH_SET-SOURCE_METADATA_ERRORS "
 
         results = {
             'success':                  success,
@@ -3809,50 +3543,57 @@ class BatchManager(models.Manager):
     def fetch_office_held_name_from_office_held_ctcl_id(self, office_held_ctcl_id, batch_set_id):
         """
         Take in office_held_ctcl_id and batch_set_id, look up BatchRow and return office_held_name
-        :param office_held_ctcl_id: 
+        The names for a whole batch set are read with one query the first time we are asked, and kept in a dict
+        until create_batch_row_actions finishes analyzing the batch (clear_office_held_names_for_batch_set).
+        :param office_held_ctcl_id:
         :param batch_set_id:
         :return:
         """
-        office_held_name = ''
-        batch_header_id = 0
-        # From batch_description, get the header_id using batch_set_id
-        # batch_header_id = get_batch_header_id_from_batch_description(batch_set_id, OFFICE_HELD)
+        if not positive_value_exists(batch_set_id) or not office_held_ctcl_id:
+            return ''
+        office_held_name_by_ctcl_id = office_held_name_by_ctcl_id_by_batch_set_id.get(batch_set_id)
+        if office_held_name_by_ctcl_id is None:
+            office_held_name_by_ctcl_id = self.retrieve_office_held_name_by_ctcl_id_dict(batch_set_id)
+            cache_office_held_names_for_batch_set(batch_set_id, office_held_name_by_ctcl_id)
+        return office_held_name_by_ctcl_id.get(office_held_ctcl_id, '')
+
+    def retrieve_office_held_name_by_ctcl_id_dict(self, batch_set_id):
+        """
+        Read office_held_name for every OFFICE_HELD BatchRow in this batch set, keyed by office_held_batch_id.
+        From the primary database, since the rows may have just been imported or edited.
+        :param batch_set_id:
+        :return:
+        """
+        office_held_name_by_ctcl_id = {}
         try:
-            if positive_value_exists(batch_set_id):
-                batch_description_on_stage = BatchDescription.objects.using('readonly').get(
-                    batch_set_id=batch_set_id,
-                    kind_of_batch=OFFICE_HELD)
-                if batch_description_on_stage:
-                    batch_header_id = batch_description_on_stage.batch_header_id
-        except BatchDescription.DoesNotExist:
-            office_held_name = ''
+            # From batch_description, get the header_id using batch_set_id
+            batch_description_on_stage = BatchDescription.objects\
+                .filter(batch_set_id=batch_set_id, kind_of_batch=OFFICE_HELD)\
+                .first()
+            if batch_description_on_stage is None:
+                return office_held_name_by_ctcl_id
+            batch_header_id = batch_description_on_stage.batch_header_id
+            batch_header_map = BatchHeaderMap.objects.get(batch_header_id=batch_header_id)
+
+            # Get the columns in BatchRow that store office_held_batch_id and office_held_name
+            # eg: batch_row_000 -> office_held_batch_id
+            office_held_id_column_name = self.retrieve_column_name_from_batch_row(
+                "office_held_batch_id", batch_header_map)
+            office_held_name_column_name = self.retrieve_column_name_from_batch_row(
+                "office_held_name", batch_header_map)
+            if not positive_value_exists(office_held_id_column_name) or \
+                    not positive_value_exists(office_held_name_column_name):
+                return office_held_name_by_ctcl_id
+
+            queryset = BatchRow.objects.filter(batch_header_id=batch_header_id)\
+                .values_list(office_held_id_column_name, office_held_name_column_name)
+            for office_held_ctcl_id, office_held_name in queryset:
+                if office_held_ctcl_id and office_held_ctcl_id not in office_held_name_by_ctcl_id:
+                    office_held_name_by_ctcl_id[office_held_ctcl_id] = \
+                        office_held_name.strip() if office_held_name else ''
+        except BatchHeaderMap.DoesNotExist:
             pass
-
-        # Lookup BatchRow with given header_id and office_held_ctcl_id. But before doing that, we need to get batch
-        # row column name that matches 'office_held_batch_id'
-        try:
-            batch_manager = BatchManager()
-            if positive_value_exists(batch_header_id) and office_held_ctcl_id:
-                batch_header_map = BatchHeaderMap.objects.using('readonly').get(batch_header_id=batch_header_id)
-
-                # Get the column name in BatchRow that stores office_held_batch_id - id taken from batch_header_map
-                # eg: batch_row_000 -> office_held_batch_id
-                office_held_id_column_name = batch_manager.retrieve_column_name_from_batch_row(
-                    "office_held_batch_id", batch_header_map)
-
-                # we found batch row column name corresponding to office_held_batch_id, now look up batch_row table
-                # with given batch_header_id and office_held_batch_id (batch_row_00)
-                batch_row_on_stage = BatchRow.objects.using('readonly').get(
-                    batch_header_id=batch_header_id,
-                    **{office_held_id_column_name: office_held_ctcl_id})
-                # we know the batch row, next retrieve value for office_held_name eg: off1 -> NC State Senator
-                office_held_name = batch_manager.retrieve_value_from_batch_row('office_held_name',
-                                                                                  batch_header_map, batch_row_on_stage)
-
-        except BatchRow.DoesNotExist:
-            office_held_name = ''
-
-        return office_held_name
+        return office_held_name_by_ctcl_id
 
     def fetch_state_code_from_person_id_in_candidate(self, person_id, batch_set_id):
         """
@@ -5006,6 +4747,7 @@ class BatchProcessManager(models.Manager):
                     CALCULATE_SITEWIDE_ELECTION_METRICS,
                     CALCULATE_ORGANIZATION_DAILY_METRICS,
                     CALCULATE_ORGANIZATION_ELECTION_METRICS,
+                    GENERATE_BALLOT_SNAPSHOTS,
                     GENERATE_VOTER_GUIDES,
                     MATCH_POLITICIANS_TO_ORGANIZATIONS,
                     REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
@@ -5014,6 +4756,8 @@ class BatchProcessManager(models.Manager):
                     RETRIEVE_FROM_BALLOTPEDIA,
                     RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS,
                     SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE,
+                    UPDATE_POLITICIAN_RECOMMENDATIONS,
+                    UPDATE_SUGGESTED_FRIENDS,
                     UPDATE_TWITTER_DATA_FROM_TWITTER,
                 ]:
             status += "KIND_OF_PROCESS_NOT_FOUND: " + str(kind_of_process) + " "
@@ -5070,7 +4814,10 @@ class BatchProcessManager(models.Manager):
             state_code="",
             status="",
             voter_id=None,
-            analytics_date_as_integer=None):
+            analytics_date_as_integer=None,
+            worker_id=None,
+            worker_steps_completed=None,
+            worker_run_time_seconds=None):
         success = True
         batch_process_log_entry = None
         batch_process_log_entry_saved = False
@@ -5104,6 +4851,11 @@ class BatchProcessManager(models.Manager):
             if positive_value_exists(analytics_date_as_integer):
                 batch_process_log_entry.analytics_date_as_integer = analytics_date_as_integer
                 save_changes = True
+            if positive_value_exists(worker_id):
+                batch_process_log_entry.worker_id = worker_id
+                batch_process_log_entry.worker_steps_completed = convert_to_int(worker_steps_completed)
+                batch_process_log_entry.worker_run_time_seconds = worker_run_time_seconds
+                save_changes = True
             if save_changes:
                 batch_process_log_entry.save()
             status += 'CREATE_BATCH_PROCESS_LOG_SAVED '
@@ -5237,6 +4989,7 @@ class BatchProcessManager(models.Manager):
     # CALCULATE_SITEWIDE_ELECTION_METRICS
     # CALCULATE_ORGANIZATION_DAILY_METRICS
     # CALCULATE_ORGANIZATION_ELECTION_METRICS
+    # GENERATE_BALLOT_SNAPSHOTS
     # GENERATE_VOTER_GUIDES
     # MATCH_POLITICIANS_TO_ORGANIZATIONS
     # REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
@@ -5244,6 +4997,8 @@ class BatchProcessManager(models.Manager):
     # RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
     # RETRIEVE_FROM_BALLOTPEDIA
     # SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE
+    # UPDATE_POLITICIAN_RECOMMENDATIONS
+    # UPDATE_SUGGESTED_FRIENDS
     @staticmethod
     def count_next_steps(
             kind_of_process_list=[],
@@ -5403,7 +5158,15 @@ class BatchProcessManager(models.Manager):
 
             # Cycle through all processes retrieved and make sure they aren't being worked on by other processes
             for batch_process in batch_process_list:
-                if batch_process.date_checked_out is None:
+                if batch_process.date_worker_heartbeat is not None:
+                    # Claimed by a worker, which is alive as long as its heartbeat is fresh
+                    status += "WORKER_CLAIMED_PROCESS_FOUND "
+                    if positive_value_exists(process_active):
+                        if batch_process_worker_is_alive(batch_process):
+                            filtered_batch_process_list.append(batch_process)
+                    elif not batch_process_worker_is_alive(batch_process):
+                        filtered_batch_process_list.append(batch_process)
+                elif batch_process.date_checked_out is None:
                     # If no date_checked_out, then process can be considered "active", "queued" or "needs_to_be_run"
                     filtered_batch_process_list.append(batch_process)
                 else:
@@ -5414,6 +5177,8 @@ class BatchProcessManager(models.Manager):
                         checked_out_expiration_time = 270  # 4.5 minutes * 60 seconds
                     elif batch_process.kind_of_process == API_REFRESH_REQUEST:
                         checked_out_expiration_time = 360  # 6 minutes * 60 seconds
+                    elif batch_process.kind_of_process == GENERATE_BALLOT_SNAPSHOTS:
+                        checked_out_expiration_time = 1800  # 30 minutes * 60 seconds
                     elif batch_process.kind_of_process == GENERATE_VOTER_GUIDES:
                         checked_out_expiration_time = 600  # 10 minutes * 60 seconds
                     elif batch_process.kind_of_process == MATCH_POLITICIANS_TO_ORGANIZATIONS:
@@ -5434,6 +5199,10 @@ class BatchProcessManager(models.Manager):
                         checked_out_expiration_time = 600  # 10 minutes * 60 seconds
                     elif batch_process.kind_of_process == SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE:
                         checked_out_expiration_time = 300  # 5 minutes * 60 seconds - See SEARCH_TWITTER_TIMED_OUT
+                    elif batch_process.kind_of_process == UPDATE_POLITICIAN_RECOMMENDATIONS:
+                        checked_out_expiration_time = 3600  # 60 minutes * 60 seconds
+                    elif batch_process.kind_of_process == UPDATE_SUGGESTED_FRIENDS:
+                        checked_out_expiration_time = 600  # 10 minutes * 60 seconds
                     elif batch_process.kind_of_process == UPDATE_TWITTER_DATA_FROM_TWITTER:
                         checked_out_expiration_time = 600  # 10 minutes * 60 seconds - See UPDATE_TWITTER_TIMED_OUT
                     else:
@@ -5473,6 +5242,187 @@ class BatchProcessManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def retrieve_batch_process_queryset_for_workers(kind_of_process_list=[], for_upcoming_elections=True):
+        """
+        Batch processes the ballot item workers run: not completed, not paused, of these kinds and (optionally) for
+        upcoming elections
+        """
+        batch_process_queryset = BatchProcess.objects\
+            .filter(date_completed__isnull=True)\
+            .exclude(batch_process_paused=True)
+        if kind_of_process_list and len(kind_of_process_list) > 0:
+            batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=kind_of_process_list)
+        if positive_value_exists(for_upcoming_elections):
+            results = ElectionManager().retrieve_upcoming_elections()
+            google_civic_election_id_list = [0] + [convert_to_int(one_election.google_civic_election_id)
+                                                   for one_election in results['election_list']]
+            batch_process_queryset = \
+                batch_process_queryset.filter(google_civic_election_id__in=google_civic_election_id_list)
+        return batch_process_queryset
+
+    def is_ballot_item_work_left_for_workers(self, kind_of_process_list=[], for_upcoming_elections=True):
+        """
+        True while any batch process the workers run isn't completed, even if every one of its chunks is held right
+        now, since a worker which found nothing to claim may be racing peers which are still creating chunks
+        """
+        try:
+            return self.retrieve_batch_process_queryset_for_workers(
+                kind_of_process_list=kind_of_process_list, for_upcoming_elections=for_upcoming_elections).exists()
+        except Exception as e:
+            logger.error("is_ballot_item_work_left_for_workers failed: " + str(e))
+            return False
+
+    def claim_next_ballot_item_chunk_for_worker(self, worker_id, kind_of_process_list=[], for_upcoming_elections=True):
+        """
+        Atomically claim the BatchProcessBallotItemChunk a worker should run the next step of:
+         - an unfinished chunk no live worker holds (because its worker finished a step, or died part way through one),
+         - otherwise a new chunk, for a batch_process with room for another. RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
+           chunks claim their map points from the batch_process's queue, so up to
+           BALLOT_ITEM_CHUNKS_RUNNING_PER_BATCH_PROCESS of them run at once. Other kinds run one chunk at a time.
+           Started processes come first, then queued ones.
+        Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so workers racing for the same chunk or batch_process
+        (also on other servers) never block each other, and only one of them gets it.
+        :param worker_id:
+        :param kind_of_process_list:
+        :param for_upcoming_elections:
+        :return:
+        """
+        status = ""
+        success = True
+        batch_process = None
+        batch_process_ballot_item_chunk = None
+        batch_process_ballot_item_chunk_found = False
+
+        date_heartbeat_time_out = now() - timedelta(seconds=BATCH_PROCESS_WORKER_HEARTBEAT_TIME_OUT)
+        date_checked_out_time_out = now() - timedelta(seconds=BATCH_PROCESS_WORKER_LEGACY_CHECKED_OUT_TIME_OUT)
+        batch_process_queryset = self.retrieve_batch_process_queryset_for_workers(
+            kind_of_process_list=kind_of_process_list, for_upcoming_elections=for_upcoming_elections)
+        # Leave processes being run by the cron-driven path (process_next_ballot_items) alone, until they time out.
+        #  Only a fresh heartbeat means workers are running it, since the cron path may have checked it out since.
+        batch_process_queryset = batch_process_queryset.filter(
+            Q(date_worker_heartbeat__gte=date_heartbeat_time_out) |
+            Q(date_checked_out__isnull=True) |
+            Q(date_checked_out__lt=date_checked_out_time_out))
+        try:
+            with transaction.atomic():
+                batch_process_ballot_item_chunk = BatchProcessBallotItemChunk.objects\
+                    .select_for_update(skip_locked=True)\
+                    .filter(batch_process_id__in=batch_process_queryset.values('id'))\
+                    .filter(BALLOT_ITEM_CHUNK_NOT_COMPLETED_FILTER)\
+                    .filter(Q(date_worker_heartbeat__isnull=True) | Q(date_worker_heartbeat__lt=date_heartbeat_time_out))\
+                    .order_by('id')\
+                    .first()
+                if batch_process_ballot_item_chunk is not None:
+                    batch_process_ballot_item_chunk.worker_id = worker_id
+                    batch_process_ballot_item_chunk.date_worker_heartbeat = now()
+                    batch_process_ballot_item_chunk.save(update_fields=['worker_id', 'date_worker_heartbeat'])
+                    batch_process = BatchProcess.objects.get(id=batch_process_ballot_item_chunk.batch_process_id)
+                    status += "BALLOT_ITEM_CHUNK_CLAIMED_BY_WORKER "
+                else:
+                    unfinished_chunk_count = Subquery(
+                        BatchProcessBallotItemChunk.objects
+                        .filter(batch_process_id=OuterRef('id'))
+                        .filter(BALLOT_ITEM_CHUNK_NOT_COMPLETED_FILTER)
+                        .values('batch_process_id')
+                        .annotate(chunk_count=Count('id'))
+                        .values('chunk_count')[:1])
+                    batch_process = batch_process_queryset\
+                        .select_for_update(skip_locked=True)\
+                        .annotate(unfinished_chunk_count=Coalesce(unfinished_chunk_count, 0))\
+                        .filter(Q(unfinished_chunk_count=0) |
+                                Q(kind_of_process=RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
+                                  unfinished_chunk_count__lt=BALLOT_ITEM_CHUNKS_RUNNING_PER_BATCH_PROCESS))\
+                        .order_by(F('date_started').asc(nulls_last=True), 'id')\
+                        .first()
+                    if batch_process is not None:
+                        if batch_process.date_started is None:
+                            batch_process.date_started = now()
+                        batch_process.date_worker_heartbeat = now()
+                        batch_process.save(update_fields=['date_started', 'date_worker_heartbeat'])
+                        batch_process_ballot_item_chunk = BatchProcessBallotItemChunk.objects.create(
+                            batch_process_id=batch_process.id,
+                            google_civic_election_id=batch_process.google_civic_election_id,
+                            state_code=batch_process.state_code,
+                            worker_id=worker_id,
+                            date_worker_heartbeat=now(),
+                        )
+                        status += "NEW_BALLOT_ITEM_CHUNK_CLAIMED_BY_WORKER "
+                if batch_process_ballot_item_chunk is not None:
+                    batch_process_ballot_item_chunk_found = True
+                else:
+                    status += "NO_BALLOT_ITEM_CHUNK_TO_CLAIM "
+        except Exception as e:
+            batch_process = None
+            batch_process_ballot_item_chunk = None
+            batch_process_ballot_item_chunk_found = False
+            status += "FAILED_CLAIM_BALLOT_ITEM_CHUNK_FOR_WORKER: " + str(e) + " "
+            success = False
+
+        results = {
+            'success':                                  success,
+            'status':                                   status,
+            'batch_process':                            batch_process,
+            'batch_process_ballot_item_chunk':          batch_process_ballot_item_chunk,
+            'batch_process_ballot_item_chunk_found':    batch_process_ballot_item_chunk_found,
+        }
+        return results
+
+    @staticmethod
+    def update_ballot_item_chunk_worker_heartbeat(batch_process_ballot_item_chunk_id, batch_process_id, worker_id):
+        """
+        Returns True while this worker still holds the chunk. The batch_process's heartbeat tells
+        process_next_ballot_items that workers are running it.
+        """
+        try:
+            number_updated = BatchProcessBallotItemChunk.objects\
+                .filter(id=batch_process_ballot_item_chunk_id, worker_id=worker_id)\
+                .update(date_worker_heartbeat=now())
+            if positive_value_exists(number_updated):
+                BatchProcess.objects.filter(id=batch_process_id).update(date_worker_heartbeat=now())
+            return positive_value_exists(number_updated)
+        except Exception as e:
+            logger.error("update_ballot_item_chunk_worker_heartbeat failed: " + str(e))
+            return False
+
+    @staticmethod
+    def release_ballot_item_chunk_from_worker(batch_process_ballot_item_chunk_id, batch_process_id, worker_id):
+        """
+        After each step, so the chunk's next step can be claimed by any worker. The last worker to release one of the
+        batch_process's chunks clears its heartbeat, so it can go back to the cron-driven path.
+        """
+        status = ""
+        try:
+            BatchProcessBallotItemChunk.objects\
+                .filter(id=batch_process_ballot_item_chunk_id, worker_id=worker_id)\
+                .update(worker_id=None, date_worker_heartbeat=None)
+            status += "BALLOT_ITEM_CHUNK_RELEASED_BY_WORKER "
+            number_cleared = BatchProcess.objects\
+                .filter(id=batch_process_id)\
+                .exclude(id__in=BatchProcessBallotItemChunk.objects
+                         .filter(batch_process_id=batch_process_id, worker_id__isnull=False,
+                                 date_worker_heartbeat__gte=now() - timedelta(
+                                     seconds=BATCH_PROCESS_WORKER_HEARTBEAT_TIME_OUT))
+                         .values('batch_process_id'))\
+                .update(date_worker_heartbeat=None)
+            if positive_value_exists(number_cleared):
+                status += "BATCH_PROCESS_WORKER_HEARTBEAT_CLEARED "
+        except Exception as e:
+            status += "FAILED_RELEASE_BALLOT_ITEM_CHUNK_FROM_WORKER: " + str(e) + " "
+        return status
+
+    @staticmethod
+    def count_ballot_item_chunks_not_completed(batch_process_id, excluded_batch_process_ballot_item_chunk_id=0):
+        try:
+            return BatchProcessBallotItemChunk.objects\
+                .filter(batch_process_id=batch_process_id)\
+                .filter(BALLOT_ITEM_CHUNK_NOT_COMPLETED_FILTER)\
+                .exclude(id=excluded_batch_process_ballot_item_chunk_id)\
+                .count()
+        except Exception as e:
+            logger.error("count_ballot_item_chunks_not_completed failed: " + str(e))
+            return 0
+
     def retrieve_active_ballot_item_chunk_not_completed(self, batch_process_id):
         status = ""
         success = True
@@ -5602,6 +5552,9 @@ class BatchProcess(models.Model):
     # When a batch_process is running, we mark when it was "taken off the shelf" to be worked on.
     #  When the process is complete, we should reset this to "NULL"
     date_checked_out = models.DateTimeField(null=True)
+    # Kept fresh while runballotitemworkers workers are running any of this process's chunks, so the cron-driven
+    #  process_next_ballot_items leaves it to them
+    date_worker_heartbeat = models.DateTimeField(null=True)
     batch_process_paused = models.BooleanField(default=False, db_index=True)
     completion_summary = models.TextField(null=True, blank=True)
     use_ballotpedia = models.BooleanField(default=False)
@@ -5658,6 +5611,33 @@ class BatchProcessBallotItemChunk(models.Model):
     create_timed_out = models.BooleanField(default=None, null=True)
     create_row_count = models.PositiveIntegerField(default=0, null=False)
 
+    # The runballotitemworkers worker running a step of this chunk, which keeps date_worker_heartbeat fresh while it
+    #  works. A claim is only considered abandoned once the heartbeat stops, instead of after a fixed time out.
+    worker_id = models.CharField(max_length=255, null=True, blank=True)
+    date_worker_heartbeat = models.DateTimeField(null=True)
+
+
+class BatchProcessMapPoint(models.Model):
+    """
+    The map points a RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS batch_process still has to retrieve ballots for.
+    Seeded once when the batch_process starts, then claimed a chunk at a time (see controllers_map_point_queue).
+    Deleted when the batch_process completes.
+    """
+    batch_process_id = models.PositiveIntegerField(default=0, null=False)
+    polling_location_we_vote_id = models.CharField(max_length=255, null=False)
+    queue_status = models.CharField(max_length=10, default=MAP_POINT_QUEUE_PENDING, null=False)
+    date_claimed = models.DateTimeField(null=True)
+    # Failed retrieves so far
+    retry_count = models.PositiveIntegerField(default=0, null=False)
+
+    class Meta:
+        unique_together = ('batch_process_id', 'polling_location_we_vote_id')
+        indexes = [
+            models.Index(
+                fields=['batch_process_id', 'queue_status', 'id'],
+                name='map_point_queue_claim_index'),
+        ]
+
 
 class BatchProcessLogEntry(models.Model):
     """
@@ -5684,6 +5664,10 @@ class BatchProcessLogEntry(models.Model):
     kind_of_process = models.CharField(max_length=50, default="")
     analytics_date_as_integer = models.PositiveIntegerField(default=None, null=True)
     status = models.TextField(null=True, blank=True)
+    # Throughput of one runballotitemworkers worker
+    worker_id = models.CharField(max_length=255, default=None, null=True)
+    worker_steps_completed = models.PositiveIntegerField(default=None, null=True)
+    worker_run_time_seconds = models.FloatField(default=None, null=True)
 
 
 class BatchProcessRepresentativesChunk(models.Model):
@@ -0,0 +1,358 @@
+# import_export_batches/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+import import_export_batches.controllers
+import import_export_batches.controllers_ballot_retrieval_pipeline
+import import_export_batches.controllers_batch_process_workers
+import import_export_batches.controllers_map_point_queue
+import import_export_ctcl.controllers
+from ballot.models import BallotReturned
+from import_export_batches.controllers import create_batch_row_actions
+from import_export_batches.controllers_ballot_retrieval_pipeline import PROVIDER_CTCL, ProviderSessions, \
+    fetch_ballots_for_polling_location_list
+from import_export_batches.controllers_batch_process_workers import run_ballot_item_batch_process_worker
+from import_export_batches.controllers_map_point_queue import claim_map_points_from_queue, \
+    mark_map_points_in_queue, seed_map_point_queue_for_batch_process
+from import_export_batches.models import BatchDescription, BatchHeaderMap, BatchManager, BatchProcess, \
+    BatchProcessManager, BatchProcessMapPoint, BatchRow, CONTEST_OFFICE, MAP_POINT_QUEUE_CLAIM_TIME_OUT, \
+    MAP_POINT_QUEUE_CLAIMED, MAP_POINT_QUEUE_EMPTY, MAP_POINT_QUEUE_FAILED, MAP_POINT_QUEUE_MAX_ATTEMPTS, \
+    MAP_POINT_QUEUE_PENDING, MAP_POINT_QUEUE_RETRIEVED, OFFICE_HELD, RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, \
+    office_held_name_by_ctcl_id_by_batch_set_id, save_batch_rows_in_bulk
+from polling_location.models import PollingLocation
+
+# How long the stub provider takes to answer each map point
+STUB_PROVIDER_DELAY_SECONDS = 0.1
+
+
+class StubProviderRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so the connection is kept open for the next request
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.request_log.append((time.monotonic(), self.client_address))
+        time.sleep(self.server.delay_seconds)
+        content = json.dumps({'election': {'id': 'stub'}, 'contests': []}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def generate_polling_location_list(count):
+    return [PollingLocation(we_vote_id='wv01ploc' + str(number), line1=str(number) + ' Main St',
+                            city='Oakland', state='CA', zip_long='94612')
+            for number in range(count)]
+
+
+class BallotRetrievalPipelineTestCase(SimpleTestCase):
+    """
+    Fetches from a stub CTCL server on localhost, so the test doesn't depend on the real provider
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderRequestHandler)
+        self.server.daemon_threads = True
+        self.server.request_log = []
+        self.server.delay_seconds = STUB_PROVIDER_DELAY_SECONDS
+        server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        server_thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.provider_sessions = ProviderSessions()
+        self.addCleanup(self.close_sessions)
+        for module, name, value in (
+                (import_export_batches.controllers_ballot_retrieval_pipeline, 'provider_sessions',
+                 self.provider_sessions),
+                (import_export_ctcl.controllers, 'CTCL_VOTER_INFO_URL',
+                 'http://127.0.0.1:' + str(self.server.server_port) + '/voterinfo')):
+            patcher = mock.patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def close_sessions(self):
+        for session, _ in self.provider_sessions.session_by_provider.values():
+            session.close()
+
+    @staticmethod
+    def fetch_ballots(polling_location_list):
+        start_time = time.monotonic()
+        fetched_list = list(fetch_ballots_for_polling_location_list(
+            provider=PROVIDER_CTCL, polling_location_list=polling_location_list, ctcl_election_uuid='stub'))
+        return fetched_list, time.monotonic() - start_time
+
+    def test_fetchers_run_at_the_same_time(self):
+        polling_location_list = generate_polling_location_list(8)
+        with override_settings(BALLOT_RETRIEVAL_FETCHER_COUNT=1, CTCL_API_REQUESTS_PER_SECOND=0):
+            fetched_list, one_fetcher_seconds = self.fetch_ballots(polling_location_list)
+        self.assertGreaterEqual(one_fetcher_seconds, 8 * STUB_PROVIDER_DELAY_SECONDS)
+        self.assertEqual(len(fetched_list), 8)
+
+        with override_settings(BALLOT_RETRIEVAL_FETCHER_COUNT=4, CTCL_API_REQUESTS_PER_SECOND=0):
+            fetched_list, four_fetcher_seconds = self.fetch_ballots(polling_location_list)
+        self.assertLess(four_fetcher_seconds, one_fetcher_seconds / 2)
+        # Every map point is answered once, in whatever order the provider answers them
+        self.assertCountEqual([polling_location for polling_location, _ in fetched_list], polling_location_list)
+        for _, fetched_ballot_results in fetched_list:
+            self.assertTrue(fetched_ballot_results['one_ballot_json_found'])
+            self.assertEqual(fetched_ballot_results['one_ballot_json']['election']['id'], 'stub')
+
+    def test_connections_are_reused(self):
+        with override_settings(BALLOT_RETRIEVAL_FETCHER_COUNT=2, CTCL_API_REQUESTS_PER_SECOND=0):
+            self.fetch_ballots(generate_polling_location_list(6))
+            # The session is kept between chunks, with its connections
+            self.fetch_ballots(generate_polling_location_list(6))
+        self.assertEqual(len(self.server.request_log), 12)
+        client_address_set = {client_address for _, client_address in self.server.request_log}
+        self.assertLessEqual(len(client_address_set), 2)
+
+    def test_requests_are_rate_limited(self):
+        self.server.delay_seconds = 0
+        with override_settings(BALLOT_RETRIEVAL_FETCHER_COUNT=4, CTCL_API_REQUESTS_PER_SECOND=20):
+            self.fetch_ballots(generate_polling_location_list(6))
+        request_time_list = sorted(request_time for request_time, _ in self.server.request_log)
+        self.assertEqual(len(request_time_list), 6)
+        # 1/20th of a second apart even with 4 fetchers, allowing for some jitter on the way to the server
+        self.assertGreaterEqual(request_time_list[-1] - request_time_list[0], 5 * 0.05 * 0.9)
+        # One request can be held up on its way and land right before the next, but never two
+        for earlier_request_time, request_time in zip(request_time_list, request_time_list[2:]):
+            self.assertGreater(request_time - earlier_request_time, 0.05)
+
+
+class BallotItemWorkerTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    @staticmethod
+    def claim(worker_id):
+        return BatchProcessManager().claim_next_ballot_item_chunk_for_worker(
+            worker_id, kind_of_process_list=[RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS],
+            for_upcoming_elections=False)
+
+    def test_process_checked_out_by_cron_is_left_alone(self):
+        # Workers ran this process once, then the cron path checked it out
+        batch_process = BatchProcess.objects.create(
+            kind_of_process=RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, google_civic_election_id=1000001,
+            date_checked_out=now(), date_worker_heartbeat=now() - timedelta(hours=1))
+        self.assertFalse(self.claim('worker1')['batch_process_ballot_item_chunk_found'])
+
+        # While workers are running it, a new worker can join in
+        BatchProcess.objects.filter(id=batch_process.id).update(date_worker_heartbeat=now())
+        self.assertTrue(self.claim('worker1')['batch_process_ballot_item_chunk_found'])
+
+    def test_last_worker_to_release_clears_the_heartbeat(self):
+        batch_process = BatchProcess.objects.create(
+            kind_of_process=RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, google_civic_election_id=1000001)
+        first_chunk = self.claim('worker1')['batch_process_ballot_item_chunk']
+        second_chunk = self.claim('worker2')['batch_process_ballot_item_chunk']
+        self.assertNotEqual(first_chunk.id, second_chunk.id)
+
+        BatchProcessManager.release_ballot_item_chunk_from_worker(first_chunk.id, batch_process.id, 'worker1')
+        self.assertIsNotNone(BatchProcess.objects.get(id=batch_process.id).date_worker_heartbeat)
+        status = BatchProcessManager.release_ballot_item_chunk_from_worker(
+            second_chunk.id, batch_process.id, 'worker2')
+        self.assertIn('BATCH_PROCESS_WORKER_HEARTBEAT_CLEARED', status)
+        self.assertIsNone(BatchProcess.objects.get(id=batch_process.id).date_worker_heartbeat)
+
+    def test_worker_waits_while_peers_hold_the_work(self):
+        not_found_results = {
+            'success': True, 'status': '', 'batch_process': None, 'batch_process_ballot_item_chunk': None,
+            'batch_process_ballot_item_chunk_found': False}
+        module = import_export_batches.controllers_batch_process_workers
+        with mock.patch.object(BatchProcessManager, 'claim_next_ballot_item_chunk_for_worker',
+                               return_value=not_found_results) as claim, \
+                mock.patch.object(BatchProcessManager, 'is_ballot_item_work_left_for_workers',
+                                  side_effect=[True, True, False]), \
+                mock.patch.object(module, 'fetch_batch_process_system_on', return_value=True), \
+                mock.patch.object(module, 'fetch_batch_process_system_ballot_items_on', return_value=True), \
+                mock.patch.object(module, 'connection'), \
+                mock.patch.object(module.time, 'sleep') as sleep:
+            results = run_ballot_item_batch_process_worker(maximum_run_time=60)
+        self.assertEqual(claim.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertIn('NO_MORE_BALLOT_ITEM_CHUNKS_TO_CLAIM', results['status'])
+
+
+class SaveBatchRowsInBulkTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    @staticmethod
+    def generate_batch_row_list(number_of_batch_rows, bad_row_number=None):
+        # A row without a batch_header_id can't be saved
+        return [BatchRow(batch_header_id=None if row_number == bad_row_number else 1,
+                         google_civic_election_id=row_number)
+                for row_number in range(number_of_batch_rows)]
+
+    def test_rows_are_saved_in_chunks(self):
+        with mock.patch.object(BatchRow.objects, 'bulk_create', wraps=BatchRow.objects.bulk_create) as bulk_create:
+            results = save_batch_rows_in_bulk(iter(self.generate_batch_row_list(5)), chunk_size=2)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['number_of_batch_rows'], 5)
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(BatchRow.objects.filter(batch_header_id=1).count(), 5)
+
+    def test_failed_chunk_is_saved_one_row_at_a_time(self):
+        with mock.patch.object(BatchRow.objects, 'bulk_create', side_effect=DatabaseError("value too long")):
+            results = save_batch_rows_in_bulk(self.generate_batch_row_list(5), chunk_size=2)
+        self.assertTrue(results['success'])
+        self.assertIn('BATCH_ROW_BULK_CREATE_FAILED_SAVING_ONE_AT_A_TIME', results['status'])
+        self.assertEqual(results['number_of_batch_rows'], 5)
+        self.assertCountEqual(BatchRow.objects.values_list('google_civic_election_id', flat=True), range(5))
+
+    def test_saving_stops_at_the_first_bad_row(self):
+        results = save_batch_rows_in_bulk(self.generate_batch_row_list(6, bad_row_number=3), chunk_size=2)
+        self.assertFalse(results['success'])
+        self.assertIn('EXCEPTION_BATCH_ROW', results['status'])
+        # The first chunk in bulk, then the row before the bad one
+        self.assertEqual(results['number_of_batch_rows'], 3)
+        self.assertCountEqual(BatchRow.objects.values_list('google_civic_election_id', flat=True), range(3))
+
+
+class OfficeHeldNameTestCase(TransactionTestCase):
+    # The batch description and header map are read from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.batch_set_id = 7
+        BatchDescription.objects.create(
+            batch_header_id=1, batch_header_map_id=1, batch_set_id=self.batch_set_id, kind_of_batch=OFFICE_HELD,
+            batch_name='offices held')
+        BatchHeaderMap.objects.create(
+            batch_header_id=1, batch_header_map_000='office_held_batch_id', batch_header_map_001='office_held_name')
+        BatchRow.objects.create(batch_header_id=1, batch_row_000='off1', batch_row_001='Mayor ')
+        BatchDescription.objects.create(
+            batch_header_id=2, batch_header_map_id=2, batch_set_id=self.batch_set_id, kind_of_batch=CONTEST_OFFICE,
+            batch_name='offices')
+        BatchHeaderMap.objects.create(batch_header_id=2, batch_header_map_000='contest_office_name')
+        BatchRow.objects.create(batch_header_id=2, batch_row_000='Mayor of Oakland')
+        self.addCleanup(office_held_name_by_ctcl_id_by_batch_set_id.clear)
+
+    def test_names_are_kept_while_the_batch_is_analyzed(self):
+        batch_manager = BatchManager()
+        office_held_name_list = []
+
+        def create_batch_row_action_contest_office(batch_description, batch_header_map, one_batch_row):
+            office_held_name_list.append(batch_manager.fetch_office_held_name_from_office_held_ctcl_id(
+                'off1', batch_description.batch_set_id))
+            # Read once for the whole batch set
+            self.assertIn(self.batch_set_id, office_held_name_by_ctcl_id_by_batch_set_id)
+            return {'batch_row_action_updated': False, 'batch_row_action_created': True}
+
+        with mock.patch.object(import_export_batches.controllers, 'create_batch_row_action_contest_office',
+                               side_effect=create_batch_row_action_contest_office):
+            create_batch_row_actions(2)
+            self.assertEqual(office_held_name_list, ['Mayor'])
+            self.assertNotIn(self.batch_set_id, office_held_name_by_ctcl_id_by_batch_set_id)
+
+            # The next analysis sees the office held rows as they are now
+            BatchRow.objects.filter(batch_header_id=1).update(batch_row_001='City Mayor')
+            create_batch_row_actions(2)
+            self.assertEqual(office_held_name_list, ['Mayor', 'City Mayor'])
+
+
+class MapPointQueueTestCase(TransactionTestCase):
+    # The map points to queue are read from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.batch_process_id = 1
+        for number in range(5):
+            PollingLocation.objects.create(
+                we_vote_id='wv01ploc' + str(number), line1=str(number) + ' Main St', city='Oakland', state='CA',
+                zip_long='94612', latitude=37.8, longitude=-122.27)
+        # Already has a ballot in this election
+        BallotReturned.objects.create(
+            we_vote_id='wv01ballot0', google_civic_election_id=1000001, polling_location_we_vote_id='wv01ploc0',
+            normalized_state='CA')
+
+    def seed(self):
+        return seed_map_point_queue_for_batch_process(
+            batch_process_id=self.batch_process_id, google_civic_election_id=1000001, state_code='CA')
+
+    @staticmethod
+    def queue_status_by_map_point():
+        return dict(BatchProcessMapPoint.objects.values_list('polling_location_we_vote_id', 'queue_status'))
+
+    def test_queue_is_seeded_once(self):
+        results = self.seed()
+        self.assertTrue(results['map_point_queue_created'])
+        self.assertEqual(results['map_point_count'], 4)
+        self.assertEqual(self.queue_status_by_map_point(), {
+            'wv01ploc1': MAP_POINT_QUEUE_PENDING, 'wv01ploc2': MAP_POINT_QUEUE_PENDING,
+            'wv01ploc3': MAP_POINT_QUEUE_PENDING, 'wv01ploc4': MAP_POINT_QUEUE_PENDING})
+
+        results = self.seed()
+        self.assertFalse(results['map_point_queue_created'])
+        self.assertIn('MAP_POINT_QUEUE_ALREADY_SEEDED', results['status'])
+        self.assertEqual(BatchProcessMapPoint.objects.count(), 4)
+
+    def test_queue_is_not_left_partly_seeded(self):
+        bulk_create = BatchProcessMapPoint.objects.bulk_create
+
+        def bulk_create_then_fail(object_list, **kwargs):
+            bulk_create(object_list[:2], **kwargs)
+            raise DatabaseError("connection lost")
+
+        module = import_export_batches.controllers_map_point_queue
+        with mock.patch.object(module.BatchProcessMapPoint.objects, 'bulk_create', side_effect=bulk_create_then_fail):
+            results = self.seed()
+        self.assertFalse(results['success'])
+        self.assertFalse(BatchProcessMapPoint.objects.exists())
+
+        # So the next chunk seeds the whole queue
+        self.assertEqual(self.seed()['map_point_count'], 4)
+
+    def test_claims_do_not_overlap(self):
+        self.seed()
+        first_claim = claim_map_points_from_queue(batch_process_id=self.batch_process_id, limit=2)
+        second_claim = claim_map_points_from_queue(batch_process_id=self.batch_process_id, limit=2)
+        self.assertEqual(first_claim['polling_location_we_vote_id_list'], ['wv01ploc1', 'wv01ploc2'])
+        self.assertEqual(second_claim['polling_location_we_vote_id_list'], ['wv01ploc3', 'wv01ploc4'])
+        self.assertEqual(claim_map_points_from_queue(
+            batch_process_id=self.batch_process_id, limit=2)['polling_location_we_vote_id_list'], [])
+        self.assertEqual(set(self.queue_status_by_map_point().values()), {MAP_POINT_QUEUE_CLAIMED})
+
+        # A claim which timed out, from a chunk which died, is handed out again
+        BatchProcessMapPoint.objects.filter(polling_location_we_vote_id='wv01ploc1')\
+            .update(date_claimed=now() - timedelta(seconds=MAP_POINT_QUEUE_CLAIM_TIME_OUT + 60))
+        self.assertEqual(claim_map_points_from_queue(
+            batch_process_id=self.batch_process_id, limit=2)['polling_location_we_vote_id_list'], ['wv01ploc1'])
+
+    def test_failed_map_points_are_retried_then_marked_failed(self):
+        self.seed()
+        claim_map_points_from_queue(batch_process_id=self.batch_process_id)
+        mark_map_points_in_queue(
+            batch_process_id=self.batch_process_id,
+            retrieved_polling_location_we_vote_id_list=['wv01ploc1'],
+            empty_polling_location_we_vote_id_list=['wv01ploc2'],
+            failed_polling_location_we_vote_id_list=['wv01ploc3'])
+        queue_status_by_map_point = self.queue_status_by_map_point()
+        self.assertEqual(queue_status_by_map_point['wv01ploc1'], MAP_POINT_QUEUE_RETRIEVED)
+        self.assertEqual(queue_status_by_map_point['wv01ploc2'], MAP_POINT_QUEUE_EMPTY)
+        self.assertEqual(queue_status_by_map_point['wv01ploc3'], MAP_POINT_QUEUE_PENDING)
+
+        for attempt_number in range(2, MAP_POINT_QUEUE_MAX_ATTEMPTS + 1):
+            self.assertEqual(claim_map_points_from_queue(
+                batch_process_id=self.batch_process_id)['polling_location_we_vote_id_list'], ['wv01ploc3'])
+            mark_map_points_in_queue(
+                batch_process_id=self.batch_process_id, failed_polling_location_we_vote_id_list=['wv01ploc3'])
+        batch_process_map_point = BatchProcessMapPoint.objects.get(polling_location_we_vote_id='wv01ploc3')
+        self.assertEqual(batch_process_map_point.queue_status, MAP_POINT_QUEUE_FAILED)
+        self.assertEqual(batch_process_map_point.retry_count, MAP_POINT_QUEUE_MAX_ATTEMPTS)
+        self.assertEqual(claim_map_points_from_queue(
+            batch_process_id=self.batch_process_id)['polling_location_we_vote_id_list'], [])
@@ -22,7 +22,11 @@ from .controllers import create_batch_header_translation_suggestions, create_bat
     update_or_create_batch_header_mapping, export_voter_list_with_emails, import_data_from_batch_row_actions
 from .controllers_batch_process import pass_through_batch_list_incoming_variables, process_next_activity_notices, \
     process_next_ballot_items, process_next_general_maintenance
+from .controllers_ballot_retrieval_pipeline import fetch_ballots_for_polling_location_list, PROVIDER_CTCL, \
+    PROVIDER_VOTE_USA
 from .controllers_ballotpedia import store_ballotpedia_json_response_to_import_batch_system
+from .controllers_map_point_queue import claim_map_points_from_queue, mark_map_points_in_queue, \
+    retrieve_polling_location_we_vote_ids_returned_empty, seed_map_point_queue_for_batch_process
 from admin_tools.views import redirect_to_sign_in_page
 from ballot.models import BallotReturnedListManager, BallotReturnedManager, MEASURE, CANDIDATE, POLITICIAN
 import csv
@@ -1534,6 +1538,8 @@ def batch_process_system_toggle_view(request):
         setting_name = 'batch_process_system_calculate_analytics_on'
     elif kind_of_process == 'GENERAL_MAINTENANCE':
         setting_name = 'batch_process_system_general_maintenance_on'
+    elif kind_of_process == 'GENERATE_BALLOT_SNAPSHOTS':
+        setting_name = 'batch_process_system_generate_ballot_snapshots_on'
     elif kind_of_process == 'GENERATE_VOTER_GUIDES':
         setting_name = 'batch_process_system_generate_voter_guides_on'
     elif kind_of_process == 'MATCH_POLITICIANS_TO_ORGANIZATIONS':
@@ -1542,6 +1548,10 @@ def batch_process_system_toggle_view(request):
         setting_name = 'batch_process_system_retrieve_from_ballotpedia_on'
     elif kind_of_process == 'SEARCH_TWITTER':
         setting_name = 'batch_process_system_search_twitter_on'
+    elif kind_of_process == 'UPDATE_POLITICIAN_RECOMMENDATIONS':
+        setting_name = 'batch_process_system_update_politician_recommendations_on'
+    elif kind_of_process == 'UPDATE_SUGGESTED_FRIENDS':
+        setting_name = 'batch_process_system_update_suggested_friends_on'
     elif kind_of_process == 'UPDATE_TWITTER_DATA':
         setting_name = 'batch_process_system_update_twitter_on'
     else:
@@ -1692,12 +1702,21 @@ def batch_process_list_view(request):
                     'REFRESH_BALLOT_ITEMS_FROM_VOTERS',
                     'RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS']
                 batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=ballot_item_processes)
+            elif kind_of_processes_to_show == "GENERATE_BALLOT_SNAPSHOTS":
+                processes = ['GENERATE_BALLOT_SNAPSHOTS']
+                batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
             elif kind_of_processes_to_show == "GENERATE_VOTER_GUIDES":
                 processes = ['GENERATE_VOTER_GUIDES']
                 batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
             elif kind_of_processes_to_show == "MATCH_POLITICIANS_TO_ORGANIZATIONS":
                 processes = ['MATCH_POLITICIANS_TO_ORGANIZATIONS']
                 batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
+            elif kind_of_processes_to_show == "UPDATE_POLITICIAN_RECOMMENDATIONS":
+                processes = ['UPDATE_POLITICIAN_RECOMMENDATIONS']
+                batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
+            elif kind_of_processes_to_show == "UPDATE_SUGGESTED_FRIENDS":
+                processes = ['UPDATE_SUGGESTED_FRIENDS']
+                batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
             elif kind_of_processes_to_show == "REPRESENTATIVES":
                 processes = ['RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS']
                 batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=processes)
@@ -1906,11 +1925,11 @@ def batch_process_list_view(request):
     from wevote_settings.models import fetch_batch_process_system_on, fetch_batch_process_system_activity_notices_on, \
         fetch_batch_process_system_api_refresh_on, fetch_batch_process_system_ballot_items_on, \
         fetch_batch_process_system_calculate_analytics_on, fetch_batch_process_system_general_maintenance_on, \
-        fetch_batch_process_system_generate_voter_guides_on, \
+        fetch_batch_process_system_generate_ballot_snapshots_on, fetch_batch_process_system_generate_voter_guides_on, \
         fetch_batch_process_system_match_politicians_to_organizations_on, \
         fetch_batch_process_system_representatives_on, fetch_batch_process_system_retrieve_from_ballotpedia_on, \
-        fetch_batch_process_system_search_twitter_on, \
-        fetch_batch_process_system_update_twitter_on
+        fetch_batch_process_system_search_twitter_on, fetch_batch_process_system_update_politician_recommendations_on, \
+        fetch_batch_process_system_update_suggested_friends_on, fetch_batch_process_system_update_twitter_on
 
     ballot_returned_oldest_date = ""
     ballot_returned_voter_oldest_date = ""
@@ -1953,6 +1972,7 @@ def batch_process_list_view(request):
         'batch_process_system_ballot_items_on':         fetch_batch_process_system_ballot_items_on(),
         'batch_process_system_calculate_analytics_on':  fetch_batch_process_system_calculate_analytics_on(),
         'batch_process_system_general_maintenance_on':  fetch_batch_process_system_general_maintenance_on(),
+        'batch_process_system_generate_ballot_snapshots_on': fetch_batch_process_system_generate_ballot_snapshots_on(),
         'batch_process_system_generate_voter_guides_on': fetch_batch_process_system_generate_voter_guides_on(),
         'batch_process_system_match_politicians_to_organizations_on': \
             fetch_batch_process_system_match_politicians_to_organizations_on(),
@@ -1960,6 +1980,10 @@ def batch_process_list_view(request):
             fetch_batch_process_system_retrieve_from_ballotpedia_on(),
         'batch_process_system_representatives_on':      fetch_batch_process_system_representatives_on(),
         'batch_process_system_search_twitter_on':       fetch_batch_process_system_search_twitter_on(),
+        'batch_process_system_update_politician_recommendations_on': \
+            fetch_batch_process_system_update_politician_recommendations_on(),
+        'batch_process_system_update_suggested_friends_on': \
+            fetch_batch_process_system_update_suggested_friends_on(),
         'batch_process_system_update_twitter_on':       fetch_batch_process_system_update_twitter_on(),
         'batch_process_search':                 batch_process_search,
         'election_list':                        election_list,
@@ -3473,45 +3497,51 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             status += "NATIONAL_WITH_STATE (" + str(state_code) + ") "
         else:
             status += "WITHOUT_STATE "
-        results = ballot_returned_list_manager.retrieve_polling_location_we_vote_id_list_from_ballot_returned(
-            google_civic_election_id=google_civic_election_id,
-            state_code=state_code,
-            limit=0,
-        )
-        status += results['status']
-        if results['polling_location_we_vote_id_list_found']:
-            polling_location_we_vote_id_list_from_ballot_returned = results['polling_location_we_vote_id_list']
-        else:
-            polling_location_we_vote_id_list_from_ballot_returned = []
-
-        # Find polling_location_we_vote_ids already used in this batch_process, which returned a ballot
+        # RETRIEVE chunks of a batch_process claim their map points from the batch_process's queue instead,
+        #  which was seeded once (see controllers_map_point_queue)
+        use_map_point_queue = \
+            not positive_value_exists(refresh_ballot_returned) and positive_value_exists(batch_process_id)
+        polling_location_we_vote_id_list_from_ballot_returned = []
         polling_location_we_vote_id_list_already_retrieved = []
-        if positive_value_exists(batch_process_id):
-            log_results = polling_location_manager.retrieve_polling_location_log_entry_list(
-                batch_process_id=batch_process_id,
-                is_from_ctcl=use_ctcl,
-                is_from_vote_usa=use_vote_usa,
-                kind_of_log_entry_list=[KIND_OF_LOG_ENTRY_BALLOT_RECEIVED],
-                only_return_polling_location_we_vote_id=True,
-                read_only=True,
-            )
-            polling_location_we_vote_id_list_already_retrieved = log_results['polling_location_we_vote_id_list']
-            if not log_results['success']:
-                status += log_results['status']
-
-        # For both REFRESH and RETRIEVE, find polling locations/map points which have come up empty
-        #  (from this data source) in previous chunks since when this process started
         polling_location_we_vote_id_list_returned_empty = []
-        results = ballot_returned_list_manager.\
-            retrieve_polling_location_we_vote_id_list_from_ballot_returned_empty(
-                batch_process_date_started=batch_process_date_started,
-                is_from_ctcl=use_ctcl,
-                is_from_vote_usa=use_vote_usa,
+        if not use_map_point_queue:
+            results = ballot_returned_list_manager.retrieve_polling_location_we_vote_id_list_from_ballot_returned(
                 google_civic_election_id=google_civic_election_id,
                 state_code=state_code,
+                limit=0,
             )
-        if results['polling_location_we_vote_id_list_found']:
-            polling_location_we_vote_id_list_returned_empty = results['polling_location_we_vote_id_list']
+            status += results['status']
+            if results['polling_location_we_vote_id_list_found']:
+                polling_location_we_vote_id_list_from_ballot_returned = results['polling_location_we_vote_id_list']
+            else:
+                polling_location_we_vote_id_list_from_ballot_returned = []
+
+            # Find polling_location_we_vote_ids already used in this batch_process, which returned a ballot
+            if positive_value_exists(batch_process_id):
+                log_results = polling_location_manager.retrieve_polling_location_log_entry_list(
+                    batch_process_id=batch_process_id,
+                    is_from_ctcl=use_ctcl,
+                    is_from_vote_usa=use_vote_usa,
+                    kind_of_log_entry_list=[KIND_OF_LOG_ENTRY_BALLOT_RECEIVED],
+                    only_return_polling_location_we_vote_id=True,
+                    read_only=True,
+                )
+                polling_location_we_vote_id_list_already_retrieved = log_results['polling_location_we_vote_id_list']
+                if not log_results['success']:
+                    status += log_results['status']
+
+            # For both REFRESH and RETRIEVE, find polling locations/map points which have come up empty
+            #  (from this data source) in previous chunks since when this process started
+            results = ballot_returned_list_manager.\
+                retrieve_polling_location_we_vote_id_list_from_ballot_returned_empty(
+                    batch_process_date_started=batch_process_date_started,
+                    is_from_ctcl=use_ctcl,
+                    is_from_vote_usa=use_vote_usa,
+                    google_civic_election_id=google_civic_election_id,
+                    state_code=state_code,
+                )
+            if results['polling_location_we_vote_id_list_found']:
+                polling_location_we_vote_id_list_returned_empty = results['polling_location_we_vote_id_list']
 
         status += "REFRESH_BALLOT_RETURNED: " + str(refresh_ballot_returned) + " "
 
@@ -3541,6 +3571,26 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             # We don't exclude the deleted map points because we need to know to delete the ballot returned entry
             # polling_location_query = polling_location_query.exclude(polling_location_deleted=True)
             polling_location_list = list(polling_location_query)
+        elif use_map_point_queue:
+            # RETRIEVE branch, for a batch_process
+            queue_results = seed_map_point_queue_for_batch_process(
+                batch_process_id=batch_process_id,
+                batch_process_date_started=batch_process_date_started,
+                google_civic_election_id=google_civic_election_id,
+                state_code=state_code,
+                use_ctcl=use_ctcl,
+                use_vote_usa=use_vote_usa,
+            )
+            status += queue_results['status']
+            date_map_points_claimed = now()
+            queue_results = claim_map_points_from_queue(
+                batch_process_id=batch_process_id,
+                limit=refresh_or_retrieve_limit,
+            )
+            status += queue_results['status']
+            claimed_polling_location_we_vote_id_list = queue_results['polling_location_we_vote_id_list']
+            polling_location_list = list(PollingLocation.objects.using('readonly')
+                                         .filter(we_vote_id__in=claimed_polling_location_we_vote_id_list))
         else:
             # RETRIEVE branch
             polling_location_query = PollingLocation.objects.using('readonly').all()
@@ -3753,7 +3803,19 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             from import_export_vote_usa.controllers import retrieve_vote_usa_ballot_items_from_polling_location_api
         contest_not_returned_from_data_source_polling_location_we_vote_id_list = []
         contest_returned_from_data_source_polling_location_we_vote_id_list = []
-        for polling_location in polling_location_list:
+        if positive_value_exists(use_ctcl) or positive_value_exists(use_vote_usa):
+            # Several map points are fetched at once, but only this thread stores them and updates the existing_*
+            #  and new_* variables passed from one map point to the next
+            fetched_ballot_iterator = fetch_ballots_for_polling_location_list(
+                provider=PROVIDER_CTCL if positive_value_exists(use_ctcl) else PROVIDER_VOTE_USA,
+                polling_location_list=polling_location_list,
+                ctcl_election_uuid=ctcl_election_uuid,
+                election_day_text=election_day_text,
+                state_code=state_code)
+        else:
+            # Ballotpedia's second request depends on its first, so it is called while storing
+            fetched_ballot_iterator = ((polling_location, None) for polling_location in polling_location_list)
+        for polling_location, fetched_ballot_results in fetched_ballot_iterator:
             one_ballot_results = {}
             if positive_value_exists(use_ballotpedia):
                 one_ballot_results = retrieve_ballotpedia_ballot_items_from_polling_location_api_v4(
@@ -3789,6 +3851,7 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
                     new_candidate_we_vote_ids_list=new_candidate_we_vote_ids_list,
                     new_measure_we_vote_ids_list=new_measure_we_vote_ids_list,
                     update_or_create_rules=update_or_create_rules,
+                    fetched_ballot_results=fetched_ballot_results,
                 )
             elif positive_value_exists(use_vote_usa):
                 one_ballot_results = retrieve_vote_usa_ballot_items_from_polling_location_api(
@@ -3807,6 +3870,7 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
                     new_candidate_we_vote_ids_list=new_candidate_we_vote_ids_list,
                     new_measure_we_vote_ids_list=new_measure_we_vote_ids_list,
                     update_or_create_rules=update_or_create_rules,
+                    fetched_ballot_results=fetched_ballot_results,
                 )
             else:
                 # Should not be possible to get here
@@ -3837,6 +3901,31 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
                 if ballots_not_retrieved < 5:
                     # Only show this error message status for the first 4 times so we don't overwhelm the log
                     status += "BALLOT_ITEMS_NOT_RETRIEVED: [[[" + one_ballot_results['status'] + "]]] "
+        if use_map_point_queue:
+            # Map points the data source had no ballot for (the ones given a BallotReturnedEmpty just now) aren't
+            #  tried again by this batch_process. The ones which failed go back in the queue.
+            retrieved_polling_location_we_vote_id_set = \
+                set(contest_returned_from_data_source_polling_location_we_vote_id_list)
+            not_retrieved_polling_location_we_vote_id_list = [
+                polling_location_we_vote_id
+                for polling_location_we_vote_id in claimed_polling_location_we_vote_id_list
+                if polling_location_we_vote_id not in retrieved_polling_location_we_vote_id_set]
+            empty_polling_location_we_vote_id_set = retrieve_polling_location_we_vote_ids_returned_empty(
+                google_civic_election_id=google_civic_election_id,
+                polling_location_we_vote_id_list=not_retrieved_polling_location_we_vote_id_list,
+                date_returned_empty_after=date_map_points_claimed,
+                use_ctcl=use_ctcl,
+                use_vote_usa=use_vote_usa)
+            queue_results = mark_map_points_in_queue(
+                batch_process_id=batch_process_id,
+                retrieved_polling_location_we_vote_id_list=list(retrieved_polling_location_we_vote_id_set),
+                empty_polling_location_we_vote_id_list=list(empty_polling_location_we_vote_id_set),
+                failed_polling_location_we_vote_id_list=[
+                    polling_location_we_vote_id
+                    for polling_location_we_vote_id in not_retrieved_polling_location_we_vote_id_list
+                    if polling_location_we_vote_id not in empty_polling_location_we_vote_id_set],
+            )
+            status += queue_results['status']
         if positive_value_exists(len(contest_returned_from_data_source_polling_location_we_vote_id_list)):
             status += "contest_returned_from_data_source_polling_location_we_vote_id_list: " + \
                       str(contest_returned_from_data_source_polling_location_we_vote_id_list) + " "
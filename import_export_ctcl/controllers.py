@@ -201,54 +201,59 @@ def create_candidate_selection_rows(xml_root, batch_set_id=0):
     :param batch_set_id: 
     :return: 
     """
-    success = False
-    status = ''
-    candidate_selection_created = False
-
-    # Look for CandidateSelection and create the batch_header first. CandidateSelection is the direct child node
-    # of VipObject
-    candidate_selection_xml_node = xml_root.findall('CandidateSelection')
-    candidate_selection = ''
-    number_of_batch_rows = 0
-
-    for one_candidate_selection in candidate_selection_xml_node:
+    # Look for CandidateSelection. CandidateSelection is the direct child node of VipObject
+    candidate_selection_value_list = []
+    for one_candidate_selection in xml_root.findall('CandidateSelection'):
         # look for relevant information under CandidateSelection: id, CandidateIds
-        candidate_selection_id = one_candidate_selection.attrib['id']
-
         contest_office_id_node = one_candidate_selection.find("./CandidateIds")
-        if contest_office_id_node is None:
-            candidate_selection = CandidateSelection()
+        contest_office_id = contest_office_id_node.text if contest_office_id_node is not None else None
+        candidate_selection_value_list.append((one_candidate_selection.attrib['id'], contest_office_id))
+    return create_candidate_selection_rows_from_list(candidate_selection_value_list, batch_set_id)
+
+
+def create_candidate_selection_rows_from_list(candidate_selection_value_list, batch_set_id=0):
+    """
+    Create candidate selection entries in the CandidateSelection table in bulk
+    :param candidate_selection_value_list: (candidate_selection_id, contest_office_id) pairs read from the XML.
+      contest_office_id is None when the CandidateSelection has no CandidateIds node.
+    :param batch_set_id:
+    :return:
+    """
+    for candidate_selection_id, contest_office_id in candidate_selection_value_list:
+        if contest_office_id is None:
             results = {
                 'success':                      False,
                 'status':                       'CREATE_CANDIDATE_SELECTION_ROWS-CONTEST_OFFICE_ID_NOT_FOUND',
                 'candidate_selection_created':  False,
-                'candidate_selection':          candidate_selection,
+                'candidate_selection':          CandidateSelection(),
             }
             return results
 
-        contest_office_id = contest_office_id_node.text
-
-        try:
-            candidate_selection = CandidateSelection.objects.create(batch_set_id=batch_set_id,
-                                                                    candidate_selection_id=candidate_selection_id,
-                                                                    contest_office_id=contest_office_id)
-            if candidate_selection:
-                candidate_selection_created = True
-                success = True
-                status = "CANDIDATE_SELECTION_CREATED"
-                number_of_batch_rows += 1
-        except Exception as e:
-            candidate_selection_created = False
-            candidate_selection = CandidateSelection()
-            success = False
-            status = "CANDIDATE_SELECTION_NOT_CREATED"
-            handle_exception(e, logger=logger, exception_message=status)
+    success = False
+    status = ''
+    candidate_selection_created = False
+    number_of_batch_rows = 0
+    try:
+        candidate_selection_list = CandidateSelection.objects.bulk_create([
+            CandidateSelection(batch_set_id=batch_set_id,
+                               candidate_selection_id=candidate_selection_id,
+                               contest_office_id=contest_office_id)
+            for candidate_selection_id, contest_office_id in candidate_selection_value_list], batch_size=2000)
+        if len(candidate_selection_list):
+            candidate_selection_created = True
+            success = True
+            status = "CANDIDATE_SELECTION_CREATED"
+            number_of_batch_rows = len(candidate_selection_list)
+    except Exception as e:
+        success = False
+        status = "CANDIDATE_SELECTION_NOT_CREATED"
+        handle_exception(e, logger=logger, exception_message=status)
 
     results = {
         'success':                      success,
         'status':                       status,
         'candidate_selection_created':  candidate_selection_created,
-        'candidate_selection':          candidate_selection,
+        'candidate_selection':          CandidateSelection(),
         'number_of_batch_rows':         number_of_batch_rows
     }
     return results
@@ -397,6 +402,24 @@ def retrieve_candidate_from_candidate_selection(candidate_selection_id, batch_se
     return results
 
 
+def retrieve_candidate_id_by_candidate_selection_id_dict(batch_set_id):
+    """
+    Read every CandidateSelection in this batch set with one query, so contest offices don't look them up one at a time
+    :param batch_set_id:
+    :return: dict of candidate ids keyed by candidate_selection_id
+    """
+    candidate_id_by_candidate_selection_id = {}
+    if not positive_value_exists(batch_set_id):
+        return candidate_id_by_candidate_selection_id
+    try:
+        queryset = CandidateSelection.objects.filter(batch_set_id=batch_set_id)\
+            .values_list('candidate_selection_id', 'contest_office_id')
+        candidate_id_by_candidate_selection_id = dict(queryset)
+    except Exception as e:
+        handle_exception(e, logger=logger, exception_message="CANDIDATE_SELECTION_RETRIEVE_FAILED")
+    return candidate_id_by_candidate_selection_id
+
+
 def retrieve_ctcl_ballot_items_for_one_voter_api(
         google_civic_election_id,
         ctcl_election_uuid="",
@@ -637,6 +660,57 @@ def retrieve_ctcl_ballot_items_for_one_voter_api(
     return results
 
 
+def fetch_ctcl_ballot_json_from_polling_location_api(ctcl_election_uuid='', text_for_map_search='', session=None):
+    """
+    Only calls the CTCL API, without touching the database, so it can be called from other threads.
+    :param ctcl_election_uuid:
+    :param text_for_map_search:
+    :param session: A requests.Session to reuse connections with
+    :return:
+    """
+    status = ""
+    one_ballot_json = ''
+    one_ballot_json_found = False
+    try:
+        api_key = CTCL_API_KEY
+        # Get the ballot info at this address
+        response = (session or requests).get(
+            CTCL_VOTER_INFO_URL,
+            headers=HEADERS_FOR_CTCL_API_CALL,
+            params={
+                "key": api_key,
+                "electionId": ctcl_election_uuid,
+                "address": text_for_map_search,
+            })
+        if positive_value_exists(response.url):
+            status += str(response.url) + ' '
+        if len(response.text) >= 2:
+            # one_ballot_json = json.loads(response.text)
+            one_ballot_json = response.json()
+            one_ballot_json_found = True
+        else:
+            status += "NO_RESULT_FOR: " + str(text_for_map_search) + " "
+    except Exception as e:
+        status += 'CTCL_API_END_POINT_CRASH2: ' + str(e) + ' '
+        results = {
+            'success':                  False,
+            'status':                   status,
+            'exception':                e,
+            'one_ballot_json':          one_ballot_json,
+            'one_ballot_json_found':    False,
+        }
+        return results
+
+    results = {
+        'success':                  True,
+        'status':                   status,
+        'exception':                None,
+        'one_ballot_json':          one_ballot_json,
+        'one_ballot_json_found':    one_ballot_json_found,
+    }
+    return results
+
+
 def retrieve_ctcl_ballot_items_from_polling_location_api(
         google_civic_election_id=0,
         ctcl_election_uuid="",
@@ -653,7 +727,12 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
         new_office_we_vote_ids_list=[],
         new_candidate_we_vote_ids_list=[],
         new_measure_we_vote_ids_list=[],
-        update_or_create_rules={}):
+        update_or_create_rules={},
+        fetched_ballot_results=None):
+    """
+    :param fetched_ballot_results: The results of fetch_ctcl_ballot_json_from_polling_location_api, when the API
+     was already called for this map point (see controllers_ballot_retrieval_pipeline). Otherwise we call it here.
+    """
     success = True
     status = ""
     polling_location_found = False
@@ -747,31 +826,17 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
             else:
                 state_code = "na"
 
-        one_ballot_json = ''
-        one_ballot_json_found = False
         ballot_returned_manager = BallotReturnedManager()
-        try:
-            api_key = CTCL_API_KEY
-            # Get the ballot info at this address
-            response = requests.get(
-                CTCL_VOTER_INFO_URL,
-                headers=HEADERS_FOR_CTCL_API_CALL,
-                params={
-                    "key": api_key,
-                    "electionId": ctcl_election_uuid,
-                    "address": text_for_map_search,
-                })
-            if positive_value_exists(response.url):
-                status += str(response.url) + ' '
-            if len(response.text) >= 2:
-                # one_ballot_json = json.loads(response.text)
-                one_ballot_json = response.json()
-                one_ballot_json_found = True
-            else:
-                status += "NO_RESULT_FOR: " + str(text_for_map_search) + " "
-        except Exception as e:
+        if fetched_ballot_results is None:
+            fetched_ballot_results = fetch_ctcl_ballot_json_from_polling_location_api(
+                ctcl_election_uuid=ctcl_election_uuid,
+                text_for_map_search=text_for_map_search)
+        status += fetched_ballot_results['status']
+        one_ballot_json = fetched_ballot_results['one_ballot_json']
+        one_ballot_json_found = fetched_ballot_results['one_ballot_json_found']
+        if not fetched_ballot_results['success']:
             success = False
-            status += 'CTCL_API_END_POINT_CRASH2: ' + str(e) + ' '
+            e = fetched_ballot_results['exception']
             log_entry_message = status
             results = polling_location_manager.create_polling_location_log_entry(
                 batch_process_id=batch_process_id,
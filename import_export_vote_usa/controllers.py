@@ -291,6 +291,55 @@ def retrieve_vote_usa_ballot_items_for_one_voter_api(
     return results
 
 
+def fetch_vote_usa_ballot_json_from_polling_location_api(
+        election_day_text='',
+        latitude=0.0,
+        longitude=0.0,
+        state_code='',
+        session=None):
+    """
+    Only calls the Vote USA API, without touching the database, so it can be called from other threads.
+    :param election_day_text:
+    :param latitude:
+    :param longitude:
+    :param state_code:
+    :param session: A requests.Session to reuse connections with
+    :return:
+    """
+    status = ""
+    try:
+        api_key = VOTE_USA_API_KEY
+        # Get the ballot info at this address
+        response = (session or requests).get(
+            VOTE_USA_VOTER_INFO_URL,
+            headers=HEADERS_FOR_VOTE_USA_API_CALL,
+            params={
+                "accessKey": api_key,
+                "electionDay": election_day_text,
+                "latitude": latitude,
+                "longitude": longitude,
+                "state": state_code,
+            })
+        one_ballot_json = json.loads(response.text)
+    except Exception as e:
+        status += 'VOTE_USA_API_END_POINT_CRASH: ' + str(e) + ' '
+        results = {
+            'success':          False,
+            'status':           status,
+            'exception':        e,
+            'one_ballot_json':  {},
+        }
+        return results
+
+    results = {
+        'success':          True,
+        'status':           status,
+        'exception':        None,
+        'one_ballot_json':  one_ballot_json,
+    }
+    return results
+
+
 def retrieve_vote_usa_ballot_items_from_polling_location_api(
         google_civic_election_id=0,
         election_day_text="",
@@ -306,7 +355,8 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
         new_office_we_vote_ids_list=[],
         new_candidate_we_vote_ids_list=[],
         new_measure_we_vote_ids_list=[],
-        update_or_create_rules={}):
+        update_or_create_rules={},
+        fetched_ballot_results=None):
     """
 
     :param google_civic_election_id:
@@ -324,6 +374,8 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
     :param new_candidate_we_vote_ids_list:
     :param new_measure_we_vote_ids_list:
     :param update_or_create_rules:
+    :param fetched_ballot_results: The results of fetch_vote_usa_ballot_json_from_polling_location_api, when the
+     API was already called for this map point (see controllers_ballot_retrieval_pipeline)
     :return:
     """
     success = True
@@ -443,23 +495,17 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
             else:
                 state_code = "na"
 
-        try:
-            api_key = VOTE_USA_API_KEY
-            # Get the ballot info at this address
-            response = requests.get(
-                VOTE_USA_VOTER_INFO_URL,
-                headers=HEADERS_FOR_VOTE_USA_API_CALL,
-                params={
-                    "accessKey": api_key,
-                    "electionDay": election_day_text,
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "state": state_code,
-                })
-            one_ballot_json = json.loads(response.text)
-        except Exception as e:
+        if fetched_ballot_results is None:
+            fetched_ballot_results = fetch_vote_usa_ballot_json_from_polling_location_api(
+                election_day_text=election_day_text,
+                latitude=latitude,
+                longitude=longitude,
+                state_code=state_code)
+        status += fetched_ballot_results['status']
+        one_ballot_json = fetched_ballot_results['one_ballot_json']
+        if not fetched_ballot_results['success']:
             success = False
-            status += 'VOTE_USA_API_END_POINT_CRASH: ' + str(e) + ' '
+            e = fetched_ballot_results['exception']
             log_entry_message = status
             results = polling_location_manager.create_polling_location_log_entry(
                 batch_process_id=batch_process_id,
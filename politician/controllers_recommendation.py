@@ -1,260 +1,309 @@
-from .models import RecommendedPoliticianLinkByPolitician
+# politician/controllers_recommendation.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import csv
+import math
+import multiprocessing
+import re
+import resource
+from concurrent.futures import ProcessPoolExecutor
 
-from politician.models import Politician
-import pandas
-from sklearn.cluster import KMeans
 import numpy
-from sklearn.feature_extraction.text import TfidfVectorizer
+from django.db import connections, transaction
+from django.db.models import Count
 from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-import nltk
-import warnings
-import polars
-
-warnings.simplefilter("ignore")
-pandas.set_option('display.max_rows', None)
-pandas.set_option('display.max_columns', None)
-nltk.download('punkt')
-
-
-def add_cluster(df: pandas.DataFrame, k: int = 300) -> pandas.DataFrame:
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, HashingVectorizer
+
+from config.base import get_environment_variable_default
+from politician.models import Politician, RecommendedPoliticianLinkByPolitician
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# Politicians are read, clustered and labeled this many at a time, so memory doesn't grow with the table
+POLITICIAN_RECOMMENDATION_CHUNK_SIZE = 5000
+POLITICIAN_RECOMMENDATION_CLUSTERS = 300
+# Passes of MiniBatchKMeans.partial_fit over all the politicians
+POLITICIAN_RECOMMENDATION_EPOCHS = 2
+# The run happens in a child process that can't grow by more than this, so a bad run can't take the server down
+POLITICIAN_RECOMMENDATION_MEMORY_LIMIT_MB = \
+    int(get_environment_variable_default('POLITICIAN_RECOMMENDATION_MEMORY_LIMIT_MB', 1024))
+RECOMMENDATIONS_PER_POLITICIAN = 5
+RECOMMENDATIONS_FROM_SAME_CLUSTER = 4
+RECOMMENDATION_LINKS_SAVED_PER_BATCH = 5000
+# Parties with this many politicians or fewer are put together as "others"
+POLITICAL_PARTY_MINIMUM_COUNT = 15
+POLITICAL_PARTY_OTHERS = 'others'
+TWITTER_DESCRIPTION_HASHED_FEATURES = 128
+# Where we put politicians without a state, roughly the middle of the country
+DEFAULT_LAT = 39.0458
+DEFAULT_LON = -76.6413
+MAXIMUM_TWITTER_FOLLOWERS_COUNT = 100000000
+STATE_LOCATION_CSV_PATH = "politician/static/stateLocation/state_code.csv"
+
+RECOMMENDATION_FLAG_FIELD_LIST = [
+    'facebook_url', 'politician_phone_number', 'google_civic_candidate_name',
+    'we_vote_hosted_profile_image_url_large', 'politician_email_address']
+RECOMMENDATION_FIELD_LIST = [
+    'id', 'we_vote_id', 'political_party', 'state_code', 'twitter_followers_count', 'twitter_description'] + \
+    RECOMMENDATION_FLAG_FIELD_LIST
+
+porter_stemmer = PorterStemmer()
+
+
+def stem_twitter_description(twitter_description):
+    return " ".join(porter_stemmer.stem(word) for word in re.findall(r"[a-z0-9']+", twitter_description.lower())
+                    if word not in ENGLISH_STOP_WORDS)
+
+
+twitter_description_vectorizer = HashingVectorizer(
+    n_features=TWITTER_DESCRIPTION_HASHED_FEATURES,
+    preprocessor=stem_twitter_description,
+    alternate_sign=False,
+    norm='l2',
+    dtype=numpy.float32)
+
+
+def retrieve_state_location_dict():
+    with open(STATE_LOCATION_CSV_PATH) as state_location_file:
+        return {one_row['state_code']: (float(one_row['lon']), float(one_row['lat']))
+                for one_row in csv.DictReader(state_location_file)}
+
+
+def retrieve_political_party_list():
     """
-        Add a clustering column to the DataFrame using KMeans.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - k (int): Number of clusters for KMeans (default is 300).
-        Returns:
-        - pandas.DataFrame: DataFrame with an additional 'Cluster' column.
-        """
-
-    try:
-        kmeans = KMeans(n_clusters=k)
-        kmeans.fit(df)
-        df['Cluster'] = kmeans.labels_
-        return df
-
-    except Exception as e:
-        df['Cluster'] = k
-        return df
+    The parties big enough to get their own feature column, from one GROUP BY
+    """
+    queryset = Politician.objects.using('readonly').values('political_party').annotate(politician_count=Count('id'))
+    political_party_set = set()
+    for one_row in queryset:
+        if one_row['politician_count'] > POLITICAL_PARTY_MINIMUM_COUNT and one_row['political_party']:
+            political_party_set.add(one_row['political_party'].lower())
+    return sorted(political_party_set) + [POLITICAL_PARTY_OTHERS]
 
 
-def make_flag(df: pandas.DataFrame, col: str) -> pandas.DataFrame:
+def generate_politician_chunks(chunk_size=POLITICIAN_RECOMMENDATION_CHUNK_SIZE):
     """
-       Create flag columns show whether politician has social media or not in the DataFrame.
-       Parameters:
-       - df (pandas.DataFrame): Input DataFrame.
-       - col (str): Name of the column.
-       Returns:
-       - pandas.DataFrame: DataFrame with an additional '{col}_flag' column.
+    Only the columns the features need, chunk_size politicians at a time, by id (keyset) so no chunk is skipped
+    or read twice when ids have gaps
     """
-
-    if col in df.columns:
-        target = df[[col]]
-    else:
-        return df
-    # replace value with 1 and None with 0
-    target = target.applymap(replacer)
-    df[f'{col}_flag'] = target
-    df = df.drop(col, axis=1)
-    return df
-
-
-def tfidf(df: pandas.DataFrame, col: str) -> pandas.DataFrame:
+    last_id = 0
+    while True:
+        chunk = list(Politician.objects.using('readonly')
+                     .filter(id__gt=last_id)
+                     .order_by('id')
+                     .values_list(*RECOMMENDATION_FIELD_LIST)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        yield chunk
+
+
+def generate_politician_feature_matrix(chunk, political_party_column_by_name, state_location_dict):
     """
-        Calculate TF-IDF values for the twitter description column in the DataFrame.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - col (str): Name of the text column.
-        Returns:
-        - pandas.DataFrame: DataFrame with additional columns for TF-IDF values.
+    One row of float32 features per politician. Every feature is already on a 0 to 1 (or -1 to 1) scale, so
+    unlike a StandardScaler, nothing has to be learned from the whole table first.
     """
-
-    if col not in df.columns:
-        return pandas.DataFrame()
-
-    ps = PorterStemmer()
-    sentences = list(df[col].fillna(""))
-    sentences = [stemming(i, ps) for i in sentences]
-    try:
-        vectorized = TfidfVectorizer(stop_words='english', max_features=100)
-        tfidf_matrix = vectorized.fit_transform(sentences)
-        return pandas.DataFrame(tfidf_matrix.toarray(), columns=vectorized.get_feature_names_out())
-    except Exception as e:
-        return pandas.DataFrame()
-
-
-def replacer(value):
-    if value is None:
-        return 0
-    else:
-        return 1
-
-
-def stemming(sentence, ps):
-    if sentence is None:
-        return ""
-
-    words = word_tokenize(sentence)
-    output = ""
-    for w in words:
-        output += " "
-        output += ps.stem(w)
-    return output
-
-
-def one_hot_add(df, category):
-    if category not in df.columns:
-        return df
-
-    try:
-        return pandas.get_dummies(df, columns=[category], prefix=[category])
-
-    except Exception as e:
-        df = df.drop([category], axis=1)
-        return df
-
-
-def remove_minority(df: pandas.DataFrame, col: str, num: int) -> pandas.DataFrame:
+    flag_field_offset = RECOMMENDATION_FIELD_LIST.index(RECOMMENDATION_FLAG_FIELD_LIST[0])
+    flag_column_offset = 3
+    political_party_offset = flag_column_offset + len(RECOMMENDATION_FLAG_FIELD_LIST)
+    feature_matrix = numpy.zeros((len(chunk), political_party_offset + len(political_party_column_by_name)),
+                                 dtype=numpy.float32)
+    twitter_description_list = []
+    for row_index, one_row in enumerate(chunk):
+        politician_id, we_vote_id, political_party, state_code, twitter_followers_count, twitter_description = \
+            one_row[:flag_field_offset]
+        lon, lat = state_location_dict.get((state_code or '').lower(), (DEFAULT_LON, DEFAULT_LAT))
+        feature_matrix[row_index, 0] = lon / 180
+        feature_matrix[row_index, 1] = lat / 90
+        feature_matrix[row_index, 2] = \
+            math.log1p(max(twitter_followers_count or 0, 0)) / math.log1p(MAXIMUM_TWITTER_FOLLOWERS_COUNT)
+        for flag_index, flag_value in enumerate(one_row[flag_field_offset:]):
+            feature_matrix[row_index, flag_column_offset + flag_index] = 0 if flag_value is None else 1
+        political_party_column = political_party_column_by_name.get(
+            (political_party or '').lower(), political_party_column_by_name[POLITICAL_PARTY_OTHERS])
+        feature_matrix[row_index, political_party_offset + political_party_column] = 1
+        twitter_description_list.append(twitter_description or '')
+    twitter_description_matrix = twitter_description_vectorizer.transform(twitter_description_list).toarray()
+    return numpy.hstack([feature_matrix, twitter_description_matrix])
+
+
+def choose_recommended_politician_indexes(cluster_label_array, random_generator):
     """
-        Combine small parties in a DataFrame column into an 'Others' if their count is below a specified threshold.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - col (str): Name of the column containing party information.
-        - num (int): Threshold count. Parties with counts less than or equal to this threshold will be combined into
-        'Others'.
-        Returns:
-        - pandas.DataFrame: DataFrame with small parties combined into 'Others' in the specified column.
+    For every politician: RECOMMENDATIONS_FROM_SAME_CLUSTER others from the same cluster, and the rest from other
+    clusters. Done for all politicians at once with numpy, instead of filtering the whole list once per cluster.
+    :return: (number_of_politicians, RECOMMENDATIONS_PER_POLITICIAN) array of indexes, -1 where nothing was found
     """
-
-    if col not in df.columns:
-        return df
-
-    for i, k in dict(df[col].value_counts()).items():
-        if k <= num:
-            df = df.replace(to_replace=i, value="Others")
-    return df
-
-
-def update_recommend():
+    number_of_politicians = len(cluster_label_array)
+    recommended_index_array = numpy.full((number_of_politicians, RECOMMENDATIONS_PER_POLITICIAN), -1,
+                                         dtype=numpy.int64)
+    if number_of_politicians < 2:
+        return recommended_index_array
+
+    # Group by cluster, in random order within each cluster. The politicians right after you in this order
+    #  (wrapping around inside your cluster) are random members of your cluster, and never you.
+    order = numpy.lexsort((random_generator.random(number_of_politicians), cluster_label_array))
+    sorted_label_array = cluster_label_array[order]
+    cluster_start_array = numpy.searchsorted(sorted_label_array, sorted_label_array, side='left')
+    cluster_size_array = numpy.searchsorted(sorted_label_array, sorted_label_array, side='right') - \
+        cluster_start_array
+    position_in_cluster_array = numpy.arange(number_of_politicians) - cluster_start_array
+    for offset in range(1, RECOMMENDATIONS_FROM_SAME_CLUSTER + 1):
+        has_enough_array = cluster_size_array > offset
+        neighbor_sorted_index_array = cluster_start_array + (position_in_cluster_array + offset) % cluster_size_array
+        recommended_index_array[order[has_enough_array], offset - 1] = \
+            order[neighbor_sorted_index_array[has_enough_array]]
+
+    # Fill the remaining columns from other clusters, drawing again where we happened to land in our own cluster,
+    #  or on a politician already recommended
+    for column in range(RECOMMENDATIONS_PER_POLITICIAN):
+        needs_index_array = recommended_index_array[:, column] == -1
+        for attempt in range(10):
+            if not needs_index_array.any():
+                break
+            candidate_index_array = random_generator.integers(0, number_of_politicians, size=number_of_politicians)
+            is_usable_array = needs_index_array & \
+                (cluster_label_array[candidate_index_array] != cluster_label_array) & \
+                (recommended_index_array != candidate_index_array[:, None]).all(axis=1)
+            recommended_index_array[is_usable_array, column] = candidate_index_array[is_usable_array]
+            needs_index_array &= ~is_usable_array
+    return recommended_index_array
+
+
+def update_politician_recommendations(
+        number_of_clusters=POLITICIAN_RECOMMENDATION_CLUSTERS,
+        chunk_size=POLITICIAN_RECOMMENDATION_CHUNK_SIZE):
     """
-        Update recommended politicians based on clustering and selection criteria.
-        Returns:
-        - None
+    Cluster all politicians with MiniBatchKMeans, reading them chunk_size at a time, and replace every
+    RecommendedPoliticianLinkByPolitician row in one transaction, so readers see either the old or the new set.
+    :param number_of_clusters:
+    :param chunk_size:
+    :return:
     """
-
-    """df of all politician data"""
-    all_data = Politician.objects.values()
-    df = pandas.DataFrame(all_data)
-    df = df.replace(numpy.NaN, None)
-
-    """df of location of state"""
-    state_df = pandas.read_csv("politician/static/stateLocation/state_code.csv")
-
-    """lower case"""
-    df.political_party = df.political_party.str.lower()
-    df.state_code = df.state_code.str.lower()
-    df = pandas.merge(df, state_df, on='state_code', how='left')
-    del state_df
-
-    for col in ['facebook_url', 'politician_phone_number', 'google_civic_candidate_name',
-                'we_vote_hosted_profile_image_url_large', 'politician_email_address']:
-        df = make_flag(df, col)
-
-    all_we_need = ['we_vote_id', 'political_party', 'politician_url', 'state_code', 'twitter_followers_count',
-                   'twitter_description', 'lon', 'lat'] + [item for item in df.columns if item.endswith("flag")]
-
-    all_we_need = [col for col in df.columns if col in all_we_need]
-
-    df = df[all_we_need]
-    df = remove_minority(df, "political_party", 15)
-
-    if 'political_party' in df.columns:
-        df['political_party'] = df['political_party'].fillna('Others')
-
-    if 'twitter_description' in df.columns:
-        df['twitter_description'] = df['twitter_description'].fillna("")
-
-    if 'lon' in df.columns:
-        df['lon'] = df['lon'].fillna(-76.6413)
-
-    if 'lat' in df.columns:
-        df['lat'] = df['lat'].fillna(39.0458)
-
-    one_hot_list = ['political_party']
-
-    for col in one_hot_list:
-        df = one_hot_add(df, col)
-
-    df = df.reset_index(drop=True)
-
-    for col in ["twitter_description"]:
-        df = pandas.concat([df, tfidf(df, col)], axis=1)
-
-    drop_list = []
-    ids = df['we_vote_id']
-
-    for col in df.columns:
-        if df[col].dtype != 'O':
-            df[col] = (df[col] - numpy.mean(df[col])) / numpy.std(df[col])
-        elif df[col].dtype == 'O':
-            drop_list.append(col)
-
-    df = df.drop(drop_list, axis=1)
-
-    k = 300
-    df = add_cluster(df, k)
-
-    if int(numpy.mean(df['Cluster'])) == k:
-        return 0
-
-    df = pandas.concat([ids, df], axis=1)
-    df = polars.from_pandas(df)
-    df = df.select(['Cluster', 'we_vote_id'])
-
-    """choose 4 from same group, 1 from outside group"""
-    bulk_update_list = []
-
-    for clus in range(0, k):
-        diff_df = df.filter(polars.col("Cluster") != clus)
-        same_df = df.filter((polars.col("Cluster") == clus))
-        size = same_df.shape[0]
-        for we_id in same_df["we_vote_id"]:
-
-            cand_list = []
-            k = 5
-
-            if size == 0:
-                cand_list = diff_df.sample(k).select("we_vote_id").to_series().to_list()
-
-            elif size < 4:
-                temp_list = same_df.sample(size).select("we_vote_id").to_series().to_list()
-                cand_list.extend(temp_list)
-                k = k - len(cand_list)
-                cand_list.extend(diff_df.sample(k).select("we_vote_id").to_series().to_list())
-
-            else:
-                temp_list = same_df.sample(k - 1).select("we_vote_id").to_series().to_list()
-                cand_list.extend(temp_list)
-                k = k - len(cand_list)
-                cand_list.extend(diff_df.sample(k).select("we_vote_id").to_series().to_list())
-
-            # no_duplicates
-            cand_list = list(set(cand_list))
-
-            if len(cand_list) == 5:
-                for i in cand_list:
-
-                    # # WV-430 removes politician self-recommendation but then only provides 4 recommendations
-                    # if we_id != i:
-                    #     record = RecommendedPoliticianLinkByPolitician(
-                    #         from_politician_we_vote_id=we_id,
-                    #         recommended_politician_we_vote_id=i)
-                    #     bulk_update_list.append(record)
-
-                    # original code
-                    record = RecommendedPoliticianLinkByPolitician(
-                        from_politician_we_vote_id=we_id,
-                        recommended_politician_we_vote_id=i)
-                    bulk_update_list.append(record)
-
-    RecommendedPoliticianLinkByPolitician.objects.bulk_create(bulk_update_list)
+    status = ""
+    political_party_list = retrieve_political_party_list()
+    political_party_column_by_name = {name: column for column, name in enumerate(political_party_list)}
+    state_location_dict = retrieve_state_location_dict()
+
+    number_of_politicians = Politician.objects.using('readonly').count()
+    # Every cluster needs a few members to recommend from, and the first partial_fit needs a sample per cluster
+    number_of_clusters = max(1, min(number_of_clusters, number_of_politicians // RECOMMENDATIONS_PER_POLITICIAN,
+                                    chunk_size))
+    if number_of_politicians <= RECOMMENDATIONS_PER_POLITICIAN:
+        status += "NOT_ENOUGH_POLITICIANS_TO_RECOMMEND "
+        return {
+            'success':                      True,
+            'status':                       status,
+            'recommendation_links_saved':   0,
+        }
+
+    mini_batch_k_means = MiniBatchKMeans(
+        n_clusters=number_of_clusters, batch_size=chunk_size, n_init=3, random_state=0)
+    for epoch in range(POLITICIAN_RECOMMENDATION_EPOCHS):
+        leftover_feature_matrix = None
+        for chunk in generate_politician_chunks(chunk_size):
+            feature_matrix = generate_politician_feature_matrix(
+                chunk, political_party_column_by_name, state_location_dict)
+            if leftover_feature_matrix is not None:
+                feature_matrix = numpy.vstack([leftover_feature_matrix, feature_matrix])
+                leftover_feature_matrix = None
+            if not hasattr(mini_batch_k_means, 'cluster_centers_') and len(feature_matrix) < number_of_clusters:
+                leftover_feature_matrix = feature_matrix
+                continue
+            mini_batch_k_means.partial_fit(feature_matrix)
+        if leftover_feature_matrix is not None:
+            mini_batch_k_means.partial_fit(leftover_feature_matrix)
+
+    we_vote_id_list = []
+    cluster_label_list = []
+    for chunk in generate_politician_chunks(chunk_size):
+        feature_matrix = generate_politician_feature_matrix(chunk, political_party_column_by_name, state_location_dict)
+        cluster_label_list.append(mini_batch_k_means.predict(feature_matrix))
+        we_vote_id_list += [one_row[1] for one_row in chunk]
+    cluster_label_array = numpy.concatenate(cluster_label_list)
+    del cluster_label_list
+
+    recommended_index_array = choose_recommended_politician_indexes(
+        cluster_label_array, numpy.random.default_rng())
+
+    recommendation_links_saved = 0
+    with transaction.atomic():
+        RecommendedPoliticianLinkByPolitician.objects.all().delete()
+        link_list = []
+        for politician_index, recommended_index_row in enumerate(recommended_index_array):
+            from_politician_we_vote_id = we_vote_id_list[politician_index]
+            for recommended_index in dict.fromkeys(recommended_index_row.tolist()):
+                if recommended_index < 0 or recommended_index == politician_index:
+                    continue
+                link_list.append(RecommendedPoliticianLinkByPolitician(
+                    from_politician_we_vote_id=from_politician_we_vote_id,
+                    recommended_politician_we_vote_id=we_vote_id_list[recommended_index]))
+            if len(link_list) >= RECOMMENDATION_LINKS_SAVED_PER_BATCH:
+                RecommendedPoliticianLinkByPolitician.objects.bulk_create(link_list)
+                recommendation_links_saved += len(link_list)
+                link_list = []
+        if link_list:
+            RecommendedPoliticianLinkByPolitician.objects.bulk_create(link_list)
+            recommendation_links_saved += len(link_list)
+
+    status += "POLITICIAN_RECOMMENDATIONS_UPDATED: " + str(number_of_politicians) + " politicians, " + \
+        str(number_of_clusters) + " clusters, " + str(recommendation_links_saved) + " links "
+    return {
+        'success':                      True,
+        'status':                       status,
+        'recommendation_links_saved':   recommendation_links_saved,
+    }
+
+
+def retrieve_data_size_of_this_process():
+    """
+    The bytes RLIMIT_DATA is checked against (VmData). A forked child starts out with all of its parent's heap.
+    """
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmData:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # Not Linux: the peak resident size is the closest we have (kilobytes on Linux, bytes on macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def limit_memory_of_this_process(memory_limit_mb):
+    # RLIMIT_DATA covers the heap and anonymous mmaps (numpy arrays) on Linux, without counting shared libraries.
+    #  It also counts the heap inherited from the parent, so the limit is memory_limit_mb on top of what we use now.
+    memory_limit_bytes = retrieve_data_size_of_this_process() + memory_limit_mb * 1024 * 1024
+    hard_limit = resource.getrlimit(resource.RLIMIT_DATA)[1]
+    if hard_limit != resource.RLIM_INFINITY:
+        memory_limit_bytes = min(memory_limit_bytes, hard_limit)
+    resource.setrlimit(resource.RLIMIT_DATA, (memory_limit_bytes, memory_limit_bytes))
+
+
+def update_politician_recommendations_with_memory_limit(memory_limit_mb=POLITICIAN_RECOMMENDATION_MEMORY_LIMIT_MB):
+    """
+    Run update_politician_recommendations in a child process that can grow by at most memory_limit_mb past the
+    memory it inherits from this one. Going over the cap fails this run (the old recommendations stay), instead of
+    the server running out of memory.
+    :param memory_limit_mb:
+    :return:
+    """
+    status = ""
+    # The child must not share our database connections
+    connections.close_all()
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=limit_memory_of_this_process, initargs=(memory_limit_mb,)) as executor:
+            return executor.submit(update_politician_recommendations).result()
+    except MemoryError:
+        status += "POLITICIAN_RECOMMENDATIONS_OVER_MEMORY_LIMIT_" + str(memory_limit_mb) + "MB "
+    except Exception as e:
+        status += "POLITICIAN_RECOMMENDATIONS_FAILED: " + str(e) + " "
+    logger.error("update_politician_recommendations_with_memory_limit: " + status)
+    return {
+        'success':                      False,
+        'status':                       status,
+        'recommendation_links_saved':   0,
+    }
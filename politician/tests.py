@@ -0,0 +1,107 @@
+# politician/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+import numpy
+from django.test import SimpleTestCase, TransactionTestCase
+
+import politician.controllers_recommendation
+from politician.controllers_recommendation import RECOMMENDATIONS_FROM_SAME_CLUSTER, \
+    RECOMMENDATIONS_PER_POLITICIAN, choose_recommended_politician_indexes, generate_politician_chunks, \
+    limit_memory_of_this_process, update_politician_recommendations
+from politician.models import Politician, RecommendedPoliticianLinkByPolitician
+
+STATE_CODE_LIST = ['CA', 'NY', 'TX']
+POLITICAL_PARTY_LIST = ['Democratic', 'Republican', 'Green']
+
+
+class PoliticianRecommendationTestCase(TransactionTestCase):
+    # Politicians are read from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.number_of_politicians = 40
+        for number in range(self.number_of_politicians):
+            Politician.objects.create(
+                we_vote_id='wv01pol' + str(number),
+                politician_name="Politician " + str(number),
+                political_party=POLITICAL_PARTY_LIST[number % 3],
+                state_code=STATE_CODE_LIST[number % 3],
+                twitter_followers_count=number * 100,
+                twitter_description="Working for " + STATE_CODE_LIST[number % 3] + " families")
+
+    def test_chunks_read_every_politician_once(self):
+        # Gaps in the ids must not skip or repeat anyone
+        Politician.objects.filter(we_vote_id__in=['wv01pol3', 'wv01pol4', 'wv01pol20']).delete()
+        chunk_list = list(generate_politician_chunks(chunk_size=7))
+        self.assertTrue(all(len(chunk) <= 7 for chunk in chunk_list))
+        we_vote_id_list = [one_row[1] for chunk in chunk_list for one_row in chunk]
+        self.assertEqual(len(we_vote_id_list), self.number_of_politicians - 3)
+        self.assertCountEqual(we_vote_id_list, Politician.objects.values_list('we_vote_id', flat=True))
+
+    def test_recommendations_are_replaced(self):
+        RecommendedPoliticianLinkByPolitician.objects.create(
+            from_politician_we_vote_id='wv01pol0', recommended_politician_we_vote_id='wv01polgone')
+
+        # Smaller chunks than the table, so the clusters are fit over several partial_fit calls
+        results = update_politician_recommendations(number_of_clusters=6, chunk_size=7)
+        self.assertTrue(results['success'])
+        self.assertFalse(RecommendedPoliticianLinkByPolitician.objects.filter(
+            recommended_politician_we_vote_id='wv01polgone').exists())
+        self.assertEqual(RecommendedPoliticianLinkByPolitician.objects.count(), results['recommendation_links_saved'])
+
+        we_vote_id_set = set(Politician.objects.values_list('we_vote_id', flat=True))
+        recommended_we_vote_id_list_by_politician = {}
+        for from_we_vote_id, recommended_we_vote_id in RecommendedPoliticianLinkByPolitician.objects.values_list(
+                'from_politician_we_vote_id', 'recommended_politician_we_vote_id'):
+            recommended_we_vote_id_list_by_politician.setdefault(from_we_vote_id, []).append(recommended_we_vote_id)
+        self.assertEqual(set(recommended_we_vote_id_list_by_politician), we_vote_id_set)
+        for from_we_vote_id, recommended_we_vote_id_list in recommended_we_vote_id_list_by_politician.items():
+            self.assertLessEqual(len(recommended_we_vote_id_list), RECOMMENDATIONS_PER_POLITICIAN)
+            self.assertEqual(len(recommended_we_vote_id_list), len(set(recommended_we_vote_id_list)))
+            self.assertNotIn(from_we_vote_id, recommended_we_vote_id_list)
+            self.assertTrue(set(recommended_we_vote_id_list) <= we_vote_id_set)
+
+    def test_too_few_politicians_leaves_recommendations_alone(self):
+        Politician.objects.exclude(we_vote_id__in=['wv01pol0', 'wv01pol1']).delete()
+        RecommendedPoliticianLinkByPolitician.objects.create(
+            from_politician_we_vote_id='wv01pol0', recommended_politician_we_vote_id='wv01pol1')
+        results = update_politician_recommendations()
+        self.assertIn('NOT_ENOUGH_POLITICIANS_TO_RECOMMEND', results['status'])
+        self.assertEqual(RecommendedPoliticianLinkByPolitician.objects.count(), 1)
+
+
+class PoliticianRecommendationIndexTestCase(SimpleTestCase):
+
+    def test_same_cluster_then_other_clusters(self):
+        cluster_label_array = numpy.array([0] * 10 + [1] * 10 + [2] * 2)
+        recommended_index_array = choose_recommended_politician_indexes(
+            cluster_label_array, numpy.random.default_rng(0))
+        self.assertEqual(recommended_index_array.shape, (22, RECOMMENDATIONS_PER_POLITICIAN))
+        for politician_index, recommended_index_row in enumerate(recommended_index_array):
+            self.assertNotIn(politician_index, recommended_index_row)
+            self.assertEqual(len(set(recommended_index_row.tolist())), RECOMMENDATIONS_PER_POLITICIAN)
+            cluster_label = cluster_label_array[politician_index]
+            same_cluster_count = int((cluster_label_array[recommended_index_row] == cluster_label).sum())
+            if cluster_label == 2:
+                # Only one other politician in this cluster
+                self.assertEqual(same_cluster_count, 1)
+            else:
+                self.assertEqual(same_cluster_count, RECOMMENDATIONS_FROM_SAME_CLUSTER)
+
+    def test_memory_limit_is_on_top_of_inherited_memory(self):
+        module = politician.controllers_recommendation
+        inherited_bytes = 3 * 1024 * 1024 * 1024
+        with mock.patch.object(module, 'retrieve_data_size_of_this_process', return_value=inherited_bytes), \
+                mock.patch.object(module.resource, 'getrlimit',
+                                  return_value=(module.resource.RLIM_INFINITY, module.resource.RLIM_INFINITY)), \
+                mock.patch.object(module.resource, 'setrlimit') as setrlimit:
+            limit_memory_of_this_process(1024)
+        memory_limit_bytes = inherited_bytes + 1024 * 1024 * 1024
+        self.assertEqual(setrlimit.call_args_list,
+                         [mock.call(module.resource.RLIMIT_DATA, (memory_limit_bytes, memory_limit_bytes))])
+
+    def test_data_size_of_this_process(self):
+        self.assertGreater(politician.controllers_recommendation.retrieve_data_size_of_this_process(), 0)
@@ -20,6 +20,7 @@ from django.utils.timezone import localtime, now
 from django.urls import reverse
 import wevote_functions.admin
 from admin_tools.views import redirect_to_sign_in_page
+from ballot.models import BallotSnapshotManager
 from campaign.models import CampaignXManager
 from candidate.controllers import retrieve_candidate_photos
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager, CandidateToOfficeLink, \
@@ -40,7 +41,6 @@ from office.models import ContestOffice
 from position.models import PositionEntered, PositionListManager
 from representative.models import Representative, RepresentativeManager
 from volunteer_task.controllers import change_tracking, change_tracking_boolean
-# from politician.controllers_recommendation import update_recommend  # 2024-05-15: Causing problems on live servers
 from volunteer_task.models import VOLUNTEER_ACTION_DUPLICATE_POLITICIAN_ANALYSIS, \
     VOLUNTEER_ACTION_POLITICIAN_DEDUPLICATION, VolunteerTaskManager
 from voter.models import fetch_voter_from_voter_device_link, voter_has_authority, VoterManager
@@ -58,8 +58,7 @@ from .controllers import add_alternate_names_to_next_spot, add_twitter_handle_to
     update_politician_details_from_candidate, \
     merge_if_duplicate_politicians, merge_these_two_politicians, politicians_import_from_master_server
 from .models import Politician, PoliticianChangeLog, PoliticianManager, POLITICIAN_UNIQUE_ATTRIBUTES_TO_BE_CLEARED, \
-    POLITICIAN_UNIQUE_IDENTIFIERS, PoliticiansArePossibleDuplicates, POLITICAL_DATA_MANAGER, UNKNOWN, \
-    RecommendedPoliticianLinkByPolitician
+    POLITICIAN_UNIQUE_IDENTIFIERS, PoliticiansArePossibleDuplicates, POLITICAL_DATA_MANAGER, UNKNOWN
 from politician.controllers_generate_color import generate_background, validate_hex
 POLITICIANS_SYNC_URL = get_environment_variable("POLITICIANS_SYNC_URL")  # politiciansSyncOut
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
@@ -3515,6 +3514,9 @@ def politician_edit_process_view(request):
                     updates_made += 1
         if updates_needed:
             CandidateCampaign.objects.bulk_update(update_list, ['seo_friendly_path'])
+            # bulk_update() doesn't send post_save
+            BallotSnapshotManager.mark_ballot_snapshots_stale_for_candidates(
+                candidate_we_vote_id_list=[candidate.we_vote_id for candidate in update_list])
             messages.add_message(request, messages.INFO,
                                  "{updates_made:,} candidates updated with new seo_friendly_path."
                                  "".format(updates_made=updates_made))
@@ -4255,10 +4257,9 @@ def update_profile_image_background_color_view_for_politicians(request):
 
 def update_recommended_politicians_view(request):
     """
-       Update recommended politicians based on certain criteria.
-       This view function updates the recommended politicians by performing several operations such as clustering,
-       one-hot encoding, TF-IDF, and adding clusters. It then selects politicians from the same cluster and a few from
-       outside the cluster as recommendations.
+       Schedule an UPDATE_POLITICIAN_RECOMMENDATIONS batch process, which clusters politicians and replaces the
+       recommendations (see politician/controllers_recommendation.py). The clustering runs in the batch process
+       system rather than in this request, under a memory limit, so it can't take a live server down.
        Parameters:
        - request: Django HttpRequest object
        Returns:
@@ -4273,11 +4274,15 @@ def update_recommended_politicians_view(request):
     success = True
     state_code = request.GET.get('state_code', "")
 
-    try:
-        RecommendedPoliticianLinkByPolitician.objects.all().delete()
-        # update_recommend()  # 2024-05-15: Causing problems on live servers
-    except Exception as e:
-        status += "Could not update: " + str(e) + " "
+    from import_export_batches.models import BatchProcessManager, UPDATE_POLITICIAN_RECOMMENDATIONS
+    batch_process_manager = BatchProcessManager()
+    results = batch_process_manager.create_batch_process(kind_of_process=UPDATE_POLITICIAN_RECOMMENDATIONS)
+    if results['batch_process_saved']:
+        messages.add_message(request, messages.INFO, "Politician recommendations will be updated by batch process " +
+                             str(results['batch_process'].id) + ".")
+    else:
+        status += "Could not schedule update: " + results['status'] + " "
+        messages.add_message(request, messages.ERROR, status)
 
     validation_list = []
     sample_num = 100
@@ -2,9 +2,9 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from .models import PositionEntered, PositionForFriends, PositionManager, PositionListManager, ANY_STANCE, \
-    FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC, THIS_ELECTION_ONLY, ALL_OTHER_ELECTIONS, \
-    ALL_ELECTIONS, SUPPORT, OPPOSE, INFORMATION_ONLY, NO_STANCE
+from .models import PositionEntered, PositionForFriends, PositionManager, PositionListManager, \
+    PositionTallyManager, ANY_STANCE, FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC, THIS_ELECTION_ONLY, \
+    ALL_OTHER_ELECTIONS, ALL_ELECTIONS, SUPPORT, OPPOSE, INFORMATION_ONLY, NO_STANCE
 from ballot.models import OFFICE, CANDIDATE, MEASURE, POLITICIAN
 from candidate.models import CandidateCampaign, CandidateManager, CandidateListManager, \
     CandidateToOfficeLink
@@ -1358,6 +1358,14 @@ def move_positions_to_another_politician(
             status += "FAILED_MOVE_FRIEND_POSITIONS_BY_POLITICIAN_ID: " + str(e) + " "
             success = False
 
+    if positive_value_exists(position_entries_moved):
+        # Queryset update() skips the signals that keep PositionTally current
+        for is_public_position in (True, False):
+            PositionTallyManager.refresh_position_tallies(
+                tally_field_name='politician_we_vote_id',
+                we_vote_id_list=[from_politician_we_vote_id, to_politician_we_vote_id],
+                is_public_position=is_public_position)
+
     results = {
         'status':                       status,
         'success':                      success,
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from position.models import PositionTallyManager
+
+# Recounts every PositionTally from PositionEntered and PositionForFriends:
+#      python manage.py rebuild_position_tallies
+# Run this once after deploying PositionTally, and any time the tallies may have drifted (for example after
+#  positions were changed with a queryset update() that did not refresh them).
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the position tallies used by the fetch_positions_count_for_* methods'
+
+    def handle(self, *args, **options):
+        results = PositionTallyManager.rebuild_all_position_tallies()
+        if results['success']:
+            self.stdout.write(results['status'])
+        else:
+            self.stderr.write(results['status'])
@@ -5,12 +5,16 @@
 
 from activity.controllers import update_or_create_activity_notice_seed_for_voter_position
 from analytics.models import ACTION_POSITION_TAKEN, AnalyticsManager
+from api_internal_cache.models import ApiInternalCacheLocalTier
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching, \
     figure_out_google_civic_election_id_voter_is_watching_by_voter_we_vote_id
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from election.models import Election
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
@@ -1002,6 +1006,325 @@ class PositionNetworkScore(models.Model):
         return ""
 
 
+# Position tallies are kept per ballot item (and per politician and organization), so the fetch_positions_count_for_*
+# methods can read one row instead of counting positions
+POSITION_TALLY_FIELD_NAME_LIST = [
+    'candidate_campaign_we_vote_id',
+    'contest_measure_we_vote_id',
+    'politician_we_vote_id',
+    'organization_we_vote_id',
+]
+POSITION_TALLY_COUNT_FIELD_BY_STANCE = {
+    ANY_STANCE:         'any_stance_count',
+    SUPPORT:            'support_count',
+    STILL_DECIDING:     'still_deciding_count',
+    INFORMATION_ONLY:   'information_only_count',
+    NO_STANCE:          'no_stance_count',
+    OPPOSE:             'oppose_count',
+    PERCENT_RATING:     'percent_rating_count',
+}
+# Counts for ids without a tally (most of them have no positions at all), so each process counts them from the
+#  positions table once every few minutes rather than on every read
+POSITION_TALLY_MISSING_CACHE_MAX_ENTRIES = 10000
+POSITION_TALLY_MISSING_CACHE_TTL_SECONDS = 300
+position_tally_missing_cache = ApiInternalCacheLocalTier(
+    max_entries=POSITION_TALLY_MISSING_CACHE_MAX_ENTRIES, ttl_seconds=POSITION_TALLY_MISSING_CACHE_TTL_SECONDS)
+
+
+class PositionTally(models.Model):
+    """
+    How many public (PositionEntered) or friends-only (PositionForFriends) positions exist for one candidate,
+    measure, politician or organization, by stance. Seeded and kept current by the PositionEntered and
+    PositionForFriends signals at the bottom of this file, and rebuilt with "python manage.py rebuild_position_tallies".
+    Reads never write: a missing tally is counted from the positions table until it is seeded.
+    """
+    # We are relying on built-in Python id field
+    tally_we_vote_id = models.CharField(max_length=255, null=False, unique=False, db_index=True)
+    is_public_position = models.BooleanField(default=True)
+    any_stance_count = models.PositiveIntegerField(default=0)
+    support_count = models.PositiveIntegerField(default=0)
+    still_deciding_count = models.PositiveIntegerField(default=0)
+    information_only_count = models.PositiveIntegerField(default=0)
+    no_stance_count = models.PositiveIntegerField(default=0)
+    oppose_count = models.PositiveIntegerField(default=0)
+    percent_rating_count = models.PositiveIntegerField(default=0)
+    date_last_updated = models.DateTimeField(null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('tally_we_vote_id', 'is_public_position')
+
+
+class PositionTallyManager(models.Manager):
+
+    @staticmethod
+    def fetch_position_tally_count(
+            tally_field_name='',
+            we_vote_id_list=None,
+            stance_we_are_looking_for=ANY_STANCE,
+            is_public_position=True):
+        """
+        Add up the tallied positions for every we_vote_id in we_vote_id_list. Tallies that do not exist yet are
+        counted from the positions table on the read replica, and kept in position_tally_missing_cache, but not saved:
+        the position signals seed them, and the rebuild_position_tallies command reconciles them, so reads never race
+        with the F() adjustments.
+        :param tally_field_name: One of POSITION_TALLY_FIELD_NAME_LIST
+        :param we_vote_id_list:
+        :param stance_we_are_looking_for:
+        :param is_public_position:
+        :return:
+        """
+        if not we_vote_id_list:
+            return 0
+        we_vote_id_list = list(set(we_vote_id_list))
+        stance_we_are_looking_for = str(stance_we_are_looking_for).upper()
+        count_field_name = POSITION_TALLY_COUNT_FIELD_BY_STANCE.get(stance_we_are_looking_for, 'any_stance_count')
+
+        position_tally_dict = {}
+        try:
+            queryset = PositionTally.objects.using('readonly').filter(
+                tally_we_vote_id__in=we_vote_id_list, is_public_position=is_public_position)
+            for tally_we_vote_id, count in queryset.values_list('tally_we_vote_id', count_field_name):
+                position_tally_dict[tally_we_vote_id] = count
+        except Exception as e:
+            logger.error("fetch_position_tally_count PositionTally query failed: " + str(e))
+
+        if tally_field_name not in POSITION_TALLY_FIELD_NAME_LIST:
+            return sum(position_tally_dict.values())
+        missing_we_vote_id_list = []
+        for one_we_vote_id in we_vote_id_list:
+            if one_we_vote_id in position_tally_dict:
+                continue
+            position_tally_values = position_tally_missing_cache.get(
+                (tally_field_name, one_we_vote_id, is_public_position))
+            if position_tally_values is None:
+                missing_we_vote_id_list.append(one_we_vote_id)
+            else:
+                position_tally_dict[one_we_vote_id] = position_tally_values[count_field_name]
+        if len(missing_we_vote_id_list):
+            try:
+                position_tally_values_dict = PositionTallyManager.count_positions_by_stance(
+                    tally_field_name=tally_field_name,
+                    we_vote_id_list=missing_we_vote_id_list,
+                    is_public_position=is_public_position,
+                    read_only=True)
+                for tally_we_vote_id, position_tally_values in position_tally_values_dict.items():
+                    position_tally_dict[tally_we_vote_id] = position_tally_values[count_field_name]
+                    position_tally_missing_cache.set(
+                        (tally_field_name, tally_we_vote_id, is_public_position), position_tally_values)
+            except Exception as e:
+                logger.error("fetch_position_tally_count count_positions_by_stance failed: " + str(e))
+
+        return sum(position_tally_dict.values())
+
+    @staticmethod
+    def count_positions_by_stance(
+            tally_field_name='',
+            we_vote_id_list=None,
+            is_public_position=True,
+            read_only=False):
+        """
+        Count the positions for these we_vote_ids with one grouped query.
+        :param tally_field_name:
+        :param we_vote_id_list: Leave as None to count every position in the table
+        :param is_public_position:
+        :param read_only: Count on the read replica. Tallies which are saved are counted from the primary database,
+          since they are often counted right after positions were changed.
+        :return: {tally_we_vote_id: {'any_stance_count': 0, 'support_count': 0, ...}}
+        """
+        position_tally_values_dict = {}
+        if we_vote_id_list is not None:
+            for one_we_vote_id in we_vote_id_list:
+                position_tally_values_dict[one_we_vote_id] = \
+                    {count_field_name: 0 for count_field_name in POSITION_TALLY_COUNT_FIELD_BY_STANCE.values()}
+        position_model = PositionEntered if is_public_position else PositionForFriends
+        if read_only:
+            queryset = position_model.objects.using('readonly').all()
+        else:
+            queryset = position_model.objects.all()
+        if we_vote_id_list is not None:
+            queryset = queryset.filter(**{tally_field_name + '__in': we_vote_id_list})
+        else:
+            queryset = queryset.exclude(**{tally_field_name + '__isnull': True}).exclude(**{tally_field_name: ''})
+        queryset = queryset.values(tally_field_name, 'stance').annotate(position_count=Count('id'))
+        for one_group in queryset:
+            tally_we_vote_id = one_group[tally_field_name]
+            if tally_we_vote_id not in position_tally_values_dict:
+                position_tally_values_dict[tally_we_vote_id] = \
+                    {count_field_name: 0 for count_field_name in POSITION_TALLY_COUNT_FIELD_BY_STANCE.values()}
+            stance = str(one_group['stance']).upper()
+            if stance in POSITION_TALLY_COUNT_FIELD_BY_STANCE and stance != ANY_STANCE:
+                position_tally_values_dict[tally_we_vote_id][POSITION_TALLY_COUNT_FIELD_BY_STANCE[stance]] += \
+                    one_group['position_count']
+            position_tally_values_dict[tally_we_vote_id]['any_stance_count'] += one_group['position_count']
+        return position_tally_values_dict
+
+    @staticmethod
+    def refresh_position_tallies(
+            tally_field_name='',
+            we_vote_id_list=None,
+            is_public_position=True):
+        """
+        Recount the positions for these we_vote_ids and save the tallies. Use this after changing positions
+        with a queryset update(), which does not send the signals that keep the tallies current.
+        :param tally_field_name:
+        :param we_vote_id_list:
+        :param is_public_position:
+        :return:
+        """
+        status = ""
+        success = True
+        position_tally_values_dict = {}
+        if tally_field_name not in POSITION_TALLY_FIELD_NAME_LIST:
+            status += "REFRESH_POSITION_TALLIES_INVALID_FIELD_NAME "
+            return {
+                'success':                      False,
+                'status':                       status,
+                'position_tally_values_dict':   position_tally_values_dict,
+            }
+        we_vote_id_list = [one_we_vote_id for one_we_vote_id in (we_vote_id_list or [])
+                           if positive_value_exists(one_we_vote_id)]
+        if not len(we_vote_id_list):
+            status += "REFRESH_POSITION_TALLIES_NOTHING_TO_REFRESH "
+            return {
+                'success':                      True,
+                'status':                       status,
+                'position_tally_values_dict':   position_tally_values_dict,
+            }
+
+        try:
+            position_tally_values_dict = PositionTallyManager.count_positions_by_stance(
+                tally_field_name=tally_field_name,
+                we_vote_id_list=we_vote_id_list,
+                is_public_position=is_public_position)
+            for tally_we_vote_id, position_tally_values in position_tally_values_dict.items():
+                PositionTally.objects.update_or_create(
+                    tally_we_vote_id=tally_we_vote_id,
+                    is_public_position=is_public_position,
+                    defaults=position_tally_values)
+            status += "POSITION_TALLIES_REFRESHED "
+        except Exception as e:
+            success = False
+            status += "REFRESH_POSITION_TALLIES_FAILED: " + str(e) + " "
+            logger.error("refresh_position_tallies failed: " + str(e))
+
+        return {
+            'success':                      success,
+            'status':                       status,
+            'position_tally_values_dict':   position_tally_values_dict,
+        }
+
+    @staticmethod
+    def seed_position_tallies(
+            tally_field_name='',
+            we_vote_id_list=None,
+            is_public_position=True):
+        """
+        Create the tallies which do not exist yet from a count of the positions table. A tally which already exists
+        is left alone, so this never undoes an F() adjustment made by update_position_tallies_for_one_position.
+        :param tally_field_name:
+        :param we_vote_id_list:
+        :param is_public_position:
+        :return:
+        """
+        position_tally_values_dict = PositionTallyManager.count_positions_by_stance(
+            tally_field_name=tally_field_name,
+            we_vote_id_list=we_vote_id_list,
+            is_public_position=is_public_position)
+        for tally_we_vote_id, position_tally_values in position_tally_values_dict.items():
+            PositionTally.objects.get_or_create(
+                tally_we_vote_id=tally_we_vote_id,
+                is_public_position=is_public_position,
+                defaults=position_tally_values)
+
+    @staticmethod
+    def rebuild_all_position_tallies():
+        """
+        Replace every tally with a fresh count of PositionEntered and PositionForFriends.
+        :return:
+        """
+        status = ""
+        success = True
+        position_tally_count = 0
+        try:
+            with transaction.atomic():
+                PositionTally.objects.all().delete()
+                for is_public_position in (True, False):
+                    position_tally_list = []
+                    for tally_field_name in POSITION_TALLY_FIELD_NAME_LIST:
+                        position_tally_values_dict = PositionTallyManager.count_positions_by_stance(
+                            tally_field_name=tally_field_name,
+                            is_public_position=is_public_position)
+                        for tally_we_vote_id, position_tally_values in position_tally_values_dict.items():
+                            position_tally_list.append(PositionTally(
+                                tally_we_vote_id=tally_we_vote_id,
+                                is_public_position=is_public_position,
+                                **position_tally_values))
+                    PositionTally.objects.bulk_create(position_tally_list, batch_size=1000)
+                    position_tally_count += len(position_tally_list)
+            status += "POSITION_TALLIES_REBUILT: " + str(position_tally_count) + " "
+        except Exception as e:
+            success = False
+            status += "REBUILD_POSITION_TALLIES_FAILED: " + str(e) + " "
+            logger.error("rebuild_all_position_tallies failed: " + str(e))
+
+        return {
+            'success':              success,
+            'status':               status,
+            'position_tally_count': position_tally_count,
+        }
+
+    @staticmethod
+    def update_position_tallies_for_one_position(
+            position_tally_key=None,
+            is_public_position=True,
+            change=1):
+        """
+        Add change to the tallies this position counts towards. When a position is added to a tally which does not
+        exist yet, the tally is seeded from the positions table, which already includes this position.
+        :param position_tally_key: (stance, candidate_campaign_we_vote_id, contest_measure_we_vote_id,
+          politician_we_vote_id, organization_we_vote_id)
+        :param is_public_position:
+        :param change: 1 or -1
+        :return:
+        """
+        if not position_tally_key:
+            return
+        stance = str(position_tally_key[0]).upper()
+        tally_field_name_by_we_vote_id = {
+            one_we_vote_id: tally_field_name
+            for tally_field_name, one_we_vote_id in zip(POSITION_TALLY_FIELD_NAME_LIST, position_tally_key[1:])
+            if positive_value_exists(one_we_vote_id)}
+        tally_we_vote_id_list = list(tally_field_name_by_we_vote_id)
+        if not len(tally_we_vote_id_list):
+            return
+        count_field_name_list = ['any_stance_count']
+        if stance in POSITION_TALLY_COUNT_FIELD_BY_STANCE and stance != ANY_STANCE:
+            count_field_name_list.append(POSITION_TALLY_COUNT_FIELD_BY_STANCE[stance])
+        if change < 0:
+            # Never go below zero if a tally got out of step, one count at a time
+            update_values = {count_field_name: Greatest(F(count_field_name) + change, 0)
+                             for count_field_name in count_field_name_list}
+        else:
+            update_values = {count_field_name: F(count_field_name) + change
+                             for count_field_name in count_field_name_list}
+        try:
+            number_updated = PositionTally.objects.filter(
+                tally_we_vote_id__in=tally_we_vote_id_list, is_public_position=is_public_position)\
+                .update(**update_values)
+            if change > 0 and number_updated < len(tally_we_vote_id_list):
+                existing_we_vote_id_set = set(PositionTally.objects.filter(
+                    tally_we_vote_id__in=tally_we_vote_id_list, is_public_position=is_public_position)
+                    .values_list('tally_we_vote_id', flat=True))
+                for one_we_vote_id in tally_we_vote_id_list:
+                    if one_we_vote_id not in existing_we_vote_id_set:
+                        PositionTallyManager.seed_position_tallies(
+                            tally_field_name=tally_field_name_by_we_vote_id[one_we_vote_id],
+                            we_vote_id_list=[one_we_vote_id],
+                            is_public_position=is_public_position)
+        except Exception as e:
+            logger.error("update_position_tallies_for_one_position failed: " + str(e))
+
+
 class PositionListManager(models.Manager):
     # 2018-05 We now have an "is_public_position()" function
     # def add_is_public_position(self, incoming_position_list, is_public_position):
@@ -1556,6 +1879,20 @@ class PositionListManager(models.Manager):
             }
             return results
 
+        # Queryset update() skips the signals that keep PositionTally current. Positions are tallied by
+        #  organization_we_vote_id (not by voter), so recount the organizations these positions are under now,
+        #  along with the voter's organization, after moving them.
+        tallied_organization_we_vote_id_set = {organization_we_vote_id}
+        try:
+            owned_by_voter_filter = Q(voter_id=voter_id) | Q(voter_we_vote_id=voter_we_vote_id) | \
+                Q(organization_id=organization_id) | Q(organization_we_vote_id=organization_we_vote_id)
+            for position_model in (PositionEntered, PositionForFriends):
+                tallied_organization_we_vote_id_set.update(
+                    position_model.objects.filter(owned_by_voter_filter)
+                    .values_list('organization_we_vote_id', flat=True).distinct())
+        except Exception as e:
+            status += "REPAIR_ALL_POSITIONS-ORGANIZATIONS_TO_TALLY_NOT_RETRIEVED: " + str(e) + " "
+
         failure_counter = 0
 
         ############################
@@ -1780,6 +2117,14 @@ class PositionListManager(models.Manager):
             status += "POSITION_FAILED_ORGANIZATION_ID_UPDATE4: " + str(e) + " "
             success = False
 
+        for is_public_position, number_changed in ((True, public_number_changed), (False, friend_number_changed)):
+            if positive_value_exists(number_changed):
+                tally_results = PositionTallyManager.refresh_position_tallies(
+                    tally_field_name='organization_we_vote_id',
+                    we_vote_id_list=list(tallied_organization_we_vote_id_set),
+                    is_public_position=is_public_position)
+                status += tally_results['status']
+
         if positive_value_exists(failure_counter):
             results = {
                 'status':           'VOTER_POSITION_LIST_PARTIALLY_REPAIRED ({failure_counter} failures) '
@@ -3926,6 +4271,14 @@ class PositionListManager(models.Manager):
             if type(friends_we_vote_id_list) is list and len(friends_we_vote_id_list) == 0:
                 return 0
 
+        if friends_we_vote_id_list is False and organizations_followed_we_vote_id_list is False \
+                and positive_value_exists(candidate_we_vote_id):
+            return PositionTallyManager.fetch_position_tally_count(
+                tally_field_name='candidate_campaign_we_vote_id',
+                we_vote_id_list=[candidate_we_vote_id],
+                stance_we_are_looking_for=stance_we_are_looking_for,
+                is_public_position=retrieve_public_positions)
+
         # Retrieve the support positions for this candidate_id
         position_count = 0
         try:
@@ -4021,10 +4374,6 @@ class PositionListManager(models.Manager):
 
         if public_or_private not in (PUBLIC_ONLY, FRIENDS_ONLY):
             public_or_private = PUBLIC_ONLY
-        if public_or_private == FRIENDS_ONLY:
-            position_list_query = PositionForFriends.objects.using('readonly').all()
-        else:
-            position_list_query = PositionEntered.objects.using('readonly').all()
 
         candidate_list_manager = CandidateListManager()
         results = candidate_list_manager.retrieve_all_candidates_for_office(
@@ -4045,40 +4394,11 @@ class PositionListManager(models.Manager):
         for one_candidate in candidate_list:
             candidate_we_vote_id_list.append(one_candidate.we_vote_id)
 
-        # As of Aug 2018 we are no longer using PERCENT_RATING
-        # position_list_query = position_list_query.exclude(stance__iexact=PERCENT_RATING)
-
-        # Retrieve the support positions for this contest_office_id
-        position_count = 0
-        try:
-            position_list_query = position_list_query.filter(
-                candidate_campaign_we_vote_id__in=candidate_we_vote_id_list)
-            # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
-            if stance_we_are_looking_for != ANY_STANCE:
-                # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
-                # if stance_we_are_looking_for == SUPPORT:
-                #     position_list_query = position_list_query.filter(
-                #         Q(stance=stance_we_are_looking_for) |  # Matches "is_support"
-                #         (Q(stance=PERCENT_RATING) & Q(vote_smart_rating_integer__gte=66))  # "is_positive_rating"
-                #     )  # | Q(stance=GRADE_RATING))
-                # elif stance_we_are_looking_for == OPPOSE:
-                #     position_list_query = position_list_query.filter(
-                #         Q(stance=stance_we_are_looking_for) |  # Matches "is_oppose"
-                #         (Q(stance=PERCENT_RATING) & Q(vote_smart_rating_integer__lte=33))  # "is_negative_rating"
-                #     )  # | Q(stance=GRADE_RATING))
-                # else:
-                #     position_list_query = position_list_query.filter(stance=stance_we_are_looking_for)
-
-                position_list_query = position_list_query.filter(stance__iexact=stance_we_are_looking_for)
-
-            # Limit to positions in the last x years - currently we are not limiting
-            # position_list = position_list.filter(election_id=election_id)
-
-            position_count = position_list_query.count()
-        except Exception as e:
-            handle_record_not_found_exception(e, logger=logger)
-
-        return position_count
+        return PositionTallyManager.fetch_position_tally_count(
+            tally_field_name='candidate_campaign_we_vote_id',
+            we_vote_id_list=candidate_we_vote_id_list,
+            stance_we_are_looking_for=stance_we_are_looking_for,
+            is_public_position=public_or_private == PUBLIC_ONLY)
 
     def fetch_public_positions_count_for_contest_measure(self, contest_measure_id,
                                                          contest_measure_we_vote_id,
@@ -4122,6 +4442,13 @@ class PositionListManager(models.Manager):
         # As of Aug 2018 we are no longer using PERCENT_RATING
         # position_list_query = position_list_query.exclude(stance__iexact=PERCENT_RATING)
 
+        if positive_value_exists(contest_measure_we_vote_id):
+            return PositionTallyManager.fetch_position_tally_count(
+                tally_field_name='contest_measure_we_vote_id',
+                we_vote_id_list=[contest_measure_we_vote_id],
+                stance_we_are_looking_for=stance_we_are_looking_for,
+                is_public_position=public_or_private == PUBLIC_ONLY)
+
         # Retrieve the support positions for this contest_measure_id
         position_count = 0
         try:
@@ -4183,6 +4510,13 @@ class PositionListManager(models.Manager):
         # As of Aug 2018 we are no longer using PERCENT_RATING
         # position_list_query = position_list_query.exclude(stance__iexact=PERCENT_RATING)
 
+        if positive_value_exists(politician_we_vote_id):
+            return PositionTallyManager.fetch_position_tally_count(
+                tally_field_name='politician_we_vote_id',
+                we_vote_id_list=[politician_we_vote_id],
+                stance_we_are_looking_for=stance_we_are_looking_for,
+                is_public_position=public_or_private == PUBLIC_ONLY)
+
         # Retrieve the support positions for this politician_id
         position_count = 0
         try:
@@ -4284,6 +4618,14 @@ class PositionListManager(models.Manager):
             if type(friends_we_vote_id_list) is list and len(friends_we_vote_id_list) == 0:
                 return 0
 
+        if friends_we_vote_id_list is False and organizations_followed_we_vote_id_list is False \
+                and positive_value_exists(organization_we_vote_id):
+            return PositionTallyManager.fetch_position_tally_count(
+                tally_field_name='organization_we_vote_id',
+                we_vote_id_list=[organization_we_vote_id],
+                stance_we_are_looking_for=stance_we_are_looking_for,
+                is_public_position=retrieve_public_positions)
+
         # Retrieve the support positions for this organization_id
         position_count = 0
         try:
@@ -4409,8 +4751,15 @@ class PositionListManager(models.Manager):
         success = True
         status = ''
         number_changed = 0
+        # Queryset update() skips the signals that keep PositionTally current, so we refresh these tallies below
+        politician_we_vote_id_list_to_refresh = [politician_we_vote_id, new_politician_we_vote_id]
 
         if positive_value_exists(candidate_we_vote_id):
+            for position_model in (PositionEntered, PositionForFriends):
+                politician_we_vote_id_list_to_refresh += list(position_model.objects
+                                                              .filter(candidate_campaign_we_vote_id=candidate_we_vote_id)
+                                                              .values_list('politician_we_vote_id', flat=True)
+                                                              .distinct())
             number_changed += PositionEntered.objects.all().filter(
                 candidate_campaign_we_vote_id=candidate_we_vote_id,
             ).update(
@@ -4455,6 +4804,13 @@ class PositionListManager(models.Manager):
                 politician_we_vote_id=new_politician_we_vote_id,
             )
 
+        if positive_value_exists(number_changed):
+            for is_public_position in (True, False):
+                PositionTallyManager.refresh_position_tallies(
+                    tally_field_name='politician_we_vote_id',
+                    we_vote_id_list=politician_we_vote_id_list_to_refresh,
+                    is_public_position=is_public_position)
+
         results = {
             'success':          success,
             'status':           status,
@@ -9218,3 +9574,53 @@ class PositionMetricsManager(models.Manager):
         total_positions_count = position_entered_count + position_for_friends_count
 
         return total_positions_count
+
+
+def get_position_tally_key(position):
+    # Read from __dict__ so positions loaded with only() or defer() do not query for the missing fields
+    return (position.__dict__.get('stance'),) + \
+        tuple(position.__dict__.get(tally_field_name) for tally_field_name in POSITION_TALLY_FIELD_NAME_LIST)
+
+
+POSITION_TALLY_KEY_FIELD_NAME_SET = {'stance'} | set(POSITION_TALLY_FIELD_NAME_LIST)
+
+
+@receiver(pre_save, sender=PositionEntered)
+@receiver(pre_save, sender=PositionForFriends)
+def remember_position_tally_key_before_save(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # Read from the database on save, rather than remembering it for every position loaded
+    instance.position_tally_key_before_save = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not POSITION_TALLY_KEY_FIELD_NAME_SET.intersection(update_fields):
+        return
+    instance.position_tally_key_before_save = sender.objects.using(using).filter(pk=instance.pk)\
+        .values_list('stance', *POSITION_TALLY_FIELD_NAME_LIST).first()
+
+
+@receiver(post_save, sender=PositionEntered)
+@receiver(post_save, sender=PositionForFriends)
+def update_position_tallies_after_position_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    is_public_position = sender is PositionEntered
+    position_tally_key = get_position_tally_key(instance)
+    if created:
+        PositionTallyManager.update_position_tallies_for_one_position(
+            position_tally_key=position_tally_key, is_public_position=is_public_position, change=1)
+        return
+    position_tally_key_before_save = getattr(instance, 'position_tally_key_before_save', None)
+    if position_tally_key_before_save is not None and position_tally_key_before_save != position_tally_key:
+        PositionTallyManager.update_position_tallies_for_one_position(
+            position_tally_key=position_tally_key_before_save, is_public_position=is_public_position, change=-1)
+        PositionTallyManager.update_position_tallies_for_one_position(
+            position_tally_key=position_tally_key, is_public_position=is_public_position, change=1)
+
+
+@receiver(post_delete, sender=PositionEntered)
+@receiver(post_delete, sender=PositionForFriends)
+def update_position_tallies_after_position_delete(sender, instance, **kwargs):
+    PositionTallyManager.update_position_tallies_for_one_position(
+        position_tally_key=get_position_tally_key(instance),
+        is_public_position=sender is PositionEntered,
+        change=-1)
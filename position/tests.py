@@ -0,0 +1,100 @@
+# position/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import TransactionTestCase
+
+from organization.models import Organization
+from position.models import OPPOSE, SUPPORT, PositionEntered, PositionListManager, PositionTally, \
+    PositionTallyManager, position_tally_missing_cache
+from voter.models import Voter
+
+
+def generate_position(number, stance=SUPPORT, **kwargs):
+    position_values = {
+        'we_vote_id':                       'wv01pos' + str(number),
+        'stance':                           stance,
+        'candidate_campaign_we_vote_id':    'wv01cand1',
+        'organization_we_vote_id':          'wv01org1',
+    }
+    position_values.update(kwargs)
+    return PositionEntered(**position_values)
+
+
+def retrieve_position_tally_counts(tally_we_vote_id):
+    return PositionTally.objects.filter(tally_we_vote_id=tally_we_vote_id, is_public_position=True)\
+        .values('any_stance_count', 'support_count', 'oppose_count').first()
+
+
+class PositionTallyTestCase(TransactionTestCase):
+    # Tallies are read with using('readonly'), so the rows need to be committed to be visible there
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        position_tally_missing_cache.clear()
+
+    def test_tallies_follow_position_changes(self):
+        position = generate_position(1)
+        position.save()
+        self.assertEqual(retrieve_position_tally_counts('wv01cand1'),
+                         {'any_stance_count': 1, 'support_count': 1, 'oppose_count': 0})
+        self.assertEqual(retrieve_position_tally_counts('wv01org1')['any_stance_count'], 1)
+
+        position.stance = OPPOSE
+        position.save()
+        self.assertEqual(retrieve_position_tally_counts('wv01cand1'),
+                         {'any_stance_count': 1, 'support_count': 0, 'oppose_count': 1})
+
+        # Saving other fields doesn't look up what the position was tallied under
+        position.statement_text = "Still opposed"
+        with self.assertNumQueries(1):
+            position.save(update_fields=['statement_text'])
+
+        # A position loaded again (with no record of how it was loaded) is moved from its old tallies on save
+        position = PositionEntered.objects.get(id=position.id)
+        position.candidate_campaign_we_vote_id = 'wv01cand2'
+        position.save()
+        self.assertEqual(retrieve_position_tally_counts('wv01cand1')['any_stance_count'], 0)
+        self.assertEqual(retrieve_position_tally_counts('wv01cand2'),
+                         {'any_stance_count': 1, 'support_count': 0, 'oppose_count': 1})
+
+        position.delete()
+        self.assertEqual(retrieve_position_tally_counts('wv01cand2'),
+                         {'any_stance_count': 0, 'support_count': 0, 'oppose_count': 0})
+
+    def test_decrement_clamps_each_count(self):
+        # Out of step: the support position was never counted as support
+        PositionTally.objects.create(tally_we_vote_id='wv01cand1', any_stance_count=2, support_count=0)
+        PositionTallyManager.update_position_tallies_for_one_position(
+            position_tally_key=(SUPPORT, 'wv01cand1', None, None, None), is_public_position=True, change=-1)
+        self.assertEqual(retrieve_position_tally_counts('wv01cand1'),
+                         {'any_stance_count': 1, 'support_count': 0, 'oppose_count': 0})
+
+    def test_missing_tally_is_counted_and_cached(self):
+        # bulk_create skips the signals, so there are no tallies yet
+        PositionEntered.objects.bulk_create([generate_position(1), generate_position(2, stance=OPPOSE)])
+        self.assertEqual(PositionTallyManager.fetch_position_tally_count(
+            tally_field_name='candidate_campaign_we_vote_id', we_vote_id_list=['wv01cand1', 'wv01cand9']), 2)
+        self.assertEqual(PositionTallyManager.fetch_position_tally_count(
+            tally_field_name='candidate_campaign_we_vote_id', we_vote_id_list=['wv01cand1'],
+            stance_we_are_looking_for=OPPOSE), 1)
+        # Reads don't write
+        self.assertFalse(PositionTally.objects.exists())
+
+        # Counted again only after the cache expires, including the candidate with no positions
+        with self.assertNumQueries(1, using='readonly'):
+            self.assertEqual(PositionTallyManager.fetch_position_tally_count(
+                tally_field_name='candidate_campaign_we_vote_id', we_vote_id_list=['wv01cand1', 'wv01cand9']), 2)
+
+    def test_repair_all_positions_for_voter_moves_organization_tallies(self):
+        Organization.objects.create(we_vote_id='wv01org2', organization_name="Voter's Organization")
+        voter = Voter.objects.create(we_vote_id='wv01voter1', linked_organization_we_vote_id='wv01org2')
+        generate_position(1, voter_id=voter.id).save()
+        self.assertEqual(retrieve_position_tally_counts('wv01org1')['any_stance_count'], 1)
+
+        results = PositionListManager.repair_all_positions_for_voter(incoming_voter_id=voter.id)
+        self.assertTrue(results['success'])
+        self.assertEqual(PositionEntered.objects.get().organization_we_vote_id, 'wv01org2')
+        self.assertEqual(retrieve_position_tally_counts('wv01org1')['any_stance_count'], 0)
+        self.assertEqual(retrieve_position_tally_counts('wv01org2'),
+                         {'any_stance_count': 1, 'support_count': 1, 'oppose_count': 0})
@@ -2,9 +2,12 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import csv
+import io
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import numpy as np
@@ -12,13 +15,15 @@ import pandas as pd
 import psycopg2
 import requests
 import sqlalchemy as sa
+from django.db import connection, transaction
 from django.http import HttpResponse
 from sqlalchemy.engine.reflection import Inspector
 
 import wevote_functions.admin
 from config.base import get_environment_variable
-from retrieve_tables.controllers_master import allowable_tables
-from wevote_functions.functions import get_voter_api_device_id
+from retrieve_tables.controllers_master import FAST_LOAD_STREAM_CHUNK_SIZE, allowable_tables
+from retrieve_tables.models import RetrieveTableState
+from wevote_functions.functions import get_voter_api_device_id, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -26,6 +31,9 @@ logger = wevote_functions.admin.get_logger(__name__)
 
 dummy_unique_id = 10000000
 LOCAL_TMP_PATH = '/tmp/'
+FAST_LOAD_MASTER_SERVER_URL = 'https://api.wevoteusa.org'
+FAST_LOAD_STREAM_NUMBER_OF_WORKERS = 4
+FAST_LOAD_STREAM_CHUNK_RETRIES = 5
 
 
 def save_off_database():
@@ -476,3 +484,278 @@ def copy_df_to_postgres(df: pd.DataFrame, conn, table_name):
         finally:
             # Clean up by removing the temporary CSV file
             os.remove(temp_csv_path)
+
+
+def retrieve_sql_files_from_master_server_streaming(request):
+    """
+    Streaming version of retrieve_sql_files_from_master_server: several tables load at once, each chunk is
+    COPYed straight from the master's CSV stream, and an interrupted load picks up where it stopped.
+    Add restart=1 to throw away the checkpoints and load everything again.
+    Runs on the Local server (developer's Mac)
+    :param request:
+    :return:
+    """
+    voter_api_device_id = get_voter_api_device_id(request)
+    restart = positive_value_exists(request.GET.get('restart', False))
+    results = fast_load_tables_from_master_server(voter_api_device_id=voter_api_device_id, restart=restart)
+    results['status_code'] = 200 if results['success'] else 500
+    return HttpResponse(json.dumps(results), content_type='application/json')
+
+
+def fast_load_tables_from_master_server(
+        voter_api_device_id='',
+        table_name_list=None,
+        number_of_workers=FAST_LOAD_STREAM_NUMBER_OF_WORKERS,
+        chunk_size=FAST_LOAD_STREAM_CHUNK_SIZE,
+        restart=False,
+        host=FAST_LOAD_MASTER_SERVER_URL):
+    """
+    Load the allowable_tables from the master server with the retrieveSQLTablesStream api.
+    Runs on the Local server
+    :param voter_api_device_id: identifies the RetrieveTableState row holding the checkpoints (and the progress bar)
+    :param table_name_list: defaults to all allowable_tables
+    :param number_of_workers: tables loading at the same time
+    :param chunk_size:
+    :param restart:
+    :param host:
+    :return:
+    """
+    t0 = time.time()
+    status = ''
+    success = True
+    table_name_list = [table_name for table_name in (table_name_list or allowable_tables)
+                       if table_name in allowable_tables]
+
+    state, created = RetrieveTableState.objects.get_or_create(voter_api_device_id=voter_api_device_id)
+    table_checkpoints = {} if restart else json.loads(state.table_checkpoints_json or '{}')
+
+    # Tables without a checkpoint start from scratch. They are truncated together, up front, along with every table
+    # that references them: a synced table among those has to be loaded again, even if its checkpoint says complete
+    table_name_list_to_truncate = [table_name for table_name in table_name_list if table_name not in table_checkpoints]
+    if table_name_list_to_truncate:
+        with transaction.atomic():
+            table_name_list_to_truncate = retrieve_table_names_referencing(table_name_list_to_truncate)
+            with connection.cursor() as cursor:
+                cursor.execute("TRUNCATE " + ", ".join(table_name_list_to_truncate) + " RESTART IDENTITY")
+            for table_name in table_name_list_to_truncate:
+                if table_name in allowable_tables:
+                    table_checkpoints[table_name] = {'last_id': 0, 'rows_loaded': 0, 'complete': False}
+                    if table_name not in table_name_list:
+                        table_name_list.append(table_name)
+            state.table_checkpoints_json = json.dumps(table_checkpoints)
+            state.save()
+    table_name_list_to_load = [table_name for table_name in table_name_list
+                               if not table_checkpoints[table_name]['complete']]
+    status += "FAST_LOAD_TABLES_TRUNCATED: " + str(len(table_name_list_to_truncate)) + " "
+    status += "FAST_LOAD_TABLES_TO_LOAD: " + str(len(table_name_list_to_load)) + " "
+
+    try:
+        requests.get(host + '/apis/v1/fastLoadStatusRetrieve',
+                     params={"initialize": True, "voter_api_device_id": voter_api_device_id}, verify=True)
+    except Exception as e:
+        logger.error('fast_load_tables_from_master_server could not initialize the progress bar: ' + str(e))
+
+    table_results_list = []
+    with ThreadPoolExecutor(max_workers=number_of_workers) as executor:
+        future_list = [executor.submit(fast_load_one_table_from_master_server, host, voter_api_device_id,
+                                       table_name, chunk_size)
+                       for table_name in table_name_list_to_load]
+        for future in future_list:
+            table_results = future.result()
+            table_results_list.append(table_results)
+            if not table_results['success']:
+                success = False
+                status += table_results['status']
+
+    minutes = (time.time() - t0) / 60
+    print(f"Total time for all tables: {minutes:.1f} minutes")
+    status += "FAST_LOAD_TABLES_COMPLETE " if success else "FAST_LOAD_TABLES_INCOMPLETE_RUN_AGAIN_TO_RESUME "
+    results = {
+        'success':              success,
+        'status':               status,
+        'table_results_list':   table_results_list,
+        'minutes':              round(minutes, 1),
+    }
+    return results
+
+
+def retrieve_table_names_referencing(table_name_list):
+    """
+    table_name_list, plus every table with a foreign key to one of them, directly or through other tables. Those are
+    the tables TRUNCATE ... CASCADE would empty.
+    :param table_name_list:
+    :return:
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH RECURSIVE referencing_table (table_oid) AS ("
+            "  SELECT unnest(%s::text[])::regclass::oid"
+            "  UNION"
+            "  SELECT pg_constraint.conrelid FROM pg_constraint"
+            "  JOIN referencing_table ON pg_constraint.confrelid = referencing_table.table_oid"
+            "  WHERE pg_constraint.contype = 'f'"
+            ") SELECT table_oid::regclass::text FROM referencing_table",
+            [list(table_name_list)])
+        referencing_table_name_list = [row[0] for row in cursor.fetchall()]
+    return list(table_name_list) + sorted(set(referencing_table_name_list) - set(table_name_list))
+
+
+def fast_load_one_table_from_master_server(host, voter_api_device_id, table_name, chunk_size):
+    """
+    Keep asking for the chunk after the last checkpoint until the master has no more rows. Runs in a worker thread,
+    with its own database connection.
+    :return:
+    """
+    status = ''
+    success = True
+    table_start_time = time.time()
+    rows_loaded_now = 0
+    session = requests.Session()
+    try:
+        checkpoint = json.loads(RetrieveTableState.objects.get(
+            voter_api_device_id=voter_api_device_id).table_checkpoints_json)[table_name]
+        while True:
+            chunk_results = fast_load_one_chunk_from_master_server(
+                session, host, voter_api_device_id, table_name, checkpoint['last_id'], chunk_size)
+            if not chunk_results['success']:
+                success = False
+                status += chunk_results['status']
+                break
+            if not chunk_results['row_count']:
+                break
+            checkpoint = chunk_results['checkpoint']
+            rows_loaded_now += chunk_results['row_count']
+            update_fast_load_db(host, voter_api_device_id, table_name, chunk_results['row_count'])
+            print(f"{table_name}: {checkpoint['rows_loaded']} rows, through id {checkpoint['last_id']}")
+
+        if success:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 1), MAX(id) "
+                               "IS NOT NULL) FROM " + table_name, [table_name])
+            save_fast_load_checkpoint(voter_api_device_id, table_name, dict(checkpoint, complete=True))
+            print(f'Table {table_name} took {((time.time() - table_start_time) / 60):.1f} min\n')
+    except Exception as e:
+        success = False
+        status += "FAST_LOAD_TABLE_FAILED " + table_name + ": " + str(e) + " "
+        logger.error("fast_load_one_table_from_master_server " + table_name + ": " + str(e))
+    finally:
+        session.close()
+        connection.close()
+
+    results = {
+        'success':          success,
+        'status':           status,
+        'table_name':       table_name,
+        'rows_loaded_now':  rows_loaded_now,
+        'seconds':          round(time.time() - table_start_time, 1),
+    }
+    return results
+
+
+def fast_load_one_chunk_from_master_server(session, host, voter_api_device_id, table_name, after_id, chunk_size):
+    """
+    Stream one chunk into the table and move the checkpoint forward, in one transaction. A failure part way
+    through rolls both back, so the chunk is simply asked for again.
+    """
+    status = ''
+    for attempt in range(FAST_LOAD_STREAM_CHUNK_RETRIES):
+        try:
+            with session.get(host + '/apis/v1/retrieveSQLTablesStream/',
+                             params={'table_name': table_name, 'after_id': after_id, 'chunk_size': chunk_size},
+                             stream=True, verify=True, timeout=(10, 300)) as response:
+                if response.status_code != 200:
+                    raise Exception("retrieveSQLTablesStream returned " + str(response.status_code) + " " +
+                                    response.text[:200])
+                row_count = int(response.headers['X-Row-Count'])
+                if not row_count:
+                    return {
+                        'success':      True,
+                        'status':       status,
+                        'row_count':    0,
+                        'checkpoint':   None,
+                    }
+                response.raw.decode_content = True
+                with transaction.atomic():
+                    copy_csv_stream_into_table(table_name, io.BufferedReader(response.raw, buffer_size=65536))
+                    checkpoint = json.loads(RetrieveTableState.objects.select_for_update().get(
+                        voter_api_device_id=voter_api_device_id).table_checkpoints_json)[table_name]
+                    checkpoint = {
+                        'last_id':      int(response.headers['X-Last-Id']),
+                        'rows_loaded':  checkpoint['rows_loaded'] + row_count,
+                        'complete':     False,
+                    }
+                    save_fast_load_checkpoint(voter_api_device_id, table_name, checkpoint)
+            return {
+                'success':      True,
+                'status':       status,
+                'row_count':    row_count,
+                'checkpoint':   checkpoint,
+            }
+        except Exception as e:
+            status += "FAST_LOAD_CHUNK_ATTEMPT_" + str(attempt + 1) + "_FAILED " + table_name + ": " + str(e) + " "
+            logger.error("fast_load_one_chunk_from_master_server " + table_name + " after id " + str(after_id) +
+                         ": " + str(e))
+            time.sleep(2 ** attempt)
+    return {
+        'success':      False,
+        'status':       status,
+        'row_count':    0,
+        'checkpoint':   None,
+    }
+
+
+def save_fast_load_checkpoint(voter_api_device_id, table_name, checkpoint):
+    with transaction.atomic():
+        state = RetrieveTableState.objects.select_for_update().get(voter_api_device_id=voter_api_device_id)
+        table_checkpoints = json.loads(state.table_checkpoints_json or '{}')
+        table_checkpoints[table_name] = checkpoint
+        state.table_checkpoints_json = json.dumps(table_checkpoints)
+        state.save(update_fields=['table_checkpoints_json'])
+
+
+def copy_csv_stream_into_table(table_name, csv_stream):
+    """
+    COPY the master's CSV into a text-only staging table, then INSERT ... SELECT into the real table by column name.
+    That way column order doesn't have to match, columns the local schema doesn't have yet are dropped, and foreign
+    keys to tables we don't sync (like voter) are set to NULL instead of failing the chunk.
+    :param table_name:
+    :param csv_stream: binary file-like, starting with the CSV header line
+    :return:
+    """
+    quote_name = connection.ops.quote_name
+    master_column_name_list = next(csv.reader([csv_stream.readline().decode('utf-8')]))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT attname, format_type(atttypid, atttypmod), attnotnull FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped", [table_name])
+        local_column_type_by_name = {name: (column_type, not_null) for name, column_type, not_null in cursor.fetchall()}
+        cursor.execute(
+            "SELECT a.attname, c.confrelid::regclass::text FROM pg_constraint c "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey) "
+            "WHERE c.contype = 'f' AND c.conrelid = %s::regclass", [table_name])
+        unsynced_foreign_key_column_set = {
+            column_name for column_name, referenced_table_name in cursor.fetchall()
+            if referenced_table_name not in allowable_tables}
+
+        staging_table_name = quote_name('fast_load_staging_' + table_name)
+        cursor.execute(
+            "CREATE TEMPORARY TABLE " + staging_table_name + " (" +
+            ", ".join(quote_name(column_name) + " text" for column_name in master_column_name_list) +
+            ") ON COMMIT DROP")
+        cursor.copy_expert("COPY " + staging_table_name + " FROM STDIN WITH (FORMAT csv)", csv_stream, size=65536)
+
+        insert_column_list = []
+        select_expression_list = []
+        for column_name in master_column_name_list:
+            if column_name not in local_column_type_by_name:
+                continue
+            column_type, not_null = local_column_type_by_name[column_name]
+            insert_column_list.append(quote_name(column_name))
+            if column_name in unsynced_foreign_key_column_set and not not_null:
+                select_expression_list.append("NULL")
+            else:
+                select_expression_list.append(quote_name(column_name) + "::" + column_type)
+        cursor.execute(
+            "INSERT INTO " + quote_name(table_name) + " (" + ", ".join(insert_column_list) + ") SELECT " +
+            ", ".join(select_expression_list) + " FROM " + staging_table_name)
+
@@ -3,8 +3,11 @@
 # -*- coding: UTF-8 -*-
 
 import json
+import queue
 import re
+import threading
 import time
+import zlib
 from datetime import datetime, timezone
 from io import StringIO
 
@@ -62,6 +65,20 @@ allowable_tables = [
 
 dummy_unique_id = 10000000
 LOCAL_TMP_PATH = '/tmp/'
+# Streaming mode (retrieveSQLTablesStream): rows per chunk, and how many compressed blocks may wait to be sent
+FAST_LOAD_STREAM_CHUNK_SIZE = 50000
+FAST_LOAD_STREAM_MAXIMUM_CHUNK_SIZE = 200000
+FAST_LOAD_STREAM_QUEUE_SIZE = 32
+
+
+def connect_to_readonly_database():
+    return psycopg2.connect(
+        database=get_environment_variable('DATABASE_NAME_READONLY'),
+        user=get_environment_variable('DATABASE_USER_READONLY'),
+        password=get_environment_variable('DATABASE_PASSWORD_READONLY'),
+        host=get_environment_variable('DATABASE_HOST_READONLY'),
+        port=get_environment_variable('DATABASE_PORT_READONLY')
+    )
 
 
 def get_max_id(table_name):
@@ -211,6 +228,137 @@ def retrieve_sql_tables_as_csv(voter_api_device_id, table_name, start, end):
         return results
 
 
+class GzipQueueWriter(object):
+    """
+    File-like target for copy_expert, running in its own thread: gzips what COPY writes, and hands the blocks to
+    the response generator through a bounded queue, so a chunk is never held in memory whole.
+    """
+
+    def __init__(self):
+        self.block_queue = queue.Queue(maxsize=FAST_LOAD_STREAM_QUEUE_SIZE)
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes the gzip format
+        self.stopped = threading.Event()
+
+    def put(self, block):
+        while not self.stopped.is_set():
+            try:
+                self.block_queue.put(block, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise IOError("GzipQueueWriter stopped, the client went away")
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        compressed_block = self.compressor.compress(data)
+        if compressed_block:
+            self.put(compressed_block)
+
+    def close(self, error=None):
+        if error is None:
+            self.put(self.compressor.flush())
+        self.put(error or StopIteration)
+
+
+def retrieve_sql_table_chunk_as_csv_stream(table_name, after_id=0, chunk_size=FAST_LOAD_STREAM_CHUNK_SIZE):
+    """
+    Streaming mode for the developer fast load. The next chunk_size rows with id > after_id, as gzipped
+    Postgres CSV (quoted, so pipes, commas and newlines inside values survive). Chunks are found by id (keyset),
+    so gaps in the ids don't produce empty or overlapping chunks. The caller asks for the next chunk with
+    after_id=last_id.
+    Runs on the Master server
+    :param table_name:
+    :param after_id:
+    :param chunk_size:
+    :return:
+    """
+    status = ''
+    after_id = convert_to_int(after_id)
+    chunk_size = min(max(convert_to_int(chunk_size), 1), FAST_LOAD_STREAM_MAXIMUM_CHUNK_SIZE)
+    if table_name not in allowable_tables:
+        status += "the table_name '" + str(table_name) + "' is not in the table list "
+        return {
+            'success':      False,
+            'status':       status,
+            'row_count':    0,
+            'last_id':      after_id,
+            'csv_stream':   None,
+        }
+
+    try:
+        conn = connect_to_readonly_database()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*), MAX(id) FROM (SELECT id FROM public." + table_name +
+                " WHERE id > %s ORDER BY id LIMIT %s) AS chunk", (after_id, chunk_size))
+            row_count, last_id = cursor.fetchone()
+    except Exception as e:
+        status += "RETRIEVE_SQL_TABLE_CHUNK_FAILED " + str(e) + " "
+        logger.error("retrieve_sql_table_chunk_as_csv_stream " + table_name + ": " + str(e))
+        return {
+            'success':      False,
+            'status':       status,
+            'row_count':    0,
+            'last_id':      after_id,
+            'csv_stream':   None,
+        }
+
+    if not row_count:
+        conn.close()
+        status += "NO_MORE_ROWS "
+        return {
+            'success':      True,
+            'status':       status,
+            'row_count':    0,
+            'last_id':      after_id,
+            'csv_stream':   iter(()),
+        }
+
+    # Bounded by last_id, so the rows match the count above even if rows are added while we stream
+    sql = conn.cursor().mogrify(
+        "COPY (SELECT * FROM public." + table_name + " WHERE id > %s AND id <= %s ORDER BY id) "
+        "TO STDOUT WITH (FORMAT csv, HEADER true)", (after_id, last_id)).decode('utf-8')
+    gzip_queue_writer = GzipQueueWriter()
+
+    def copy_table_chunk():
+        error = None
+        try:
+            with conn.cursor() as copy_cursor:
+                copy_cursor.copy_expert(sql, gzip_queue_writer, size=65536)
+        except Exception as copy_error:
+            error = copy_error
+            logger.error("retrieve_sql_table_chunk_as_csv_stream COPY " + table_name + ": " + str(copy_error))
+        finally:
+            conn.close()
+        try:
+            gzip_queue_writer.close(error)
+        except IOError:
+            pass
+
+    def generate_csv_stream():
+        threading.Thread(target=copy_table_chunk, daemon=True).start()
+        try:
+            while True:
+                block = gzip_queue_writer.block_queue.get()
+                if block is StopIteration:
+                    return
+                if isinstance(block, Exception):
+                    raise block
+                yield block
+        finally:
+            gzip_queue_writer.stopped.set()
+
+    status += "STREAMING " + table_name + " "
+    return {
+        'success':      True,
+        'status':       status,
+        'row_count':    row_count,
+        'last_id':      last_id,
+        'csv_stream':   generate_csv_stream(),
+    }
+
+
 def dump_row_col_labels_and_errors(table_name, header, row, index):
     if row[0] == index:
         cnt = 0
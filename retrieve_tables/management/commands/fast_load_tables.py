@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from retrieve_tables.controllers_local import FAST_LOAD_MASTER_SERVER_URL, FAST_LOAD_STREAM_NUMBER_OF_WORKERS, \
+    fast_load_tables_from_master_server
+from retrieve_tables.controllers_master import FAST_LOAD_STREAM_CHUNK_SIZE
+
+# Loads the synced tables from the master server into your local database, several tables at a time:
+#      python manage.py fast_load_tables
+# If it is interrupted, run it again and it carries on from the last chunk each table saved. To start over:
+#      python manage.py fast_load_tables --restart
+
+
+class Command(BaseCommand):
+    help = 'Stream the allowable_tables from the master server into the local database, resuming where it stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=FAST_LOAD_STREAM_NUMBER_OF_WORKERS)
+        parser.add_argument('--chunk-size', type=int, default=FAST_LOAD_STREAM_CHUNK_SIZE)
+        parser.add_argument('--table', action='append', dest='table_name_list',
+                            help='Only load this table, for example --table politician_politician')
+        parser.add_argument('--restart', action='store_true', help='Forget the checkpoints and load everything again')
+        parser.add_argument('--host', default=FAST_LOAD_MASTER_SERVER_URL)
+        parser.add_argument('--voter-api-device-id', default='fast_load_tables_command',
+                            help='Names the RetrieveTableState row that keeps the checkpoints')
+
+    def handle(self, *args, **options):
+        results = fast_load_tables_from_master_server(
+            voter_api_device_id=options['voter_api_device_id'],
+            table_name_list=options['table_name_list'],
+            number_of_workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+            host=options['host'])
+        for table_results in results['table_results_list']:
+            self.stdout.write(table_results['table_name'] + ": " + str(table_results['rows_loaded_now']) +
+                              " rows in " + str(table_results['seconds']) + " seconds")
+        if results['success']:
+            self.stdout.write(results['status'])
+        else:
+            self.stderr.write(results['status'])
@@ -15,3 +15,6 @@ class RetrieveTableState(models.Model):
     total_records = models.PositiveIntegerField(verbose_name="Total records to be exported", default=0)
     voter_api_device_id = models.CharField(verbose_name='voter_api_device_id', max_length=255, null=True, unique=True,
                                            db_index=True)
+    # Streaming fast load, on the local server: {table_name: {"last_id": int, "rows_loaded": int, "complete": bool}}
+    # written in the same transaction as each chunk, so an interrupted load resumes after the last loaded chunk
+    table_checkpoints_json = models.TextField(null=True, blank=True, default=None)
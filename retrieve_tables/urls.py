@@ -4,11 +4,14 @@
 
 from django.urls import re_path
 
-from retrieve_tables.controllers_local import retrieve_sql_files_from_master_server
+from retrieve_tables.controllers_local import retrieve_sql_files_from_master_server, \
+    retrieve_sql_files_from_master_server_streaming
 from retrieve_tables.controllers_master import fast_load_status_retrieve
 
 urlpatterns = [
     # views_admin
     re_path(r'^import/status/$', fast_load_status_retrieve, name='fast_load_status_retrieve'),
     re_path(r'^import/files/$', retrieve_sql_files_from_master_server, name='retrieve_sql_files_from_master_server'),
+    re_path(r'^import/stream/$', retrieve_sql_files_from_master_server_streaming,
+            name='retrieve_sql_files_from_master_server_streaming'),
 ]
@@ -7,6 +7,7 @@ from config.base import get_environment_variable
 from elasticsearch import Elasticsearch
 from organization.models import OrganizationManager
 from politician.models import PoliticianManager
+from search.models import KIND_OF_OWNER_BY_SEARCH_SCOPE, fetch_search_name_index
 from voter.models import fetch_voter_id_from_voter_device_link
 import wevote_functions.admin
 from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
@@ -15,9 +16,49 @@ logger = wevote_functions.admin.get_logger(__name__)
 ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
 
 
-def search_all_for_api(text_from_search_field='', voter_device_id='', search_scope_list=[]):
+def search_politicians_in_database(text_from_search_field=''):
+    """
+    The politician search searchAll ran before the SearchNameIndex, for while this process's index is being built
+    :param text_from_search_field:
+    :return:
     """
+    status = ""
+    search_results = []
+    results = PoliticianManager().search_politicians(name_search_terms=text_from_search_field)
+    if not positive_value_exists(results['success']):
+        status += results['status']
+    for one_politician in results['politician_search_results_list']:
+        one_search_result = {
+            'result_title':             one_politician.display_full_name(),
+            'result_image':             one_politician.we_vote_hosted_profile_image_url_medium,
+            'result_subtitle':          "",
+            'result_summary':           "",
+            'result_score':             0,
+            'link_internal':            '',
+            'kind_of_owner':            "POLITICIAN",
+            'google_civic_election_id': 0,
+            'state_code':               one_politician.state_code,
+            'twitter_handle':           one_politician.politician_twitter_handle,
+            'twitter_handle2':          one_politician.politician_twitter_handle2,
+            'twitter_handle3':          one_politician.politician_twitter_handle3,
+            'twitter_handle4':          one_politician.politician_twitter_handle4,
+            'twitter_handle5':          one_politician.politician_twitter_handle5,
+            'we_vote_id':               one_politician.we_vote_id,
+            'local_id':                 one_politician.id,
+        }
+        search_results.append(one_search_result)
+    results = {
+        'status':           status,
+        'search_results':   search_results,
+    }
+    return results
 
+
+def search_all_for_api(text_from_search_field='', voter_device_id='', search_scope_list=[]):
+    """
+    Ranked name and twitter handle search over politicians, candidates, offices and organizations,
+    answered from the in-memory SearchNameIndex. Until this process has built its index, politicians are
+    searched in the database instead.
     :param text_from_search_field:
     :param voter_device_id:
     :param search_scope_list:
@@ -59,38 +100,47 @@ def search_all_for_api(text_from_search_field='', voter_device_id='', search_sco
         }
         return results
 
-    # Example of querying ALL indexes
     search_results = []
     search_count = 0
     status = ""
-    politician_manager = PoliticianManager()
+    kind_of_owner_list = [KIND_OF_OWNER_BY_SEARCH_SCOPE[search_scope] for search_scope in search_scope_list
+                          if search_scope in KIND_OF_OWNER_BY_SEARCH_SCOPE]
+    if positive_value_exists(len(search_scope_list)) and not positive_value_exists(len(kind_of_owner_list)):
+        status += "SEARCH_SCOPE_LIST_NOT_RECOGNIZED "
     try:
-        results = politician_manager.search_politicians(name_search_terms=text_from_search_field)
-        politician_search_results_list = results['politician_search_results_list']
-        success = results['success']
-        if not positive_value_exists(success):
-            status += results['status']
-        for one_politician in politician_search_results_list:
-            # link_internal = "/office/" + one_search_result_dict['we_vote_id']
-            link_internal = ''
-
+        search_name_index = fetch_search_name_index()
+        if search_name_index is None:
+            # The first build in this process is still running
+            status += "SEARCH_NAME_INDEX_BUILDING "
+            search_result_list = []
+            if not positive_value_exists(len(kind_of_owner_list)) or 'POLITICIAN' in kind_of_owner_list:
+                results = search_politicians_in_database(text_from_search_field=text_from_search_field)
+                status += results['status']
+                search_results = results['search_results']
+                search_count = len(search_results)
+        else:
+            search_result_list = search_name_index.search(
+                text_from_search_field=text_from_search_field,
+                kind_of_owner_list=kind_of_owner_list)
+        for result_score, document in search_result_list:
+            twitter_handle_list = list(document.twitter_handle_list) + [''] * 5
             one_search_result = {
-                'result_title':             one_politician.display_full_name(),
-                'result_image':             one_politician.we_vote_hosted_profile_image_url_medium,
+                'result_title':             document.result_title,
+                'result_image':             document.result_image,
                 'result_subtitle':          "",
                 'result_summary':           "",
-                'result_score':             0,
-                'link_internal':            link_internal,
-                'kind_of_owner':            "POLITICIAN",
-                'google_civic_election_id': 0,
-                'state_code':               one_politician.state_code,
-                'twitter_handle':           one_politician.politician_twitter_handle,
-                'twitter_handle2':          one_politician.politician_twitter_handle2,
-                'twitter_handle3':          one_politician.politician_twitter_handle3,
-                'twitter_handle4':          one_politician.politician_twitter_handle4,
-                'twitter_handle5':          one_politician.politician_twitter_handle5,
-                'we_vote_id':               one_politician.we_vote_id,
-                'local_id':                 one_politician.id,
+                'result_score':             result_score,
+                'link_internal':            document.link_internal,
+                'kind_of_owner':            document.kind_of_owner,
+                'google_civic_election_id': document.google_civic_election_id,
+                'state_code':               document.state_code,
+                'twitter_handle':           twitter_handle_list[0],
+                'twitter_handle2':          twitter_handle_list[1],
+                'twitter_handle3':          twitter_handle_list[2],
+                'twitter_handle4':          twitter_handle_list[3],
+                'twitter_handle5':          twitter_handle_list[4],
+                'we_vote_id':               document.we_vote_id,
+                'local_id':                 document.local_id,
             }
             search_results.append(one_search_result)
             search_count += 1
@@ -99,7 +149,7 @@ def search_all_for_api(text_from_search_field='', voter_device_id='', search_sco
         success = True
 
     except Exception as e:
-        status = 'POLITICIAN_SEARCH: ' + str(e) + " "
+        status += 'SEARCH_NAME_INDEX: ' + str(e) + " "
         success = False
 
     results = {
@@ -2,18 +2,30 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import bisect
+from collections import Counter, namedtuple
+from datetime import datetime
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
 from ballot.models import BallotReturnedManager
-from config.base import get_environment_variable
+from config.base import get_environment_variable, get_environment_variable_default
 from candidate.models import CandidateCampaign
+from django.db import connections
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from elasticsearch import Elasticsearch
-from election.models import Election
+from election.models import Election, fetch_election_catalog
 from measure.models import ContestMeasure
 from office.models import ContestOffice
-from organization.models import Organization
+from organization.models import INDIVIDUAL, Organization
+from politician.models import Politician
 import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions_date import convert_date_to_date_as_integer
 
 logger = wevote_functions.admin.get_logger(__name__)
 STATE_CODE_MAP = {
@@ -86,6 +98,454 @@ def convert_state_code_to_state_text(incoming_state_code):
     else:
         return ""
 
+
+# search_scope_list options for searchAll. No scope means all of them.
+SEARCH_SCOPE_CANDIDATE_NAME = 'CN'
+SEARCH_SCOPE_OFFICE_NAME = 'OFN'
+SEARCH_SCOPE_ORGANIZATION_NAME = 'ON'
+SEARCH_SCOPE_POLITICIAN_NAME = 'PN'
+KIND_OF_OWNER_BY_SEARCH_SCOPE = {
+    SEARCH_SCOPE_CANDIDATE_NAME:        'CANDIDATE',
+    SEARCH_SCOPE_OFFICE_NAME:           'OFFICE',
+    SEARCH_SCOPE_ORGANIZATION_NAME:     'ORGANIZATION',
+    SEARCH_SCOPE_POLITICIAN_NAME:       'POLITICIAN',
+}
+
+# The name index is built once per process on a background thread, kept current by the save/delete signals below,
+# and rebuilt from the database after SEARCH_NAME_INDEX_MAX_AGE_SECONDS to pick up changes made in other processes.
+SEARCH_NAME_INDEX_MAX_AGE_SECONDS = \
+    int(get_environment_variable_default('SEARCH_NAME_INDEX_MAX_AGE_SECONDS', 60 * 60))
+SEARCH_NAME_INDEX_BUILD_RETRY_SECONDS = 60
+SEARCH_NAME_INDEX_MAX_RESULTS = 50
+# How much one search word adds to a result's score, by how it matched one of the result's tokens
+SEARCH_WORD_EXACT_SCORE = 4.0
+SEARCH_WORD_PREFIX_SCORE = 3.0
+SEARCH_WORD_SUBSTRING_SCORE = 2.0
+SEARCH_WORD_SIMILAR_SCORE = 1.0
+# Share of trigrams two tokens need in common to count as a misspelling of one another
+SEARCH_WORD_SIMILARITY_THRESHOLD = 0.4
+
+SearchNameIndexDocument = namedtuple('SearchNameIndexDocument', [
+    'kind_of_owner', 'local_id', 'we_vote_id', 'result_title', 'result_image', 'link_internal',
+    'google_civic_election_id', 'state_code', 'twitter_handle_list', 'token_tuple'])
+
+
+def convert_to_search_tokens(text):
+    """
+    Lower case words without accents or punctuation: "José O'Neil" -> ['jose', 'o', 'neil']
+    """
+    if not positive_value_exists(text):
+        return []
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def convert_twitter_handle_to_search_tokens(twitter_handle):
+    """
+    The whole handle, plus its parts, so "@Joe_Biden" is found with "joebiden", "joe" or "biden"
+    """
+    token_list = convert_to_search_tokens(twitter_handle)
+    if len(token_list) > 1:
+        token_list.append(''.join(token_list))
+    return token_list
+
+
+def convert_search_token_to_trigrams(token):
+    """
+    Padded like Postgres pg_trgm, so short words and first letters count: "kamla" -> {"  k", " ka", "kam", ... "la "}
+    """
+    padded_token = "  " + token + " "
+    return {padded_token[index:index + 3] for index in range(len(padded_token) - 2)}
+
+
+def generate_politician_search_document(politician_dict):
+    if politician_dict['politician_name']:
+        result_title = politician_dict['politician_name']
+    elif politician_dict['first_name'] and politician_dict['last_name']:
+        result_title = politician_dict['first_name'] + " " + politician_dict['last_name']
+    elif politician_dict['google_civic_candidate_name']:
+        result_title = politician_dict['google_civic_candidate_name']
+    else:
+        result_title = (politician_dict['first_name'] or '') + " " + (politician_dict['last_name'] or '')
+    twitter_handle_list = [politician_dict['politician_twitter_handle' + suffix]
+                           for suffix in ('', '2', '3', '4', '5')]
+    return generate_search_document(
+        kind_of_owner='POLITICIAN',
+        local_id=politician_dict['id'],
+        we_vote_id=politician_dict['we_vote_id'],
+        result_title=result_title,
+        result_image=politician_dict['we_vote_hosted_profile_image_url_medium'],
+        link_internal='',
+        state_code=politician_dict['state_code'],
+        twitter_handle_list=twitter_handle_list)
+
+
+def generate_candidate_search_document(candidate_dict):
+    if positive_value_exists(candidate_dict['candidate_twitter_handle']):
+        link_internal = "/" + candidate_dict['candidate_twitter_handle']
+    else:
+        link_internal = "/candidate/" + candidate_dict['we_vote_id']
+    twitter_handle_list = [candidate_dict['candidate_twitter_handle' + suffix] for suffix in ('', '2', '3')]
+    return generate_search_document(
+        kind_of_owner='CANDIDATE',
+        local_id=candidate_dict['id'],
+        we_vote_id=candidate_dict['we_vote_id'],
+        result_title=candidate_dict['candidate_name'],
+        result_image=candidate_dict['we_vote_hosted_profile_image_url_medium'],
+        link_internal=link_internal,
+        google_civic_election_id=candidate_dict['google_civic_election_id'],
+        state_code=candidate_dict['state_code'],
+        twitter_handle_list=twitter_handle_list)
+
+
+def generate_office_search_document(office_dict):
+    return generate_search_document(
+        kind_of_owner='OFFICE',
+        local_id=office_dict['id'],
+        we_vote_id=office_dict['we_vote_id'],
+        result_title=office_dict['office_name'],
+        link_internal="/office/" + office_dict['we_vote_id'],
+        google_civic_election_id=office_dict['google_civic_election_id'],
+        state_code=office_dict['state_code'])
+
+
+def generate_organization_search_document(organization_dict):
+    if positive_value_exists(organization_dict['organization_twitter_handle']):
+        link_internal = "/" + organization_dict['organization_twitter_handle']
+    else:
+        link_internal = "/voterguide/" + organization_dict['we_vote_id']
+    return generate_search_document(
+        kind_of_owner='ORGANIZATION',
+        local_id=organization_dict['id'],
+        we_vote_id=organization_dict['we_vote_id'],
+        result_title=organization_dict['organization_name'],
+        result_image=organization_dict['we_vote_hosted_profile_image_url_medium'],
+        link_internal=link_internal,
+        state_code=organization_dict['state_served_code'],
+        twitter_handle_list=[organization_dict['organization_twitter_handle']])
+
+
+def generate_search_document(
+        kind_of_owner='',
+        local_id=0,
+        we_vote_id='',
+        result_title='',
+        result_image='',
+        link_internal='',
+        google_civic_election_id=0,
+        state_code='',
+        twitter_handle_list=None):
+    twitter_handle_list = [twitter_handle for twitter_handle in twitter_handle_list or []
+                           if positive_value_exists(twitter_handle)]
+    token_list = convert_to_search_tokens(result_title)
+    for twitter_handle in twitter_handle_list:
+        token_list += convert_twitter_handle_to_search_tokens(twitter_handle)
+    return SearchNameIndexDocument(
+        kind_of_owner=kind_of_owner,
+        local_id=local_id,
+        we_vote_id=we_vote_id,
+        result_title=result_title or '',
+        result_image=result_image or '',
+        link_internal=link_internal,
+        google_civic_election_id=google_civic_election_id or 0,
+        state_code=state_code or '',
+        twitter_handle_list=tuple(twitter_handle_list),
+        token_tuple=tuple(dict.fromkeys(token_list)))
+
+
+def is_upcoming_candidate(candidate_dict):
+    return positive_value_exists(candidate_dict['candidate_ultimate_election_date']) and \
+        candidate_dict['candidate_ultimate_election_date'] >= convert_date_to_date_as_integer(datetime.now().date())
+
+
+def is_upcoming_office(office_dict):
+    election_list = fetch_election_catalog().retrieve_upcoming_elections(include_test_election=True)
+    return str(office_dict['google_civic_election_id']) in \
+        {str(election.google_civic_election_id) for election in election_list}
+
+
+def is_searchable_organization(organization_dict):
+    return organization_dict['organization_type'] != INDIVIDUAL
+
+
+# Per model: the fields a document is built from, which rows are searchable, and how to build the document.
+# Candidates and offices are limited to upcoming elections, and voters' own organizations are left out.
+SEARCH_NAME_INDEX_SOURCE_BY_MODEL = {
+    CandidateCampaign: (
+        ('id', 'we_vote_id', 'candidate_name', 'candidate_twitter_handle', 'candidate_twitter_handle2',
+         'candidate_twitter_handle3', 'candidate_ultimate_election_date', 'google_civic_election_id', 'state_code',
+         'we_vote_hosted_profile_image_url_medium'),
+        is_upcoming_candidate,
+        generate_candidate_search_document),
+    ContestOffice: (
+        ('id', 'we_vote_id', 'office_name', 'google_civic_election_id', 'state_code'),
+        is_upcoming_office,
+        generate_office_search_document),
+    Organization: (
+        ('id', 'we_vote_id', 'organization_name', 'organization_twitter_handle', 'organization_type',
+         'state_served_code', 'we_vote_hosted_profile_image_url_medium'),
+        is_searchable_organization,
+        generate_organization_search_document),
+    Politician: (
+        ('id', 'we_vote_id', 'politician_name', 'first_name', 'last_name', 'google_civic_candidate_name',
+         'politician_twitter_handle', 'politician_twitter_handle2', 'politician_twitter_handle3',
+         'politician_twitter_handle4', 'politician_twitter_handle5', 'state_code',
+         'we_vote_hosted_profile_image_url_medium'),
+        None,
+        generate_politician_search_document),
+}
+
+
+class SearchNameIndex(object):
+    """
+    In-memory index of politician, candidate, office and organization names and twitter handles.
+    Each search word is matched against the indexed tokens exactly, as a prefix (through the sorted token list),
+    as a substring, or as a likely misspelling (both through the trigram postings). Every word has to match,
+    and the best scoring max_results documents are returned.
+    """
+
+    def __init__(self):
+        self.document_by_key = {}
+        self.key_set_by_token = {}
+        self.sorted_token_list = []
+        self.token_set_by_trigram = {}
+        self.lock = threading.RLock()
+        self.date_built = time.monotonic()
+
+    def add_document(self, document):
+        with self.lock:
+            for token in self.index_document(document):
+                bisect.insort(self.sorted_token_list, token)
+
+    def add_document_list(self, document_iterable):
+        """
+        For building a whole index: the token list is sorted once at the end, rather than kept sorted token by token
+        """
+        with self.lock:
+            for document in document_iterable:
+                self.index_document(document)
+            self.sorted_token_list = sorted(self.key_set_by_token)
+
+    def index_document(self, document):
+        """
+        Everything but keeping sorted_token_list in order. Call with self.lock held.
+        :return: the tokens that are new to the index
+        """
+        key = (document.kind_of_owner, document.local_id)
+        self.remove_document(key)
+        self.document_by_key[key] = document
+        new_token_list = []
+        for token in document.token_tuple:
+            key_set = self.key_set_by_token.get(token)
+            if key_set is None:
+                key_set = self.key_set_by_token[token] = set()
+                new_token_list.append(token)
+                for trigram in convert_search_token_to_trigrams(token):
+                    self.token_set_by_trigram.setdefault(trigram, set()).add(token)
+            key_set.add(key)
+        return new_token_list
+
+    def remove_document(self, key):
+        with self.lock:
+            document = self.document_by_key.pop(key, None)
+            if document is None:
+                return
+            for token in document.token_tuple:
+                key_set = self.key_set_by_token.get(token)
+                if key_set is None:
+                    continue
+                key_set.discard(key)
+                if key_set:
+                    continue
+                del self.key_set_by_token[token]
+                # In add_document_list the token may not be in the sorted list yet
+                token_index = bisect.bisect_left(self.sorted_token_list, token)
+                if token_index < len(self.sorted_token_list) and self.sorted_token_list[token_index] == token:
+                    del self.sorted_token_list[token_index]
+                for trigram in convert_search_token_to_trigrams(token):
+                    token_set = self.token_set_by_trigram.get(trigram)
+                    if token_set is not None:
+                        token_set.discard(token)
+                        if not token_set:
+                            del self.token_set_by_trigram[trigram]
+
+    def score_tokens_for_word(self, word):
+        """
+        :return: {token: score} for every indexed token this search word matches
+        """
+        score_by_token = {}
+        if word in self.key_set_by_token:
+            score_by_token[word] = SEARCH_WORD_EXACT_SCORE
+        # Even one letter, since people search as they type: "kamala h"
+        token_index = bisect.bisect_right(self.sorted_token_list, word)
+        while token_index < len(self.sorted_token_list) and self.sorted_token_list[token_index].startswith(word):
+            score_by_token[self.sorted_token_list[token_index]] = SEARCH_WORD_PREFIX_SCORE
+            token_index += 1
+        if len(word) < 3:
+            return score_by_token
+        word_trigram_set = convert_search_token_to_trigrams(word)
+        # A token containing the word has at least the word's unpadded trigrams in common with it
+        word_inner_trigram_count = len(word) - 2
+        shared_trigram_counter = Counter()
+        for trigram in word_trigram_set:
+            shared_trigram_counter.update(self.token_set_by_trigram.get(trigram, ()))
+        for token, shared_trigram_count in shared_trigram_counter.items():
+            if token in score_by_token:
+                continue
+            if shared_trigram_count >= word_inner_trigram_count and word in token:
+                score_by_token[token] = SEARCH_WORD_SUBSTRING_SCORE
+                continue
+            # Padded tokens have len(token) + 1 trigrams, fewer when a trigram repeats
+            similarity = shared_trigram_count / (len(word_trigram_set) + len(token) + 1 - shared_trigram_count)
+            if similarity >= SEARCH_WORD_SIMILARITY_THRESHOLD:
+                score_by_token[token] = round(SEARCH_WORD_SIMILAR_SCORE * similarity, 2)
+        return score_by_token
+
+    def search(self, text_from_search_field='', kind_of_owner_list=None, max_results=SEARCH_NAME_INDEX_MAX_RESULTS):
+        """
+        :return: list of (result_score, SearchNameIndexDocument), best first
+        """
+        word_list = list(dict.fromkeys(convert_to_search_tokens(text_from_search_field)))
+        if not word_list:
+            return []
+        with self.lock:
+            score_by_key = None
+            for word in word_list:
+                word_score_by_key = {}
+                for token, token_score in self.score_tokens_for_word(word).items():
+                    for key in self.key_set_by_token[token]:
+                        if token_score > word_score_by_key.get(key, 0):
+                            word_score_by_key[key] = token_score
+                if score_by_key is None:
+                    score_by_key = word_score_by_key
+                else:
+                    score_by_key = {key: score + word_score_by_key[key]
+                                    for key, score in score_by_key.items() if key in word_score_by_key}
+                if not score_by_key:
+                    return []
+            if kind_of_owner_list:
+                score_by_key = {key: score for key, score in score_by_key.items() if key[0] in kind_of_owner_list}
+            best_key_list = heapq.nsmallest(
+                max_results, score_by_key,
+                key=lambda key: (-score_by_key[key], len(self.document_by_key[key].result_title), key))
+            return [(round(score_by_key[key], 2), self.document_by_key[key]) for key in best_key_list]
+
+
+search_name_index = None
+# Guards starting a build, and swapping the new index in
+search_name_index_build_lock = threading.Lock()
+search_name_index_build_thread = None
+search_name_index_date_build_started = None
+# Instances saved or deleted while a build is running. The build may have read them before the change, so they are
+#  applied to the new index again before it replaces the old one.
+search_name_index_build_update_list = []
+
+
+def generate_search_name_index_documents():
+    for model, (field_name_tuple, is_searchable, generate_document) in SEARCH_NAME_INDEX_SOURCE_BY_MODEL.items():
+        queryset = model.objects.using('readonly').all()
+        if model is CandidateCampaign:
+            queryset = queryset.filter(
+                candidate_ultimate_election_date__gte=convert_date_to_date_as_integer(datetime.now().date()))
+        elif model is ContestOffice:
+            election_list = fetch_election_catalog().retrieve_upcoming_elections(include_test_election=True)
+            queryset = queryset.filter(
+                google_civic_election_id__in=[election.google_civic_election_id for election in election_list])
+        elif model is Organization:
+            queryset = queryset.exclude(organization_type=INDIVIDUAL)
+        for one_dict in queryset.values(*field_name_tuple).iterator(chunk_size=2000):
+            yield generate_document(one_dict)
+
+
+def build_search_name_index():
+    new_search_name_index = SearchNameIndex()
+    new_search_name_index.add_document_list(generate_search_name_index_documents())
+    return new_search_name_index
+
+
+def is_search_name_index_build_running():
+    # A forked process doesn't inherit its parent's threads, so a build started before the fork isn't running here
+    return search_name_index_build_thread is not None and search_name_index_build_thread.is_alive()
+
+
+def run_search_name_index_build():
+    global search_name_index
+    try:
+        new_search_name_index = build_search_name_index()
+    except Exception as e:
+        logger.error("BUILD_SEARCH_NAME_INDEX_FAILED: " + str(e))
+        new_search_name_index = None
+    finally:
+        connections.close_all()
+    with search_name_index_build_lock:
+        if new_search_name_index is not None:
+            for instance, deleted in search_name_index_build_update_list:
+                apply_search_name_index_update(new_search_name_index, instance, deleted)
+            search_name_index = new_search_name_index
+        search_name_index_build_update_list.clear()
+
+
+def start_search_name_index_build():
+    """
+    Build a new index on a background thread, unless one is being built, or a build was started less than
+    SEARCH_NAME_INDEX_BUILD_RETRY_SECONDS ago (so a database outage doesn't start one build per search).
+    :return: True if a build was started
+    """
+    global search_name_index_build_thread, search_name_index_date_build_started
+    with search_name_index_build_lock:
+        if is_search_name_index_build_running():
+            return False
+        if search_name_index_date_build_started is not None and \
+                time.monotonic() - search_name_index_date_build_started < SEARCH_NAME_INDEX_BUILD_RETRY_SECONDS:
+            return False
+        search_name_index_build_update_list.clear()
+        search_name_index_date_build_started = time.monotonic()
+        search_name_index_build_thread = threading.Thread(
+            target=run_search_name_index_build, name='SearchNameIndexBuild', daemon=True)
+        search_name_index_build_thread.start()
+        return True
+
+
+def fetch_search_name_index():
+    """
+    The index for this process, or None until the first build finishes. A missing or out-of-date index is built
+    on a background thread, and callers keep searching the old one until the new one is ready.
+    :return:
+    """
+    current_search_name_index = search_name_index
+    if current_search_name_index is None or \
+            time.monotonic() - current_search_name_index.date_built >= SEARCH_NAME_INDEX_MAX_AGE_SECONDS:
+        start_search_name_index_build()
+    return current_search_name_index
+
+
+def apply_search_name_index_update(current_search_name_index, instance, deleted=False):
+    field_name_tuple, is_searchable, generate_document = SEARCH_NAME_INDEX_SOURCE_BY_MODEL[type(instance)]
+    try:
+        one_dict = {field_name: getattr(instance, field_name, None) for field_name in field_name_tuple}
+        document = generate_document(one_dict)
+        if deleted or (is_searchable is not None and not is_searchable(one_dict)):
+            current_search_name_index.remove_document((document.kind_of_owner, document.local_id))
+        else:
+            current_search_name_index.add_document(document)
+    except Exception as e:
+        logger.error("UPDATE_SEARCH_NAME_INDEX_FAILED: " + str(e))
+
+
+def update_search_name_index(instance, deleted=False):
+    """
+    Keep the index in this process current. Nothing to do until the index has been built.
+    """
+    with search_name_index_build_lock:
+        if is_search_name_index_build_running():
+            search_name_index_build_update_list.append((instance, deleted))
+        current_search_name_index = search_name_index
+    if current_search_name_index is None:
+        return
+    apply_search_name_index_update(current_search_name_index, instance, deleted)
+
+
 ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
 if positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
     elastic_search_object = Elasticsearch(
@@ -99,6 +559,7 @@ if positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
 @receiver(post_save, sender=CandidateCampaign)
 def save_candidate_campaign_signal(sender, instance, **kwargs):
     # logger.debug("search.save_candidate_campaign_signal")
+    update_search_name_index(instance)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         doc = {
             "candidate_name": instance.candidate_name,
@@ -121,6 +582,7 @@ def save_candidate_campaign_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=CandidateCampaign)
 def delete_candidate_campaign_signal(sender, instance, **kwargs):
     # logger.debug("search.delete_CandidateCampaign_signal")
+    update_search_name_index(instance, deleted=True)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         try:
             res = elastic_search_object.delete(index="candidates", doc_type='candidate', id=instance.id)
@@ -170,6 +632,7 @@ def delete_contest_measure_signal(sender, instance, **kwargs):
 @receiver(post_save, sender=ContestOffice)
 def save_contest_office_signal(sender, instance, **kwargs):
     # logger.debug("search.save_ContestOffice_signal")
+    update_search_name_index(instance)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         doc = {
             "we_vote_id": instance.we_vote_id,
@@ -189,6 +652,7 @@ def save_contest_office_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=ContestOffice)
 def delete_contest_office_signal(sender, instance, **kwargs):
     # logger.debug("search.delete_ContestOffice_signal")
+    update_search_name_index(instance, deleted=True)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         try:
             res = elastic_search_object.delete(index="offices", doc_type='office', id=instance.id)
@@ -247,6 +711,7 @@ def delete_election_signal(sender, instance, **kwargs):
 @receiver(post_save, sender=Organization)
 def save_organization_signal(sender, instance, **kwargs):
     # logger.debug("search.save_Organization_signal")
+    update_search_name_index(instance)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         doc = {
             "we_vote_id": instance.we_vote_id,
@@ -268,6 +733,7 @@ def save_organization_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=Organization)
 def delete_organization_signal(sender, instance, **kwargs):
     # logger.debug("search.delete_Organization_signal")
+    update_search_name_index(instance, deleted=True)
     if ELASTIC_SEARCH_TURNED_ON and 'elastic_search_object' in globals():
         try:
             res = elastic_search_object.delete(index="organizations", doc_type='organization', id=instance.id)
@@ -278,6 +744,18 @@ def delete_organization_signal(sender, instance, **kwargs):
             logger.error(status)
 
 
+
+# Politician
+@receiver(post_save, sender=Politician)
+def save_politician_signal(sender, instance, **kwargs):
+    update_search_name_index(instance)
+
+
+@receiver(post_delete, sender=Politician)
+def delete_politician_signal(sender, instance, **kwargs):
+    update_search_name_index(instance, deleted=True)
+
+
 # @receiver(post_save)
 # def save_signal(sender, **kwargs):
 #     print("### save")
@@ -0,0 +1,169 @@
+# search/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+import search.controllers
+import search.models
+from politician.models import Politician
+from search.controllers import search_all_for_api
+from search.models import SEARCH_WORD_EXACT_SCORE, SEARCH_WORD_PREFIX_SCORE, SEARCH_WORD_SUBSTRING_SCORE, \
+    SearchNameIndex, fetch_search_name_index, generate_office_search_document, generate_politician_search_document, \
+    update_search_name_index
+
+
+def generate_politician_dict(local_id, politician_name, politician_twitter_handle=''):
+    return {
+        'id':                                       local_id,
+        'we_vote_id':                               'wv01pol' + str(local_id),
+        'politician_name':                          politician_name,
+        'first_name':                               '',
+        'last_name':                                '',
+        'google_civic_candidate_name':              '',
+        'politician_twitter_handle':                politician_twitter_handle,
+        'politician_twitter_handle2':               '',
+        'politician_twitter_handle3':               '',
+        'politician_twitter_handle4':               '',
+        'politician_twitter_handle5':               '',
+        'state_code':                               'CA',
+        'we_vote_hosted_profile_image_url_medium':  '',
+    }
+
+
+def generate_document_list():
+    return [
+        generate_politician_search_document(generate_politician_dict(1, "Kamala Harris", "KamalaHarris")),
+        generate_politician_search_document(generate_politician_dict(2, "Joe Biden", "Joe_Biden")),
+        generate_politician_search_document(generate_politician_dict(3, "Ben Harrison")),
+        generate_office_search_document({
+            'id': 4, 'we_vote_id': 'wv01off4', 'office_name': "Governor of California",
+            'google_civic_election_id': 1000001, 'state_code': 'CA'}),
+    ]
+
+
+class SearchNameIndexTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.search_name_index = SearchNameIndex()
+        self.search_name_index.add_document_list(generate_document_list())
+
+    def search_local_id_list(self, text_from_search_field, kind_of_owner_list=None):
+        return [document.local_id for _, document in self.search_name_index.search(
+            text_from_search_field=text_from_search_field, kind_of_owner_list=kind_of_owner_list)]
+
+    def test_add_document_list_matches_add_document(self):
+        incremental_search_name_index = SearchNameIndex()
+        for document in generate_document_list():
+            incremental_search_name_index.add_document(document)
+        self.assertEqual(self.search_name_index.sorted_token_list, incremental_search_name_index.sorted_token_list)
+        self.assertEqual(self.search_name_index.sorted_token_list, sorted(self.search_name_index.key_set_by_token))
+
+    def test_prefix_match(self):
+        # Search as you type: "kamala h"
+        result_list = self.search_name_index.search(text_from_search_field="kamala h")
+        self.assertEqual([document.local_id for _, document in result_list], [1])
+        self.assertEqual(result_list[0][0], SEARCH_WORD_EXACT_SCORE + SEARCH_WORD_PREFIX_SCORE)
+        # Equal scores, shorter title first
+        self.assertEqual(self.search_local_id_list("harr"), [3, 1])
+
+    def test_substring_match(self):
+        result_list = self.search_name_index.search(text_from_search_field="arris")
+        self.assertEqual(sorted(document.local_id for _, document in result_list), [1, 3])
+        self.assertEqual({result_score for result_score, _ in result_list}, {SEARCH_WORD_SUBSTRING_SCORE})
+        # Inside the whole twitter handle only
+        self.assertEqual(self.search_local_id_list("ebiden"), [2])
+
+    def test_exact_match_ranks_first(self):
+        self.assertEqual(self.search_local_id_list("harris"), [1, 3])
+        # "harris" is also close enough to be a misspelling of "harrison"
+        self.assertEqual(self.search_local_id_list("harrison"), [3, 1])
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.search_local_id_list("joe harris"), [])
+
+    def test_kind_of_owner_list(self):
+        self.assertEqual(self.search_local_id_list("california"), [4])
+        self.assertEqual(self.search_local_id_list("california", kind_of_owner_list=['POLITICIAN']), [])
+
+    def test_remove_document(self):
+        self.search_name_index.remove_document(('POLITICIAN', 3))
+        self.assertEqual(self.search_local_id_list("harr"), [1])
+        self.assertNotIn('harrison', self.search_name_index.sorted_token_list)
+
+
+class SearchNameIndexBuildTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.build_can_finish = threading.Event()
+        for name, value in (('search_name_index', None), ('search_name_index_build_thread', None),
+                            ('search_name_index_date_build_started', None)):
+            patcher = mock.patch.object(search.models, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(search.models, 'build_search_name_index', self.build_search_name_index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build_search_name_index(self):
+        self.build_can_finish.wait(5)
+        new_search_name_index = SearchNameIndex()
+        new_search_name_index.add_document_list(generate_document_list())
+        return new_search_name_index
+
+    def test_build_runs_in_background(self):
+        self.assertIsNone(fetch_search_name_index())
+        self.assertTrue(search.models.is_search_name_index_build_running())
+        # Only one build at a time
+        build_thread = search.models.search_name_index_build_thread
+        self.assertIsNone(fetch_search_name_index())
+        self.assertIs(search.models.search_name_index_build_thread, build_thread)
+
+        self.build_can_finish.set()
+        build_thread.join(5)
+        search_name_index = fetch_search_name_index()
+        self.assertEqual([document.local_id for _, document in search_name_index.search("kamala")], [1])
+
+    def test_update_during_build_is_applied_to_new_index(self):
+        fetch_search_name_index()
+        politician = Politician(**generate_politician_dict(5, "Kamala Jones"))
+        update_search_name_index(politician)
+        politician_to_delete = Politician(**generate_politician_dict(3, "Ben Harrison"))
+        update_search_name_index(politician_to_delete, deleted=True)
+
+        self.build_can_finish.set()
+        search.models.search_name_index_build_thread.join(5)
+        search_name_index = fetch_search_name_index()
+        self.assertEqual(sorted(document.local_id for _, document in search_name_index.search("kamala")), [1, 5])
+        self.assertEqual([document.local_id for _, document in search_name_index.search("ben")], [])
+        self.assertEqual(search.models.search_name_index_build_update_list, [])
+
+
+class SearchAllWhileIndexBuildsTestCase(TransactionTestCase):
+    # search_politicians reads with using('readonly'), so the rows need to be committed to be visible there
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        for module, name, value in (
+                (search.controllers, 'fetch_search_name_index', mock.Mock(return_value=None)),
+                (search.controllers, 'is_voter_device_id_valid', mock.Mock(return_value={'success': True})),
+                (search.controllers, 'fetch_voter_id_from_voter_device_link', mock.Mock(return_value=1))):
+            patcher = mock.patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_politicians_are_searched_in_the_database(self):
+        Politician.objects.create(we_vote_id='wv01pol1', politician_name="Kamala Harris")
+        results = search_all_for_api(text_from_search_field="harris", voter_device_id='device1')
+        self.assertTrue(results['success'])
+        self.assertIn('SEARCH_NAME_INDEX_BUILDING', results['status'])
+        self.assertTrue(results['search_results_found'])
+        self.assertEqual([one_result['we_vote_id'] for one_result in results['search_results']], ['wv01pol1'])
+
+        # Only politicians are in the database search
+        results = search_all_for_api(
+            text_from_search_field="harris", voter_device_id='device1', search_scope_list=['OFN'])
+        self.assertFalse(results['search_results_found'])
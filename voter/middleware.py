@@ -0,0 +1,24 @@
+# voter/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Per-request memo of voter_device_id lookups"""
+
+from .models import voter_device_request_memo
+
+
+class VoterDeviceRequestMemoMiddleware(object):
+    """
+    Gives each request its own voter_device_request_memo, so fetch_voter_device_identity goes to the process cache
+    (or the database) at most once per voter_device_id per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = voter_device_request_memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            voter_device_request_memo.reset(token)
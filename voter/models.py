@@ -5,6 +5,7 @@ import json
 import re
 import string
 import sys
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 
 import pytz
@@ -14,11 +15,14 @@ from django.contrib.auth.models import (BaseUserManager, AbstractBaseUser)  # Pe
 from django.core.validators import RegexValidator
 from django.db import (models, IntegrityError)
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from geopy import get_geocoder_for_service
 from validate_email import validate_email
 
 import wevote_functions.admin
+from api_internal_cache.models import ApiInternalCacheLocalTier
 from apple.models import AppleUser
 from config.base import get_environment_variable, get_environment_variable_default
 from exception.models import handle_exception, handle_record_found_more_than_one_exception, \
@@ -4383,14 +4387,95 @@ class VoterIssuesLookup(models.Model):
     womens_equality = models.BooleanField(default=None, null=True)
 
 
-# This method *just* returns the voter_id or 0
-def fetch_voter_id_from_voter_device_link(voter_device_id):
+# ########## voter_device_id -> voter cache ###########
+# Nearly every API call turns the voter_device_id cookie into a voter, often several times in one request. That
+#  lookup is read through:
+#  1) voter_device_request_memo, for the rest of the request (see voter.middleware.VoterDeviceRequestMemoMiddleware)
+#  2) A process-local LRU, for VOTER_DEVICE_CACHE_LOCAL_TTL_SECONDS
+#  3) VoterDeviceLink (and Voter, for the voter_we_vote_id)
+# Saving or deleting a VoterDeviceLink (sign in, sign out, voter merge) clears its entry from the request memo and
+#  from the local tier of the process it happens in. Other processes can keep using the old entry until it expires
+#  in their local tier, which is why that time-to-live is short.
+VOTER_DEVICE_CACHE_ON = \
+    str(get_environment_variable_default('VOTER_DEVICE_CACHE_ON', True)).lower() == 'true' and 'test' not in sys.argv
+VOTER_DEVICE_CACHE_LOCAL_MAX_ENTRIES = \
+    int(get_environment_variable_default('VOTER_DEVICE_CACHE_LOCAL_MAX_ENTRIES', 20000))
+VOTER_DEVICE_CACHE_LOCAL_TTL_SECONDS = int(get_environment_variable_default('VOTER_DEVICE_CACHE_LOCAL_TTL_SECONDS', 15))
+
+voter_device_cache_local_tier = ApiInternalCacheLocalTier(
+    max_entries=VOTER_DEVICE_CACHE_LOCAL_MAX_ENTRIES, ttl_seconds=VOTER_DEVICE_CACHE_LOCAL_TTL_SECONDS)
+# voter_device_id -> identity dict, for the request being handled. None outside of a request.
+voter_device_request_memo = ContextVar('voter_device_request_memo', default=None)
+
+
+def voter_device_cache_key(voter_device_id):
+    return 'voter_device:' + str(voter_device_id)
+
+
+def cache_voter_device_identity(voter_device_id, voter_device_identity):
+    if not VOTER_DEVICE_CACHE_ON:
+        return
+    request_memo = voter_device_request_memo.get()
+    if request_memo is not None:
+        request_memo[voter_device_id] = voter_device_identity
+    voter_device_cache_local_tier.set(voter_device_cache_key(voter_device_id), voter_device_identity)
+
+
+def invalidate_voter_device_cache(voter_device_id):
+    request_memo = voter_device_request_memo.get()
+    if request_memo is not None:
+        request_memo.pop(voter_device_id, None)
+    voter_device_cache_local_tier.delete(voter_device_cache_key(voter_device_id))
+
+
+def fetch_voter_device_identity(voter_device_id):
+    """
+    The voter a voter_device_id is signed in as, from the cache when we can
+    :param voter_device_id:
+    :return: {'voter_id': ..., 'voter_we_vote_id': ...}, or None when there is no VoterDeviceLink. voter_we_vote_id
+     is None until fetch_voter_we_vote_id_from_voter_device_link looks it up. Entries are shared, so don't change them.
+    """
+    if not positive_value_exists(voter_device_id):
+        return None
+    if VOTER_DEVICE_CACHE_ON:
+        request_memo = voter_device_request_memo.get()
+        if request_memo is not None and voter_device_id in request_memo:
+            return request_memo[voter_device_id]
+        voter_device_identity = voter_device_cache_local_tier.get(voter_device_cache_key(voter_device_id))
+        if voter_device_identity is not None:
+            if request_memo is not None:
+                request_memo[voter_device_id] = voter_device_identity
+            return voter_device_identity
+
     voter_device_link_manager = VoterDeviceLinkManager()
     results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(
         voter_device_id, read_only=True)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        return voter_device_link.voter_id
+    if not results['voter_device_link_found']:
+        # Not cached, so a VoterDeviceLink created a moment from now is found right away
+        return None
+    voter_device_identity = {
+        'voter_id':         results['voter_device_link'].voter_id,
+        'voter_we_vote_id': None,
+    }
+    cache_voter_device_identity(voter_device_id, voter_device_identity)
+    return voter_device_identity
+
+
+@receiver(post_save, sender=VoterDeviceLink)
+def save_voter_device_link_signal(sender, instance, **kwargs):
+    invalidate_voter_device_cache(instance.voter_device_id)
+
+
+@receiver(post_delete, sender=VoterDeviceLink)
+def delete_voter_device_link_signal(sender, instance, **kwargs):
+    invalidate_voter_device_cache(instance.voter_device_id)
+
+
+# This method *just* returns the voter_id or 0
+def fetch_voter_id_from_voter_device_link(voter_device_id):
+    voter_device_identity = fetch_voter_device_identity(voter_device_id)
+    if voter_device_identity is not None:
+        return voter_device_identity['voter_id']
     return 0
 
 
@@ -4448,12 +4533,9 @@ def fetch_api_voter_from_request(request):
 
 
 def fetch_voter_from_voter_device_link(voter_device_id):
-    voter_device_link_manager = VoterDeviceLinkManager()
-    results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(
-        voter_device_id, read_only=True)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        voter_id = voter_device_link.voter_id
+    voter_device_identity = fetch_voter_device_identity(voter_device_id)
+    if voter_device_identity is not None:
+        voter_id = voter_device_identity['voter_id']
         voter_manager = VoterManager()
         results = voter_manager.retrieve_voter_by_id(voter_id, read_only=True)
         if results['voter_found']:
@@ -4464,16 +4546,18 @@ def fetch_voter_from_voter_device_link(voter_device_id):
 
 
 def fetch_voter_we_vote_id_from_voter_device_link(voter_device_id):
-    voter_device_link_manager = VoterDeviceLinkManager()
-    results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id,
-                                                                                        read_only=True)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        voter_id = voter_device_link.voter_id
+    voter_device_identity = fetch_voter_device_identity(voter_device_id)
+    if voter_device_identity is not None:
+        if voter_device_identity['voter_we_vote_id'] is not None:
+            return voter_device_identity['voter_we_vote_id']
         voter_manager = VoterManager()
-        results = voter_manager.retrieve_voter_by_id(voter_id, read_only=True)
+        results = voter_manager.retrieve_voter_by_id(voter_device_identity['voter_id'], read_only=True)
         if results['voter_found']:
             voter = results['voter']
+            cache_voter_device_identity(voter_device_id, {
+                'voter_id':         voter_device_identity['voter_id'],
+                'voter_we_vote_id': voter.we_vote_id,
+            })
             return voter.we_vote_id
         return ""
 
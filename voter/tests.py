@@ -0,0 +1,71 @@
+# voter/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.test import TransactionTestCase
+
+import voter.models
+from voter.middleware import VoterDeviceRequestMemoMiddleware
+from voter.models import Voter, VoterDeviceLink, VoterDeviceLinkManager, fetch_voter_id_from_voter_device_link, \
+    fetch_voter_we_vote_id_from_voter_device_link, voter_device_cache_local_tier, voter_device_request_memo
+
+
+# The cache is off under the test runner, so each test turns it on
+@mock.patch.object(voter.models, 'VOTER_DEVICE_CACHE_ON', True)
+class VoterDeviceCacheTestCase(TransactionTestCase):
+    # Voters are read from readonly
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        voter_device_cache_local_tier.clear()
+        self.addCleanup(voter_device_cache_local_tier.clear)
+        self.voter = Voter.objects.create(we_vote_id='wv01voter1')
+        self.other_voter = Voter.objects.create(we_vote_id='wv01voter2')
+        self.voter_device_link = VoterDeviceLink.objects.create(voter_device_id='device1', voter_id=self.voter.id)
+
+    def test_lookups_are_cached(self):
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.voter.id)
+        self.assertEqual(fetch_voter_we_vote_id_from_voter_device_link('device1'), 'wv01voter1')
+        with self.assertNumQueries(0):
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.voter.id)
+            self.assertEqual(fetch_voter_we_vote_id_from_voter_device_link('device1'), 'wv01voter1')
+
+    def test_missing_link_is_not_cached(self):
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device2'), 0)
+        VoterDeviceLink.objects.create(voter_device_id='device2', voter_id=self.other_voter.id)
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device2'), self.other_voter.id)
+
+    def test_saving_the_link_clears_the_cache(self):
+        self.assertEqual(fetch_voter_we_vote_id_from_voter_device_link('device1'), 'wv01voter1')
+        # Signing in as another voter, or a voter merge, moves the device
+        self.voter_device_link.voter_id = self.other_voter.id
+        self.voter_device_link.save()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.other_voter.id)
+        self.assertEqual(fetch_voter_we_vote_id_from_voter_device_link('device1'), 'wv01voter2')
+
+    def test_deleting_the_link_clears_the_cache(self):
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.voter.id)
+        # Signing out deletes with a queryset
+        VoterDeviceLinkManager.delete_voter_device_link('device1')
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), 0)
+
+        VoterDeviceLink.objects.create(voter_device_id='device1', voter_id=self.voter.id)
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.voter.id)
+        VoterDeviceLink.objects.get(voter_device_id='device1').delete()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), 0)
+
+    def test_request_memo(self):
+        def get_response(request):
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.voter.id)
+            self.assertIn('device1', voter_device_request_memo.get())
+            # Cleared from the request memo too, not just the process cache
+            VoterDeviceLink.objects.filter(voter_device_id='device1').update(voter_id=self.other_voter.id)
+            VoterDeviceLink.objects.get(voter_device_id='device1').save()
+            self.assertNotIn('device1', voter_device_request_memo.get())
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device1'), self.other_voter.id)
+            return 'response'
+
+        self.assertEqual(VoterDeviceRequestMemoMiddleware(get_response)(None), 'response')
+        self.assertIsNone(voter_device_request_memo.get())
@@ -285,6 +285,10 @@ def fetch_batch_process_system_general_maintenance_on():
     return fetch_batch_process_system_on_by_process_name('batch_process_system_general_maintenance_on')
 
 
+def fetch_batch_process_system_generate_ballot_snapshots_on():
+    return fetch_batch_process_system_on_by_process_name('batch_process_system_generate_ballot_snapshots_on')
+
+
 def fetch_batch_process_system_generate_voter_guides_on():
     return fetch_batch_process_system_on_by_process_name('batch_process_system_generate_voter_guides_on')
 
@@ -313,6 +317,14 @@ def fetch_batch_process_system_search_twitter_on():
     return fetch_batch_process_system_on_by_process_name('batch_process_system_search_twitter_on')
 
 
+def fetch_batch_process_system_update_politician_recommendations_on():
+    return fetch_batch_process_system_on_by_process_name('batch_process_system_update_politician_recommendations_on')
+
+
+def fetch_batch_process_system_update_suggested_friends_on():
+    return fetch_batch_process_system_on_by_process_name('batch_process_system_update_suggested_friends_on')
+
+
 def fetch_batch_process_system_update_twitter_on():
     return fetch_batch_process_system_on_by_process_name('batch_process_system_update_twitter_on')
 